@@ -60,9 +60,21 @@ def create_app(config_name='default'):
     # Initialize extensions
     init_extensions(app)
 
+    # Count and time each request's queries, before any other hook runs them
+    from app.services.query_profiler import register_query_profiler
+    register_query_profiler(app)
+
+    # Request latency, pool usage, cache hits and door decisions for /metrics
+    from app.services.metrics import register_metrics
+    register_metrics(app)
+
     # Register blueprints. Diagnostic endpoints stay out of production builds.
     register_blueprints(app, include_dev_tools=config_name != 'production')
     
+    # Per-request caches must not outlive the request. Registered before the
+    # account guard, which leaves the request's principal among them.
+    register_request_cache_reset(app)
+
     # Reject tokens belonging to deactivated accounts
     register_active_account_guard(app)
 
@@ -72,11 +84,54 @@ def create_app(config_name='default'):
     # Attach baseline security headers to every response
     register_security_headers(app)
 
-    # Per-request caches must not outlive the request
-    register_request_cache_reset(app)
+    # Every gym_settings write tells the other workers' settings caches
+    from app.services.settings_cache import register_write_through
+    register_write_through()
+
+    # Keep the daily revenue rollups in step with the ledger
+    from app.services.revenue_rollup import register_rollup_maintenance
+    register_rollup_maintenance()
+
+    # Keep each member's attendance summary in step with their entries
+    from app.services.attendance_summary import register_attendance_maintenance
+    register_attendance_maintenance()
+
+    # Count check-ins per branch per minute for the member app's "is it busy?"
+    from app.services.occupancy import register_occupancy_maintenance
+    register_occupancy_maintenance()
+
+    # Keep each conversation's last message and unread counts with its messages
+    from app.services.message_threads import register_thread_maintenance
+    register_thread_maintenance()
+
+    # Keep the customer search entries in step with the customer rows
+    from app.services.customer_search import register_search_maintenance
+    register_search_maintenance()
+
+    # Drop cached owner-dashboard snapshots when the figures behind them change
+    from app.services.dashboard_cache import register_dirty_tracking
+    register_dirty_tracking()
+
+    # Drop cached branch scopes when branches, gyms or staff assignments change
+    from app.services.scope_cache import register_scope_invalidation
+    register_scope_invalidation()
 
-    # Carry out due account deletions without needing the member to come back
-    register_retention_sweep(app)
+    # Drop cached account flags when an account is deactivated or signed out
+    from app.services.principal import register_revocation_tracking
+    register_revocation_tracking()
+
+    # Start each worker's push and message dispatchers with the worker, not
+    # with its first enqueue, so what was pending across a restart is not
+    # stranded
+    from app.services.push_outbox import register_push_dispatcher
+    register_push_dispatcher(app)
+    from app.services.message_outbox import register_message_dispatcher
+    register_message_dispatcher(app)
+
+    # Run housekeeping (account erasure, subscription expiry, lapsed freezes)
+    # on a timetable, once across all workers, instead of on request traffic
+    from app.services.scheduler import register_job_scheduler
+    register_job_scheduler(app)
 
     # Pick an SMS/email provider from the environment. Without this the
     # notification service keeps its development console default, which
@@ -111,7 +166,7 @@ def create_app(config_name='default'):
 #: Caches that hold for exactly one request. Each lives on ``flask.g`` and is
 #: keyed by gym id, so a stale entry is a stale *value*, not another tenant's
 #: data — an owner flipping a gym rule would otherwise keep seeing the old one.
-_PER_REQUEST_CACHES = ('_gym_rules_cache', '_gym_branch_ids_cache')
+_PER_REQUEST_CACHES = ('_gym_rules_cache', '_branch_scope_cache', '_principal')
 
 
 def register_request_cache_reset(app):
@@ -132,50 +187,6 @@ def register_request_cache_reset(app):
                 delattr(g, attr)
 
 
-#: How often the opportunistic retention sweep is allowed to run, per worker.
-_RETENTION_SWEEP_INTERVAL_SECONDS = 3600
-
-#: Monotonic timestamp of the last sweep in this worker. Per-process, so two
-#: workers may each run one an hour; the sweep is idempotent, so that is fine.
-_last_retention_sweep = [0.0]
-
-
-def register_retention_sweep(app):
-    """Erase accounts whose 90-day deletion grace period has elapsed.
-
-    Deletion used to be carried out only when the member next logged in or
-    opened their profile — and someone who has asked to be deleted is exactly
-    the person who never comes back, so their data stayed indefinitely.
-
-    There is no worker process in this deployment, so this rides on request
-    traffic instead: at most once an hour per worker, bounded to a couple of
-    hundred rows, and never on the request's critical path — it runs after the
-    response has been sent. `flask purge-deleted-accounts` does the same thing
-    on demand for anyone who wants it deterministic.
-    """
-    import time
-
-    @app.teardown_request
-    def _sweep_due_deletions(exception=None):
-        if exception is not None:
-            return
-
-        now = time.monotonic()
-        if now - _last_retention_sweep[0] < _RETENTION_SWEEP_INTERVAL_SECONDS:
-            return
-        _last_retention_sweep[0] = now
-
-        try:
-            from app.services.retention_service import purge_due_accounts
-            purged = purge_due_accounts()
-            if purged:
-                app.logger.info(
-                    'Retention: erased %s account(s) past the grace period', purged)
-        except Exception as e:
-            # Never let housekeeping affect the response that just went out.
-            app.logger.warning('Retention sweep failed: %s', e)
-
-
 #: Arbitrary but fixed key for the advisory lock that serialises schema
 #: migration across gunicorn workers. Any constant works as long as every
 #: worker uses the same one.
@@ -297,6 +308,17 @@ def _ensure_db_schema(app):
                     db.session.commit()
                     app.logger.info('Auto-migration: added template_hash column to fingerprints table')
 
+            # The counter workers compare to know their cached gym settings
+            # are stale. 0 everywhere is fine: nothing has cached anything yet.
+            if 'gyms' in existing_tables:
+                columns = [col['name'] for col in inspector.get_columns('gyms')]
+                if 'settings_version' not in columns:
+                    db.session.execute(text(
+                        'ALTER TABLE gyms ADD COLUMN settings_version INTEGER NOT NULL DEFAULT 0'
+                    ))
+                    db.session.commit()
+                    app.logger.info('Auto-migration: added settings_version column to gyms table')
+
             # Add gym_id column to users table if missing
             if 'users' in existing_tables:
                 columns = [col['name'] for col in inspector.get_columns('users')]
@@ -411,6 +433,33 @@ def _ensure_db_schema(app):
                             f'Auto-migration: added sessions_valid_from column to {_table} table'
                         )
 
+            # A pending account deletion request, which used to be a line in
+            # health_notes that the purge found with LIKE over every member.
+            # Those lines are moved into the column as it is added; after
+            # that nothing reads health_notes for them again.
+            if 'customers' in existing_tables:
+                columns = [col['name'] for col in inspector.get_columns('customers')]
+                if 'deletion_requested_at' not in columns:
+                    db.session.execute(text(
+                        'ALTER TABLE customers ADD COLUMN deletion_requested_at TIMESTAMP'
+                    ))
+                    db.session.commit()
+                    app.logger.info(
+                        'Auto-migration: added deletion_requested_at column to customers table')
+                    from app.services.retention_service import backfill_requests
+                    moved = backfill_requests()
+                    if moved:
+                        app.logger.info(
+                            f'Auto-migration: moved {moved} deletion request(s) out of health_notes')
+                index_names = {idx['name'] for idx in inspector.get_indexes('customers')}
+                if 'ix_customers_deletion_requested_at' not in index_names:
+                    db.session.execute(text(
+                        'CREATE INDEX ix_customers_deletion_requested_at '
+                        'ON customers (deletion_requested_at)'
+                    ))
+                    db.session.commit()
+                    app.logger.info('Auto-migration: added index on customers.deletion_requested_at')
+
             # The captain a member trains with, on private-training subscriptions.
             if 'subscriptions' in existing_tables:
                 columns = [col['name'] for col in inspector.get_columns('subscriptions')]
@@ -504,6 +553,38 @@ def _ensure_db_schema(app):
                     db.session.commit()
                     app.logger.info('Auto-migration: added index on complaints.customer_id')
 
+            # The employee performance report groups the ledger by staff
+            # member over a date window; without this it reads each staff
+            # member's whole history to find the window.
+            if 'transactions' in existing_tables:
+                index_names = {idx['name'] for idx in inspector.get_indexes('transactions')}
+                if 'ix_transactions_created_by_created_at' not in index_names:
+                    db.session.execute(text(
+                        'CREATE INDEX ix_transactions_created_by_created_at '
+                        'ON transactions (created_by, created_at)'
+                    ))
+                    db.session.commit()
+                    app.logger.info(
+                        'Auto-migration: added index on transactions(created_by, created_at)'
+                    )
+
+            # Composite indexes behind the keyset-paged lists (entry logs,
+            # a member's history, a branch's ledger), and behind a member's
+            # subscriptions by status (the door, and bulk expiry).
+            for table, name, columns in (
+                ('entry_logs', 'ix_entry_logs_customer_entry_time', 'customer_id, entry_time, id'),
+                ('entry_logs', 'ix_entry_logs_branch_entry_time', 'branch_id, entry_time, id'),
+                ('transactions', 'ix_transactions_branch_transaction_date',
+                 'branch_id, transaction_date, id'),
+                ('subscriptions', 'ix_subscriptions_customer_status', 'customer_id, status'),
+            ):
+                if table not in existing_tables:
+                    continue
+                if name not in {idx['name'] for idx in inspector.get_indexes(table)}:
+                    db.session.execute(text(f'CREATE INDEX {name} ON {table} ({columns})'))
+                    db.session.commit()
+                    app.logger.info(f'Auto-migration: added index {name}')
+
             if 'daily_closings' in existing_tables:
                 indexed_columns = {
                     col for idx in inspector.get_indexes('daily_closings') for col in idx['column_names']
@@ -545,6 +626,78 @@ def _ensure_db_schema(app):
                         'Auto-migration: added unique index on '
                         'daily_closings(branch_id, closing_date)'
                     )
+
+            # Backfill the daily revenue rollups the first time this runs
+            # against a ledger that predates them. create_all() above has
+            # just built the table empty, and from here on the Transaction
+            # listeners keep it current — but every report and dashboard now
+            # reads it, so history recorded before the table existed has to be
+            # summed in once or it would simply vanish from them. An empty
+            # rollup table beside a non-empty ledger is exactly that state.
+            if 'transactions' in existing_tables:
+                from app.models.daily_revenue_rollup import DailyRevenueRollup
+                from app.models.transaction import Transaction
+                has_rollups = db.session.query(DailyRevenueRollup.id).first()
+                has_ledger = db.session.query(Transaction.id).first()
+                if has_ledger and not has_rollups:
+                    from app.services.revenue_rollup import rebuild
+                    written = rebuild()
+                    app.logger.info(
+                        f'Auto-migration: backfilled {written} daily revenue rollup row(s)'
+                    )
+
+            # And for attendance: the member app reads its visit counts and
+            # streaks from the summaries alone.
+            if 'entry_logs' in existing_tables:
+                from app.models.attendance_summary import AttendanceSummary
+                from app.models.entry_log import EntryLog
+                has_summaries = db.session.query(AttendanceSummary.customer_id).first()
+                has_entries = db.session.query(EntryLog.id).first()
+                if has_entries and not has_summaries:
+                    from app.services.attendance_summary import rebuild as rebuild_attendance
+                    written = rebuild_attendance()
+                    app.logger.info(
+                        f'Auto-migration: summarised attendance for {written} member(s)'
+                    )
+
+            # And the occupancy buckets, so the first "is it busy?" after the
+            # deploy counts the check-ins of the hour before it.
+            if 'entry_logs' in existing_tables:
+                from app.models.branch_occupancy import BranchOccupancyBucket
+                if not db.session.query(BranchOccupancyBucket.branch_id).first():
+                    from app.services.occupancy import rebuild as rebuild_occupancy
+                    written = rebuild_occupancy()
+                    if written:
+                        app.logger.info(
+                            f'Auto-migration: counted {written} occupancy bucket(s)')
+
+            # And the message threads: the thread lists read nothing else, so
+            # conversations from before the table would otherwise vanish.
+            if 'messages' in existing_tables:
+                from app.models.message import Message
+                from app.models.message_thread import MessageThread
+                has_threads = db.session.query(MessageThread.id).first()
+                has_messages = db.session.query(Message.id).first()
+                if has_messages and not has_threads:
+                    from app.services.message_threads import rebuild as rebuild_threads
+                    written = rebuild_threads()
+                    app.logger.info(
+                        f'Auto-migration: summarised {written} message thread(s)'
+                    )
+
+            # Same for the customer search entries: members who predate the
+            # table are not findable until they are written in once.
+            if 'customers' in existing_tables:
+                from app.models.customer import Customer
+                from app.models.customer_search_entry import CustomerSearchEntry
+                has_entries = db.session.query(CustomerSearchEntry.customer_id).first()
+                has_customers = db.session.query(Customer.id).first()
+                if has_customers and not has_entries:
+                    from app.services.customer_search import rebuild as rebuild_search
+                    written = rebuild_search()
+                    app.logger.info(
+                        f'Auto-migration: indexed {written} customer(s) for search'
+                    )
         except Exception as e:
             app.logger.warning(f'Schema migration check: {e}')
         finally:
@@ -644,7 +797,11 @@ def register_active_account_guard(app):
 
     Two checks, both answered by one SELECT: the account is still active, and
     the token was issued after the account's revocation cutoff (set by logout
-    and by password changes — see app/services/session_service.py).
+    and by password changes — see app/services/session_service.py). For staff
+    that SELECT loads the whole row and becomes the request's principal, so
+    ``role_required`` and ``get_current_user()`` do not read it again; and
+    within PRINCIPAL_CACHE_SECONDS of the last read the flags come from this
+    worker's revocation cache instead (app/services/principal.py).
 
     ``role_required`` checks ``is_active``, but roughly half the routes are
     guarded by a bare ``@jwt_required()`` and read the user through
@@ -659,7 +816,7 @@ def register_active_account_guard(app):
     """
     from flask import jsonify, request
     from flask_jwt_extended import get_jwt, verify_jwt_in_request
-    from app.extensions import db
+    from app.services.principal import customer_status, user_status
     from app.services.session_service import token_is_revoked
 
     @app.before_request
@@ -678,15 +835,12 @@ def register_active_account_guard(app):
         except Exception:
             return None
 
-        # Read the flag as a scalar rather than loading the ORM object.
-        # db.session.get() answers from the identity map, so a session that
-        # already saw this row earlier would return a stale is_active and wave
-        # a revoked account straight through. A column query always issues a
-        # SELECT — and it also skips User.managed_branches, which is
-        # selectin-eager and would otherwise fire an extra query per request.
+        # Never db.session.get(): it answers from the identity map, so a
+        # session that already saw this row earlier would return a stale
+        # is_active and wave a revoked account straight through. The status
+        # helpers always read the stored row (or this worker's cached copy,
+        # which commits of those flags drop).
         if claims.get('scope') == 'client':
-            from app.models.customer import Customer
-
             # A member's token must not be usable as a staff account.
             #
             # Both token kinds are signed with the same secret and carry a bare
@@ -711,12 +865,10 @@ def register_active_account_guard(app):
             customer_id = claims.get('customer_id')
             if customer_id is None:
                 return None
-            row = db.session.query(
-                Customer.is_active, Customer.sessions_valid_from
-            ).filter(Customer.id == customer_id).first()
-            if row is None:
+            status = customer_status(customer_id)
+            if status is None:
                 return None
-            is_active, valid_from = row
+            is_active, valid_from = status
             if is_active is False:
                 return jsonify({
                     'success': False,
@@ -729,18 +881,15 @@ def register_active_account_guard(app):
                 }), 401
             return None
 
-        from app.models.user import User
         try:
             user_id = int(claims.get('sub'))
         except (TypeError, ValueError):
             return None
 
-        row = db.session.query(
-            User.is_active, User.sessions_valid_from
-        ).filter(User.id == user_id).first()
-        if row is None:
+        status = user_status(user_id)
+        if status is None:
             return None
-        is_active, valid_from = row
+        is_active, valid_from = status
         if is_active is False:
             # 401 rather than 403: the session itself is no longer valid, so
             # the client should log out. The Flutter interceptor force-logs-out
@@ -822,6 +971,7 @@ def register_error_handlers(app):
 
 def register_cli_commands(app):
     """Register Flask CLI commands"""
+    import click
     
     @app.cli.command('init-db')
     def init_db():
@@ -841,13 +991,187 @@ def register_cli_commands(app):
     def purge_deleted_accounts():
         """Erase members whose 90-day deletion grace period has elapsed.
 
-        The same work the hourly request-time sweep does, on demand — for a
-        cron job, or for anyone who wants to prove it has run.
+        The same work the hourly purge-deleted-accounts job does, in one go
+        and regardless of its timetable.
         """
         from app.services.retention_service import purge_due_accounts
         purged = purge_due_accounts(limit=10000)
         print(f'✅ Erased {purged} account(s) past the grace period.')
-    
+
+    @app.cli.command('dispatch-push')
+    def dispatch_push():
+        """Deliver every push notification that is due.
+
+        What each worker's dispatcher thread does on its own, on demand — for
+        PUSH_DISPATCHER=manual deployments, or to drain the queue by hand.
+        """
+        from app.services.push_outbox import dispatch_pending
+        handled = dispatch_pending(max_batches=10000)
+        print(f'✅ Dispatched {handled} queued push notification(s).')
+
+    @app.cli.command('dispatch-messages')
+    def dispatch_messages():
+        """Send every queued SMS/email code that is due.
+
+        The same work as each worker's message dispatcher thread, on demand —
+        for MESSAGE_DISPATCHER=manual deployments, or to drain the queue by hand.
+        """
+        from app.services.message_outbox import dispatch_pending
+        handled = dispatch_pending(max_batches=10000)
+        print(f'✅ Dispatched {handled} queued message(s).')
+
+    @app.cli.group('jobs')
+    def jobs():
+        """The periodic housekeeping jobs (app/services/scheduler.py)."""
+
+    @jobs.command('list')
+    def jobs_list():
+        """Every job, when it runs next and how it last went."""
+        from app.models.scheduled_job import ScheduledJob
+        from app.services.scheduler import ensure_job_rows, registered_jobs
+
+        ensure_job_rows()
+        rows = {row.name: row for row in ScheduledJob.query.all()}
+        for name, spec in sorted(registered_jobs().items()):
+            row = rows[name]
+            state = 'enabled' if row.enabled else 'DISABLED'
+            last = row.last_status.value if row.last_status else 'never run'
+            print(f'{name:<26} every {spec.every:>5}s  {state:<8}  '
+                  f'next {row.next_run_at:%Y-%m-%d %H:%M:%S}  last: {last}')
+            if spec.description:
+                print(f'    {spec.description}')
+
+    @jobs.command('run')
+    @click.argument('name', required=False)
+    @click.option('--due', is_flag=True,
+                  help='Run every job that is due, as the scheduler would.')
+    def jobs_run(name, due):
+        """Run a job now, whether or not it is due.
+
+        Still takes the job's lock, so it will not overlap a run in progress
+        on another worker — it reports that and does nothing instead.
+        """
+        from app.services.scheduler import registered_jobs, run_due_jobs, run_job
+
+        if due:
+            runs = run_due_jobs()
+        elif name in registered_jobs():
+            run = run_job(name, force=True)
+            if run is None:
+                print(f'⏭  {name} is running elsewhere; skipped.')
+                return
+            runs = [run]
+        else:
+            raise click.UsageError(
+                f"Name a job ({', '.join(sorted(registered_jobs()))}) or pass --due.")
+        for run in runs:
+            mark = '✅' if run.error is None else '❌'
+            print(f'{mark} {run.job_name}: {run.processed} row(s) in '
+                  f'{run.batches} batch(es)' + (f' — {run.error}' if run.error else ''))
+        if not runs:
+            print('Nothing was due.')
+
+    @jobs.command('history')
+    @click.argument('name', required=False)
+    @click.option('--limit', type=int, default=20, show_default=True)
+    def jobs_history(name, limit):
+        """Recent runs, newest first."""
+        from app.models.scheduled_job import JobRun
+
+        query = JobRun.query
+        if name:
+            query = query.filter_by(job_name=name)
+        for run in query.order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit):
+            took = ((run.finished_at - run.started_at).total_seconds()
+                    if run.finished_at else None)
+            print(f'{run.started_at:%Y-%m-%d %H:%M:%S}  {run.job_name:<26} '
+                  f'{run.status.value:<9} {run.processed:>6} row(s)'
+                  + (f'  {took:.1f}s' if took is not None else '')
+                  + (f'  {run.error}' if run.error else ''))
+
+    def _set_enabled(name, enabled):
+        from app.extensions import db
+        from app.models.scheduled_job import ScheduledJob
+        from app.services.scheduler import ensure_job_rows, registered_jobs
+
+        if name not in registered_jobs():
+            raise click.UsageError(f'No job named {name!r}.')
+        ensure_job_rows()
+        db.session.get(ScheduledJob, name).enabled = enabled
+        db.session.commit()
+        print(f"✅ {name} {'enabled' if enabled else 'disabled'}.")
+
+    @jobs.command('enable')
+    @click.argument('name')
+    def jobs_enable(name):
+        """Let the scheduler run a job again."""
+        _set_enabled(name, True)
+
+    @jobs.command('disable')
+    @click.argument('name')
+    def jobs_disable(name):
+        """Stop the scheduler running a job (`jobs run` still can)."""
+        _set_enabled(name, False)
+
+    @app.cli.command('rebuild-revenue-rollups')
+    @click.option('--gym-id', type=int, default=None,
+                  help='Rebuild one gym only (default: every branch).')
+    def rebuild_revenue_rollups(gym_id):
+        """Recompute the daily revenue rollups from the transaction ledger.
+
+        The backfill for history recorded before the rollups existed, and the
+        repair after a gym changes its timezone: rows already written stay on
+        the local day they were dated under until this re-dates them.
+        """
+        from app.services.revenue_rollup import rebuild
+        written = rebuild(gym_id=gym_id)
+        print(f'✅ Wrote {written} daily revenue rollup row(s).')
+
+    @app.cli.command('rebuild-attendance-summaries')
+    def rebuild_attendance_summaries():
+        """Recompute every member's attendance summary from the entry logs.
+
+        The backfill for visits recorded before the summaries existed, and the
+        repair after a gym changes its timezone: visits already summarised stay
+        on the local day they were dated under until this re-dates them.
+        """
+        from app.services.attendance_summary import rebuild
+        written = rebuild()
+        print(f'✅ Summarised attendance for {written} member(s).')
+
+    @app.cli.command('rebuild-occupancy')
+    def rebuild_occupancy():
+        """Recount the last day of branch occupancy buckets from the entry logs.
+
+        For check-ins written below the ORM, which the buckets never saw, and
+        for a database whose entries predate them.
+        """
+        from app.services.occupancy import rebuild
+        written = rebuild()
+        print(f'✅ Wrote {written} occupancy bucket(s).')
+
+    @app.cli.command('rebuild-message-threads')
+    def rebuild_message_threads():
+        """Recompute every message thread summary from the messages.
+
+        The backfill for conversations that predate the summaries, and the
+        repair after messages are written or deleted below the ORM.
+        """
+        from app.services.message_threads import rebuild
+        written = rebuild()
+        print(f'✅ Summarised {written} message thread(s).')
+
+    @app.cli.command('rebuild-customer-search')
+    def rebuild_customer_search():
+        """Recompute the customer search entries from the customers table.
+
+        The backfill for members added before search entries existed, and the
+        repair after a change to how names and numbers are folded.
+        """
+        from app.services.customer_search import rebuild
+        written = rebuild()
+        print(f'✅ Indexed {written} customer(s) for search.')
+
     @app.cli.command('reset-db')
     def reset_db():
         """Reset database (drop all tables and recreate)"""
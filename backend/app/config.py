@@ -68,6 +68,92 @@ class Config:
     ITEMS_PER_PAGE = 20
     MAX_ITEMS_PER_PAGE = 100
     
+    # How stale a worker's cached gym settings (house rules, time zone) may be
+    # after another worker changes them. The worker that makes the change sees
+    # it at once; 0 turns the cache off. See app/services/settings_cache.py.
+    GYM_SETTINGS_CACHE_SECONDS = int(os.getenv('GYM_SETTINGS_CACHE_SECONDS', '30'))
+
+    # How long an owner-dashboard snapshot may be served before it is
+    # recomputed. Committed writes in this worker drop it sooner; 0 turns the
+    # cache off. See app/services/dashboard_cache.py.
+    OWNER_DASHBOARD_CACHE_SECONDS = int(os.getenv('OWNER_DASHBOARD_CACHE_SECONDS', '30'))
+
+    # How long a worker may reuse a staff member's resolved branch scope (their
+    # gym and its branch ids). Changes made through this worker apply at once;
+    # this bounds how long other workers lag. 0 keeps it per request only. See
+    # app/services/scope_cache.py.
+    BRANCH_SCOPE_CACHE_SECONDS = int(os.getenv('BRANCH_SCOPE_CACHE_SECONDS', '30'))
+
+    # How long a worker may trust its copy of an account's active flag and
+    # sign-out cutoff. Logout and deactivation through this worker apply at
+    # once; in the other workers a revoked token keeps working for up to this
+    # long, so keep it to seconds. 0 reads the account on every request and
+    # makes logout immediate everywhere. See app/services/principal.py.
+    PRINCIPAL_CACHE_SECONDS = int(os.getenv('PRINCIPAL_CACHE_SECONDS', '5'))
+
+    # Branch occupancy for the member app (app/services/occupancy.py). A worker
+    # answers "is it busy?" from the minute buckets it last loaded for up to
+    # CACHE_SECONDS; its own check-ins count at once, other workers' after the
+    # next load. 0 reads the buckets on every request. VISIT_MINUTES is a
+    # typical visit's length, behind the "currently inside" estimate; 0 leaves
+    # the estimate out.
+    OCCUPANCY_CACHE_SECONDS = int(os.getenv('OCCUPANCY_CACHE_SECONDS', '15'))
+    OCCUPANCY_VISIT_MINUTES = int(os.getenv('OCCUPANCY_VISIT_MINUTES', '75'))
+
+    # Password hashing (app/services/password_hashing.py). ROUNDS is the
+    # pbkdf2_sha256 cost of new hashes; existing ones are upgraded or
+    # downgraded on their next login. WORKERS child processes per gunicorn
+    # worker do the hashing, with up to MAX_PENDING more waiting; 0 workers
+    # hashes inline on the request thread.
+    PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', '29000'))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '1'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+
+    # Push notifications (app/services/push_outbox.py). Requests only queue
+    # them; DISPATCHER 'thread' delivers from a background thread per worker,
+    # 'manual' leaves it to `flask dispatch-push`. TRANSPORT 'fake' sends
+    # nothing and records what it would have.
+    PUSH_DISPATCHER = os.getenv('PUSH_DISPATCHER', 'thread')
+    PUSH_TRANSPORT = os.getenv('PUSH_TRANSPORT', 'firebase')
+    PUSH_BATCH_SIZE = int(os.getenv('PUSH_BATCH_SIZE', '500'))
+    PUSH_MAX_ATTEMPTS = int(os.getenv('PUSH_MAX_ATTEMPTS', '6'))
+    PUSH_RETRY_BASE_SECONDS = int(os.getenv('PUSH_RETRY_BASE_SECONDS', '30'))
+    PUSH_POLL_SECONDS = int(os.getenv('PUSH_POLL_SECONDS', '30'))
+
+    # One-time codes by SMS/email (app/services/message_outbox.py), queued the
+    # same way. Codes expire after 15 minutes, so retries start quickly and
+    # stop well inside that: 5s, 10s, 20s, 40s, then dead-lettered.
+    MESSAGE_DISPATCHER = os.getenv('MESSAGE_DISPATCHER', 'thread')
+    MESSAGE_BATCH_SIZE = int(os.getenv('MESSAGE_BATCH_SIZE', '50'))
+    MESSAGE_MAX_ATTEMPTS = int(os.getenv('MESSAGE_MAX_ATTEMPTS', '5'))
+    MESSAGE_RETRY_BASE_SECONDS = int(os.getenv('MESSAGE_RETRY_BASE_SECONDS', '5'))
+    MESSAGE_POLL_SECONDS = int(os.getenv('MESSAGE_POLL_SECONDS', '5'))
+
+    # Periodic housekeeping (app/services/scheduler.py). SCHEDULER 'thread'
+    # checks for due jobs every POLL_SECONDS from a thread in each worker, one
+    # runner per job at a time; 'manual' leaves it to `flask jobs run --due`
+    # from cron. MAX_BATCHES bounds one run; the rest waits for the next.
+    # LOCK_DIR holds the SQLite job locks (default: the system temp dir).
+    JOBS_SCHEDULER = os.getenv('JOBS_SCHEDULER', 'thread')
+    JOBS_POLL_SECONDS = int(os.getenv('JOBS_POLL_SECONDS', '60'))
+    JOBS_MAX_BATCHES = int(os.getenv('JOBS_MAX_BATCHES', '20'))
+    JOBS_LOCK_DIR = os.getenv('JOBS_LOCK_DIR')
+
+    # Query profiling (app/services/query_profiler.py). Counts and times each
+    # request's statements into a Server-Timing header, and logs a statement
+    # run REPEAT_THRESHOLD times in one request as a likely N+1; 0 leaves the
+    # warning out. Off in production unless asked for: the header tells any
+    # client how much work an endpoint does.
+    QUERY_PROFILING = os.getenv('QUERY_PROFILING', '1') == '1'
+    QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '5'))
+
+    # Prometheus metrics at GET /metrics (app/services/metrics.py), summed
+    # across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set. TOKEN, if
+    # set, must be sent as "Authorization: Bearer <token>" by the scraper;
+    # production refuses to boot with the endpoint on and no token.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
     # File Upload (for future expansion)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
@@ -102,6 +188,8 @@ class ProductionConfig(Config):
     # stays permissive so existing deploys keep working.
     CORS_ORIGINS = _parse_origins(os.getenv('CORS_ORIGINS'), default='*')
 
+    QUERY_PROFILING = os.getenv('QUERY_PROFILING', '0') == '1'
+
     @staticmethod
     def validate():
         """Refuse to boot on the committed development secrets.
@@ -111,6 +199,11 @@ class ProductionConfig(Config):
         has read this file mint a valid owner/super-admin token.
         """
         missing = [name for name in REQUIRED_IN_PRODUCTION if not os.getenv(name)]
+        # /metrics names every endpoint, its traffic and each branch's door
+        # scans; without a token anyone who can reach the API can read them.
+        # A deploy that does not scrape switches it off with METRICS_ENABLED=0.
+        if os.getenv('METRICS_ENABLED', '1') == '1' and not os.getenv('METRICS_TOKEN'):
+            missing.append('METRICS_TOKEN (or METRICS_ENABLED=0)')
         if missing:
             raise ConfigError(
                 'Refusing to start in production without: '
@@ -132,6 +225,34 @@ class TestingConfig(Config):
     # client address; leaving the limiter on just throttles the tests and
     # turns unrelated assertions into 429s.
     RATELIMIT_ENABLED = False
+    # Off: several tests swap out ZoneInfo or a setting mid-module and assert on
+    # the very next read. The cache has its own tests, which switch it on.
+    GYM_SETTINGS_CACHE_SECONDS = 0
+    # Off for the same reason: tests that move the clock or write below the ORM
+    # read the dashboard straight after. tests/test_dashboard_cache.py turns it on.
+    OWNER_DASHBOARD_CACHE_SECONDS = 0
+    # Likewise: fixtures reassign branches with bulk and raw writes between
+    # requests. tests/test_scope_cache.py turns it on.
+    BRANCH_SCOPE_CACHE_SECONDS = 0
+    # Off, so the existing guard tests keep exercising the read from the
+    # database. tests/test_principal.py turns it on.
+    PRINCIPAL_CACHE_SECONDS = 0
+    # Off, so each request reads the buckets the test has just written.
+    # tests/test_occupancy.py turns it on.
+    OCCUPANCY_CACHE_SECONDS = 0
+    # Inline: a pool of child processes per test module is slow to start and
+    # buys nothing single-threaded. tests/test_password_hashing.py starts one.
+    PASSWORD_HASH_WORKERS = 0
+    # Nothing leaves the test process, and pushes wait to be dispatched by the
+    # test that wants them (tests/test_push_outbox.py).
+    PUSH_TRANSPORT = 'fake'
+    PUSH_DISPATCHER = 'manual'
+    # Likewise for codes: tests/test_message_outbox.py and the reset tests
+    # dispatch explicitly.
+    MESSAGE_DISPATCHER = 'manual'
+    # And no housekeeping behind the tests' backs: tests/test_scheduler.py
+    # runs the jobs itself.
+    JOBS_SCHEDULER = 'manual'
 
 
 config = {
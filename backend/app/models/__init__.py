@@ -6,6 +6,7 @@ from .branch import Branch
 from .gym import Gym
 from .gym_setting import GymSetting
 from .customer import Customer, Gender
+from .customer_search_entry import CustomerSearchEntry
 from .service import Service, ServiceType
 from .subscription import Subscription, SubscriptionStatus
 from .transaction import Transaction, PaymentMethod, TransactionType
@@ -14,21 +15,29 @@ from .complaint import Complaint, ComplaintType, ComplaintStatus
 from .issue import Issue, IssueStatus, IssuePriority
 from .freeze_history import FreezeHistory
 from .daily_closing import DailyClosing
+from .daily_revenue_rollup import DailyRevenueRollup
 from .fingerprint import Fingerprint
 from .activation_code import ActivationCode, ActivationCodeType
+from .message_delivery import MessageDelivery, DeliveryStatus
 from .entry_log import EntryLog, EntryType, EntryStatus
+from .attendance_summary import AttendanceSummary
+from .branch_occupancy import BranchOccupancyBucket
 from .device_token import DeviceToken
+from .push_outbox import PushOutbox, PushRecipient, PushStatus
+from .scheduled_job import JobRun, JobRunStatus, ScheduledJob
 from .gym_class import (
     GymClass, ClassSession, ClassAttendance, ClassFeedback, ClassSessionStatus,
 )
 from .private_session import PrivateSession, PrivateSessionStatus
 from .body_measurement import BodyMeasurement
 from .message import Message, MessageSender
+from .message_thread import MessageThread
 
 __all__ = [
     'BodyMeasurement',
     'Message',
     'MessageSender',
+    'MessageThread',
     'User',
     'UserRole',
     'Branch',
@@ -36,6 +45,7 @@ __all__ = [
     'GymSetting',
     'Customer',
     'Gender',
+    'CustomerSearchEntry',
     'Service',
     'ServiceType',
     'Subscription',
@@ -53,13 +63,24 @@ __all__ = [
     'IssuePriority',
     'FreezeHistory',
     'DailyClosing',
+    'DailyRevenueRollup',
     'Fingerprint',
     'ActivationCode',
     'ActivationCodeType',
+    'MessageDelivery',
+    'DeliveryStatus',
     'EntryLog',
     'EntryType',
     'EntryStatus',
+    'AttendanceSummary',
+    'BranchOccupancyBucket',
     'DeviceToken',
+    'PushOutbox',
+    'PushRecipient',
+    'PushStatus',
+    'ScheduledJob',
+    'JobRun',
+    'JobRunStatus',
     'GymClass',
     'ClassSession',
     'ClassAttendance',
@@ -0,0 +1,45 @@
+"""
+Attendance summary - one row per member: visits, streaks, last visit
+"""
+from app.extensions import db
+
+
+class AttendanceSummary(db.Model):
+    """A member's attendance, kept pre-computed for the member app's home screen.
+
+    ``/api/client/stats`` used to count every approved entry the member ever
+    made, count again for the month, and walk 30 days of distinct entry dates
+    for the streak — on every open of the app. This holds the answers instead,
+    so the screen reads one row however long the member has been coming.
+
+    Days are the gym's local business day (app/services/business_time.py), so
+    a visit at 00:30 in Cairo lands on the day it happened there, not the UTC
+    one. ``current_streak`` is the run of consecutive days ending on
+    ``last_visit_date``; whether it is still alive is for the reader to judge
+    against today.
+
+    Maintained in the same flush as the entry log itself by
+    app/services/attendance_summary.py; ``flask rebuild-attendance-summaries``
+    recomputes it.
+    """
+    __tablename__ = 'attendance_summaries'
+
+    customer_id = db.Column(
+        db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), primary_key=True
+    )
+
+    total_visits = db.Column(db.Integer, nullable=False, default=0)
+
+    # Visits in the calendar month of the last visit. A reader in a later
+    # month reads zero.
+    month_start = db.Column(db.Date, nullable=True)
+    month_visits = db.Column(db.Integer, nullable=False, default=0)
+
+    last_visit_date = db.Column(db.Date, nullable=True)
+    last_visit_at = db.Column(db.DateTime, nullable=True)  # UTC, like entry_time
+
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AttendanceSummary {self.customer_id}: {self.total_visits} visit(s)>'
@@ -0,0 +1,30 @@
+"""
+Branch occupancy bucket - approved check-ins per branch per minute
+"""
+from app.extensions import db
+
+
+class BranchOccupancyBucket(db.Model):
+    """How many members came through a branch's door in one UTC minute.
+
+    The member app's "is it busy?" figure is the number of check-ins in the
+    trailing hour. Counting ``entry_logs`` for it meant a range scan per poll,
+    and hundreds of members poll at the peak hour. Summing at most an hour of
+    these instead is sixty primary-key rows, however busy the branch is.
+
+    Maintained in the same flush as the entry log itself by
+    app/services/occupancy.py, and pruned after a day by the
+    prune-occupancy job; ``flask rebuild-occupancy`` recounts it.
+    """
+    __tablename__ = 'branch_occupancy_buckets'
+
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id', ondelete='CASCADE'),
+                          primary_key=True)
+
+    # The start of the minute, naive UTC like entry_time.
+    minute = db.Column(db.DateTime, primary_key=True, index=True)
+
+    entries = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BranchOccupancyBucket branch={self.branch_id} {self.minute}: {self.entries}>'
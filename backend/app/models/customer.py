@@ -3,7 +3,6 @@ Customer model - Gym members/clients
 """
 from datetime import datetime
 from app.extensions import db
-from passlib.hash import pbkdf2_sha256
 import enum
 import secrets
 import string
@@ -56,7 +55,14 @@ class Customer(db.Model):
     # Preferred UI language ('ar' or 'en'). NULL means the client hasn't
     # set one yet — used as the signal to show the first-login language step.
     preferred_language = db.Column(db.String(5), nullable=True)
-    
+
+    # When the member asked for their account to be deleted; NULL when no
+    # request is pending. The purge erases everyone whose grace period has run
+    # out with a range scan on this index — see
+    # app/services/retention_service.py. It used to be a "[DELETE_REQUEST]"
+    # line in health_notes, found with LIKE '%...%' over the whole table.
+    deletion_requested_at = db.Column(db.DateTime, nullable=True, index=True)
+
     # Branch relationship
     branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False, index=True)
     branch = db.relationship('Branch', back_populates='customers')
@@ -140,26 +146,43 @@ class Customer(db.Model):
     @property
     def age(self):
         """Calculate age from date_of_birth"""
-        if self.date_of_birth:
+        return Customer.age_from(self.date_of_birth)
+
+    @staticmethod
+    def age_from(date_of_birth):
+        """Age in whole years today, or None without a date of birth."""
+        if date_of_birth:
             today = datetime.utcnow().date()
-            age = today.year - self.date_of_birth.year
+            age = today.year - date_of_birth.year
             # Subtract one year if birthday hasn't occurred this year yet
-            if (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day):
+            if (today.month, today.day) < (date_of_birth.month, date_of_birth.day):
                 age -= 1
             return age
         return None
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = pbkdf2_sha256.hash(password)
+        from app.services.password_hashing import hash_password
+        self.password_hash = hash_password(password)
         self.temp_password = None  # Clear temp password once real password is set
         self.password_changed = True
     
     def check_password(self, password):
-        """Verify password"""
+        """Verify password.
+
+        A match against a hash made at another cost re-hashes it at the
+        configured one (app/services/password_hashing.py). Assigned directly,
+        not through set_password(): the member has not chosen a new password,
+        so a temporary one must stay temporary.
+        """
         if not self.password_hash:
             return False
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        from app.services.password_hashing import hash_password, verify_password
+
+        matches, needs_rehash = verify_password(password, self.password_hash)
+        if matches and needs_rehash:
+            self.password_hash = hash_password(password)
+        return matches
     
     def generate_temp_password(self):
         """Generate a random temporary password"""
@@ -0,0 +1,38 @@
+"""
+Customer search entry - one normalized, indexable search row per member
+"""
+from app.extensions import db
+
+
+class CustomerSearchEntry(db.Model):
+    """What the front desk can find a member by, folded for matching.
+
+    Searching ``customers`` directly meant ``ILIKE '%term%'`` over five
+    columns, which no index can serve: every keystroke in the search box was a
+    scan of the whole table. This keeps the searchable text for each member in
+    one place, already normalized (case, Arabic letter variants, diacritics,
+    digits) so the database compares plain strings, and lets each dialect put
+    its own substring index over it — a ``pg_trgm`` GIN index on Postgres, an
+    FTS5 trigram table on SQLite (app/services/customer_search.py).
+
+    Maintained in the same flush as the customer row itself, on create, update
+    and anonymisation; ``flask rebuild-customer-search`` recomputes it.
+    """
+    __tablename__ = 'customer_search_entries'
+
+    customer_id = db.Column(
+        db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), primary_key=True
+    )
+
+    # The folded full name on its own, for ranking name matches first.
+    name_key = db.Column(db.String(150), nullable=False, default='')
+
+    # Name, email, national id and QR code, folded and space-separated.
+    search_text = db.Column(db.String(500), nullable=False, default='')
+
+    # The phone number's digits only, so "0100 123-4567" and "01001234567"
+    # are the same number.
+    phone_digits = db.Column(db.String(32), nullable=False, default='', index=True)
+
+    def __repr__(self):
+        return f'<CustomerSearchEntry {self.customer_id}>'
@@ -0,0 +1,46 @@
+"""
+Daily revenue rollup - one row per branch, business day, payment method and
+transaction type
+"""
+from app.extensions import db
+from app.models.transaction import PaymentMethod, TransactionType
+
+
+class DailyRevenueRollup(db.Model):
+    """What a branch took on one of its gym's local days, pre-aggregated.
+
+    Every revenue figure on the owner and accountant screens is a sum over
+    ``transactions`` in a date window, and the ledger only ever grows. Summing
+    it on every page load made those screens slower with every month the gym
+    traded; summing this table instead costs days x branches, however long the
+    history is.
+
+    Maintained by ``app.services.revenue_rollup`` in the same flush as the
+    transaction itself, so it can never disagree with the ledger it summarises.
+    ``flask rebuild-revenue-rollups`` recomputes it from scratch.
+    """
+    __tablename__ = 'daily_revenue_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'business_date', 'payment_method',
+                            'transaction_type', name='uq_daily_revenue_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False)
+
+    # The gym's local day, not the UTC one — see app/services/business_time.
+    business_date = db.Column(db.Date, nullable=False, index=True)
+
+    payment_method = db.Column(db.Enum(PaymentMethod), nullable=False)
+    transaction_type = db.Column(db.Enum(TransactionType), nullable=False)
+
+    # Net of discount, like every revenue figure in the system. The discount is
+    # kept alongside so the gross can still be reported (net + discount).
+    net_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (f'<DailyRevenueRollup branch={self.branch_id} {self.business_date} '
+                f'{self.payment_method.value}/{self.transaction_type.value}>')
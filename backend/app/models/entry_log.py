@@ -25,6 +25,14 @@ class EntryLog(db.Model):
     """Entry log for tracking gym access"""
     __tablename__ = 'entry_logs'
 
+    # Newest-first history for one member and for one branch's door log: the
+    # keyset pages (app/utils/cursor_pagination.py) seek into these and read
+    # one page of rows, id breaking ties in index order.
+    __table_args__ = (
+        db.Index('ix_entry_logs_customer_entry_time', 'customer_id', 'entry_time', 'id'),
+        db.Index('ix_entry_logs_branch_entry_time', 'branch_id', 'entry_time', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Customer and subscription
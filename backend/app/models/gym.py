@@ -28,6 +28,11 @@ class Gym(db.Model):
     secondary_color = db.Column(db.String(10), nullable=False, default='#EF4444')
     is_setup_complete = db.Column(db.Boolean, default=False, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+
+    # Bumped by every write to this gym's gym_settings rows. Workers cache the
+    # settings in process memory and compare this one integer to know when
+    # theirs are out of date — see app/services/settings_cache.py.
+    settings_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -1,9 +1,10 @@
 """Messages between a captain and the members who train privately with them.
 
-There is no thread table. A thread *is* the (trainer, member) pair — the same
-pair the private-training subscription already names — so a separate row would
-be a second place for the same fact to live and a second place for it to go
-stale. Listing threads reads the captain's roster and joins the last message.
+A thread *is* the (trainer, member) pair — the same pair the private-training
+subscription already names. ``message_threads`` (app/models/message_thread.py)
+keeps a summary per pair — the latest message and each side's unread count —
+so the thread lists do not have to work those out from this table; it is
+written alongside every message and never decides anything.
 
 Who may talk to whom is deliberately not stored here either. It is derived from
 the subscription every time, by ``trainer_has_client``: a permission copied
@@ -0,0 +1,80 @@
+"""One-time codes waiting to be delivered by SMS or email.
+
+``/api/client/auth/request-code`` and ``/forgot-password`` used to hand the
+code to the provider inside the request: a fresh SMTP connection — TCP, TLS,
+login — or an SMS API call, all before the member got an answer. A slow mail
+server held a worker for as long as it liked, and a member behind it waited
+just the same.
+
+The request now persists the code and one of these rows, and returns. The
+dispatcher (app/services/message_outbox.py) sends it afterwards, over a reused
+connection, and records what happened here so the app can poll for it by
+``reference``.
+"""
+import enum
+from datetime import datetime
+
+from app.extensions import db
+
+
+class DeliveryStatus(enum.Enum):
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'  # dead-lettered: permanent error, or out of attempts
+    CANCELLED = 'cancelled'  # the code was used, replaced or expired first
+
+
+class MessageDelivery(db.Model):
+    __tablename__ = 'message_deliveries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    #: What the app polls with. Random, so one member's delivery cannot be
+    #: looked up by guessing the next number.
+    reference = db.Column(db.String(32), nullable=False, unique=True, index=True)
+
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True, index=True)
+    activation_code_id = db.Column(db.Integer, db.ForeignKey('activation_codes.id'), nullable=True)
+    activation_code = db.relationship('ActivationCode')
+
+    channel = db.Column(db.String(10), nullable=False)  # 'sms' or 'email'
+    #: Null for a stand-in row written for an identifier that matched no
+    #: member: it goes through the queue like any other and is sent nowhere,
+    #: so polling it cannot tell a stranger from a member.
+    target = db.Column(db.String(120), nullable=True)
+    subject = db.Column(db.String(255), nullable=True)
+    #: The rendered message — it contains the code. Cleared as soon as the
+    #: row is settled, so a live code sits in this table only while it is
+    #: still on its way.
+    body = db.Column(db.Text, nullable=True)
+
+    status = db.Column(db.Enum(DeliveryStatus), nullable=False, default=DeliveryStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    #: A dispatcher's claim on the row; see PushOutbox.
+    claimed_by = db.Column(db.String(32), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    settled_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_message_deliveries_due', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        """What the member's app sees. Nothing that says where it went."""
+        status = self.status.value
+        if self.status == DeliveryStatus.QUEUED and self.attempts:
+            status = 'retrying'
+        return {
+            'delivery_id': self.reference,
+            'status': status,
+            'channel': self.channel,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'settled_at': self.settled_at.isoformat() if self.settled_at else None,
+        }
+
+    def __repr__(self):
+        return f'<MessageDelivery {self.id} {self.status.value}>'
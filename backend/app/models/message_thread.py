@@ -0,0 +1,53 @@
+"""
+Message thread - one row per (captain, member) conversation: its latest
+message and what each side has not read yet
+"""
+from datetime import datetime
+
+from app.extensions import db
+
+
+class MessageThread(db.Model):
+    """Where a conversation stands, kept so a thread list is one indexed read.
+
+    A thread is still the (trainer, member) pair, and who may write in it is
+    still decided by the subscription every time (app/services/
+    coaching_access.py), never by this row. What lives here is only what the
+    thread lists need and used to work out from ``messages`` on every open: a
+    busy captain's list loaded their whole message history to find the last
+    message of each conversation, and ran a grouped count for the unread
+    badges.
+
+    Maintained in the same flush as each message by
+    app/services/message_threads.py. Opening a thread takes the messages it
+    marks read off the reader's unread count, never below 0, rather than
+    zeroing it, so a message that lands meanwhile stays counted;
+    ``flask rebuild-message-threads`` recomputes it.
+    """
+    __tablename__ = 'message_threads'
+    __table_args__ = (
+        db.UniqueConstraint('trainer_id', 'customer_id', name='uq_message_threads_pair'),
+        # Each side's thread list, most recent first, keyset-paged.
+        db.Index('ix_message_threads_trainer_recent', 'trainer_id', 'last_message_at', 'id'),
+        db.Index('ix_message_threads_customer_recent', 'customer_id', 'last_message_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    trainer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    customer_id = db.Column(
+        db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), nullable=False)
+
+    last_message_id = db.Column(
+        db.Integer, db.ForeignKey('messages.id', ondelete='SET NULL'), nullable=True)
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+    last_message_at = db.Column(db.DateTime, nullable=False)
+
+    # Messages the captain has not read (sent by the member), and the reverse.
+    trainer_unread = db.Column(db.Integer, nullable=False, default=0)
+    member_unread = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<MessageThread trainer={self.trainer_id} customer={self.customer_id}>'
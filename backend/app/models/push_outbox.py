@@ -0,0 +1,68 @@
+"""Push notifications waiting to be delivered.
+
+Sending a push used to happen inside the request that caused it: one Firebase
+round trip per device, in series, before the response went back. A message, a
+complaint or a closed class took as long as Firebase did, and a push that
+failed was simply lost.
+
+The request now only writes a row here (app/services/push_outbox.py) and the
+dispatcher delivers it afterwards — batched with other pending pushes, retried
+with backoff when Firebase has a bad moment, and recorded either way.
+"""
+import enum
+from datetime import datetime
+
+from app.extensions import db
+
+
+class PushStatus(enum.Enum):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'  # gave up after PUSH_MAX_ATTEMPTS
+
+
+class PushRecipient(enum.Enum):
+    USER = 'user'
+    CUSTOMER = 'customer'
+
+
+class PushOutbox(db.Model):
+    __tablename__ = 'push_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    recipient_type = db.Column(db.Enum(PushRecipient), nullable=False)
+    #: Every user or customer this notification is for. Resolved to device
+    #: tokens at the first delivery attempt, not at enqueue, so the request
+    #: does no more than an INSERT.
+    recipient_ids = db.Column(db.JSON, nullable=False)
+
+    title = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    data = db.Column(db.JSON, nullable=True)
+
+    status = db.Column(db.Enum(PushStatus), nullable=False, default=PushStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    #: The device tokens still owed this push: null before the first attempt,
+    #: then only the ones that failed in a way worth retrying.
+    tokens = db.Column(db.JSON, nullable=True)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    #: A dispatcher's claim on the row, so two workers never send it twice.
+    #: Expires, so a dispatcher that dies mid-batch does not strand it.
+    claimed_by = db.Column(db.String(32), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # The dispatcher's only question: what is due?
+        db.Index('ix_push_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<PushOutbox {self.id} {self.status.value}>'
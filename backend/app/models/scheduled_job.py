@@ -0,0 +1,75 @@
+"""Periodic housekeeping jobs, and a record of every time one ran.
+
+Housekeeping used to ride on request traffic — the retention purge ran from a
+``teardown_request`` hook at most hourly per worker, expiring subscriptions had
+no trigger at all, and lapsed freezes were only ended when someone happened to
+read them. app/services/scheduler.py now runs them on a timetable; these two
+tables are its state.
+
+``scheduled_jobs`` holds one row per job: when it is next due, and whether an
+operator has switched it off. Advancing ``next_run_at`` is how a worker claims
+a run, so the timetable holds across workers and instances. ``job_runs`` is the
+history — ``flask jobs history`` reads it.
+"""
+import enum
+from datetime import datetime
+
+from app.extensions import db
+
+
+class JobRunStatus(enum.Enum):
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+class ScheduledJob(db.Model):
+    __tablename__ = 'scheduled_jobs'
+
+    name = db.Column(db.String(64), primary_key=True)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    next_run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.Enum(JobRunStatus), nullable=True)
+
+    def __repr__(self):
+        return f'<ScheduledJob {self.name}>'
+
+
+class JobRun(db.Model):
+    __tablename__ = 'job_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Enum(JobRunStatus), nullable=False, default=JobRunStatus.RUNNING)
+    #: hostname:pid of the worker that ran it.
+    runner = db.Column(db.String(120), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    batches = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    #: Whatever else the job reported, e.g. per-gym counts.
+    detail = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.String(1000), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_runs_job_started', 'job_name', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job': self.job_name,
+            'status': self.status.value,
+            'runner': self.runner,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'batches': self.batches,
+            'processed': self.processed,
+            'detail': self.detail,
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f'<JobRun {self.job_name} {self.status.value}>'
@@ -75,6 +75,14 @@ class Subscription(db.Model):
     # Relationships
     freeze_history = db.relationship('FreezeHistory', back_populates='subscription', lazy='dynamic', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # A member's subscriptions in a given status: the door's lookup, and
+        # expiry's "does anything still admit them" check for each member it
+        # touches. With only the single-column status index, SQLite answered
+        # that check by walking every active subscription in the table.
+        db.Index('ix_subscriptions_customer_status', 'customer_id', 'status'),
+    )
+
     def __repr__(self):
         return f'<Subscription {self.id} - {self.customer.full_name} - {self.service.name}>'
 
@@ -151,8 +159,8 @@ class Subscription(db.Model):
             Subscription.end_date.desc(),
         ).all()
 
-        # A freeze that has run its course must not still bar the door. Settled
-        # here, on the read that cares, because nothing else will do it.
+        # A freeze that has run its course must not still bar the door. The
+        # scheduled job settles them too, but the door cannot wait for it.
         if any(s.settle_expired_freeze() for s in candidates):
             candidates.sort(
                 key=lambda s: (s.status != SubscriptionStatus.ACTIVE, -s.end_date.toordinal())
@@ -172,6 +180,14 @@ class Subscription(db.Model):
             Subscription.status == SubscriptionStatus.ACTIVE,
         ).order_by(Subscription.end_date.desc()).all()
 
+    @staticmethod
+    def lapsed(status, end_date, today=None):
+        """Expired by status or by date: what is_expired() answers, without
+        the write. For serialising, where a read must not commit."""
+        if status == SubscriptionStatus.EXPIRED:
+            return True
+        return end_date < (today or datetime.utcnow().date())
+
     def is_expired(self):
         """Check if subscription is expired"""
         if self.status == SubscriptionStatus.EXPIRED:
@@ -232,9 +248,9 @@ class Subscription(db.Model):
         could, so a member who froze for a week was still refused at the door a
         month later, having already been charged for the extension.
 
-        Derived on read rather than scheduled, for the same reason the private
-        session auto-confirm is: this deployment has no worker process, so a
-        status that depended on one would sit stale forever.
+        The settle-freezes job (app/services/housekeeping.py) now ends them
+        on a timetable. This is still called on the entry read, which cannot
+        wait for the next run, and by deployments that run jobs from cron.
 
         Returns True if a freeze was ended.
         """
@@ -25,6 +25,16 @@ class Transaction(db.Model):
     """Transaction model - All financial transactions"""
     __tablename__ = 'transactions'
 
+    # "What did this staff member take in this window" — the employee
+    # performance report asks it for every staff member at once. The branch
+    # index serves a branch's ledger newest first, as the keyset pages of
+    # /api/transactions and /api/payments read it.
+    __table_args__ = (
+        db.Index('ix_transactions_created_by_created_at', 'created_by', 'created_at'),
+        db.Index('ix_transactions_branch_transaction_date',
+                 'branch_id', 'transaction_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Amount
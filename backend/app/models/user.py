@@ -3,7 +3,6 @@ User model - Authentication and staff management
 """
 from datetime import datetime
 from app.extensions import db
-from passlib.hash import pbkdf2_sha256
 import enum
 
 
@@ -156,11 +155,22 @@ class User(db.Model):
 
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = pbkdf2_sha256.hash(password)
+        from app.services.password_hashing import hash_password
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        """Verify password"""
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        """Verify password.
+
+        A match against a hash made at another cost re-hashes it at the
+        configured one (app/services/password_hashing.py); the caller's next
+        commit stores it.
+        """
+        from app.services.password_hashing import hash_password, verify_password
+
+        matches, needs_rehash = verify_password(password, self.password_hash)
+        if matches and needs_rehash:
+            self.password_hash = hash_password(password)
+        return matches
 
     def to_dict(self):
         """Convert to dictionary"""
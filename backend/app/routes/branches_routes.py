@@ -285,6 +285,15 @@ def activate_branch(branch_id):
     return success_response(branch.to_dict(), "Branch activated successfully")
 
 
+@branches_bp.route('/scope-cache-stats', methods=['GET'])
+@jwt_required()
+@role_required(UserRole.SUPER_ADMIN)
+def get_scope_cache_stats():
+    """Branch-scope cache hit/miss counters for this worker."""
+    from app.services import scope_cache
+    return success_response(scope_cache.stats())
+
+
 @branches_bp.route('/<int:branch_id>/performance', methods=['GET'])
 @jwt_required()
 def get_branch_performance(branch_id):
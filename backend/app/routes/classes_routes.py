@@ -414,19 +414,19 @@ def close_session(session_id):
     attendees = session.attendance.all()
     notified = 0
     if gym_rule(get_current_gym_id(user), 'ask_feedback_after_class'):
-        from app.services.fcm_service import notify_customer
+        from app.services.fcm_service import notify_customers
         class_name = session.gym_class.name if session.gym_class else 'your class'
-        for row in attendees:
-            try:
-                notified += notify_customer(
-                    row.customer_id,
-                    'How was your class?',
-                    f'Tell us what you thought of {class_name}.',
-                    {'type': 'class_feedback', 'session_id': str(session.id)},
-                )
-            except Exception:
-                # A push failure must not roll back a finished class.
-                pass
+        try:
+            # One queued push for the whole class rather than one per member.
+            notified = notify_customers(
+                [row.customer_id for row in attendees],
+                'How was your class?',
+                f'Tell us what you thought of {class_name}.',
+                {'type': 'class_feedback', 'session_id': str(session.id)},
+            )
+        except Exception:
+            # A push failure must not roll back a finished class.
+            pass
 
     return success_response({
         **session.to_dict(),
@@ -2,9 +2,10 @@
 Client authentication routes - Code-based authentication for mobile app
 """
 from flask import Blueprint, current_app, request
-from datetime import datetime, timedelta
 from app.models import Customer, ActivationCode, ActivationCodeType
+from app.services import message_outbox
 from app.services.notification_service import get_notification_service
+from app.services.retention_service import deletion_status
 from app.services.session_service import revoke_sessions, revoke_sessions_and_commit
 from app.utils import success_response, error_response
 from app.utils.client_auth import (
@@ -14,46 +15,6 @@ from app.extensions import db, limiter
 
 client_auth_bp = Blueprint('client_auth', __name__, url_prefix='/api/client/auth')
 
-_DELETE_REQUEST_PREFIX = '[DELETE_REQUEST]'
-_DELETE_GRACE_DAYS = 90
-
-
-def _extract_delete_request_date(customer: Customer):
-    notes = customer.health_notes or ''
-    for line in notes.splitlines():
-        if line.startswith(_DELETE_REQUEST_PREFIX):
-            try:
-                raw_date = line.split(':', 1)[1].strip()
-                return datetime.fromisoformat(raw_date)
-            except (IndexError, ValueError):
-                return None
-    return None
-
-
-def _build_delete_status(customer: Customer):
-    requested_at = _extract_delete_request_date(customer)
-    if not requested_at:
-        return {
-            'requested': False,
-            'requested_at': None,
-            'scheduled_delete_at': None,
-            'days_remaining': None,
-            'is_due': False,
-        }
-
-    scheduled_delete_at = requested_at + timedelta(days=_DELETE_GRACE_DAYS)
-    now = datetime.utcnow()
-    days_remaining = max((scheduled_delete_at - now).days, 0)
-
-    return {
-        'requested': True,
-        'requested_at': requested_at.isoformat(),
-        'scheduled_delete_at': scheduled_delete_at.isoformat(),
-        'days_remaining': days_remaining,
-        'is_due': now >= scheduled_delete_at,
-    }
-
-
 @client_auth_bp.route('/login', methods=['POST'])
 # Members log in from their own phones on mobile data, but a gym's wifi puts
 # many of them behind one address — same shared-budget problem as staff login.
@@ -85,8 +46,8 @@ def client_login():
     if not customer:
         return error_response('Invalid phone or password', 401)
 
-    deletion_status = _build_delete_status(customer)
-    if deletion_status['is_due']:
+    account_deletion = deletion_status(customer)
+    if account_deletion['is_due']:
         customer.is_active = False
         db.session.commit()
         return error_response('This account has been deleted after the 90-day grace period.', 403)
@@ -94,6 +55,8 @@ def client_login():
     # Verify password
     if not customer.check_password(password):
         return error_response('Invalid phone or password', 401)
+    if db.session.is_modified(customer):
+        db.session.commit()  # A hash re-derived at the configured cost
     
     # Generate client JWT
     access_token = create_client_token(customer.id)
@@ -127,7 +90,7 @@ def client_login():
             'active_subscription_count': len(active_subscriptions),
             'preferred_language': customer.preferred_language,
         },
-        'account_deletion': deletion_status,
+        'account_deletion': account_deletion,
         'gym': gym_data,
     }, 'Login successful')
 
@@ -151,6 +114,10 @@ def request_activation_code():
         - message: Success message
         - delivery_target: Masked phone/email
         - expires_in: Code expiry time in seconds
+        - delivery_id: poll GET /deliveries/<delivery_id> to see it arrive
+
+    The code is queued, not sent, before this returns; see
+    app/services/message_outbox.py.
     """
     data = request.get_json()
     
@@ -171,10 +138,14 @@ def request_activation_code():
     
     if not customer:
         # Security: Don't reveal if customer exists
+        stand_in = message_outbox.queue_stand_in(delivery_method)
+        db.session.commit()
+        message_outbox.wake()
         return success_response({
             'message': 'If this account exists, you will receive an activation code',
             'delivery_target': _mask_identifier(identifier, delivery_method),
-            'expires_in': 900
+            'expires_in': 900,
+            'delivery_id': stand_in.reference,
         })
     
     # Allow override of delivery method
@@ -207,36 +178,23 @@ def request_activation_code():
         expiry_minutes=15
     )
     
+    delivery = message_outbox.queue_activation_code(
+        activation_code, plain_code, customer.full_name)
     db.session.commit()
-    
-    # Send code via notification service
-    notification_service = get_notification_service()
-    try:
-        # The code itself is a credential — it only goes to stdout when the
-        # app is running in debug, never in a deployed environment where the
-        # log stream is readable by anyone with dashboard access.
-        if current_app.debug:
-            print(f"\n{'='*70}", flush=True)
-            print("🔐 ACTIVATION CODE REQUESTED", flush=True)
-            print(f"{'='*70}", flush=True)
-            print(f"📱 Phone: {delivery_target}", flush=True)
-            print(f"🔢 CODE: {plain_code}", flush=True)
-            print(f"👤 Customer: {customer.full_name}", flush=True)
-            print(f"{'='*70}\n", flush=True)
-
-        notification_service.send_activation_code(
-            delivery_method=delivery_method,
-            target=delivery_target,
-            code=plain_code,
-            customer_name=customer.full_name
-        )
-    except Exception as e:
-        # The reason stays server-side: it names the provider and its failure
-        # mode, which is of no use to a member and of some use to an attacker.
-        current_app.logger.exception('Failed to send activation code: %s', e)
-        db.session.rollback()
-        return error_response('Could not send the activation code. Please try again.', 500)
-    
+    message_outbox.wake()
+
+    # The code itself is a credential — it only goes to stdout when the app is
+    # running in debug, never in a deployed environment where the log stream
+    # is readable by anyone with dashboard access.
+    if current_app.debug:
+        print(f"\n{'='*70}", flush=True)
+        print("🔐 ACTIVATION CODE REQUESTED", flush=True)
+        print(f"{'='*70}", flush=True)
+        print(f"📱 Phone: {delivery_target}", flush=True)
+        print(f"🔢 CODE: {plain_code}", flush=True)
+        print(f"👤 Customer: {customer.full_name}", flush=True)
+        print(f"{'='*70}\n", flush=True)
+
     # The code is never returned over the API, in any environment.
     #
     # It used to be included whenever current_app.debug was set, which made a
@@ -248,10 +206,29 @@ def request_activation_code():
     return success_response({
         'message': f'Activation code sent via {delivery_method}',
         'delivery_target': _mask_identifier(delivery_target, delivery_method),
-        'expires_in': 900  # 15 minutes in seconds
+        'expires_in': 900,  # 15 minutes in seconds
+        'delivery_id': delivery.reference,
     })
 
 
+@client_auth_bp.route('/deliveries/<reference>', methods=['GET'])
+# Polled by the app while it waits, so looser than the endpoints that mint
+# codes; still capped, since references are the only thing it accepts.
+@limiter.limit('60 per minute')
+def delivery_status(reference):
+    """Where a requested code has got to.
+
+    ``status`` is queued, retrying, sent, failed (ask for a new code) or
+    cancelled (a newer code replaced it). A reference handed out for an
+    unknown identifier moves through the same states, so this says nothing
+    about who is a member.
+    """
+    delivery = message_outbox.get_delivery(reference)
+    if delivery is None:
+        return error_response('Delivery not found', 404)
+    return success_response(delivery.to_dict())
+
+
 @client_auth_bp.route('/verify-code', methods=['POST'])
 # Second line of defence behind the per-code attempt counter, since the counter
 # resets with every newly minted code.
@@ -474,15 +451,24 @@ def forgot_password():
     else:
         customer = Customer.query.filter_by(phone=identifier, is_active=True).first()
 
-    generic_response = success_response({
-        'message': _RESET_SENT_MESSAGE,
-        'delivery_target': _mask_identifier(
-            identifier, 'email' if '@' in identifier else 'sms'),
-        'expires_in': 900,
-    })
+    def generic_response(delivery=None):
+        # Anyone who is not sent a real code still gets a delivery to poll,
+        # one that goes nowhere but looks the same from outside.
+        if delivery is None:
+            delivery = message_outbox.queue_stand_in(
+                'email' if '@' in identifier else 'sms')
+            db.session.commit()
+            message_outbox.wake()
+        return success_response({
+            'message': _RESET_SENT_MESSAGE,
+            'delivery_target': _mask_identifier(
+                identifier, 'email' if '@' in identifier else 'sms'),
+            'expires_in': 900,
+            'delivery_id': delivery.reference,
+        })
 
     if not customer:
-        return generic_response
+        return generic_response()
 
     delivery = _choose_delivery(customer, notification_service,
                                data.get('delivery_method'))
@@ -494,7 +480,7 @@ def forgot_password():
             'Password reset requested for customer %s but no deliverable '
             'contact method is configured', customer.id,
         )
-        return generic_response
+        return generic_response()
 
     delivery_method, delivery_target = delivery
 
@@ -506,40 +492,22 @@ def forgot_password():
     ).all():
         old_code.is_used = True
 
-    _, plain_code = ActivationCode.create_code(
+    reset_code, plain_code = ActivationCode.create_code(
         customer_id=customer.id,
         delivery_method=delivery_method,
         delivery_target=delivery_target,
         code_type=ActivationCodeType.PASSWORD_RESET,
         expiry_minutes=15,
     )
+    # Queued with the code, in one commit. If it cannot be delivered in the
+    # end, the dispatcher burns the code, so no live reset code is left that
+    # nobody received.
+    queued = message_outbox.queue_activation_code(
+        reset_code, plain_code, customer.full_name, purpose='password_reset')
     db.session.commit()
+    message_outbox.wake()
 
-    try:
-        notification_service.send_activation_code(
-            delivery_method=delivery_method,
-            target=delivery_target,
-            code=plain_code,
-            customer_name=customer.full_name,
-            purpose='password_reset',
-        )
-    except Exception as e:
-        # The code was committed before sending, so a failure here would leave
-        # a live reset code nobody received. Burn it.
-        current_app.logger.exception('Failed to send password reset code: %s', e)
-        ActivationCode.query.filter_by(
-            customer_id=customer.id,
-            is_used=False,
-            code_type=ActivationCodeType.PASSWORD_RESET,
-        ).update({'is_used': True}, synchronize_session=False)
-        db.session.commit()
-        return error_response(
-            'Could not send the reset code. Please try again, or ask your gym '
-            'reception to reset your password.',
-            500,
-        )
-
-    return generic_response
+    return generic_response(queued)
 
 
 def _choose_delivery(customer, notification_service, requested_method=None):
@@ -4,22 +4,25 @@ Client routes - Mobile app endpoints for clients
 from flask import Blueprint, request
 from datetime import datetime, timedelta
 from app.models import (
-    Customer, Subscription, SubscriptionStatus, EntryLog, EntryType, EntryStatus, Transaction,
+    Subscription, SubscriptionStatus, EntryLog, EntryType, Transaction,
 )
+from app.services import attendance_summary, occupancy
+from app.schemas.rows import CLIENT_HISTORY_ROWS
 from app.services.qr_service import QRService
 from app.services.gym_rules import gym_rule
-from app.utils import success_response, error_response, paginate, format_pagination_response
+from app.utils import (
+    success_response, error_response, paginate, format_pagination_response,
+    keyset_paginate, format_cursor_pagination, cursor_requested, InvalidCursor,
+)
 from app.utils.client_auth import (
     client_token_required, create_client_token, get_current_client,
 )
+from app.services.retention_service import GRACE_DAYS, deletion_status
 from app.services.session_service import revoke_sessions
 from app.extensions import db
 
 client_bp = Blueprint('client', __name__, url_prefix='/api/client')
 
-_DELETE_REQUEST_PREFIX = '[DELETE_REQUEST]'
-_DELETE_GRACE_DAYS = 90
-
 
 def _entry_subscription(customer):
     """The member's subscription that grants gym entry, honouring gym rules.
@@ -38,60 +41,6 @@ def _entry_subscription(customer):
     )
 
 
-def _extract_delete_request_date(customer: Customer):
-    notes = customer.health_notes or ''
-    for line in notes.splitlines():
-        if line.startswith(_DELETE_REQUEST_PREFIX):
-            try:
-                raw_date = line.split(':', 1)[1].strip()
-                return datetime.fromisoformat(raw_date)
-            except (IndexError, ValueError):
-                return None
-    return None
-
-
-def _append_delete_request_note(customer: Customer, requested_at: datetime):
-    notes = customer.health_notes or ''
-    cleaned_lines = [
-        line for line in notes.splitlines() if not line.startswith(_DELETE_REQUEST_PREFIX)
-    ]
-    cleaned_lines.append(f'{_DELETE_REQUEST_PREFIX}: {requested_at.isoformat()}')
-    customer.health_notes = '\n'.join([line for line in cleaned_lines if line]).strip() or None
-
-
-def _clear_delete_request_note(customer: Customer):
-    notes = customer.health_notes or ''
-    cleaned_lines = [
-        line for line in notes.splitlines() if not line.startswith(_DELETE_REQUEST_PREFIX)
-    ]
-    customer.health_notes = '\n'.join([line for line in cleaned_lines if line]).strip() or None
-
-
-def _build_delete_status(customer: Customer):
-    requested_at = _extract_delete_request_date(customer)
-    if not requested_at:
-        return {
-            'requested': False,
-            'requested_at': None,
-            'scheduled_delete_at': None,
-            'days_remaining': None,
-            'is_due': False,
-        }
-
-    scheduled_delete_at = requested_at + timedelta(days=_DELETE_GRACE_DAYS)
-    now = datetime.utcnow()
-    delta_days = (scheduled_delete_at - now).days
-    days_remaining = max(delta_days, 0)
-
-    return {
-        'requested': True,
-        'requested_at': requested_at.isoformat(),
-        'scheduled_delete_at': scheduled_delete_at.isoformat(),
-        'days_remaining': days_remaining,
-        'is_due': now >= scheduled_delete_at,
-    }
-
-
 @client_bp.route('/me', methods=['GET'])
 @client_token_required
 def get_client_profile():
@@ -106,8 +55,8 @@ def get_client_profile():
     if not customer:
         return error_response('Customer not found', 404)
 
-    deletion_status = _build_delete_status(customer)
-    if deletion_status['is_due']:
+    account_deletion = deletion_status(customer)
+    if account_deletion['is_due']:
         customer.is_active = False
         db.session.commit()
         return error_response('This account has been deleted after the 90-day grace period.', 403)
@@ -160,7 +109,7 @@ def get_client_profile():
     # No `Gym.query.first()` fallback — that served an arbitrary other
     # tenant's name, logo and colours to a customer whose branch has no gym.
     response_data['gym'] = gym.to_dict() if gym else None
-    response_data['account_deletion'] = deletion_status
+    response_data['account_deletion'] = account_deletion
 
     return success_response(response_data)
 
@@ -180,17 +129,17 @@ def request_account_deletion():
         return error_response('Customer not found', 404)
 
     requested_at = datetime.utcnow()
-    _append_delete_request_note(customer, requested_at)
+    customer.deletion_requested_at = requested_at
     db.session.commit()
 
-    scheduled_delete_at = requested_at + timedelta(days=_DELETE_GRACE_DAYS)
+    scheduled_delete_at = requested_at + timedelta(days=GRACE_DAYS)
 
     return success_response(
         {
             'requested': True,
             'requested_at': requested_at.isoformat(),
             'scheduled_delete_at': scheduled_delete_at.isoformat(),
-            'grace_period_days': _DELETE_GRACE_DAYS,
+            'grace_period_days': GRACE_DAYS,
         },
         'Account deletion requested. Your account is scheduled for deletion in 90 days.'
     )
@@ -205,11 +154,10 @@ def cancel_account_deletion():
     if not customer:
         return error_response('Customer not found', 404)
 
-    existing_request = _extract_delete_request_date(customer)
-    if not existing_request:
+    if customer.deletion_requested_at is None:
         return error_response('No pending deletion request found.', 404)
 
-    _clear_delete_request_note(customer)
+    customer.deletion_requested_at = None
     db.session.commit()
 
     return success_response(
@@ -580,9 +528,12 @@ def get_client_history():
         - per_page: Items per page (default 20)
         - from_date: Start date filter (ISO format)
         - to_date: End date filter (ISO format)
+        - cursor: Keyset paging instead of page (empty for the first page,
+          then each response's next_cursor)
     
     Returns:
-        List of entry logs
+        List of entry logs. With ``cursor`` there is nowhere in a bare list for
+        the next cursor, so the response is ``{entries, pagination}`` instead.
     """
     customer = get_current_client()
     
@@ -611,34 +562,29 @@ def get_client_history():
         except ValueError:
             pass
     
+    # Bare columns with the branch and service names joined in, instead of
+    # two lazy loads per visit (app/schemas/rows.py).
+    query = CLIENT_HISTORY_ROWS.select(query)
+
+    if cursor_requested(request.args):
+        try:
+            result = keyset_paginate(
+                query, EntryLog.entry_time, EntryLog.id,
+                cursor=request.args.get('cursor'), per_page=per_page,
+            )
+        except InvalidCursor as e:
+            return error_response(str(e), 400)
+        return success_response({
+            'entries': CLIENT_HISTORY_ROWS.dump(result['items']),
+            'pagination': format_cursor_pagination(result),
+        })
+
     query = query.order_by(EntryLog.entry_time.desc())
     
     items, total, pages, current_page = paginate(query, page, per_page)
     
-    # Format entries with proper structure for Flutter client
-    entries = []
-    for entry in items:
-        # Derive service name from subscription -> service relationship if available
-        service_name = 'Gym Access'
-        if entry.subscription and entry.subscription.service:
-            service_name = entry.subscription.service.name
-
-        entry_data = {
-            'id': entry.id,
-            'date': entry.entry_time.strftime('%Y-%m-%d') if entry.entry_time else '',
-            'time': entry.entry_time.strftime('%H:%M:%S') if entry.entry_time else '',
-            'datetime': entry.entry_time.isoformat() if entry.entry_time else '',
-            'branch': entry.branch.name if entry.branch else 'Unknown',
-            'branch_id': entry.branch_id,
-            'service': service_name,
-            'coins_used': entry.coins_deducted or 0,
-            'entry_type': entry.entry_type.value if entry.entry_type else 'QR_SCAN',
-            'entry_status': entry.entry_status.value if entry.entry_status else 'APPROVED'
-        }
-        entries.append(entry_data)
-    
     # Return array directly (Flutter expects data: [array])
-    return success_response(entries)
+    return success_response(CLIENT_HISTORY_ROWS.dump(items))
 
 
 @client_bp.route('/stats', methods=['GET'])
@@ -650,7 +596,9 @@ def get_client_stats():
     Returns:
         - total_visits: Total gym visits
         - visits_this_month: Visits in current month
-        - current_streak: Current consecutive days
+        - current_streak: Consecutive days visited, up to today or yesterday
+        - longest_streak: The longest run of consecutive days ever
+        - last_visit_at: When the member last came in
         - active_subscription: Active subscription details
     """
     customer = get_current_client()
@@ -658,22 +606,10 @@ def get_client_stats():
     if not customer:
         return error_response('Customer not found', 404)
     
-    # Total visits
-    total_visits = EntryLog.query.filter_by(
-        customer_id=customer.id,
-        entry_status=EntryStatus.APPROVED
-    ).count()
-    
-    # Visits this month
-    first_day_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    visits_this_month = EntryLog.query.filter_by(
-        customer_id=customer.id,
-        entry_status=EntryStatus.APPROVED
-    ).filter(EntryLog.entry_time >= first_day_of_month).count()
-    
-    # Current streak (simplified - consecutive days)
-    current_streak = _calculate_streak(customer.id)
-    
+    # One row, kept current as entries are recorded — see
+    # app/services/attendance_summary.py.
+    attendance = attendance_summary.stats_for(customer)
+
     # Headline subscription stays a single object for existing clients;
     # `active_subscriptions` carries the rest for members holding several.
     active = Subscription.active_for(customer.id)
@@ -684,9 +620,7 @@ def get_client_stats():
     )
 
     return success_response({
-        'total_visits': total_visits,
-        'visits_this_month': visits_this_month,
-        'current_streak': current_streak,
+        **attendance,
         'active_subscription': headline.to_dict() if headline else None,
         'active_subscriptions': [s.to_dict() for s in active],
     })
@@ -808,56 +742,25 @@ def get_branch_activity():
     belongs to — never a branch they aren't a member of, and never a
     gym-wide total, so this can't be used to infer another site's traffic.
     Denied scans are excluded: someone turned away at the door never entered.
+
+    Read from the branch's per-minute check-in counts (app/services/
+    occupancy.py), not from the entry logs, and marked cacheable for a minute
+    so the app backs off instead of polling.
     """
     customer = get_current_client()
 
     if not customer:
         return error_response('Customer not found', 404)
 
-    since = datetime.utcnow() - timedelta(hours=1)
-    count = EntryLog.query.filter(
-        EntryLog.branch_id == customer.branch_id,
-        EntryLog.entry_status == EntryStatus.APPROVED,
-        EntryLog.entry_time >= since,
-    ).count()
+    activity = occupancy.branch_activity(customer.branch_id)
 
-    return success_response({
+    response, status = success_response({
         'branch_id': customer.branch_id,
         'branch_name': customer.branch.name if customer.branch else None,
-        'entries_last_hour': count,
-        'level': _busy_level(count),
+        **activity,
+        'level': _busy_level(activity['entries_last_hour']),
         'as_of': datetime.utcnow().isoformat(),
     })
-
-
-def _calculate_streak(customer_id: int) -> int:
-    """Calculate consecutive days streak"""
-    # Get unique entry dates in last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    entries = db.session.query(
-        db.func.date(EntryLog.entry_time).label('entry_date')
-    ).filter(
-        EntryLog.customer_id == customer_id,
-        EntryLog.entry_status == EntryStatus.APPROVED,
-        EntryLog.entry_time >= thirty_days_ago
-    ).distinct().order_by(db.desc('entry_date')).all()
-    
-    if not entries:
-        return 0
-    
-    # Calculate streak
-    streak = 0
-    current_date = datetime.utcnow().date()
-    
-    for entry in entries:
-        entry_date = entry[0]
-        
-        # Check if this is consecutive day
-        if entry_date == current_date or entry_date == current_date - timedelta(days=streak):
-            streak += 1
-            current_date = entry_date - timedelta(days=1)
-        else:
-            break
-    
-    return streak
+    response.headers['Cache-Control'] = (
+        f'private, max-age={occupancy.CLIENT_MAX_AGE_SECONDS}')
+    return response, status
@@ -7,9 +7,9 @@ from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from marshmallow import ValidationError
 from sqlalchemy import or_
-from sqlalchemy.orm import joinedload
 from datetime import datetime
 from app.schemas import CustomerSchema
+from app.schemas.rows import CUSTOMER_ROWS, customer_items
 from app.models.customer import Customer, Gender
 from app.models.subscription import Subscription
 from app.services.session_service import revoke_sessions
@@ -60,6 +60,22 @@ def _may_see_health(user, customer_id):
     return trainer_has_client(user.id, customer_id)
 
 
+def _customer_items(rows, user):
+    """CUSTOMER_ROWS rows as the list and search return them, for ``user``.
+
+    has_active_subscription is batched for the page in one query rather than
+    an EXISTS per member. A trainer sees health data only for members on
+    their roster, resolved once for the page rather than per row.
+    """
+    ids = [row.id for row in rows]
+    active_sub_ids = Customer.batch_has_active_subscription(ids)
+    coached = None
+    if user and user.role == UserRole.TRAINER:
+        from app.services.coaching_access import coached_customer_ids
+        coached = coached_customer_ids(user.id)
+    return customer_items(rows, _may_see_temp_password(user), active_sub_ids, coached)
+
+
 @customers_bp.route('', methods=['GET'])
 @jwt_required()
 def get_customers():
@@ -76,41 +92,20 @@ def get_customers():
     # Branch filtering based on role
     query = scope_query_to_branches(query, Customer.branch_id, user, branch_id)
 
-    # Search
-    if search:
-        query = query.filter(
-            db.or_(
-                Customer.full_name.ilike(f'%{search}%'),
-                Customer.phone.ilike(f'%{search}%')
-            )
-        )
-    
-    query = query.options(joinedload(Customer.branch)).order_by(Customer.created_at.desc())
+    query = query.order_by(Customer.created_at.desc())
 
-    # Get paginated customers
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Search: through the folded, indexed search entries, best match first
+    # (app/services/customer_search.py).
+    if search and search.strip():
+        from app.services.customer_search import search as search_customers_by
+        query = search_customers_by(query, search.strip())
 
-    # Batch has_active_subscription for the whole page in one query instead
-    # of letting each to_dict() run its own EXISTS query.
-    active_sub_ids = Customer.batch_has_active_subscription([c.id for c in pagination.items])
-    show_temp = _may_see_temp_password(user)
-    # None means "no health restriction"; a set means the caller is a trainer
-    # and may only see the health data of members on their roster. Resolved
-    # once for the page rather than per row.
-    coached = None
-    if user and user.role == UserRole.TRAINER:
-        from app.services.coaching_access import coached_customer_ids
-        coached = coached_customer_ids(user.id)
+    # Get paginated customers, as bare columns with the branch name joined in
+    # (app/schemas/rows.py).
+    pagination = CUSTOMER_ROWS.select(query).paginate(
+        page=page, per_page=per_page, error_out=False)
+    customers_data = _customer_items(pagination.items, user)
 
-    customers_data = [
-        customer.to_dict(
-            include_temp_password=show_temp,
-            has_active_subscription=customer.id in active_sub_ids,
-            include_health=coached is None or customer.id in coached,
-        )
-        for customer in pagination.items
-    ]
-    
     return success_response({
         'items': customers_data,
         'pagination': {
@@ -477,6 +472,10 @@ def search_customers():
     """
     Search customers by name, phone, email, national_id, or qr_code
     
+    Matching ignores case, Arabic letter variants and diacritics, and the
+    spacing of phone numbers; results come best match first. See
+    app/services/customer_search.py.
+    
     Query params:
         - q: Search query string
         - branch_id: Filter by branch (optional)
@@ -491,41 +490,18 @@ def search_customers():
     
     current_user = get_current_user()
     
-    # Build search query
-    search_pattern = f'%{query_string}%'
-    query = Customer.query.filter(
-        db.or_(
-            Customer.full_name.ilike(search_pattern),
-            Customer.phone.ilike(search_pattern),
-            Customer.email.ilike(search_pattern),
-            Customer.national_id.ilike(search_pattern),
-            Customer.qr_code.ilike(search_pattern)
-        ),
-        Customer.is_active == True
-    )
+    from app.services.customer_search import search
+
+    query = search(Customer.query.filter(Customer.is_active == True), query_string)
     
     # Role-based filtering
     query = scope_query_to_branches(query, Customer.branch_id, current_user, branch_id)
 
     # Limit results
-    customers = query.options(joinedload(Customer.branch)).limit(limit).all()
-
-    active_sub_ids = Customer.batch_has_active_subscription([c.id for c in customers])
-    show_temp = _may_see_temp_password(current_user)
-    coached = None
-    if current_user and current_user.role == UserRole.TRAINER:
-        from app.services.coaching_access import coached_customer_ids
-        coached = coached_customer_ids(current_user.id)
+    customers = CUSTOMER_ROWS.select(query).limit(limit).all()
 
     return success_response({
-        'items': [
-            c.to_dict(
-                include_temp_password=show_temp,
-                has_active_subscription=c.id in active_sub_ids,
-                include_health=coached is None or c.id in coached,
-            )
-            for c in customers
-        ],
+        'items': _customer_items(customers, current_user),
         'total': len(customers),
         'query': query_string
     })
@@ -119,14 +119,28 @@ def get_owner_dashboard():
     """Get owner dashboard with smart alerts and analytics.
 
     Regional managers get the same dashboard restricted to their branch group.
+    Served from a short-lived snapshot (app/services/dashboard_cache.py);
+    ``?fresh=1`` recomputes it.
     """
+    from app.services import dashboard_cache
+
     user = get_current_user()
-    data = DashboardService.get_owner_dashboard(
-        branch_ids=get_accessible_branch_ids(user)
+    fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+    data = dashboard_cache.owner_dashboard(
+        branch_ids=get_accessible_branch_ids(user), fresh=fresh,
     )
     return success_response(data)
 
 
+@dashboards_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+@role_required(UserRole.SUPER_ADMIN)
+def get_dashboard_cache_stats():
+    """Owner-dashboard cache hit/miss counters for this worker."""
+    from app.services import dashboard_cache
+    return success_response(dashboard_cache.stats())
+
+
 @dashboards_bp.route('/accountant', methods=['GET'])
 @jwt_required()
 @role_required(UserRole.SUPER_ADMIN, UserRole.OWNER, UserRole.CENTRAL_ACCOUNTANT, UserRole.ACCOUNTANT, UserRole.BRANCH_ACCOUNTANT)
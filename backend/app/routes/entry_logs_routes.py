@@ -14,6 +14,7 @@ from app.utils import (
 )
 from app.models.user import UserRole
 from app.services.gym_rules import gym_rule
+from app.services.qr_service import QRService
 from app.extensions import db
 
 logger = logging.getLogger(__name__)
@@ -193,7 +194,30 @@ def scan_qr_code():
         sessions_deducted = 1
     # For time_based, no deduction needed
     
-    # All checks passed - record entry and deduct coin/session
+    # Deduct coin or session first, each as one conditional UPDATE: the checks
+    # above read a count that a second scan of the same member may have spent
+    # in the meantime, and the database is the only place that can settle it.
+    if coins_deducted > 0 and subscription.remaining_coins is not None:
+        if QRService.meter(subscription, 'remaining_coins', coins_deducted) is None:
+            return error_response("No coins remaining", 403, {
+                "code": "NO_COINS",
+                "customer_name": customer.full_name,
+                "customer_id": customer.id,
+                "remaining_coins": 0,
+                "subscription_type": subscription.service.name
+            })
+
+    if sessions_deducted > 0 and subscription.remaining_sessions is not None:
+        if QRService.meter(subscription, 'remaining_sessions', sessions_deducted) is None:
+            return error_response("No sessions remaining", 403, {
+                "code": "NO_SESSIONS",
+                "customer_name": customer.full_name,
+                "customer_id": customer.id,
+                "remaining_sessions": 0,
+                "subscription_type": subscription.service.name
+            })
+
+    # All checks passed - record entry
     entry_log = EntryLog(
         customer_id=customer.id,
         subscription_id=subscription.id,
@@ -203,13 +227,6 @@ def scan_qr_code():
         coins_deducted=coins_deducted
     )
     
-    # Deduct coin or session
-    if coins_deducted > 0 and subscription.remaining_coins is not None:
-        subscription.remaining_coins -= coins_deducted
-    
-    if sessions_deducted > 0 and subscription.remaining_sessions is not None:
-        subscription.remaining_sessions -= sessions_deducted
-    
     db.session.add(entry_log)
     db.session.commit()
     
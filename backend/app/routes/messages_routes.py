@@ -8,20 +8,22 @@ Sending requires a live coaching relationship. Reading an existing thread does
 not: when a member's package lapses, deleting the conversation out from under
 both of them would be a worse answer than letting it go quiet.
 """
-from datetime import datetime
-
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
-from sqlalchemy import func, or_
 
 from app.extensions import db
 from app.models.customer import Customer
 from app.models.message import Message, MessageSender
+from app.models.message_thread import MessageThread
 from app.models.user import User, UserRole
+from app.services import message_threads
 from app.services.coaching_access import (
     coaches_of, coaching_subscriptions, has_ever_coached, trainer_has_client,
 )
-from app.utils import success_response, error_response, role_required, get_current_user
+from app.utils import (
+    success_response, error_response, role_required, get_current_user,
+    keyset_paginate, format_cursor_pagination, cursor_requested, InvalidCursor,
+)
 from app.utils.client_auth import client_token_required, get_current_client
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/api')
@@ -45,59 +47,44 @@ def _thread_query(trainer_id, customer_id):
     )
 
 
-def _unread_counts(pairs, unread_from):
-    """Unread totals for many threads in one query.
+def _thread_page(query):
+    """Threads most recent first: one keyset page when the app asks for one
+    (``?cursor=``), otherwise all of them. Returns (threads, page), ``page``
+    being None when unpaged. Raises InvalidCursor."""
+    if cursor_requested(request.args):
+        page = keyset_paginate(
+            query, MessageThread.last_message_at, MessageThread.id,
+            cursor=request.args.get('cursor'),
+            per_page=request.args.get('per_page', 20, type=int),
+        )
+        return page['items'], page
+    threads = query.order_by(
+        MessageThread.last_message_at.desc(), MessageThread.id.desc()).all()
+    return threads, None
+
+
+def _last_message(thread):
+    """(last_message, last_message_at) as a thread list item carries them."""
+    if thread is None:
+        return None, None
+    last = thread.last_message
+    return (last.to_dict() if last else None), thread.last_message_at.isoformat()
 
-    ``pairs`` is a list of (trainer_id, customer_id). Counting per thread in a
-    loop is a query per member on a captain's roster, on the screen they open
-    most.
-    """
-    if not pairs:
-        return {}
-
-    conditions = [
-        db.and_(Message.trainer_id == t, Message.customer_id == c)
-        for t, c in pairs
-    ]
-    rows = db.session.query(
-        Message.trainer_id, Message.customer_id, func.count(Message.id)
-    ).filter(
-        or_(*conditions),
-        Message.sender == unread_from,
-        Message.read_at.is_(None),
-    ).group_by(Message.trainer_id, Message.customer_id).all()
-
-    return {(t, c): n for t, c, n in rows}
-
-
-def _last_messages(pairs):
-    """The most recent message in each thread, as {(trainer, customer): Message}."""
-    if not pairs:
-        return {}
-
-    conditions = [
-        db.and_(Message.trainer_id == t, Message.customer_id == c)
-        for t, c in pairs
-    ]
-    # Ordered oldest-first so the dict ends up holding the newest per thread.
-    rows = Message.query.filter(or_(*conditions)).order_by(
-        Message.created_at.asc()).all()
-
-    latest = {}
-    for message in rows:
-        latest[(message.trainer_id, message.customer_id)] = message
-    return latest
-
-
-def _mark_read(trainer_id, customer_id, sender_to_mark):
-    """Mark the other party's messages in this thread as read."""
-    updated = _thread_query(trainer_id, customer_id).filter(
-        Message.sender == sender_to_mark,
-        Message.read_at.is_(None),
-    ).update({'read_at': datetime.utcnow()}, synchronize_session=False)
-    if updated:
-        db.session.commit()
-    return updated
+
+def _messaged(shown, page, partner_column, *conditions):
+    """The partners who already have a thread: those in hand when unpaged,
+    otherwise every page's, read as ids alone."""
+    if page is None:
+        return {partner_id for partner_id, _ in shown}
+    return {partner_id for partner_id, in db.session.query(partner_column).filter(
+        *conditions)}
+
+
+def _thread_list(items, page, total_unread):
+    data = {'items': items, 'total_unread': total_unread}
+    if page is not None:
+        data['pagination'] = format_cursor_pagination(page)
+    return data
 
 
 def _serialise_thread_messages(trainer_id, customer_id, limit):
@@ -128,31 +115,41 @@ def trainer_threads():
     for sub in subs:
         by_customer.setdefault(sub.customer_id, sub)
 
-    pairs = [(trainer.id, customer_id) for customer_id in by_customer]
-    unread = _unread_counts(pairs, MessageSender.MEMBER)
-    latest = _last_messages(pairs)
-
-    threads = []
-    for customer_id, sub in by_customer.items():
-        last = latest.get((trainer.id, customer_id))
-        threads.append({
+    # Narrowed to the current roster: a lapsed member's thread stays readable
+    # from their side, but leaves the captain's list with the package.
+    query = message_threads.threads_query(trainer_id=trainer.id, partners=by_customer)
+    try:
+        threads, page = _thread_page(query)
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
+
+    # Never-messaged members go after the last thread, so on the last page.
+    shown = [(thread.customer_id, thread) for thread in threads]
+    if page is None or not page['has_more']:
+        messaged = _messaged(shown, page, MessageThread.customer_id,
+                             MessageThread.trainer_id == trainer.id)
+        shown += [(customer_id, None) for customer_id in by_customer
+                  if customer_id not in messaged]
+
+    customers = {c.id: c for c in Customer.query.filter(
+        Customer.id.in_([customer_id for customer_id, _ in shown]))} if shown else {}
+
+    items = []
+    for customer_id, thread in shown:
+        customer = customers.get(customer_id)
+        last_message, last_message_at = _last_message(thread)
+        items.append({
             'customer_id': customer_id,
-            'customer_name': sub.customer.full_name if sub.customer else None,
-            'customer_phone': sub.customer.phone if sub.customer else None,
-            'subscription_status': sub.status.value,
-            'unread_count': unread.get((trainer.id, customer_id), 0),
-            'last_message': last.to_dict() if last else None,
-            'last_message_at': last.created_at.isoformat() if last else None,
+            'customer_name': customer.full_name if customer else None,
+            'customer_phone': customer.phone if customer else None,
+            'subscription_status': by_customer[customer_id].status.value,
+            'unread_count': thread.trainer_unread if thread else 0,
+            'last_message': last_message,
+            'last_message_at': last_message_at,
         })
 
-    # Most recently active first; never-messaged members fall to the bottom
-    # rather than being scattered through the list by member id.
-    threads.sort(key=lambda t: t['last_message_at'] or '', reverse=True)
-
-    return success_response({
-        'items': threads,
-        'total_unread': sum(t['unread_count'] for t in threads),
-    })
+    return success_response(_thread_list(items, page, message_threads.total_unread(
+        trainer_id=trainer.id, partners=by_customer)))
 
 
 @messages_bp.route('/private-training/messages/<int:customer_id>', methods=['GET'])
@@ -165,7 +162,7 @@ def trainer_read_thread(customer_id):
 
     limit = min(request.args.get('limit', 100, type=int), 200)
     messages = _serialise_thread_messages(trainer.id, customer_id, limit)
-    _mark_read(trainer.id, customer_id, MessageSender.MEMBER)
+    message_threads.mark_read(trainer.id, customer_id, MessageSender.TRAINER)
 
     customer = db.session.get(Customer, customer_id)
     return success_response({
@@ -222,30 +219,40 @@ def client_threads():
     if not customer:
         return error_response('Customer not found', 404)
 
-    subs = coaches_of(customer.id)
-    pairs = [(sub.trainer_id, customer.id) for sub in subs]
-    unread = _unread_counts(pairs, MessageSender.TRAINER)
-    latest = _last_messages(pairs)
+    by_trainer = {sub.trainer_id: sub for sub in coaches_of(customer.id)}
 
-    threads = []
-    for sub in subs:
-        trainer = db.session.get(User, sub.trainer_id)
-        last = latest.get((sub.trainer_id, customer.id))
-        threads.append({
-            'trainer_id': sub.trainer_id,
+    query = message_threads.threads_query(customer_id=customer.id, partners=by_trainer)
+    try:
+        threads, page = _thread_page(query)
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
+
+    shown = [(thread.trainer_id, thread) for thread in threads]
+    if page is None or not page['has_more']:
+        messaged = _messaged(shown, page, MessageThread.trainer_id,
+                             MessageThread.customer_id == customer.id)
+        shown += [(trainer_id, None) for trainer_id in by_trainer
+                  if trainer_id not in messaged]
+
+    trainers = {u.id: u for u in User.query.filter(
+        User.id.in_([trainer_id for trainer_id, _ in shown]))} if shown else {}
+
+    items = []
+    for trainer_id, thread in shown:
+        trainer = trainers.get(trainer_id)
+        sub = by_trainer[trainer_id]
+        last_message, last_message_at = _last_message(thread)
+        items.append({
+            'trainer_id': trainer_id,
             'trainer_name': trainer.full_name if trainer else None,
             'service_name': sub.service.name if sub.service else None,
-            'unread_count': unread.get((sub.trainer_id, customer.id), 0),
-            'last_message': last.to_dict() if last else None,
-            'last_message_at': last.created_at.isoformat() if last else None,
+            'unread_count': thread.member_unread if thread else 0,
+            'last_message': last_message,
+            'last_message_at': last_message_at,
         })
 
-    threads.sort(key=lambda t: t['last_message_at'] or '', reverse=True)
-
-    return success_response({
-        'items': threads,
-        'total_unread': sum(t['unread_count'] for t in threads),
-    })
+    return success_response(_thread_list(items, page, message_threads.total_unread(
+        customer_id=customer.id, partners=by_trainer)))
 
 
 @messages_bp.route('/client/messages/<int:trainer_id>', methods=['GET'])
@@ -259,7 +266,7 @@ def client_read_thread(trainer_id):
 
     limit = min(request.args.get('limit', 100, type=int), 200)
     messages = _serialise_thread_messages(trainer_id, customer.id, limit)
-    _mark_read(trainer_id, customer.id, MessageSender.TRAINER)
+    message_threads.mark_read(trainer_id, customer.id, MessageSender.MEMBER)
 
     trainer = db.session.get(User, trainer_id)
     return success_response({
@@ -9,11 +9,13 @@ from app.models.transaction import PaymentMethod, TransactionType, net_amount
 from app.utils import (
     success_response, error_response, get_current_user, role_required,
     paginate, format_pagination_response, get_accessible_branch_ids,
-    scope_query_to_branches
+    scope_query_to_branches, keyset_paginate, format_cursor_pagination,
+    cursor_requested, total_requested, InvalidCursor
 )
 from app.models.user import UserRole, FINANCE_READ_ROLES
 from app.extensions import db
 from app.schemas import TransactionSchema, DailyClosingSchema
+from app.schemas.rows import TRANSACTION_ROWS
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
@@ -35,9 +37,15 @@ def get_payments():
         - date_to: End date (YYYY-MM-DD)
         - page: Page number
         - limit: Items per page
+        - cursor: Keyset paging instead of page (empty for the first page,
+          then each response's next_cursor)
+        - with_total: With cursor, include an (estimated) total
     """
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('limit', request.args.get('per_page', 20), type=int)
+    # `limit` is the Flutter name, `per_page` everyone else's. Falling back
+    # through get()'s default handed the raw per_page string on unconverted.
+    per_page = (request.args.get('limit', type=int)
+                or request.args.get('per_page', 20, type=int))
     branch_id = request.args.get('branch_id', type=int)
     payment_method = request.args.get('payment_method')
     date_from = request.args.get('date_from')
@@ -82,6 +90,31 @@ def get_payments():
         except ValueError:
             pass
 
+    # Keyset pages for infinite scroll (?cursor=, empty for the first page).
+    # The range total is a SUM over every matching row, so it comes with the
+    # first page only — the list shows it once, at the top — and later pages
+    # stay as cheap as the first.
+    if cursor_requested(request.args):
+        cursor = request.args.get('cursor')
+        try:
+            result = keyset_paginate(
+                TRANSACTION_ROWS.select(query), Transaction.transaction_date, Transaction.id,
+                cursor=cursor, per_page=per_page,
+                with_total=total_requested(request.args),
+            )
+        except InvalidCursor as e:
+            return error_response(str(e), 400)
+        response_data = {
+            'items': TRANSACTION_ROWS.dump(result['items']),
+            'pagination': format_cursor_pagination(result),
+        }
+        if not cursor:
+            response_data['total_amount'] = float(
+                query.with_entities(func.coalesce(func.sum(net_amount()), 0))
+                .scalar() or 0
+            )
+        return success_response(response_data)
+
     # Order by most recent
     query = query.order_by(Transaction.transaction_date.desc())
 
@@ -99,12 +132,13 @@ def get_payments():
         .scalar() or 0
     )
 
-    # Paginate
-    items, total, pages, current_page = paginate(query, page, per_page)
+    # Paginate, reading bare columns rather than objects through the schema
+    # (app/schemas/rows.py).
+    items, total, pages, current_page = paginate(TRANSACTION_ROWS.select(query), page, per_page)
 
     # Format response
-    schema = TransactionSchema()
-    response_data = format_pagination_response(items, total, pages, current_page, schema)
+    response_data = format_pagination_response(items, total, pages, current_page,
+                                               TRANSACTION_ROWS)
     response_data['total_amount'] = total_amount
 
     return success_response(response_data)
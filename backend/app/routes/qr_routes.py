@@ -12,6 +12,7 @@ from app.utils import (
     get_accessible_branch_ids
 )
 from app.services.gym_rules import gym_rule
+from app.services.qr_service import QRService
 from app.extensions import db
 from datetime import datetime
 
@@ -41,6 +42,14 @@ def _parse_coin_count(raw):
     return count, None
 
 
+def _insufficient_coins(subscription, required):
+    return error_response(
+        f'Insufficient coins. Available: {subscription.remaining_coins}, '
+        f'Required: {required}',
+        403
+    )
+
+
 def _usable_subscription(customer):
     """The subscription this scan should meter, or (None, error).
 
@@ -141,23 +150,23 @@ def scan_qr_code():
         return error_response('Invalid action. Use "check_in" or "deduct_coins"', 400)
 
     if meters_coins and coins_deducted > active_subscription.remaining_coins:
-        return error_response(
-            f'Insufficient coins. Available: {active_subscription.remaining_coins}, '
-            f'Required: {coins_deducted}',
-            403
-        )
+        return _insufficient_coins(active_subscription, coins_deducted)
 
-    # Deduct coins from subscription
+    # Deduct coins from subscription. One conditional UPDATE, so two scans of
+    # the same member racing each other cannot both spend the last coin.
     coins_before = active_subscription.remaining_coins
     if meters_coins:
-        active_subscription.remaining_coins -= coins_deducted
-    
+        coins_after = QRService.meter(active_subscription, 'remaining_coins', coins_deducted)
+        if coins_after is None:
+            return _insufficient_coins(active_subscription, coins_deducted)
+        coins_before = coins_after + coins_deducted
+
     # Create entry log
     entry_log = EntryLog(
         customer_id=customer.id,
         subscription_id=active_subscription.id,
         branch_id=branch_id,
-        entry_type=EntryType.QR_CODE,
+        entry_type=EntryType.QR_SCAN,
         entry_time=datetime.utcnow(),
         notes=data.get('notes', f'{service_name} - {coins_deducted} coin(s) deducted')
     )
@@ -232,9 +241,14 @@ def deduct_coins():
             403
         )
 
-    # Deduct coins
-    coins_before = active_subscription.remaining_coins
-    active_subscription.remaining_coins -= coins_to_deduct
+    # Deduct coins — atomically; see scan_qr_code.
+    coins_after = QRService.meter(active_subscription, 'remaining_coins', coins_to_deduct)
+    if coins_after is None:
+        return error_response(
+            f'Insufficient coins. Available: {active_subscription.remaining_coins}',
+            403
+        )
+    coins_before = coins_after + coins_to_deduct
 
     branch_id = current_user.branch_id if current_user.branch_id else customer.branch_id
     
@@ -243,7 +257,7 @@ def deduct_coins():
         customer_id=customer.id,
         subscription_id=active_subscription.id,
         branch_id=branch_id,
-        entry_type=EntryType.QR_CODE,
+        entry_type=EntryType.QR_SCAN,
         entry_time=datetime.utcnow(),
         notes=data.get('notes', f'{service_name} - {coins_to_deduct} coin(s) deducted')
     )
@@ -9,6 +9,11 @@ from app.models.transaction import PaymentMethod, TransactionType
 from app.models.subscription import SubscriptionStatus
 from app.models.complaint import ComplaintStatus
 from app.models.expense import ExpenseStatus
+from app.models.daily_revenue_rollup import DailyRevenueRollup
+from app.services.business_time import day_bounds_utc, gym_today
+from app.services.report_buckets import as_day, bucket_starts, revenue_buckets
+from app.services.revenue_rollup import rollup_sums
+from app.services.staff_performance import performance_by_staff
 from app.utils import (
     success_response, error_response, get_current_user, role_required,
     get_current_gym_id, get_accessible_branch_ids, scope_query_to_branches
@@ -17,6 +22,7 @@ from app.models.user import UserRole, FINANCE_READ_ROLES
 from app.extensions import db
 from datetime import date, datetime, timedelta
 from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import joinedload
 from collections import defaultdict
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
@@ -152,36 +158,27 @@ def get_daily_report():
     date_str = request.args.get('date')
     branch_id = request.args.get('branch_id', type=int)
     
+    current_user = get_current_user()
+    gym_id = get_current_gym_id(current_user)
+
+    # The gym's day, not the server's — see app/services/business_time.
     if date_str:
         try:
             report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             return error_response('Invalid date format. Use YYYY-MM-DD', 400)
     else:
-        report_date = datetime.utcnow().date()
-    
-    current_user = get_current_user()
-    
-    # Build query for transactions on this date
-    start_datetime = datetime.combine(report_date, datetime.min.time())
-    end_datetime = datetime.combine(report_date, datetime.max.time())
-    
-    query = Transaction.query.filter(
-        and_(
-            Transaction.created_at >= start_datetime,
-            Transaction.created_at <= end_datetime
-        )
-    )
-    
-    # Role-based filtering
-    query = scope_query_to_branches(query, Transaction.branch_id, current_user, branch_id)
+        report_date = gym_today(gym_id)
 
-    transactions = query.all()
-    
-    # Calculate metrics
-    total_transactions = len(transactions)
-    total_revenue = float(sum(float(t.amount) - float(t.discount or 0) for t in transactions))
-    total_discount = float(sum(float(t.discount or 0) for t in transactions))
+    # Totals from the day's rollups: a handful of rows per branch.
+    by_method = scope_query_to_branches(
+        rollup_sums(DailyRevenueRollup.payment_method, start=report_date, end=report_date),
+        DailyRevenueRollup.branch_id, current_user, branch_id,
+    ).all()
+
+    total_transactions = int(sum(row[3] or 0 for row in by_method))
+    total_revenue = float(sum(row[1] or 0 for row in by_method))
+    total_discount = float(sum(row[2] or 0 for row in by_method))
 
     # Payment method breakdown (keys match PaymentMethod enum values)
     payment_breakdown = {
@@ -189,10 +186,18 @@ def get_daily_report():
         'network': 0.0,
         'transfer': 0.0
     }
-    for t in transactions:
-        key = t.payment_method.value
-        if key in payment_breakdown:
-            payment_breakdown[key] += float(t.amount) - float(t.discount or 0)
+    for method, net, _discount, _count in by_method:
+        if method.value in payment_breakdown:
+            payment_breakdown[method.value] += float(net or 0)
+
+    # The itemised list is one day by definition, so it stays on the ledger.
+    start_utc, end_utc = day_bounds_utc(gym_id, report_date)
+    query = Transaction.query.filter(
+        Transaction.transaction_date >= start_utc,
+        Transaction.transaction_date < end_utc,
+    )
+    query = scope_query_to_branches(query, Transaction.branch_id, current_user, branch_id)
+    transactions = query.order_by(Transaction.transaction_date, Transaction.id).all()
 
     # New subscriptions today
     sub_query = Subscription.query.filter(
@@ -238,49 +243,37 @@ def get_weekly_report():
     week_start_str = request.args.get('week_start')
     branch_id = request.args.get('branch_id', type=int)
     
+    current_user = get_current_user()
+
     if week_start_str:
         try:
             week_start = datetime.strptime(week_start_str, '%Y-%m-%d').date()
         except ValueError:
             return error_response('Invalid date format. Use YYYY-MM-DD', 400)
     else:
-        # Default to this week's Monday
-        today = datetime.utcnow().date()
+        # Default to this week's Monday, in the gym's calendar
+        today = gym_today(get_current_gym_id(current_user))
         week_start = today - timedelta(days=today.weekday())
     
     week_end = week_start + timedelta(days=6)
-    
-    current_user = get_current_user()
-    
-    # Build query
-    start_datetime = datetime.combine(week_start, datetime.min.time())
-    end_datetime = datetime.combine(week_end, datetime.max.time())
-    
-    query = Transaction.query.filter(
-        and_(
-            Transaction.created_at >= start_datetime,
-            Transaction.created_at <= end_datetime
-        )
-    )
-    
-    # Role-based filtering
-    query = scope_query_to_branches(query, Transaction.branch_id, current_user, branch_id)
-    
-    transactions = query.all()
-    
+
+    # Seven days of rollups, grouped by day: at most 7 rows, however busy.
+    rows = scope_query_to_branches(
+        rollup_sums(DailyRevenueRollup.business_date, start=week_start, end=week_end),
+        DailyRevenueRollup.branch_id, current_user, branch_id,
+    ).all()
+
     # Daily breakdown
-    daily_revenue = defaultdict(float)
-    for t in transactions:
-        day = t.created_at.date()
-        daily_revenue[day.isoformat()] += float(t.amount) - float(t.discount or 0)
+    daily_revenue = {day.isoformat(): float(net or 0) for day, net, _d, _c in rows}
 
-    total_revenue = float(sum(float(t.amount) - float(t.discount or 0) for t in transactions))
+    total_revenue = float(sum(daily_revenue.values()))
+    total_transactions = int(sum(row[3] or 0 for row in rows))
 
     return success_response({
         'week_start': week_start.isoformat(),
         'week_end': week_end.isoformat(),
         'total_revenue': total_revenue,
-        'total_transactions': len(transactions),
+        'total_transactions': total_transactions,
         'average_daily_revenue': total_revenue / 7,
         'daily_breakdown': [
             {'date': date, 'revenue': float(revenue)}
@@ -303,13 +296,16 @@ def get_monthly_report():
     month_str = request.args.get('month')
     branch_id = request.args.get('branch_id', type=int)
     
+    current_user = get_current_user()
+
     if month_str:
         try:
             month_date = datetime.strptime(month_str, '%Y-%m')
         except ValueError:
             return error_response('Invalid month format. Use YYYY-MM', 400)
     else:
-        month_date = datetime.utcnow().replace(day=1)
+        today = gym_today(get_current_gym_id(current_user))
+        month_date = datetime.combine(today.replace(day=1), datetime.min.time())
     
     # Calculate month range
     month_start = month_date.replace(day=1)
@@ -317,27 +313,14 @@ def get_monthly_report():
         month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
     else:
         month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-    
-    current_user = get_current_user()
-    
-    # Build query
-    start_datetime = datetime.combine(month_start.date(), datetime.min.time())
-    end_datetime = datetime.combine(month_end.date(), datetime.max.time())
-    
-    query = Transaction.query.filter(
-        and_(
-            Transaction.created_at >= start_datetime,
-            Transaction.created_at <= end_datetime
-        )
-    )
-    
-    query = scope_query_to_branches(query, Transaction.branch_id, current_user, branch_id)
 
-    transactions = query.all()
-
-    # Calculate metrics
-    total_revenue = float(sum(float(t.amount) - float(t.discount or 0) for t in transactions))
-    total_transactions = len(transactions)
+    # Calculate metrics, from the month's rollups
+    revenue, _discount, count = scope_query_to_branches(
+        rollup_sums(start=month_start.date(), end=month_end.date()),
+        DailyRevenueRollup.branch_id, current_user, branch_id,
+    ).one()
+    total_revenue = float(revenue or 0)
+    total_transactions = int(count or 0)
 
     # New subscriptions this month
     sub_query = Subscription.query.filter(
@@ -394,57 +377,31 @@ def get_revenue_trend():
     buckets = max(1, min(buckets, 36))
     branch_id = request.args.get('branch_id', type=int)
 
-    today = datetime.utcnow().date()
+    current_user = get_current_user()
+    gym_id = get_current_gym_id(current_user)
+    today = gym_today(gym_id)
 
     # Bucket start dates, oldest first.
-    if period == 'daily':
-        starts = [today - timedelta(days=i) for i in range(buckets - 1, -1, -1)]
-    elif period == 'weekly':
-        current_week = today - timedelta(days=today.weekday())
-        starts = [current_week - timedelta(weeks=i) for i in range(buckets - 1, -1, -1)]
-    else:
-        starts = []
-        for i in range(buckets - 1, -1, -1):
-            month = today.month - i
-            year = today.year
-            while month <= 0:
-                month += 12
-                year -= 1
-            starts.append(date(year, month, 1))
-
-    def bucket_of(day):
-        if period == 'daily':
-            return day
-        if period == 'weekly':
-            return day - timedelta(days=day.weekday())
-        return day.replace(day=1)
+    starts = bucket_starts(period, today, buckets)
 
-    current_user = get_current_user()
-
-    # One query for the whole range; bucketing happens in memory rather than
-    # per-period round trips.
-    query = Transaction.query.filter(
-        and_(
-            Transaction.created_at >= datetime.combine(starts[0], datetime.min.time()),
-            Transaction.created_at <= datetime.combine(today, datetime.max.time())
-        )
-    )
+    # One query for the whole range, bucketed by the database: it returns one
+    # row per period — at most 36 — rather than every day or transaction in
+    # the window for Python to sort into periods. See app/services/report_buckets.
+    query = revenue_buckets(period, start=starts[0], end=today)
 
     # Never let one gym's revenue leak into another's chart.
-    gym_id = get_current_gym_id(current_user)
     if gym_id:
-        query = query.join(Branch, Transaction.branch_id == Branch.id).filter(
+        query = query.join(Branch, DailyRevenueRollup.branch_id == Branch.id).filter(
             Branch.gym_id == gym_id
         )
 
-    query = scope_query_to_branches(query, Transaction.branch_id, current_user, branch_id)
+    query = scope_query_to_branches(query, DailyRevenueRollup.branch_id, current_user, branch_id)
 
-    revenue_by_bucket = defaultdict(float)
-    count_by_bucket = defaultdict(int)
-    for t in query.all():
-        key = bucket_of(t.created_at.date())
-        revenue_by_bucket[key] += float(t.amount) - float(t.discount or 0)
-        count_by_bucket[key] += 1
+    revenue_by_bucket = {}
+    count_by_bucket = {}
+    for bucket, net, _discount, count in query.all():
+        revenue_by_bucket[as_day(bucket)] = float(net or 0)
+        count_by_bucket[as_day(bucket)] = int(count or 0)
 
     def label_of(start):
         if period == 'daily':
@@ -768,82 +725,22 @@ def get_employee_performance():
     elif accessible is not None:
         staff_query = staff_query.filter(User.branch_id.in_(accessible))
 
-    staff_members = staff_query.all()
-    
-    performance_data = []
-    
-    for staff in staff_members:
-        # Count transactions created by this staff member
-        transactions = Transaction.query.filter(
-            and_(
-                Transaction.created_by == staff.id,
-                Transaction.created_at >= datetime.combine(month_start.date(), datetime.min.time()),
-                Transaction.created_at <= datetime.combine(month_end.date(), datetime.max.time())
-            )
-        ).all()
-        
-        transactions_count = len(transactions)
-        total_revenue = float(sum(float(t.amount) - float(t.discount or 0) for t in transactions))
-
-        # Renewal rate = renewals / membership sales (new signups + renewals).
-        #
-        # The old version divided renewals by *every* transaction, so a protein
-        # shake or a freeze fee dragged the rate down — a made-up number. The
-        # honest question is "of the memberships this person sold, how many were
-        # repeat business rather than brand-new signups", so only SUBSCRIPTION
-        # and RENEWAL transactions belong in the denominator. Null when they
-        # sold no memberships at all, so "no sales" never reads as "0%".
-        new_sub_count = sum(
-            1 for t in transactions if t.transaction_type == TransactionType.SUBSCRIPTION
-        )
-        renewals_count = sum(
-            1 for t in transactions if t.transaction_type == TransactionType.RENEWAL
-        )
-        membership_sales = new_sub_count + renewals_count
-        renewal_rate = (
-            renewals_count / membership_sales * 100 if membership_sales else None
-        )
+    # The branch rides along in the same query; it used to be one lazy load
+    # per staff member.
+    staff_members = staff_query.options(joinedload(User.branch)).all()
+
+    # Every staff member's figures in two grouped queries — see
+    # app/services/staff_performance.
+    figures = performance_by_staff(
+        [staff.id for staff in staff_members],
+        datetime.combine(month_start.date(), datetime.min.time()),
+        datetime.combine(month_end.date(), datetime.max.time()),
+        date.today(),
+    )
 
-        # Retention rate = of the subscriptions this staff member opened in the
-        # window that have SINCE ENDED, how many the same member came back from.
-        #
-        # The old version asked "does this customer have any active subscription
-        # right now" — but a member who signed up last week is trivially still
-        # active, so it climbed toward 100% and measured nothing. Real retention
-        # can only be judged once a subscription has had the chance to lapse, so
-        # the denominator is subscriptions whose end_date has already passed, and
-        # the numerator is those whose member holds a later or currently-active
-        # subscription. Null until at least one has ended — not a fake 100%.
-        created_subs = Subscription.query.filter(
-            and_(
-                Subscription.created_by == staff.id,
-                Subscription.created_at >= datetime.combine(month_start.date(), datetime.min.time()),
-                Subscription.created_at <= datetime.combine(month_end.date(), datetime.max.time())
-            )
-        ).all()
-
-        report_today = date.today()
-        ended_subs = [s for s in created_subs if s.end_date and s.end_date < report_today]
-        retained = 0
-        if ended_subs:
-            # One query for every candidate "came back" subscription across
-            # this staffer's ended subs, instead of one query per ended sub.
-            customer_ids = list({s.customer_id for s in ended_subs})
-            candidates_by_customer = defaultdict(list)
-            for cs in Subscription.query.filter(Subscription.customer_id.in_(customer_ids)).all():
-                candidates_by_customer[cs.customer_id].append(cs)
-
-            for sub in ended_subs:
-                came_back = any(
-                    cs.id != sub.id and (
-                        cs.start_date >= sub.end_date or cs.status == SubscriptionStatus.ACTIVE
-                    )
-                    for cs in candidates_by_customer.get(sub.customer_id, [])
-                )
-                if came_back:
-                    retained += 1
-        retention_rate = (retained / len(ended_subs) * 100) if ended_subs else None
+    performance_data = []
 
+    for staff in staff_members:
         performance_data.append({
             'staff_id': staff.id,
             'id': staff.id,
@@ -855,14 +752,7 @@ def get_employee_performance():
             'is_active': staff.is_active,
             'branch_id': staff.branch_id,
             'branch_name': staff.branch.name if staff.branch else 'N/A',
-            'transactions_count': transactions_count,
-            'total_revenue': total_revenue,
-            'new_subscriptions': new_sub_count,
-            'renewals_count': renewals_count,
-            'renewal_rate': renewal_rate,
-            'customers_signed': len(created_subs),
-            'subscriptions_ended': len(ended_subs),
-            'retention_rate': retention_rate
+            **figures[staff.id],
         })
     
     # Sort by revenue
@@ -5,11 +5,14 @@ from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from marshmallow import ValidationError
 from app.schemas import TransactionSchema
+from app.schemas.rows import TRANSACTION_ROWS
 from app.models.transaction import Transaction
 from app.utils import (
     success_response, error_response, role_required,
     paginate, format_pagination_response, get_current_user,
-    get_accessible_branch_ids, scope_query_to_branches
+    get_accessible_branch_ids, scope_query_to_branches,
+    keyset_paginate, format_cursor_pagination, cursor_requested,
+    total_requested, InvalidCursor
 )
 from app.models.user import UserRole, FINANCE_READ_ROLES
 from app.extensions import db
@@ -21,7 +24,12 @@ transactions_bp = Blueprint('transactions', __name__, url_prefix='/api/transacti
 @jwt_required()
 @role_required(*FINANCE_READ_ROLES)
 def get_transactions():
-    """Get all transactions (paginated)"""
+    """Get all transactions (paginated).
+
+    Pass ``cursor`` (empty for the first page, then each page's
+    ``next_cursor``) for keyset pages that cost the same at any depth; see
+    app/utils/cursor_pagination.py.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     branch_id = request.args.get('branch_id', type=int)
@@ -45,14 +53,31 @@ def get_transactions():
         query = query.filter(Transaction.transaction_date >= start_date)
     if end_date:
         query = query.filter(Transaction.transaction_date <= end_date)
-    
+
+    # Bare columns, names joined in, instead of objects through the schema
+    # (app/schemas/rows.py).
+    query = TRANSACTION_ROWS.select(query)
+
+    if cursor_requested(request.args):
+        try:
+            result = keyset_paginate(
+                query, Transaction.transaction_date, Transaction.id,
+                cursor=request.args.get('cursor'), per_page=per_page,
+                with_total=total_requested(request.args),
+            )
+        except InvalidCursor as e:
+            return error_response(str(e), 400)
+        return success_response({
+            'items': TRANSACTION_ROWS.dump(result['items']),
+            'pagination': format_cursor_pagination(result),
+        })
+
     query = query.order_by(Transaction.transaction_date.desc())
     
     items, total, pages, current_page = paginate(query, page, per_page)
     
-    schema = TransactionSchema()
     return success_response(
-        format_pagination_response(items, total, pages, current_page, schema)
+        format_pagination_response(items, total, pages, current_page, TRANSACTION_ROWS)
     )
 
 
@@ -5,6 +5,7 @@ from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from datetime import datetime
 from app.models import EntryLog, EntryType, EntryStatus, Subscription, SubscriptionStatus, Customer
+from app.schemas.rows import ENTRY_LOG_ROWS
 from app.services.qr_service import QRService
 from app.utils import (
     success_response, error_response, get_current_user, role_required,
@@ -75,6 +76,14 @@ def validate_qr_code():
         subscription_id=subscription_id,
         branch_id=branch_id
     )
+
+    # Metered before the decision is final: the counter is taken with one
+    # conditional UPDATE, and a concurrent scan may have spent the last visit
+    # since validate_entry looked — in which case this scan is a refusal.
+    if is_valid and coins_to_deduct > 0 and subscription:
+        deducted, shortfall = QRService.deduct_entry(subscription, coins_to_deduct)
+        if not deducted:
+            is_valid, reason = False, shortfall
     
     if not is_valid:
         # Create denied entry log
@@ -93,10 +102,6 @@ def validate_qr_code():
             'status': 'denied'
         })
     
-    # Deduct entry if needed
-    if coins_to_deduct > 0 and subscription:
-        QRService.deduct_entry(subscription, coins_to_deduct)
-    
     # Create approved entry log
     entry = EntryLog.create_entry(
         customer_id=customer_id,
@@ -184,6 +189,12 @@ def validate_barcode():
         subscription_id=subscription.id,
         branch_id=branch_id
     )
+
+    # Metered before deciding, as in validate_qr_code.
+    if is_valid and coins_to_deduct > 0 and subscription:
+        deducted, shortfall = QRService.deduct_entry(subscription, coins_to_deduct)
+        if not deducted:
+            is_valid, reason = False, shortfall
     
     if not is_valid:
         # Create denied entry
@@ -203,10 +214,6 @@ def validate_barcode():
             'subscription': subscription.to_dict()
         })
     
-    # Deduct entry
-    if coins_to_deduct > 0:
-        QRService.deduct_entry(subscription, coins_to_deduct)
-    
     # Create entry log
     entry = EntryLog.create_entry(
         customer_id=customer.id,
@@ -283,6 +290,12 @@ def manual_entry():
         subscription_id=subscription.id,
         branch_id=branch_id
     )
+
+    # Metered before deciding, as in validate_qr_code.
+    if is_valid and coins_to_deduct > 0 and subscription:
+        deducted, shortfall = QRService.deduct_entry(subscription, coins_to_deduct)
+        if not deducted:
+            is_valid, reason = False, shortfall
     
     if not is_valid:
         # Create denied entry
@@ -300,10 +313,6 @@ def manual_entry():
             'entry_id': entry.id
         })
     
-    # Deduct entry
-    if coins_to_deduct > 0:
-        QRService.deduct_entry(subscription, coins_to_deduct)
-    
     # Create entry log
     entry = EntryLog.create_entry(
         customer_id=customer_id,
@@ -346,11 +355,17 @@ def get_entry_logs():
         - status: Filter by status (approved/denied)
         - from_date: Start date filter
         - to_date: End date filter
+        - cursor: Keyset paging instead of page (empty for the first page,
+          then each response's next_cursor)
+        - with_total: With cursor, include an (estimated) total
     
     Returns:
         Paginated list of entry logs
     """
-    from app.utils import paginate, format_pagination_response
+    from app.utils import (
+        paginate, keyset_paginate, format_cursor_pagination,
+        cursor_requested, total_requested, InvalidCursor,
+    )
     
     staff_user = get_current_user()
     
@@ -402,12 +417,30 @@ def get_entry_logs():
             query = query.filter(EntryLog.entry_time <= to_dt)
         except ValueError:
             pass
-    
+
+    # Bare columns with the member, branch and staff names joined in, not
+    # objects with a lazy load apiece (app/schemas/rows.py).
+    query = ENTRY_LOG_ROWS.select(query)
+
+    if cursor_requested(request.args):
+        try:
+            result = keyset_paginate(
+                query, EntryLog.entry_time, EntryLog.id,
+                cursor=request.args.get('cursor'), per_page=per_page,
+                with_total=total_requested(request.args),
+            )
+        except InvalidCursor as e:
+            return error_response(str(e), 400)
+        return success_response({
+            'entries': ENTRY_LOG_ROWS.dump(result['items']),
+            'pagination': format_cursor_pagination(result),
+        })
+
     query = query.order_by(EntryLog.entry_time.desc())
     
     items, total, pages, current_page = paginate(query, page, per_page)
     
-    entries = [entry.to_dict() for entry in items]
+    entries = ENTRY_LOG_ROWS.dump(items)
     
     return success_response({
         'entries': entries,
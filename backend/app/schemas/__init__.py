@@ -5,7 +5,7 @@ from marshmallow import Schema, fields, validate, validates, ValidationError
 from app.models.user import UserRole
 from app.models.customer import Gender
 from app.models.service import ServiceType
-from app.models.subscription import SubscriptionStatus
+from app.models.subscription import Subscription, SubscriptionStatus
 from app.models.transaction import PaymentMethod, TransactionType
 from app.models.expense import ExpenseStatus
 from app.models.complaint import ComplaintType, ComplaintStatus
@@ -158,8 +158,17 @@ class SubscriptionSchema(Schema):
     stopped_at = fields.DateTime(dump_only=True)
     classes_attended = fields.Int()
     created_at = fields.DateTime(dump_only=True)
-    is_expired = fields.Bool(dump_only=True)
-    can_access = fields.Bool(dump_only=True)
+    # Functions, not fields.Bool: on the model these are methods, and a Bool
+    # field reading a bound method serialised it as true — every subscription
+    # in the list, expired or not, read is_expired and can_access true. Nor
+    # may they call the methods: is_expired() commits a status change.
+    is_expired = fields.Function(
+        lambda obj: Subscription.lapsed(obj.status, obj.end_date), dump_only=True)
+    can_access = fields.Function(
+        lambda obj: obj.status == SubscriptionStatus.ACTIVE
+        and not Subscription.lapsed(obj.status, obj.end_date),
+        dump_only=True,
+    )
 
 
 class FreezeSubscriptionSchema(Schema):
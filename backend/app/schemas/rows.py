@@ -0,0 +1,304 @@
+"""
+Row serializers for the list endpoints: bare columns in, JSON-ready dicts out.
+
+A page of transactions through ``TransactionSchema().dump`` loads twenty full
+Transaction objects, then reads ``branch_name``, ``customer_name`` and
+``created_by_name`` off each — three lazy loads per row unless the route
+remembered to eager-load them — and runs every value through marshmallow's
+per-field dispatch. The entry log and customer lists did the same through
+``to_dict()``. The lists are the most-read screens in the staff app, and
+most of their time went there.
+
+A :class:`RowSerializer` is laid out once, at import: the columns a list
+shows, the names it needs outer-joined in, and a converter for each value
+that is not already JSON (enums, dates, decimals). :meth:`RowSerializer.select`
+turns a route's query — filtered, scoped and ordered as before — into one
+that reads only those columns, names included, in a single statement;
+:meth:`RowSerializer.dump` then builds each row's dict with a ``zip`` and
+the handful of conversions, no objects and no lazy loads.
+
+The output is byte-for-byte what the schema or ``to_dict()`` produced
+(tests/test_row_serializers.py holds them to it), so no client notices. The
+single-record endpoints keep ``to_dict()``; what they return is richer and
+one row does not need this.
+"""
+from sqlalchemy.orm import aliased
+
+from app.models.branch import Branch
+from app.models.customer import Customer
+from app.models.entry_log import EntryLog
+from app.models.service import Service
+from app.models.subscription import Subscription, SubscriptionStatus
+from app.models.transaction import Transaction
+from app.models.user import User
+
+
+def _value(member):
+    """An enum's API value ('active'), as EnumValue and ``to_dict()`` give."""
+    return member.value
+
+
+def _iso(moment):
+    return moment.isoformat()
+
+
+class RowSerializer:
+    """One list's columns, joins and conversions, laid out once.
+
+    ``fields`` maps each output key, in output order, to ``(column, convert)``:
+    a column expression, and a function applied to its non-null values (or
+    None to pass them through). ``joins`` are ``(entity, onclause)`` pairs
+    outer-joined in for the columns that come from other tables — aliased, so
+    they never collide with a join the route's own filters made. ``derive``,
+    if given, is called with each row's dict before conversion, to add or
+    remove keys computed from the raw values.
+    """
+
+    def __init__(self, fields, joins=(), derive=None):
+        self.keys = tuple(fields)
+        self.columns = tuple(column.label(key) for key, (column, _) in fields.items())
+        self.converters = tuple((key, convert) for key, (_, convert) in fields.items()
+                                if convert is not None)
+        self.joins = tuple(joins)
+        self.derive = derive
+
+    def select(self, query):
+        """``query`` reading only this list's columns, as labelled rows.
+
+        The rows carry each key as an attribute, so keyset pagination reads
+        its cursor off them as it does off model objects.
+        """
+        query = query.with_entities(*self.columns)
+        for entity, onclause in self.joins:
+            query = query.outerjoin(entity, onclause)
+        return query
+
+    def dump(self, rows, many=True):
+        """JSON-ready dicts for ``rows`` from :meth:`select`.
+
+        Takes ``many`` so it can stand in for a marshmallow schema, as in
+        ``format_pagination_response``; there is only the many form.
+        """
+        keys, converters, derive = self.keys, self.converters, self.derive
+        items = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            if derive is not None:
+                derive(item)
+            for key, convert in converters:
+                value = item[key]
+                if value is not None:
+                    item[key] = convert(value)
+            items.append(item)
+        return items
+
+
+# ───────────────────────────── transactions ─────────────────────────────────
+
+_tx_branch = aliased(Branch)
+_tx_customer = aliased(Customer)
+_tx_staff = aliased(User)
+
+#: TransactionSchema's dump, for /api/transactions and /api/payments.
+TRANSACTION_ROWS = RowSerializer(
+    {
+        'id': (Transaction.id, None),
+        # fields.Decimal(as_string=True): the Numeric column's Decimal as text.
+        'amount': (Transaction.amount, str),
+        'discount': (Transaction.discount, str),
+        'payment_method': (Transaction.payment_method, _value),
+        'transaction_type': (Transaction.transaction_type, _value),
+        'branch_id': (Transaction.branch_id, None),
+        'branch_name': (_tx_branch.name, None),
+        'customer_id': (Transaction.customer_id, None),
+        'customer_name': (_tx_customer.full_name, None),
+        'subscription_id': (Transaction.subscription_id, None),
+        'created_by': (Transaction.created_by, None),
+        'created_by_name': (_tx_staff.full_name, None),
+        'description': (Transaction.description, None),
+        'notes': (Transaction.notes, None),
+        'reference_number': (Transaction.reference_number, None),
+        'transaction_date': (Transaction.transaction_date, _iso),
+        'created_at': (Transaction.created_at, _iso),
+    },
+    joins=(
+        (_tx_branch, _tx_branch.id == Transaction.branch_id),
+        (_tx_customer, _tx_customer.id == Transaction.customer_id),
+        (_tx_staff, _tx_staff.id == Transaction.created_by),
+    ),
+)
+
+
+# ───────────────────────────── subscriptions ────────────────────────────────
+
+_sub_customer = aliased(Customer)
+_sub_service = aliased(Service)
+_sub_branch = aliased(Branch)
+
+
+def _subscription_access(item):
+    lapsed = Subscription.lapsed(item['status'], item['end_date'])
+    item['is_expired'] = lapsed
+    item['can_access'] = item['status'] == SubscriptionStatus.ACTIVE and not lapsed
+
+
+#: SubscriptionSchema's dump, for /api/subscriptions.
+SUBSCRIPTION_ROWS = RowSerializer(
+    {
+        'id': (Subscription.id, None),
+        'customer_id': (Subscription.customer_id, None),
+        'customer_name': (_sub_customer.full_name, None),
+        'customer_phone': (_sub_customer.phone, None),
+        'service_id': (Subscription.service_id, None),
+        'service_name': (_sub_service.name, None),
+        'service_type': (_sub_service.service_type, _value),
+        'branch_id': (Subscription.branch_id, None),
+        'branch_name': (_sub_branch.name, None),
+        'start_date': (Subscription.start_date, _iso),
+        'end_date': (Subscription.end_date, _iso),
+        'status': (Subscription.status, _value),
+        'freeze_count': (Subscription.freeze_count, None),
+        'total_frozen_days': (Subscription.total_frozen_days, None),
+        'stop_reason': (Subscription.stop_reason, None),
+        'stopped_at': (Subscription.stopped_at, _iso),
+        'classes_attended': (Subscription.classes_attended, None),
+        'created_at': (Subscription.created_at, _iso),
+    },
+    joins=(
+        (_sub_customer, _sub_customer.id == Subscription.customer_id),
+        (_sub_service, _sub_service.id == Subscription.service_id),
+        (_sub_branch, _sub_branch.id == Subscription.branch_id),
+    ),
+    derive=_subscription_access,
+)
+
+
+# ───────────────────────────── entry logs ───────────────────────────────────
+
+_entry_customer = aliased(Customer)
+_entry_branch = aliased(Branch)
+_entry_staff = aliased(User)
+_entry_subscription = aliased(Subscription)
+_entry_service = aliased(Service)
+
+#: EntryLog.to_dict(), for the staff entry log list (/api/validation/entry-logs).
+ENTRY_LOG_ROWS = RowSerializer(
+    {
+        'id': (EntryLog.id, None),
+        'customer_id': (EntryLog.customer_id, None),
+        'customer_name': (_entry_customer.full_name, None),
+        'subscription_id': (EntryLog.subscription_id, None),
+        'entry_type': (EntryLog.entry_type, _value),
+        'entry_status': (EntryLog.entry_status, _value),
+        'branch_id': (EntryLog.branch_id, None),
+        'branch_name': (_entry_branch.name, None),
+        'coins_deducted': (EntryLog.coins_deducted, None),
+        'denial_reason': (EntryLog.denial_reason, None),
+        'processed_by': (_entry_staff.full_name, None),
+        'notes': (EntryLog.notes, None),
+        'entry_time': (EntryLog.entry_time, _iso),
+        'created_at': (EntryLog.created_at, _iso),
+    },
+    joins=(
+        (_entry_customer, _entry_customer.id == EntryLog.customer_id),
+        (_entry_branch, _entry_branch.id == EntryLog.branch_id),
+        (_entry_staff, _entry_staff.id == EntryLog.processed_by_user_id),
+    ),
+)
+
+
+def _history_entry(item):
+    entered = item.pop('entry_time')
+    item['date'] = entered.strftime('%Y-%m-%d') if entered else ''
+    item['time'] = entered.strftime('%H:%M:%S') if entered else ''
+    item['datetime'] = entered.isoformat() if entered else ''
+    item['branch'] = item['branch'] or 'Unknown'
+    item['service'] = item['service'] or 'Gym Access'
+    item['coins_used'] = item['coins_used'] or 0
+    item['entry_type'] = item['entry_type'].value if item['entry_type'] else 'QR_SCAN'
+    item['entry_status'] = item['entry_status'].value if item['entry_status'] else 'APPROVED'
+
+
+#: The member app's visit history (/api/client/history), shaped the way the
+#: Flutter history screen reads it.
+CLIENT_HISTORY_ROWS = RowSerializer(
+    {
+        'id': (EntryLog.id, None),
+        'entry_time': (EntryLog.entry_time, None),
+        'branch': (_entry_branch.name, None),
+        'branch_id': (EntryLog.branch_id, None),
+        'service': (_entry_service.name, None),
+        'coins_used': (EntryLog.coins_deducted, None),
+        'entry_type': (EntryLog.entry_type, None),
+        'entry_status': (EntryLog.entry_status, None),
+    },
+    joins=(
+        (_entry_branch, _entry_branch.id == EntryLog.branch_id),
+        (_entry_subscription, _entry_subscription.id == EntryLog.subscription_id),
+        (_entry_service, _entry_service.id == _entry_subscription.service_id),
+    ),
+    derive=_history_entry,
+)
+
+
+# ───────────────────────────── customers ────────────────────────────────────
+
+_customer_branch = aliased(Branch)
+
+
+def _customer_derived(item):
+    item['age'] = Customer.age_from(item['date_of_birth'])
+    item['qr_code'] = item['qr_code'] or f"customer_id:{item['id']}"
+
+
+#: Customer.to_dict(), for the customer list and search. The route still
+#: decides per caller what to keep: see :func:`customer_items`.
+CUSTOMER_ROWS = RowSerializer(
+    {
+        'id': (Customer.id, None),
+        'full_name': (Customer.full_name, None),
+        'phone': (Customer.phone, None),
+        'email': (Customer.email, None),
+        'national_id': (Customer.national_id, None),
+        'date_of_birth': (Customer.date_of_birth, _iso),
+        'gender': (Customer.gender, _value),
+        'address': (Customer.address, None),
+        'height': (Customer.height, None),
+        'weight': (Customer.weight, None),
+        'bmi': (Customer.bmi, None),
+        'bmi_category': (Customer.bmi_category, None),
+        'bmr': (Customer.bmr, None),
+        'ideal_weight': (Customer.ideal_weight, None),
+        'daily_calories': (Customer.daily_calories, None),
+        'health_notes': (Customer.health_notes, None),
+        'qr_code': (Customer.qr_code, None),
+        'branch_id': (Customer.branch_id, None),
+        'branch_name': (_customer_branch.name, None),
+        'is_active': (Customer.is_active, None),
+        'password_changed': (Customer.password_changed, None),
+        'preferred_language': (Customer.preferred_language, None),
+        'created_at': (Customer.created_at, _iso),
+        'updated_at': (Customer.updated_at, _iso),
+        'temp_password': (Customer.temp_password, None),
+    },
+    joins=((_customer_branch, _customer_branch.id == Customer.branch_id),),
+    derive=_customer_derived,
+)
+
+
+def customer_items(rows, include_temp_password, active_ids, coached=None):
+    """CUSTOMER_ROWS dicts with what ``to_dict()`` takes as arguments applied:
+    the batched active-subscription flag, the temporary password for staff
+    who may see it, and health fields only for members the caller may see
+    them for (``coached``, None meaning all)."""
+    items = CUSTOMER_ROWS.dump(rows)
+    for item in items:
+        customer_id = item['id']
+        temp_password = item.pop('temp_password')
+        item['has_active_subscription'] = customer_id in active_ids
+        if coached is not None and customer_id not in coached:
+            for field in Customer.HEALTH_FIELDS:
+                item.pop(field, None)
+        if include_temp_password and not item['password_changed']:
+            item['temp_password'] = temp_password
+    return items
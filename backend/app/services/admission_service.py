@@ -0,0 +1,194 @@
+"""Door admission in one round trip.
+
+Every scan at the door used to walk the object graph one lazy load at a time:
+the customer, then ``customer.branch`` for its gym, then the gym's rules, then
+the candidate entry subscriptions, then ``subscription.service`` for the
+metering flags — five or more SELECTs on the most frequent request this API
+serves, each paying the network round trip to Postgres.
+
+:func:`admit` asks all of it in a single statement. The customer row is joined
+to its branch (for the gym id), to the one gym setting the door cares about,
+and to every subscription that could be the one metered, each with its
+service. Loading them as ORM entities puts them in the identity map, so the
+``subscription.service`` the callers go on to read resolves there instead of
+issuing another query.
+
+The rules themselves are unchanged and still live where they did —
+``Subscription.entry_query`` for what "grants entry" means, ``gym_rules`` for
+the override — this only changes how many times the database is asked.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, or_, select
+
+from app.extensions import db
+
+#: The only gym rule the door consults.
+_ENTRY_RULE = 'pt_only_members_may_enter'
+
+#: Built once per process. Everything that varies between scans is a bind
+#: parameter, so SQLAlchemy's compiled-statement cache serves every scan after
+#: the first from the same compiled form — and Postgres sees one statement
+#: shape it can plan once.
+_statement = None
+
+
+def _admission_statement():
+    global _statement
+    if _statement is not None:
+        return _statement
+
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym_setting import GymSetting
+    from app.models.service import Service
+    from app.models.subscription import Subscription, SubscriptionStatus
+
+    _statement = (
+        select(Customer, GymSetting.value, Subscription, Service)
+        .select_from(Customer)
+        .outerjoin(Branch, Branch.id == Customer.branch_id)
+        .outerjoin(GymSetting, and_(
+            GymSetting.gym_id == Branch.gym_id,
+            GymSetting.key == _ENTRY_RULE,
+        ))
+        # Either a candidate for "the" entry subscription, or the specific one
+        # the caller named — which may be in any state, and may not even be
+        # this member's, and both of those have to be reported as such.
+        .outerjoin(Subscription, or_(
+            and_(
+                Subscription.customer_id == Customer.id,
+                Subscription.status.in_(
+                    [SubscriptionStatus.ACTIVE, SubscriptionStatus.FROZEN]),
+            ),
+            Subscription.id == bindparam('subscription_id'),
+        ))
+        .outerjoin(Service, Service.id == Subscription.service_id)
+        .where(Customer.id == bindparam('customer_id'))
+    )
+    return _statement
+
+
+def _load(customer_id, subscription_id):
+    """(customer, raw entry rule, [(subscription, service), ...])."""
+    rows = db.session.execute(
+        _admission_statement(),
+        {'customer_id': customer_id, 'subscription_id': subscription_id},
+    ).all()
+    if not rows:
+        return None, None, []
+
+    customer, raw_rule = rows[0][0], rows[0][1]
+    subscriptions = [(row[2], row[3]) for row in rows if row[2] is not None]
+    return customer, raw_rule, subscriptions
+
+
+def _entry_choice(customer_id, subscriptions, allow_non_entry):
+    """The same choice ``Subscription.entry_subscription_for`` makes, from rows
+    already in hand."""
+    from app.models.subscription import SubscriptionStatus
+
+    def order(subscription):
+        return (subscription.status != SubscriptionStatus.ACTIVE,
+                -subscription.end_date.toordinal())
+
+    candidates = [
+        subscription for subscription, service in subscriptions
+        if subscription.customer_id == customer_id
+        and subscription.status in (SubscriptionStatus.ACTIVE, SubscriptionStatus.FROZEN)
+        and (allow_non_entry or (service is not None and service.grants_gym_entry))
+    ]
+    candidates.sort(key=order)
+
+    # Frozen candidates still have to have a lapsed freeze ended on read. That
+    # costs a query, but only for a member who is frozen — never the common
+    # active-member scan.
+    if any(s.settle_expired_freeze() for s in candidates):
+        candidates.sort(key=order)
+
+    return candidates[0] if candidates else None
+
+
+def admit(customer_id, subscription_id=None, branch_id=None):
+    """Whether this member may enter, in one query.
+
+    Returns ``(is_valid, reason, subscription, coins_to_deduct)`` — exactly the
+    contract of ``QRService.validate_entry``, which is a thin wrapper over this.
+    """
+    from app.models.subscription import SubscriptionStatus
+    from app.services.gym_rules import rule_value
+
+    customer, raw_rule, subscriptions = _load(customer_id, subscription_id)
+    if not customer:
+        return False, "Customer not found", None, 0
+
+    if not customer.is_active:
+        return False, "Customer account is inactive", None, 0
+
+    # A customer with no branch has no gym, so the join found no setting and
+    # this falls to the default — what gym_rule(None, ...) answered.
+    allow_non_entry = rule_value(_ENTRY_RULE, raw_rule)
+
+    if subscription_id:
+        subscription = next(
+            (s for s, _ in subscriptions if s.id == subscription_id), None)
+        # Belongs-to check: without it, a request naming someone else's
+        # subscription id would admit this customer and spend the other
+        # member's visits.
+        if subscription and subscription.customer_id != customer_id:
+            return False, "Subscription does not belong to this customer", None, 0
+        # Grants-entry check: the caller supplied this id (a QR token carries
+        # it), so the entry rule has to be re-applied here rather than trusted
+        # from whoever minted it. Without this, a token naming the member's own
+        # private-training package would open the door and meter sessions
+        # their captain never delivered.
+        if (
+            subscription is not None
+            and not allow_non_entry
+            and subscription.service is not None
+            and not subscription.service.grants_gym_entry
+        ):
+            return False, "This subscription does not grant gym entry", subscription, 0
+    else:
+        # The one that grants entry: a member holding gym *and* private
+        # training has more than one, and only the gym package should be
+        # metered by a scan at the door.
+        subscription = _entry_choice(customer_id, subscriptions, allow_non_entry)
+
+    if not subscription:
+        return False, "No active subscription found", None, 0
+
+    # Check subscription status (includes frozen, stopped, expired)
+    if subscription.status != SubscriptionStatus.ACTIVE:
+        return False, f"Subscription is {subscription.status.value}", subscription, 0
+
+    # Check if subscription is expired by date
+    if subscription.end_date and subscription.end_date < datetime.utcnow().date():
+        return False, "Subscription expired", subscription, 0
+
+    # Check branch access (if branch_id provided)
+    if branch_id and subscription.branch_id != branch_id:
+        return False, "Subscription not valid for this branch", subscription, 0
+
+    # Check remaining visits/coins.
+    #
+    # A NULL counter means the subscription does not meter that thing — a
+    # time-based membership has unlimited visits, and a coin package is metered
+    # through remaining_coins instead. Comparing NULL with <= 0 raises
+    # TypeError, which surfaced as a 500 at the front desk rather than a
+    # denial, so the None case has to be handled before the compare.
+    service = subscription.service
+    coins_to_deduct = 0
+    if service.has_visits and subscription.remaining_visits is not None:
+        if subscription.remaining_visits <= 0:
+            return False, "No remaining visits on subscription", subscription, 0
+        coins_to_deduct = 1
+
+    # Check class-based limits
+    if service.has_classes and subscription.remaining_classes is not None:
+        if subscription.remaining_classes <= 0:
+            return False, "No remaining classes on subscription", subscription, 0
+        coins_to_deduct = 1
+
+    # All checks passed
+    return True, "Entry approved", subscription, coins_to_deduct
@@ -0,0 +1,274 @@
+"""Member attendance — visits, streaks, last visit — kept pre-computed.
+
+The member app's home screen (``/api/client/stats``) used to answer from
+``entry_logs`` on every open: a count of every approved entry the member had
+ever made, a second count for the month, and a walk over the distinct entry
+dates of the last 30 days for the streak. The first two grow with the member's
+history; the third capped every streak at 30 days, and compared UTC dates, so
+a visit after midnight in Cairo counted towards the day before.
+
+``attendance_summaries`` holds one row per member with the answers, in the
+gym's local business day. Keeping it correct:
+
+* **Incrementally.** A mapper listener on ``EntryLog`` folds each approved
+  entry into the member's row with one conditional UPDATE, in the same flush
+  as the entry, so the two commit or roll back together. Entries arrive in
+  time order almost always; one that does not (a backdated entry, one whose
+  status or time is edited, one deleted) has the member's row recomputed
+  from their entries instead, which is also how the first visit creates it.
+* **From scratch.** ``flask rebuild-attendance-summaries`` recomputes every
+  row: the backfill for history that predates the table, and the repair after
+  a gym changes its ``timezone`` setting.
+"""
+from datetime import timedelta
+
+from sqlalchemy import and_, case, event, inspect as sa_inspect, or_, select
+
+from app.extensions import db
+from app.utils.upsert import upsert
+
+#: The entry attributes a summary is derived from. A change to any of these
+#: recomputes the member's row; a change to anything else does not touch it.
+_TRACKED = ('customer_id', 'branch_id', 'entry_status', 'entry_time')
+
+_COLUMNS = ('total_visits', 'month_start', 'month_visits', 'last_visit_date',
+            'last_visit_at', 'current_streak', 'longest_streak')
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def summarise(visits):
+    """The summary columns for an iterable of ``(business_date, entry_time)``.
+
+    Any order. Returns None for no visits at all.
+    """
+    visits = list(visits)
+    if not visits:
+        return None
+    days = sorted({day for day, _ in visits})
+    last_day = days[-1]
+
+    longest = run = 1
+    for previous, day in zip(days, days[1:]):
+        run = run + 1 if day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+
+    month = _month(last_day)
+    return {
+        'total_visits': len(visits),
+        'month_start': month,
+        'month_visits': sum(1 for day, _ in visits if _month(day) == month),
+        'last_visit_date': last_day,
+        'last_visit_at': max(when for _, when in visits),
+        'current_streak': run,
+        'longest_streak': longest,
+    }
+
+
+# ───────────────────────────── incremental ──────────────────────────────────
+
+def _business_dates(connection):
+    """A ``(branch_id, entry_time) -> local date`` function for one flush."""
+    from app.services.revenue_rollup import _branch_timezone, business_date
+
+    zones = {}
+
+    def local_date(branch_id, when):
+        if branch_id not in zones:
+            zones[branch_id] = _branch_timezone(connection, branch_id)
+        return business_date(zones[branch_id], when)
+    return local_date
+
+
+def _store(connection, customer_id, values):
+    """Write one member's row, or remove it when they have no visits left."""
+    from app.models.attendance_summary import AttendanceSummary
+
+    table = AttendanceSummary.__table__
+    if values is None:
+        connection.execute(table.delete().where(table.c.customer_id == customer_id))
+        return
+
+    upsert(connection, table, dict(values, customer_id=customer_id), ['customer_id'],
+           lambda new: {name: new[name] for name in _COLUMNS})
+
+
+def recompute(connection, customer_id):
+    """Rebuild one member's row from their approved entries."""
+    from app.models.entry_log import EntryLog, EntryStatus
+
+    local_date = _business_dates(connection)
+    rows = connection.execute(
+        select(EntryLog.branch_id, EntryLog.entry_time).where(
+            EntryLog.customer_id == customer_id,
+            EntryLog.entry_status == EntryStatus.APPROVED,
+        )
+    )
+    _store(connection, customer_id, summarise(
+        (local_date(branch_id, when), when) for branch_id, when in rows
+    ))
+
+
+def _fold_in(connection, customer_id, day, when):
+    """Add one visit on ``day`` to the member's row, if it is not behind it.
+
+    One UPDATE, computed by the database from the row as it stands, so two
+    entries flushing at once cannot both read the old streak. Matches nothing
+    when the member has no row yet or ``day`` is before their last visit;
+    returns whether it matched.
+    """
+    from app.models.attendance_summary import AttendanceSummary
+
+    table = AttendanceSummary.__table__
+    month = _month(day)
+    follows = table.c.last_visit_date == day - timedelta(days=1)
+    streak = case(
+        (table.c.last_visit_date == day, table.c.current_streak),
+        (follows, table.c.current_streak + 1),
+        else_=1,
+    )
+    updated = connection.execute(
+        table.update()
+        .where(table.c.customer_id == customer_id, table.c.last_visit_date <= day)
+        # In this order: MySQL applies the assignments left to right, each
+        # seeing the ones before it, so every column that reads another's old
+        # value goes ahead of it — month_visits before month_start, both
+        # streaks before last_visit_date, longest before current.
+        .ordered_values(
+            (table.c.total_visits, table.c.total_visits + 1),
+            (table.c.month_visits, case(
+                (table.c.month_start == month, table.c.month_visits + 1), else_=1,
+            )),
+            (table.c.month_start, month),
+            (table.c.longest_streak, case(
+                (and_(follows, table.c.current_streak + 1 > table.c.longest_streak),
+                 table.c.current_streak + 1),
+                else_=table.c.longest_streak,
+            )),
+            (table.c.current_streak, streak),
+            (table.c.last_visit_at, case(
+                (or_(table.c.last_visit_at.is_(None), table.c.last_visit_at < when), when),
+                else_=table.c.last_visit_at,
+            )),
+            (table.c.last_visit_date, day),
+        )
+    )
+    return bool(updated.rowcount)
+
+
+def _on_insert(mapper, connection, target):
+    from app.models.entry_log import EntryStatus
+
+    if target.entry_status != EntryStatus.APPROVED or target.entry_time is None:
+        return
+    day = _business_dates(connection)(target.branch_id, target.entry_time)
+    if not _fold_in(connection, target.customer_id, day, target.entry_time):
+        recompute(connection, target.customer_id)
+
+
+def _on_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _TRACKED):
+        return
+    customers = {target.customer_id}
+    customers.update(state.attrs.customer_id.history.deleted or ())
+    for customer_id in customers:
+        if customer_id is not None:
+            recompute(connection, customer_id)
+
+
+def _on_delete(mapper, connection, target):
+    recompute(connection, target.customer_id)
+
+
+def register_attendance_maintenance():
+    from app.models.entry_log import EntryLog
+
+    for event_name, listener in (
+        ('after_insert', _on_insert),
+        ('after_update', _on_update),
+        ('after_delete', _on_delete),
+    ):
+        if not event.contains(EntryLog, event_name, listener):
+            event.listen(EntryLog, event_name, listener)
+
+
+# ─────────────────────────────── rebuild ────────────────────────────────────
+
+def rebuild(batch_size=5000):
+    """Recompute every member's row from ``entry_logs``. Returns rows written.
+
+    Streams the approved entries in member order, so only one member's visits
+    are held at a time. One transaction; readers see the old rows until it
+    commits. An entry recorded while this runs may be missed — run it at a
+    quiet hour, or simply run it again.
+    """
+    from app.models.attendance_summary import AttendanceSummary
+    from app.models.entry_log import EntryLog, EntryStatus
+
+    connection = db.session.connection()
+    local_date = _business_dates(connection)
+    table = AttendanceSummary.__table__
+    db.session.execute(table.delete())
+
+    rows = db.session.execute(
+        select(EntryLog.customer_id, EntryLog.branch_id, EntryLog.entry_time)
+        .where(EntryLog.entry_status == EntryStatus.APPROVED)
+        .order_by(EntryLog.customer_id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    written, records, member, visits = 0, [], None, []
+
+    def flush_member():
+        summary = summarise(visits)
+        if summary is not None:
+            records.append(dict(summary, customer_id=member))
+
+    for customer_id, branch_id, when in rows:
+        if customer_id != member:
+            flush_member()
+            member, visits = customer_id, []
+            if len(records) >= batch_size:
+                db.session.execute(table.insert(), records)
+                written += len(records)
+                records = []
+        visits.append((local_date(branch_id, when), when))
+    flush_member()
+    if records:
+        db.session.execute(table.insert(), records)
+        written += len(records)
+    db.session.commit()
+    return written
+
+
+# ──────────────────────────────── reading ───────────────────────────────────
+
+def stats_for(customer, today=None):
+    """What the member app shows: counts, streaks and the last visit.
+
+    ``today`` is the gym's local date (``gym_today``) unless given. A streak
+    is current while its last day is today or yesterday — today's visit may
+    simply not have happened yet.
+    """
+    from app.models.attendance_summary import AttendanceSummary
+
+    summary = db.session.get(AttendanceSummary, customer.id)
+    if summary is None:
+        return {'total_visits': 0, 'visits_this_month': 0, 'current_streak': 0,
+                'longest_streak': 0, 'last_visit_at': None}
+
+    if today is None:
+        from app.services.business_time import gym_today
+        today = gym_today(customer.branch.gym_id if customer.branch else None)
+    alive = summary.last_visit_date >= today - timedelta(days=1)
+    return {
+        'total_visits': summary.total_visits,
+        'visits_this_month': (summary.month_visits
+                              if summary.month_start == _month(today) else 0),
+        'current_streak': summary.current_streak if alive else 0,
+        'longest_streak': summary.longest_streak,
+        'last_visit_at': summary.last_visit_at.isoformat() if summary.last_visit_at else None,
+    }
@@ -37,15 +37,14 @@ def gym_timezone(gym_id):
     business days existed, so the worst case is the old behaviour rather than
     an outage.
     """
-    name = DEFAULT_TIMEZONE
-    if gym_id is not None:
-        try:
-            from app.models.gym_setting import GymSetting
-            row = GymSetting.query.filter_by(gym_id=gym_id, key='timezone').first()
-            if row and row.value:
-                name = row.value.strip()
-        except Exception:
-            name = DEFAULT_TIMEZONE
+    from app.services.settings_cache import derived
+    return derived(gym_id, 'timezone', _resolve_timezone)
+
+
+def _resolve_timezone(settings):
+    """The ZoneInfo for a gym's settings map. Cached with the settings by
+    ``gym_timezone``, so it is resolved once per change, not once per call."""
+    name = (settings.get('timezone') or '').strip() or DEFAULT_TIMEZONE
 
     try:
         return ZoneInfo(name)
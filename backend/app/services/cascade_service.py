@@ -15,6 +15,15 @@ from app.models.customer import Customer
 from app.models.branch import Branch
 
 
+def _forget_cached_flags():
+    """Make the request guard re-read every account's active flag once this
+    commits: the bulk UPDATEs here are invisible to the session events that
+    normally tell it (app/services/principal.py). Deactivations are rare
+    enough that forgetting everyone is cheaper than listing who."""
+    from app.services.principal import invalidate_on_commit
+    invalidate_on_commit(db.session, everything=True)
+
+
 def deactivate_branch_members(branch_id):
     """Deactivate every staff user and client of a single branch.
 
@@ -28,6 +37,7 @@ def deactivate_branch_members(branch_id):
     customers = Customer.query.filter_by(branch_id=branch_id, is_active=True).update(
         {'is_active': False}, synchronize_session=False
     )
+    _forget_cached_flags()
     return staff, customers
 
 
@@ -55,4 +65,10 @@ def deactivate_gym_members(gym_id):
         {'is_active': False}, synchronize_session=False
     )
 
+    # Bulk UPDATEs bypass the session events that keep cached branch scopes
+    # honest, so drop this gym's by hand.
+    from app.services.scope_cache import invalidate
+    invalidate(gym_ids=[gym_id])
+    _forget_cached_flags()
+
     return {'branches': branches, 'staff': staff, 'customers': customers}
@@ -0,0 +1,344 @@
+"""Finding a member by name, phone, email, national id or QR code.
+
+The front desk searches on every keystroke, and the search used to be
+``ILIKE '%term%'`` across five columns of ``customers`` — a leading wildcard,
+so no index could help and each keystroke scanned the table. It was also
+literal: "احمد" did not find "أحمد", and "0100 123 4567" did not find
+"01001234567".
+
+Now every member has a row in ``customer_search_entries`` holding their
+searchable text already folded (:func:`normalize_text`) and their phone as bare
+digits (:func:`phone_digits`). The search term is folded the same way, so the
+database only ever compares plain strings, and each dialect indexes those:
+
+* **Postgres** — ``pg_trgm`` GIN indexes, which serve ``LIKE '%term%'``
+  directly. Installed when the table is created; if the extension cannot be
+  created (no privilege), search still works, unindexed, and says so in the
+  log.
+* **SQLite** — an FTS5 ``trigram`` table over the entries, kept in step by
+  triggers, narrows the candidates before the same ``LIKE`` confirms them.
+* **Anything else** — the ``LIKE`` alone, over one narrow table rather than
+  five columns of a wide one.
+
+Results are ranked: an exact phone number, then an exact name, then names that
+start with the term, then names with a word that does, then everything else.
+
+Entries are written in the same flush as the customer — on create, on any
+change to a searched field, and on anonymisation, which removes the entry
+outright so an erased member cannot be found by what they used to be called.
+``flask rebuild-customer-search`` recomputes them all.
+"""
+import logging
+import re
+import unicodedata
+
+from sqlalchemy import (
+    and_, case, event, false, inspect as sa_inspect, literal_column, or_, select,
+    table, text,
+)
+
+from app.extensions import db
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+#: The customer attributes an entry is derived from.
+_SEARCHED = ('full_name', 'phone', 'email', 'national_id', 'qr_code')
+
+#: Trigram indexes cannot narrow anything shorter than this.
+_TRIGRAM = 3
+
+#: SQLite's FTS5 table over the entries, kept in step by triggers.
+_FTS_TABLE = 'customer_search_fts'
+
+# Letters that are written several ways and searched as one. Hamza and madda
+# forms of alef (أ إ آ) and the hamza seats (ؤ ئ) reduce to their base letter
+# by decomposition (see normalize_text); these are the ones that do not.
+_FOLD = str.maketrans({
+    'ٱ': 'ا',   # alef wasla
+    'ى': 'ي',   # alef maksura, written for a final ya
+    'ی': 'ي',   # Persian ya
+    'ة': 'ه',   # ta marbuta, written for a final ha
+    'ک': 'ك',   # Persian kaf
+    'ـ': None,  # tatweel, a stretching stroke with no sound
+})
+
+# Eastern Arabic and Persian digits, as typed on an Arabic keyboard.
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+
+_PHONE_LIKE = re.compile(r'^[\d\s+\-().]+$')
+
+
+# ─────────────────────────────── folding ────────────────────────────────────
+
+def normalize_text(value):
+    """``value`` folded for matching: lower case, no diacritics or tashkeel,
+    one spelling per Arabic letter, Western digits, single spaces."""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value).translate(_DIGITS))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    value = value.translate(_FOLD).casefold()
+    return ' '.join(value.split())
+
+
+def phone_digits(value):
+    """Just the digits of a phone number, Eastern Arabic digits included."""
+    if not value:
+        return ''
+    return ''.join(ch for ch in str(value).translate(_DIGITS) if ch.isdigit())
+
+
+def _entry_values(customer):
+    name = normalize_text(customer.full_name)
+    searchable = [name] + [normalize_text(getattr(customer, field))
+                           for field in ('email', 'national_id', 'qr_code')]
+    return {
+        'customer_id': customer.id,
+        'name_key': name[:150],
+        'search_text': ' '.join(part for part in searchable if part)[:500],
+        'phone_digits': phone_digits(customer.phone)[:32],
+    }
+
+
+def _erased(customer):
+    from app.services.retention_service import ANONYMISED_PHONE_PREFIX
+    return (customer.phone or '').startswith(ANONYMISED_PHONE_PREFIX)
+
+
+# ───────────────────────────── maintenance ──────────────────────────────────
+
+def _write(connection, customer):
+    from app.models.customer_search_entry import CustomerSearchEntry
+
+    entries = CustomerSearchEntry.__table__
+    if _erased(customer):
+        connection.execute(entries.delete().where(entries.c.customer_id == customer.id))
+        return
+
+    values = _entry_values(customer)
+    upsert(connection, entries, values, ['customer_id'],
+           lambda new: {name: new[name] for name in values if name != 'customer_id'})
+
+
+def _on_insert(mapper, connection, target):
+    _write(connection, target)
+
+
+def _on_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _SEARCHED):
+        _write(connection, target)
+
+
+def _on_delete(mapper, connection, target):
+    from app.models.customer_search_entry import CustomerSearchEntry
+
+    entries = CustomerSearchEntry.__table__
+    connection.execute(entries.delete().where(entries.c.customer_id == target.id))
+
+
+def register_search_maintenance():
+    from app.models.customer import Customer
+
+    _register_ddl()
+
+    for event_name, listener in (
+        ('after_insert', _on_insert),
+        ('after_update', _on_update),
+        ('after_delete', _on_delete),
+    ):
+        if not event.contains(Customer, event_name, listener):
+            event.listen(Customer, event_name, listener)
+
+
+def rebuild(batch_size=2000):
+    """Recompute every entry from ``customers``. Returns the number written.
+
+    The backfill for members who predate the table, and the repair after a
+    change to the folding rules. One transaction; searches see the old
+    entries until it commits.
+    """
+    from app.models.customer import Customer
+    from app.models.customer_search_entry import CustomerSearchEntry
+
+    install_indexes(db.session.connection())
+    db.session.execute(CustomerSearchEntry.__table__.delete())
+
+    members = db.session.execute(
+        select(Customer.id, Customer.full_name, Customer.phone, Customer.email,
+               Customer.national_id, Customer.qr_code)
+        .execution_options(yield_per=batch_size)
+    )
+    records = [_entry_values(member) for member in members if not _erased(member)]
+    for start in range(0, len(records), batch_size):
+        db.session.execute(CustomerSearchEntry.__table__.insert(),
+                           records[start:start + batch_size])
+    written = len(records)
+    db.session.commit()
+    return written
+
+
+# ─────────────────────────── dialect indexes ────────────────────────────────
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {_FTS_TABLE} USING fts5("
+    "search_text, phone_digits, content='customer_search_entries', "
+    "content_rowid='customer_id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS customer_search_fts_ai "
+    "AFTER INSERT ON customer_search_entries BEGIN "
+    f"INSERT INTO {_FTS_TABLE}(rowid, search_text, phone_digits) "
+    "VALUES (new.customer_id, new.search_text, new.phone_digits); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_search_fts_ad "
+    "AFTER DELETE ON customer_search_entries BEGIN "
+    f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, search_text, phone_digits) "
+    "VALUES ('delete', old.customer_id, old.search_text, old.phone_digits); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_search_fts_au "
+    "AFTER UPDATE ON customer_search_entries BEGIN "
+    f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, search_text, phone_digits) "
+    "VALUES ('delete', old.customer_id, old.search_text, old.phone_digits); "
+    f"INSERT INTO {_FTS_TABLE}(rowid, search_text, phone_digits) "
+    "VALUES (new.customer_id, new.search_text, new.phone_digits); END",
+)
+
+_POSTGRES_DDL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_customer_search_text_trgm '
+    'ON customer_search_entries USING gin (search_text gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_customer_search_phone_trgm '
+    'ON customer_search_entries USING gin (phone_digits gin_trgm_ops)',
+)
+
+
+def install_indexes(connection):
+    """Put the dialect's substring index over the entries. Idempotent.
+
+    A failure (pg_trgm not permitted, SQLite built without FTS5) is logged and
+    leaves search working unindexed rather than taking startup down with it.
+    """
+    statements = {'sqlite': _SQLITE_DDL, 'postgresql': _POSTGRES_DDL}.get(
+        connection.dialect.name, ())
+    if not statements:
+        return
+    try:
+        if connection.dialect.name == 'postgresql':
+            # In a savepoint, so a refused CREATE EXTENSION does not abort the
+            # transaction it runs in (create_all's, or a rebuild's).
+            with connection.begin_nested():
+                for statement in statements:
+                    connection.execute(text(statement))
+        else:
+            for statement in statements:
+                connection.execute(text(statement))
+    except Exception as exc:
+        logger.warning('Customer search index not installed (%s); '
+                       'search will run unindexed.', exc)
+    _fts_ready.clear()
+
+
+def _after_create(target, connection, **kw):
+    install_indexes(connection)
+
+
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {_FTS_TABLE}'))
+        _fts_ready.clear()
+
+
+def _register_ddl():
+    from app.models.customer_search_entry import CustomerSearchEntry
+
+    entries = CustomerSearchEntry.__table__
+    for event_name, listener in (('after_create', _after_create),
+                                 ('before_drop', _before_drop)):
+        if not event.contains(entries, event_name, listener):
+            event.listen(entries, event_name, listener)
+
+
+#: Per database URL: whether the SQLite FTS5 table is there to be used.
+_fts_ready = {}
+
+
+def _sqlite_fts(bind):
+    key = str(bind.url)
+    if key not in _fts_ready:
+        with bind.connect() as connection:
+            _fts_ready[key] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {'name': _FTS_TABLE},
+            ).first() is not None
+    return _fts_ready[key]
+
+
+# ──────────────────────────────── search ────────────────────────────────────
+
+#: LIKE escape character. Not a backslash: Postgres and MySQL disagree about
+#: what a backslash inside a string literal means.
+_ESCAPE = '!'
+
+
+def _like(value):
+    escaped = value.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return f'%{escaped}%'
+
+
+def _fts_phrase(column, value):
+    return f'{column} : "' + value.replace('"', '""') + '"'
+
+
+def search(query, term, ranked=True):
+    """``query`` (over Customer) narrowed to members matching ``term``.
+
+    Every word of the term must appear in the member's name, email, national
+    id or QR code; or, for a term that looks like a phone number, its digits
+    must appear in theirs. With ``ranked`` the results are ordered best match
+    first, replacing any existing ORDER BY.
+    """
+    from app.models.customer import Customer
+    from app.models.customer_search_entry import CustomerSearchEntry as Entry
+
+    folded = normalize_text(term)
+    words = folded.split()
+    digits = phone_digits(term) if _PHONE_LIKE.match(term or '') else ''
+    if len(digits) < _TRIGRAM:
+        digits = ''
+
+    matches = []
+    if words:
+        matches.append(and_(*(Entry.search_text.like(_like(word), escape=_ESCAPE)
+                              for word in words)))
+    if digits:
+        matches.append(Entry.phone_digits.like(_like(digits), escape=_ESCAPE))
+
+    if not matches:
+        return query.filter(false())
+    query = query.join(Entry, Entry.customer_id == Customer.id).filter(or_(*matches))
+
+    bind = db.session.get_bind()
+    long_words = [word for word in words if len(word) >= _TRIGRAM]
+    if bind.dialect.name == 'sqlite' and long_words and _sqlite_fts(bind):
+        # The trigram table narrows to candidates; the LIKEs above confirm
+        # them (and check any word too short for trigrams to see).
+        fts_query = ' AND '.join(_fts_phrase('search_text', word) for word in long_words)
+        if digits:
+            fts_query = f'({fts_query}) OR {_fts_phrase("phone_digits", digits)}'
+        query = query.filter(Entry.customer_id.in_(
+            select(literal_column('rowid'))
+            .select_from(table(_FTS_TABLE))
+            .where(text(f'{_FTS_TABLE} MATCH :fts_query').bindparams(fts_query=fts_query))
+        ))
+
+    if not ranked:
+        return query
+
+    ranks = []
+    if digits:
+        ranks.append((Entry.phone_digits == digits, 0))
+    ranks += [
+        (Entry.name_key == folded, 1),
+        (Entry.name_key.like(_like(folded)[1:], escape=_ESCAPE), 2),
+        (Entry.name_key.like('% ' + _like(folded)[1:], escape=_ESCAPE), 3),
+    ]
+    return query.order_by(None).order_by(case(*ranks, else_=4), Customer.full_name,
+                                         Customer.id)
@@ -0,0 +1,158 @@
+"""Owner dashboard snapshots, held briefly and dropped when the numbers move.
+
+The owner's home screen is the most expensive read in the API — about ten
+aggregates plus ``compare_branches_performance``'s six grouped queries — and
+the app refreshes it every time the owner comes back to it. Almost every one of
+those refreshes lands on figures that have not changed since the last.
+
+Each worker keeps the last snapshot per branch scope (an owner's whole gym, a
+regional manager's group) for ``OWNER_DASHBOARD_CACHE_SECONDS``. A committed
+write to any of the rows the dashboard counts — transactions, subscriptions,
+complaints, expenses, customers, branches — drops every snapshot covering that
+branch in this worker at once; other workers pick it up when their copy
+expires, so the interval is the bound on how stale a figure can be. Writes made
+below the ORM (the door's metering UPDATE, bulk backfills) are covered by the
+interval alone.
+
+``?fresh=1`` on the endpoint skips the cache for one request, and
+:func:`stats` reports hits and misses for monitoring. Set the interval to 0 to
+turn the cache off.
+"""
+import time
+
+from sqlalchemy import inspect as sa_inspect
+
+from app.services import worker_cache
+
+#: Branch scopes kept per worker; least recently used go first.
+MAX_SNAPSHOTS = 256
+
+#: Stands for "every scope": a write whose branch could not be told.
+_ALL = object()
+
+#: Session.info key the flush collects dirty branch ids under until commit.
+_PENDING = 'dashboard_dirty_branches'
+
+_clock = time.monotonic
+
+
+def _cache():
+    return worker_cache.for_app('owner_dashboard_cache', MAX_SNAPSHOTS,
+                                metric='owner_dashboard')
+
+
+def _ttl():
+    return worker_cache.seconds('OWNER_DASHBOARD_CACHE_SECONDS')
+
+
+def _scope_key(branch_ids):
+    return None if branch_ids is None else tuple(sorted(set(branch_ids)))
+
+
+def owner_dashboard(branch_ids=None, fresh=False):
+    """``DashboardService.get_owner_dashboard(branch_ids)``, from a snapshot if
+    a recent enough one exists.
+
+    ``fresh`` recomputes regardless and stores the result, so the next
+    ordinary read sees it too. The snapshot is shared: treat it as read-only.
+    """
+    from app.services.dashboard_service import DashboardService
+
+    ttl = _ttl()
+    if not ttl:
+        return DashboardService.get_owner_dashboard(branch_ids=branch_ids)
+
+    cache = _cache()
+    key = _scope_key(branch_ids)
+    now = _clock()
+
+    if fresh:
+        cache.bypass()
+    else:
+        snapshot = cache.get(key, ttl, now)
+        if snapshot is not worker_cache.MISSING:
+            return snapshot
+
+    snapshot = DashboardService.get_owner_dashboard(branch_ids=branch_ids)
+    return cache.put(key, snapshot, now)
+
+
+def mark_dirty(branch_ids):
+    """Drop every snapshot that counts any of these branches.
+
+    ``None`` in the set (or the set being None) means "unknown branch" and
+    drops everything.
+    """
+    try:
+        cache = _cache()
+    except RuntimeError:
+        return  # No app context: nothing cached here to drop.
+
+    everything = branch_ids is None or _ALL in branch_ids or None in branch_ids
+    cache.drop(lambda key, snapshot: everything or key is None
+               or any(b in branch_ids for b in key))
+
+
+def stats():
+    """Hit/miss counters for this worker, for monitoring."""
+    cache = _cache()
+    counters = cache.stats(_ttl(), size_key='snapshots')
+    counters['bypasses'] = cache.bypasses
+    return counters
+
+
+def reset():
+    """Forget every snapshot and zero the counters (tests, mostly)."""
+    try:
+        cache = _cache()
+    except RuntimeError:
+        return
+    cache.clear()
+
+
+# ───────────────────────────── dirty tracking ───────────────────────────────
+#
+# Collected at flush, applied at commit: a write that rolls back must not cost
+# anyone their snapshot, and one that commits must not leave a stale one behind
+# for the rest of the interval.
+
+def _watched():
+    from app.models.branch import Branch
+    from app.models.complaint import Complaint
+    from app.models.customer import Customer
+    from app.models.expense import Expense
+    from app.models.subscription import Subscription
+    from app.models.transaction import Transaction
+    return (Transaction, Subscription, Complaint, Expense, Customer), Branch
+
+
+def _branches_touched(obj, attribute):
+    """The branch ids a written row counted toward, before and after."""
+    state = sa_inspect(obj)
+    history = state.attrs[attribute].history
+    ids = set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+    if not ids:
+        # Expired and never reloaded: nothing to say which branch it was.
+        ids = {state.dict.get(attribute, _ALL)}
+    return ids
+
+
+def _collect(session, pending):
+    branch_scoped, branch_model = _watched()
+    touched = pending['branches']
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, branch_scoped):
+            touched |= _branches_touched(obj, 'branch_id')
+        elif isinstance(obj, branch_model):
+            touched |= _branches_touched(obj, 'id')
+
+
+def _apply(pending):
+    mark_dirty(pending['branches'])
+
+
+_tracker = worker_cache.CommitTracker(_PENDING, ('branches',), _collect, _apply)
+
+
+def register_dirty_tracking():
+    _tracker.register()
@@ -1,14 +1,15 @@
 """
 Dashboard service - analytics and reports
 """
-from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, or_, extract
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
 from app.extensions import db
 from app.models.user import User, UserRole
 from app.models.branch import Branch
 from app.models.customer import Customer
 from app.models.subscription import Subscription, SubscriptionStatus
 from app.models.transaction import Transaction, PaymentMethod
+from app.models.daily_revenue_rollup import DailyRevenueRollup
 from app.models.expense import Expense, ExpenseStatus
 from app.models.complaint import Complaint, ComplaintStatus
 from app.models.transaction import net_amount
@@ -31,7 +32,10 @@ class DashboardService:
         branch_ids: optional list restricting every metric to those branches
         (used for regional managers, who see only their branch group).
         """
-        today = date.today()
+        from app.services.business_time import gym_id_for_branch, gym_today
+        from app.services.revenue_rollup import net_revenue
+
+        today = gym_today(gym_id_for_branch(branch_ids[0]) if branch_ids else None)
         thirty_days_ago = today - timedelta(days=30)
         seven_days_ago = today - timedelta(days=7)
 
@@ -56,10 +60,9 @@ class DashboardService:
             ), Expense.branch_id).count()
         }
 
-        # Revenue summary (last 30 days)
-        total_revenue = branch_scoped(db.session.query(func.sum(net_amount())).filter(
-            Transaction.transaction_date >= thirty_days_ago
-        ), Transaction.branch_id).scalar() or 0
+        # Revenue summary (last 30 days), from the daily rollups rather than
+        # the ledger — see app/services/revenue_rollup.
+        total_revenue = net_revenue(start=thirty_days_ago, branch_ids=branch_ids)
 
         # Active subscriptions
         active_subscriptions = branch_scoped(Subscription.query.filter(
@@ -91,7 +94,9 @@ class DashboardService:
             Complaint.created_at >= thirty_days_ago
         ), Complaint.branch_id).group_by(Complaint.complaint_type).all()
 
-        # Staff performance (top 5)
+        # Staff performance (top 5). The one figure here still summed from the
+        # ledger: the rollups carry no "who took it" dimension. It is bounded by
+        # the indexed 30-day window, not by the length of the history.
         staff_revenue = branch_scoped(db.session.query(
             User.id,
             User.full_name,
@@ -129,9 +134,8 @@ class DashboardService:
         accountants). Passing neither means gym-wide (central tier).
         """
         # The gym's day, not the server's — see app/services/business_time.
-        from app.services.business_time import (
-            day_bounds_utc, gym_id_for_branch, gym_today,
-        )
+        from app.services.business_time import gym_id_for_branch, gym_today
+        from app.services.revenue_rollup import rollup_sums
         gym_id = gym_id_for_branch(
             branch_id or (branch_ids[0] if branch_ids else None))
         today = gym_today(gym_id)
@@ -145,48 +149,46 @@ class DashboardService:
                 return query.filter(column.in_(branch_ids))
             return query
 
+        # Every revenue figure below comes from the daily rollups, which are
+        # already dated in the gym's local day — see app/services/revenue_rollup.
+        Rollup = DailyRevenueRollup
+
         # Daily sales (today)
-        start_utc, end_utc = day_bounds_utc(gym_id, today)
-        today_transactions = scoped(Transaction.query.filter(
-            Transaction.transaction_date >= start_utc,
-            Transaction.transaction_date < end_utc,
-        ), Transaction.branch_id)
-        
         today_summary = {
             'cash': 0,
             'network': 0,
             'transfer': 0,
             'total': 0
         }
-        
-        for txn in today_transactions.all():
+
+        today_by_method = scoped(
+            rollup_sums(Rollup.payment_method, start=today, end=today),
+            Rollup.branch_id,
+        ).all()
+        for method, net, _discount, _count in today_by_method:
             # Net of discount, like the monthly figures directly below and like
             # every other revenue number in the system. Summing gross here put
             # the accountant's own dashboard at odds with itself: today read
             # high by the day's discounts while the month beside it did not.
-            amount = float(txn.amount) - float(txn.discount or 0)
+            amount = float(net or 0)
             today_summary['total'] += amount
-            if txn.payment_method == PaymentMethod.CASH:
+            if method == PaymentMethod.CASH:
                 today_summary['cash'] += amount
-            elif txn.payment_method == PaymentMethod.NETWORK:
+            elif method == PaymentMethod.NETWORK:
                 today_summary['network'] += amount
-            elif txn.payment_method == PaymentMethod.TRANSFER:
+            elif method == PaymentMethod.TRANSFER:
                 today_summary['transfer'] += amount
-        
-        # Monthly revenue
-        current_month_revenue = scoped(db.session.query(func.sum(net_amount())).filter(
-            Transaction.transaction_date >= current_month_start
-        ), Transaction.branch_id)
 
-        last_month_revenue = scoped(db.session.query(func.sum(net_amount())).filter(
-            and_(
-                Transaction.transaction_date >= last_month_start,
-                Transaction.transaction_date < current_month_start
-            )
-        ), Transaction.branch_id)
+        # Monthly revenue
+        current_month_total = scoped(
+            rollup_sums(start=current_month_start), Rollup.branch_id
+        ).one()[0] or 0
 
-        current_month_total = current_month_revenue.scalar() or 0
-        last_month_total = last_month_revenue.scalar() or 0
+        last_month_total = scoped(
+            rollup_sums(start=last_month_start,
+                        end=current_month_start - timedelta(days=1)),
+            Rollup.branch_id,
+        ).one()[0] or 0
 
         # Expenses
         expenses_query = scoped(Expense.query.filter(
@@ -225,7 +227,8 @@ class DashboardService:
     @staticmethod
     def get_branch_manager_dashboard(branch_id):
         """Get branch manager dashboard"""
-        today = date.today()
+        from app.services.business_time import gym_id_for_branch, gym_today
+        today = gym_today(gym_id_for_branch(branch_id))
         seven_days_ago = today - timedelta(days=7)
         
         # Branch stats
@@ -273,61 +276,38 @@ class DashboardService:
     
     @staticmethod
     def get_revenue_report(start_date, end_date, branch_id=None, group_by='day'):
-        """Get detailed revenue report"""
-        query = Transaction.query.filter(
-            and_(
-                Transaction.transaction_date >= start_date,
-                Transaction.transaction_date <= end_date
-            )
-        )
-        
-        if branch_id:
-            query = query.filter_by(branch_id=branch_id)
-        
+        """Get detailed revenue report.
+
+        Read from the daily rollups, so the dates are the gym's business days
+        and the cost is one row per day and branch rather than per transaction.
+        """
+        from app.services.report_buckets import as_day, revenue_buckets
+        from app.services.revenue_rollup import rollup_sums
+
+        branch_ids = [branch_id] if branch_id else None
+        Rollup = DailyRevenueRollup
+
         if group_by == 'day':
-            results = db.session.query(
-                func.date(Transaction.transaction_date).label('date'),
-                func.sum(net_amount()).label('total'),
-                func.count(Transaction.id).label('count')
-            ).filter(
-                and_(
-                    Transaction.transaction_date >= start_date,
-                    Transaction.transaction_date <= end_date
-                )
-            )
-            
-            if branch_id:
-                results = results.filter(Transaction.branch_id == branch_id)
-            
-            results = results.group_by(func.date(Transaction.transaction_date)).all()
-            
+            results = rollup_sums(
+                Rollup.business_date, start=start_date, end=end_date,
+                branch_ids=branch_ids,
+            ).order_by(Rollup.business_date).all()
+
             return [{
                 'date': r[0].isoformat(),
                 'total': float(r[1]),
-                'count': r[2]
+                'count': int(r[3])
             } for r in results]
-        
+
         elif group_by == 'month':
-            results = db.session.query(
-                extract('year', Transaction.transaction_date).label('year'),
-                extract('month', Transaction.transaction_date).label('month'),
-                func.sum(net_amount()).label('total')
-            ).filter(
-                and_(
-                    Transaction.transaction_date >= start_date,
-                    Transaction.transaction_date <= end_date
-                )
-            )
-            
-            if branch_id:
-                results = results.filter(Transaction.branch_id == branch_id)
-            
-            results = results.group_by('year', 'month').all()
-            
+            results = revenue_buckets(
+                'monthly', start=start_date, end=end_date, branch_ids=branch_ids,
+            ).all()
+
             return [{
-                'year': int(r[0]),
-                'month': int(r[1]),
-                'total': float(r[2])
+                'year': as_day(r[0]).year,
+                'month': as_day(r[0]).month,
+                'total': float(r[1])
             } for r in results]
-        
+
         return []
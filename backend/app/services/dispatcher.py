@@ -0,0 +1,75 @@
+"""A per-worker background thread that drains one of the delivery queues.
+
+Push notifications (app/services/push_outbox.py) and one-time codes
+(app/services/message_outbox.py) are both written to a table by the request
+and delivered afterwards. Each queue gets one of these threads per worker
+process: asleep until :func:`wake` is called after an enqueue, and waking on
+its own every ``poll`` seconds to pick up retries that have come due. The job
+scheduler (app/services/scheduler.py) uses one too, started without a nudge
+and left to its poll.
+
+Started lazily — from the first request a worker serves, or its first
+enqueue — so the thread is always created after gunicorn forks rather than
+inherited dead from the master. A new thread drains once before it first
+sleeps, so whatever was left due when the last worker stopped goes out at once.
+"""
+import logging
+import os
+import threading
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class DispatcherThread(threading.Thread):
+    def __init__(self, app, name, drain, poll_key):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.drain = drain
+        self.poll_key = poll_key
+        self.pid = os.getpid()
+        self.event = threading.Event()
+
+    def run(self):
+        while True:
+            self.event.clear()
+            with self.app.app_context():
+                try:
+                    self.drain()
+                except Exception:
+                    logger.exception('%s failed', self.name)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            self.event.wait(self.app.config.get(self.poll_key, 30))
+
+
+_start_lock = threading.Lock()
+
+
+def wake(name, drain, mode_key, poll_key, nudge=True):
+    """Nudge this worker's ``name`` thread, starting it if need be.
+
+    Does nothing unless ``app.config[mode_key]`` is ``'thread'``; ``manual``
+    deployments drain the queue from a CLI command instead. ``nudge=False``
+    only makes sure the thread is running, and is cheap enough to call on
+    every request.
+    """
+    from flask import current_app
+
+    if current_app.config.get(mode_key, 'thread') != 'thread':
+        return
+    app = current_app._get_current_object()
+    thread = app.extensions.get(name)
+    if (not nudge and thread is not None and thread.pid == os.getpid()
+            and thread.is_alive()):
+        return
+    with _start_lock:
+        thread = app.extensions.get(name)
+        if thread is None or thread.pid != os.getpid() or not thread.is_alive():
+            thread = DispatcherThread(app, name, drain, poll_key)
+            app.extensions[name] = thread
+            thread.start()
+    if nudge:
+        thread.event.set()
@@ -9,6 +9,11 @@ SETUP:
      a secret that must never be committed — or, for local dev, place the
      key file at FIREBASE_SERVICE_ACCOUNT_PATH (default: 'service_account.json'
      in the backend directory).
+
+The notify_* helpers do not talk to Firebase: they queue a push_outbox row
+and return, and the dispatcher in app/services/push_outbox.py delivers it in
+batches, with retries. send_push_to_token(s) still send directly, for
+diagnostics.
 """
 import os
 import json
@@ -97,7 +102,7 @@ def send_push_to_token(
         return True
     except messaging.UnregisteredError:
         logger.warning(f'Push token unregistered: {fcm_token[:20]}…')
-        _deactivate_token(fcm_token)
+        _deactivate_tokens([fcm_token])
         return False
     except Exception as e:
         logger.error(f'Push send error: {e}')
@@ -131,11 +136,10 @@ def send_push_to_tokens(
     try:
         response = messaging.send_each_for_multicast(message)
         # Deactivate failed tokens
-        for i, send_response in enumerate(response.responses):
-            if send_response.exception and isinstance(
-                send_response.exception, messaging.UnregisteredError
-            ):
-                _deactivate_token(fcm_tokens[i])
+        _deactivate_tokens([
+            fcm_tokens[i] for i, send_response in enumerate(response.responses)
+            if isinstance(send_response.exception, messaging.UnregisteredError)
+        ])
         logger.info(f'Push multicast: {response.success_count} ok, {response.failure_count} failed')
         return response.success_count
     except Exception as e:
@@ -148,25 +152,38 @@ def send_push_to_tokens(
 # ──────────────────────────────────────────────
 
 def notify_user(user_id: int, title: str, body: str, data: Optional[Dict[str, str]] = None) -> int:
-    """Send a push notification to all active devices of a staff/admin user."""
-    from app.models.device_token import DeviceToken
-    tokens = DeviceToken.query.filter_by(user_id=user_id, is_active=True).all()
-    sent = 0
-    for dt in tokens:
-        if send_push_to_token(dt.fcm_token, title, body, data):
-            sent += 1
-    return sent
+    """Queue a push to every active device of a staff/admin user.
+
+    Returns how many recipients it was queued for (0 or 1). Delivery happens
+    after the request, in app/services/push_outbox.py.
+    """
+    return notify_users([user_id], title, body, data)
+
+
+def notify_users(user_ids: List[int], title: str, body: str, data: Optional[Dict[str, str]] = None) -> int:
+    """Queue one push for several staff users at once."""
+    from app.models.push_outbox import PushRecipient
+    from app.services.push_outbox import enqueue
+
+    ids = {i for i in user_ids if i is not None}
+    return len(ids) if enqueue(PushRecipient.USER, ids, title, body, data) else 0
 
 
 def notify_customer(customer_id: int, title: str, body: str, data: Optional[Dict[str, str]] = None) -> int:
-    """Send a push notification to all active devices of a customer/client."""
-    from app.models.device_token import DeviceToken
-    tokens = DeviceToken.query.filter_by(customer_id=customer_id, is_active=True).all()
-    sent = 0
-    for dt in tokens:
-        if send_push_to_token(dt.fcm_token, title, body, data):
-            sent += 1
-    return sent
+    """Queue a push to every active device of a customer/client.
+
+    Returns how many recipients it was queued for (0 or 1).
+    """
+    return notify_customers([customer_id], title, body, data)
+
+
+def notify_customers(customer_ids: List[int], title: str, body: str, data: Optional[Dict[str, str]] = None) -> int:
+    """Queue one push for several members at once — one row, not one per member."""
+    from app.models.push_outbox import PushRecipient
+    from app.services.push_outbox import enqueue
+
+    ids = {i for i in customer_ids if i is not None}
+    return len(ids) if enqueue(PushRecipient.CUSTOMER, ids, title, body, data) else 0
 
 
 def notify_role(
@@ -177,7 +194,7 @@ def notify_role(
     gym_id: Optional[int] = None,
 ) -> int:
     """
-    Send a push notification to users with a given role.
+    Queue a push notification to users with a given role.
 
     role_value: 'owner', 'branch_manager', 'front_desk', 'super_admin', etc.
     gym_id:     restrict delivery to that gym's staff. Callers should always
@@ -208,20 +225,17 @@ def notify_role(
             (User.gym_id == gym_id) | (User.id.in_(owner_ids or [-1]))
         )
 
-    user_ids = [u.id for u in query.all()]
+    # Only those with a device to send to: most staff never install the app,
+    # and a row for nobody is a row the dispatcher has to open for nothing.
+    user_ids = [row[0] for row in query.with_entities(User.id).filter(
+        User.id.in_(db_session().query(DeviceToken.user_id).filter(
+            DeviceToken.is_active == True,  # noqa: E712 (SQL boolean, not Python)
+        ))
+    )]
     if not user_ids:
         return 0
 
-    tokens = DeviceToken.query.filter(
-        DeviceToken.user_id.in_(user_ids),
-        DeviceToken.is_active == True,
-    ).all()
-
-    fcm_list = [dt.fcm_token for dt in tokens]
-    if not fcm_list:
-        return 0
-
-    return send_push_to_tokens(fcm_list, title, body, data)
+    return notify_users(user_ids, title, body, data)
 
 
 def notify_all_customers(
@@ -230,7 +244,7 @@ def notify_all_customers(
     data: Optional[Dict[str, str]] = None,
     gym_id: Optional[int] = None,
 ) -> int:
-    """Send a push notification to registered client devices.
+    """Queue a push notification to registered client devices.
 
     gym_id restricts delivery to members of that gym's branches. It has no
     callers yet; the parameter exists so the first one cannot accidentally
@@ -247,23 +261,21 @@ def notify_all_customers(
         ).filter(Branch.gym_id == gym_id)
         query = query.filter(DeviceToken.customer_id.in_(member_ids))
 
-    tokens = query.all()
-    fcm_list = [dt.fcm_token for dt in tokens]
-    if not fcm_list:
-        return 0
-    return send_push_to_tokens(fcm_list, title, body, data)
+    customer_ids = [row[0] for row in query.with_entities(DeviceToken.customer_id).distinct()]
+    return notify_customers(customer_ids, title, body, data)
 
 
 # ──────────────────────────────────────────────
 #  Internal helper
 # ──────────────────────────────────────────────
 
-def _deactivate_token(fcm_token: str):
-    """Mark a token as inactive in the DB."""
+def _deactivate_tokens(fcm_tokens):
+    """Mark tokens as inactive in the DB: one UPDATE, one commit."""
+    if not fcm_tokens:
+        return
     try:
-        from app.models.device_token import DeviceToken
-        from app.extensions import db
-        DeviceToken.query.filter_by(fcm_token=fcm_token).update({'is_active': False})
-        db.session.commit()
+        from app.services.push_outbox import deactivate_tokens
+        deactivate_tokens(fcm_tokens)
+        db_session().commit()
     except Exception:
-        pass
+        db_session().rollback()
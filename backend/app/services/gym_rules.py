@@ -43,12 +43,23 @@ def default_for(key):
     return RULES[key][0]
 
 
+def rule_value(key, raw):
+    """Interpret a stored setting for ``key``, or its default when unset.
+
+    For callers that fetched the ``gym_settings.value`` themselves — the door
+    admission query joins it in rather than paying a round trip here.
+    """
+    return default_for(key) if raw is None else _as_bool(raw)
+
+
 def gym_rule(gym_id, key):
     """Whether ``key`` is switched on for this gym.
 
     Cached per request: the door-scan path reads a rule on every check-in, and
     several endpoints consult more than one while assembling a response. Same
-    ``flask.g`` approach as ``_gym_branch_ids`` in app/utils/decorators.py.
+    ``flask.g`` approach as the branch scope in app/services/scope_cache.py.
+    Behind that sits the per-process cache in app/services/settings_cache.py,
+    so most requests do not read ``gym_settings`` at all.
 
     Fails to the documented default rather than raising — an unreadable setting
     should never take down a check-in.
@@ -67,17 +78,10 @@ def gym_rule(gym_id, key):
         g._gym_rules_cache = cache
 
     if gym_id not in cache:
-        from app.models.gym_setting import GymSetting
-        try:
-            cache[gym_id] = {
-                row.key: row.value
-                for row in GymSetting.query.filter_by(gym_id=gym_id).all()
-            }
-        except Exception:
-            cache[gym_id] = {}
+        from app.services.settings_cache import settings_for
+        cache[gym_id] = settings_for(gym_id)
 
-    raw = cache[gym_id].get(key)
-    return default if raw is None else _as_bool(raw)
+    return rule_value(key, cache[gym_id].get(key))
 
 
 def all_rules_for(gym_id):
@@ -110,7 +114,10 @@ def set_rules(gym_id, updates):
         row.value = 'true' if bool(value) else 'false'
 
     db.session.commit()
-    # The cache was populated before this write; drop it so the same request
-    # reads back what it just saved.
+    # The caches were populated before this write; drop them so the same
+    # request reads back what it just saved. (The write itself already bumped
+    # the gym's settings_version, which is how the other workers find out.)
+    from app.services.settings_cache import invalidate
+    invalidate(gym_id)
     if hasattr(g, '_gym_rules_cache'):
         g._gym_rules_cache.pop(gym_id, None)
@@ -0,0 +1,70 @@
+"""The periodic housekeeping jobs, as registered with app/services/scheduler.py.
+
+Each one processes a bounded batch per call and commits it; the scheduler
+calls again while batches come back full.
+
+* ``purge-deleted-accounts`` — erase members whose 90-day deletion grace
+  period has elapsed. It used to run from a ``teardown_request`` hook, at most
+  hourly per worker, and so only ever ran on a worker that was serving
+  traffic.
+* ``expire-subscriptions`` — move subscriptions past their end date to
+  EXPIRED and deactivate fingerprints of members left with none. Nothing
+  triggered it before.
+* ``settle-freezes`` — end freezes whose agreed period is over. These used to
+  be ended only when something read the subscription for entry, so reports
+  and the member's app showed them frozen until the member next came in.
+* ``prune-occupancy`` — drop branch occupancy buckets older than a day
+  (app/services/occupancy.py). Only the last hour or so is ever read.
+"""
+from datetime import datetime
+
+from app.services.scheduler import job
+
+
+@job('purge-deleted-accounts', every=3600, batch_size=200)
+def purge_deleted_accounts(batch_size):
+    """Erase members whose deletion grace period has elapsed."""
+    from app.services.retention_service import purge_due_accounts
+    return purge_due_accounts(limit=batch_size)
+
+
+@job('expire-subscriptions', every=900, batch_size=5000)
+def expire_subscriptions(batch_size):
+    """Expire subscriptions past their end date."""
+    from app.utils.helpers import auto_expire_subscriptions
+    result = auto_expire_subscriptions(limit=batch_size)
+    return result['expired'], result
+
+
+@job('settle-freezes', every=900, batch_size=200)
+def settle_freezes(batch_size):
+    """End freezes whose agreed period is over."""
+    from sqlalchemy import func
+
+    from app.extensions import db
+    from app.models.freeze_history import FreezeHistory
+    from app.models.subscription import Subscription, SubscriptionStatus
+
+    # The latest active freeze per subscription is the one that decides, as
+    # in Subscription.settle_expired_freeze; pick only those already over, so
+    # a batch is never filled with rows that will not settle.
+    latest = db.session.query(
+        FreezeHistory.subscription_id,
+        func.max(FreezeHistory.freeze_end).label('freeze_end'),
+    ).filter(FreezeHistory.is_active.is_(True)).group_by(
+        FreezeHistory.subscription_id).subquery()
+    due = Subscription.query.join(
+        latest, latest.c.subscription_id == Subscription.id,
+    ).filter(
+        Subscription.status == SubscriptionStatus.FROZEN,
+        latest.c.freeze_end < datetime.utcnow().date(),
+    ).order_by(Subscription.id).limit(batch_size).all()
+
+    return sum(1 for subscription in due if subscription.settle_expired_freeze())
+
+
+@job('prune-occupancy', every=3600, batch_size=5000)
+def prune_occupancy(batch_size):
+    """Drop branch occupancy buckets older than a day."""
+    from app.services.occupancy import prune
+    return prune(limit=batch_size)
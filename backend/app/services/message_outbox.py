@@ -0,0 +1,238 @@
+"""Queueing one-time codes for SMS/email, and the dispatcher that sends them.
+
+``/api/client/auth/request-code`` and ``/forgot-password`` used to call the
+provider inline, so the member's request lasted as long as an SMTP handshake
+or an SMS API call, and a slow provider tied up a worker for every code. Now
+the route calls :func:`queue_activation_code` in the same transaction that
+creates the code, commits, calls :func:`wake`, and answers with a
+``delivery_id`` the app can poll (``GET /api/client/auth/deliveries/<id>``).
+
+:func:`dispatch_once` does the sending:
+
+* claims due rows the same way the push dispatcher does, so a worker's thread
+  and ``flask dispatch-messages`` never send one twice;
+* skips a row whose code has since been used, replaced or has expired
+  (CANCELLED) — a code the member can no longer use is not worth sending;
+* sends the rest through the configured provider on a small thread pool,
+  never more at once than the provider's ``max_concurrency`` allows;
+* retries a failure after ``MESSAGE_RETRY_BASE_SECONDS`` × 2ⁿ, and
+  dead-letters the row (FAILED) on an error retrying cannot fix or after
+  ``MESSAGE_MAX_ATTEMPTS`` — burning its code, so no live code is left that
+  nobody received.
+
+Settled rows keep their status and error for the app and for support, but not
+their body: the code only sits in this table while it is on its way.
+"""
+import logging
+import secrets
+import smtplib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+#: How long a claim lasts before another dispatcher may take the row over.
+CLAIM_SECONDS = 120
+
+#: Failures that will fail the same way next time: the provider cannot send
+#: by this method at all, or the address was refused outright.
+PERMANENT_ERRORS = (NotImplementedError, ValueError, smtplib.SMTPRecipientsRefused)
+
+
+def _config(key, default):
+    from flask import current_app
+    return current_app.config.get(key, default)
+
+
+# ───────────────────────────── enqueueing ───────────────────────────────────
+
+def queue_activation_code(activation_code, plain_code, customer_name, purpose='login'):
+    """Queue the message carrying ``plain_code``. Adds to the session; the
+    caller commits (with the code itself) and then calls :func:`wake`."""
+    from app.models.message_delivery import MessageDelivery
+    from app.services.notification_service import get_notification_service
+
+    subject, body = get_notification_service().render_activation_code(
+        activation_code.delivery_method, plain_code, customer_name, purpose)
+    row = MessageDelivery(
+        reference=secrets.token_urlsafe(16),
+        customer_id=activation_code.customer_id,
+        activation_code=activation_code,
+        channel=activation_code.delivery_method,
+        target=activation_code.delivery_target,
+        subject=subject,
+        body=body,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(row)
+    return row
+
+
+def queue_stand_in(delivery_method):
+    """Queue a row that is sent nowhere, for an identifier that matched no
+    member. It passes through the dispatcher like a real one, so its
+    ``delivery_id`` polls the same way. Adds to the session; caller commits."""
+    from app.models.message_delivery import MessageDelivery
+
+    row = MessageDelivery(
+        reference=secrets.token_urlsafe(16),
+        channel=delivery_method,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(row)
+    return row
+
+
+def wake():
+    """Nudge this worker's message dispatcher thread (app/services/dispatcher.py)."""
+    from app.services.dispatcher import wake as wake_thread
+    wake_thread('message_dispatcher', dispatch_pending,
+                'MESSAGE_DISPATCHER', 'MESSAGE_POLL_SECONDS')
+
+
+def ensure_started():
+    """Start this worker's message dispatcher thread if it is not running."""
+    from app.services.dispatcher import wake as wake_thread
+    wake_thread('message_dispatcher', dispatch_pending,
+                'MESSAGE_DISPATCHER', 'MESSAGE_POLL_SECONDS', nudge=False)
+
+
+def register_message_dispatcher(app):
+    """Start the dispatcher thread from the first request a worker serves, so
+    codes queued or due for a retry when a worker restarted are sent without
+    waiting for the next member to ask for one."""
+    @app.before_request
+    def _start_message_dispatcher():
+        ensure_started()
+
+
+def get_delivery(reference):
+    """The delivery with this reference, or None."""
+    from app.models.message_delivery import MessageDelivery
+    return MessageDelivery.query.filter_by(reference=reference).first()
+
+
+# ───────────────────────────── dispatching ──────────────────────────────────
+
+def _claim(limit):
+    from app.models.message_delivery import DeliveryStatus, MessageDelivery
+
+    now = datetime.utcnow()
+    due = (
+        MessageDelivery.status == DeliveryStatus.QUEUED,
+        MessageDelivery.next_attempt_at <= now,
+        db.or_(MessageDelivery.claimed_until.is_(None), MessageDelivery.claimed_until < now),
+    )
+    ids = [row[0] for row in db.session.query(MessageDelivery.id).filter(*due)
+           .order_by(MessageDelivery.next_attempt_at, MessageDelivery.id).limit(limit)]
+    if not ids:
+        db.session.rollback()
+        return []
+    claim = uuid.uuid4().hex
+    # The same conditions again: rows another dispatcher claimed since the
+    # SELECT no longer match, and are left to it.
+    MessageDelivery.query.filter(MessageDelivery.id.in_(ids), *due).update(
+        {'claimed_by': claim, 'claimed_until': now + timedelta(seconds=CLAIM_SECONDS)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return (MessageDelivery.query.filter(MessageDelivery.claimed_by == claim)
+            .order_by(MessageDelivery.id).all())
+
+
+def _send(service, row):
+    """One send, off the request and off the session. Returns None or the error."""
+    try:
+        service.deliver(row['channel'], row['target'], row['subject'], row['body'])
+        return None
+    except Exception as e:
+        return e
+
+
+def _backoff(attempts):
+    return _config('MESSAGE_RETRY_BASE_SECONDS', 5) * (2 ** max(attempts - 1, 0))
+
+
+def dispatch_once(limit=None):
+    """Send one batch of due messages. Returns how many rows it handled."""
+    from app.models.activation_code import ActivationCode
+    from app.models.message_delivery import DeliveryStatus
+    from app.services.notification_service import get_notification_service
+
+    rows = _claim(limit or _config('MESSAGE_BATCH_SIZE', 50))
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    code_ids = {row.activation_code_id for row in rows if row.activation_code_id}
+    live_codes = {code.id for code in ActivationCode.query.filter(
+        ActivationCode.id.in_(code_ids),
+        ActivationCode.is_used == False,  # noqa: E712 (SQL boolean, not Python)
+        ActivationCode.expires_at > now,
+    )} if code_ids else set()
+
+    to_send = []
+    for row in rows:
+        if row.target is None:
+            _settle(row, DeliveryStatus.SENT, now)
+        elif row.activation_code_id and row.activation_code_id not in live_codes:
+            _settle(row, DeliveryStatus.CANCELLED, now)
+        else:
+            to_send.append(row)
+
+    if to_send:
+        service = get_notification_service()
+        # Plain values for the pool threads, which must not touch the session.
+        work = [{'channel': r.channel, 'target': r.target,
+                 'subject': r.subject, 'body': r.body} for r in to_send]
+        workers = min(len(work), service.max_concurrency())
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='message-send') as pool:
+            outcomes = list(pool.map(lambda item: _send(service, item), work))
+
+        now = datetime.utcnow()
+        max_attempts = _config('MESSAGE_MAX_ATTEMPTS', 5)
+        burn = []
+        for row, error in zip(to_send, outcomes):
+            row.attempts += 1
+            row.claimed_by = row.claimed_until = None
+            if error is None:
+                _settle(row, DeliveryStatus.SENT, now)
+                continue
+            row.last_error = (f'{type(error).__name__}: {error}')[:500]
+            logger.warning('Message delivery %s failed (attempt %s): %s',
+                           row.id, row.attempts, row.last_error)
+            if isinstance(error, PERMANENT_ERRORS) or row.attempts >= max_attempts:
+                _settle(row, DeliveryStatus.FAILED, now)
+                if row.activation_code_id:
+                    burn.append(row.activation_code_id)
+            else:
+                row.next_attempt_at = now + timedelta(seconds=_backoff(row.attempts))
+        if burn:
+            ActivationCode.query.filter(ActivationCode.id.in_(burn)).update(
+                {'is_used': True}, synchronize_session=False)
+
+    db.session.commit()
+    return len(rows)
+
+
+def _settle(row, status, now):
+    """Final status; the body, and the code in it, are no longer needed."""
+    row.status = status
+    row.settled_at = now
+    row.body = None
+    row.claimed_by = row.claimed_until = None
+
+
+def dispatch_pending(max_batches=100):
+    """Keep dispatching until nothing is due (or ``max_batches``). Returns rows."""
+    total = 0
+    for _ in range(max_batches):
+        handled = dispatch_once()
+        if not handled:
+            break
+        total += handled
+    return total
@@ -0,0 +1,215 @@
+"""Message thread summaries, kept alongside the messages.
+
+The thread lists — a captain's roster of conversations, a member's captains —
+used to be worked out from ``messages`` on every open: an OR of every
+(trainer, member) pair, every message in all of those threads loaded
+oldest-first to keep the last one, and a grouped count for the unread badges.
+A busy captain's list read their entire message history each time.
+
+``message_threads`` holds one row per pair with the latest message and each
+side's unread count, indexed by each side and recency, so a list is one
+indexed read and pages by keyset. Keeping it correct:
+
+* **On send.** A mapper listener on ``Message`` upserts the pair's row in the
+  same flush as the message: newest message, one more unread for the side
+  that did not write it.
+* **On read.** :func:`mark_read` marks the messages read and takes that many
+  off the reader's count in the same commit.
+* **On erasure.** Deleting a member's messages deletes their threads
+  (``retention_service.anonymise``); a message deleted through the ORM has its
+  thread recomputed.
+* **From scratch.** ``flask rebuild-message-threads`` recomputes every row,
+  which is also the backfill for conversations that predate the table.
+"""
+from datetime import datetime
+
+from sqlalchemy import case, event, func, select
+
+from app.extensions import db
+from app.utils.upsert import upsert
+
+
+def _unread(sender, read_at):
+    """(trainer_unread, member_unread) one message adds."""
+    from app.models.message import MessageSender
+
+    if read_at is not None:
+        return 0, 0
+    return (1, 0) if sender == MessageSender.MEMBER else (0, 1)
+
+
+# ───────────────────────────── maintenance ──────────────────────────────────
+
+def _on_insert(mapper, connection, target):
+    from app.models.message_thread import MessageThread
+
+    table = MessageThread.__table__
+    trainer_unread, member_unread = _unread(target.sender, target.read_at)
+    values = {
+        'trainer_id': target.trainer_id,
+        'customer_id': target.customer_id,
+        'last_message_id': target.id,
+        'last_message_at': target.created_at,
+        'trainer_unread': trainer_unread,
+        'member_unread': member_unread,
+        'created_at': datetime.utcnow(),
+    }
+
+    def on_conflict(new):
+        # last_message_id before last_message_at: MySQL applies these in order
+        # and would otherwise compare against the time it has just written.
+        newer = new.last_message_at >= table.c.last_message_at
+        return {
+            'last_message_id': case((newer, new.last_message_id),
+                                    else_=table.c.last_message_id),
+            'last_message_at': case((newer, new.last_message_at),
+                                    else_=table.c.last_message_at),
+            'trainer_unread': table.c.trainer_unread + new.trainer_unread,
+            'member_unread': table.c.member_unread + new.member_unread,
+        }
+
+    upsert(connection, table, values, ['trainer_id', 'customer_id'], on_conflict)
+
+
+def _summaries(rows):
+    """Thread rows for ``rows`` of (trainer, customer, id, created_at, sender,
+    read_at), ordered by pair, then created_at, then id."""
+    threads = {}
+    for trainer_id, customer_id, message_id, created_at, sender, read_at in rows:
+        thread = threads.setdefault((trainer_id, customer_id), {
+            'trainer_id': trainer_id, 'customer_id': customer_id,
+            'trainer_unread': 0, 'member_unread': 0,
+            'created_at': created_at,
+        })
+        thread['last_message_id'] = message_id
+        thread['last_message_at'] = created_at
+        trainer_unread, member_unread = _unread(sender, read_at)
+        thread['trainer_unread'] += trainer_unread
+        thread['member_unread'] += member_unread
+    return list(threads.values())
+
+
+def _message_rows(*conditions):
+    from app.models.message import Message
+    return select(
+        Message.trainer_id, Message.customer_id, Message.id, Message.created_at,
+        Message.sender, Message.read_at,
+    ).where(*conditions).order_by(
+        Message.trainer_id, Message.customer_id, Message.created_at, Message.id)
+
+
+def recompute(connection, trainer_id, customer_id):
+    """Rebuild one pair's row from its messages, or drop it if none are left."""
+    from app.models.message import Message
+    from app.models.message_thread import MessageThread
+
+    table = MessageThread.__table__
+    connection.execute(table.delete().where(
+        table.c.trainer_id == trainer_id, table.c.customer_id == customer_id))
+    rows = _summaries(connection.execute(_message_rows(
+        Message.trainer_id == trainer_id, Message.customer_id == customer_id)))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _on_delete(mapper, connection, target):
+    recompute(connection, target.trainer_id, target.customer_id)
+
+
+def register_thread_maintenance():
+    from app.models.message import Message
+
+    for event_name, listener in (
+        ('after_insert', _on_insert),
+        ('after_delete', _on_delete),
+    ):
+        if not event.contains(Message, event_name, listener):
+            event.listen(Message, event_name, listener)
+
+
+def mark_read(trainer_id, customer_id, reader):
+    """Mark the other party's messages in a thread read, as ``reader`` opens it.
+
+    Returns how many messages that was. Commits only if there were any.
+    """
+    from app.models.message import Message, MessageSender
+    from app.models.message_thread import MessageThread
+
+    from_other = (MessageSender.MEMBER if reader == MessageSender.TRAINER
+                  else MessageSender.TRAINER)
+    updated = Message.query.filter(
+        Message.trainer_id == trainer_id,
+        Message.customer_id == customer_id,
+        Message.sender == from_other,
+        Message.read_at.is_(None),
+    ).update({'read_at': datetime.utcnow()}, synchronize_session=False)
+    if updated:
+        # Less what was just marked, not zero: a message sent between the two
+        # UPDATEs is counted here but was not in the read set, and zeroing
+        # would lose it until a rebuild. Floored, for a count already off.
+        column = (MessageThread.trainer_unread if reader == MessageSender.TRAINER
+                  else MessageThread.member_unread)
+        MessageThread.query.filter_by(
+            trainer_id=trainer_id, customer_id=customer_id,
+        ).update({column: case((column > updated, column - updated), else_=0)},
+                 synchronize_session=False)
+        db.session.commit()
+    return updated
+
+
+def rebuild(batch_size=5000):
+    """Recompute every thread from ``messages``. Returns the rows written.
+
+    Streams the messages in thread order. One transaction; readers see the old
+    rows until it commits.
+    """
+    from app.models.message_thread import MessageThread
+
+    table = MessageThread.__table__
+    db.session.execute(table.delete())
+    rows = _summaries(db.session.execute(
+        _message_rows().execution_options(yield_per=batch_size)))
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
+
+
+# ──────────────────────────────── reading ───────────────────────────────────
+
+def _side(trainer_id, customer_id, partners):
+    """Filters for one side's threads, narrowed to ``partners`` if given."""
+    from app.models.message_thread import MessageThread as T
+
+    if trainer_id is not None:
+        conditions = [T.trainer_id == trainer_id]
+        if partners is not None:
+            conditions.append(T.customer_id.in_(list(partners)))
+    else:
+        conditions = [T.customer_id == customer_id]
+        if partners is not None:
+            conditions.append(T.trainer_id.in_(list(partners)))
+    return conditions
+
+
+def threads_query(trainer_id=None, customer_id=None, partners=None):
+    """One side's threads, with their last message loaded alongside.
+
+    Pass ``trainer_id`` for a captain's list or ``customer_id`` for a
+    member's. ``partners`` narrows it to the other side's ids — the captain's
+    current roster, the member's current captains.
+    """
+    from sqlalchemy.orm import joinedload
+    from app.models.message_thread import MessageThread as T
+
+    return T.query.options(joinedload(T.last_message)).filter(
+        *_side(trainer_id, customer_id, partners))
+
+
+def total_unread(trainer_id=None, customer_id=None, partners=None):
+    """The reader's unread messages across the same threads, in one sum."""
+    from app.models.message_thread import MessageThread as T
+
+    column = T.trainer_unread if trainer_id is not None else T.member_unread
+    return db.session.query(func.coalesce(func.sum(column), 0)).filter(
+        *_side(trainer_id, customer_id, partners)).scalar()
@@ -0,0 +1,218 @@
+"""Prometheus metrics for the API, aggregated across gunicorn workers.
+
+Sentry samples a tenth of requests for traces, and ``/health`` says only that
+a worker answers. Neither says which endpoint is slow at which hour, or which
+branch's peak pushes the two workers into queueing. ``GET /metrics`` does, in
+the Prometheus text format:
+
+* ``gym_request_duration_seconds`` — latency histogram per blueprint and
+  endpoint (Flask's endpoint name, so ``/api/client/qr`` is ``client.get_client_qr``);
+* ``gym_requests_total`` — requests per blueprint, endpoint, method and
+  status;
+* ``gym_db_pool_checked_out`` / ``gym_db_pool_overflow`` — connections in use
+  and borrowed past the pool size, summed over live workers;
+* ``gym_cache_lookups_total`` — hits and misses of the per-worker caches
+  (owner dashboard, branch scope, principal); the hit ratio is
+  ``rate(...{result="hit"}) / rate(...)`` by ``cache``;
+* ``gym_door_scans_total`` — committed door decisions per branch, approved or
+  denied, from whichever route wrote the entry log.
+
+**Across workers.** Each gunicorn worker is its own process with its own
+counters. With ``PROMETHEUS_MULTIPROC_DIR`` set (the Dockerfile sets it), the
+client library keeps them in memory-mapped files in that directory and the
+scrape sums every worker's, whichever worker answers it; backend/gunicorn.conf.py
+empties the directory at boot and retires a dead worker's gauges. Without it
+(development, tests) the counters are this process's.
+
+``prometheus_client`` is optional at import time, like firebase-admin: without
+it every recording call is a no-op and ``/metrics`` answers 503.
+``METRICS_TOKEN``, when set, is required as a bearer token on ``/metrics``;
+``ProductionConfig.validate`` will not boot production without one unless
+``METRICS_ENABLED=0``.
+"""
+import hmac
+import logging
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+#: Labels for a request that matched no route, and for the app's own routes.
+UNMATCHED = 'unmatched'
+APP = 'app'
+
+#: Session.info key the flush collects door decisions under until commit.
+_PENDING = 'metrics_door_scans'
+
+_metrics = None
+
+
+def _registry_metrics():
+    """The metric objects, created on first use. None without prometheus_client."""
+    global _metrics
+    if _metrics is not None:
+        return _metrics or None
+
+    try:
+        from prometheus_client import Counter, Gauge, Histogram
+    except ImportError:
+        logger.warning('prometheus_client package not installed — metrics disabled')
+        _metrics = {}
+        return None
+
+    _metrics = {
+        'duration': Histogram(
+            'gym_request_duration_seconds', 'Time spent answering a request.',
+            ['blueprint', 'endpoint']),
+        'requests': Counter(
+            'gym_requests_total', 'Requests answered.',
+            ['blueprint', 'endpoint', 'method', 'status']),
+        # livesum: every live worker's connections, added up; a dead worker's
+        # are dropped rather than frozen at their last value.
+        'pool_checked_out': Gauge(
+            'gym_db_pool_checked_out', 'Database connections in use.',
+            multiprocess_mode='livesum'),
+        'pool_overflow': Gauge(
+            'gym_db_pool_overflow', 'Connections open beyond the pool size.',
+            multiprocess_mode='livesum'),
+        'cache_lookups': Counter(
+            'gym_cache_lookups_total', 'Per-worker cache lookups.',
+            ['cache', 'result']),
+        'door_scans': Counter(
+            'gym_door_scans_total', 'Committed door decisions.',
+            ['branch_id', 'result']),
+    }
+    return _metrics
+
+
+# ───────────────────────────── recording ────────────────────────────────────
+
+def cache_lookup(cache, hit):
+    """Count one lookup in one of the per-worker caches."""
+    metrics = _registry_metrics()
+    if metrics:
+        metrics['cache_lookups'].labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def door_scan(branch_id, result):
+    """Count one door decision at ``branch_id``: 'approved' or 'denied'."""
+    metrics = _registry_metrics()
+    if metrics:
+        metrics['door_scans'].labels(str(branch_id), result).inc()
+
+
+def _record_request(blueprint, endpoint, method, status, seconds):
+    metrics = _registry_metrics()
+    if metrics:
+        metrics['duration'].labels(blueprint, endpoint).observe(seconds)
+        metrics['requests'].labels(blueprint, endpoint, method, str(status)).inc()
+
+
+def _on_entry_insert(mapper, connection, target):
+    from sqlalchemy.orm import object_session
+
+    if target.entry_status is None or target.branch_id is None:
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING, []).append(
+            (target.branch_id, target.entry_status.value))
+
+
+def _count_committed(session):
+    for branch_id, result in session.info.pop(_PENDING, ()):
+        door_scan(branch_id, result)
+
+
+def _discard(session):
+    session.info.pop(_PENDING, None)
+
+
+def _watch_pool(pool):
+    """Keep the pool gauges at this worker's current figures."""
+    if not hasattr(pool, 'checkedout'):
+        return  # Not a QueuePool (SQLite in memory, NullPool): nothing to report.
+
+    def _update(*args):
+        metrics = _registry_metrics()
+        if metrics:
+            metrics['pool_checked_out'].set(pool.checkedout())
+            metrics['pool_overflow'].set(max(pool.overflow(), 0))
+
+    for event_name in ('checkout', 'checkin'):
+        event.listen(pool, event_name, _update)
+
+
+# ───────────────────────────── exposition ───────────────────────────────────
+
+def render():
+    """The metrics as Prometheus text: (body, content type), or None."""
+    if _registry_metrics() is None:
+        return None
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def register_metrics(app):
+    """Time and count every request, and serve ``GET /metrics``."""
+    from flask import Response, g, request
+    from app.extensions import db
+
+    for target, event_name, listener in (
+        (Session, 'after_commit', _count_committed),
+        (Session, 'after_rollback', _discard),
+    ):
+        if not event.contains(target, event_name, listener):
+            event.listen(target, event_name, listener)
+
+    from app.models.entry_log import EntryLog
+    if not event.contains(EntryLog, 'after_insert', _on_entry_insert):
+        event.listen(EntryLog, 'after_insert', _on_entry_insert)
+
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    with app.app_context():
+        _watch_pool(db.engine.pool)
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        if request.endpoint is None:
+            blueprint = endpoint = UNMATCHED
+        else:
+            # Routes on the app itself (/health, /metrics) have no blueprint.
+            blueprint, endpoint = request.blueprint or APP, request.endpoint
+        _record_request(blueprint, endpoint, request.method, response.status_code,
+                        time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f'Bearer {token}'):
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        rendered = render()
+        if rendered is None:
+            return Response('Metrics are not available: prometheus_client is not installed\n',
+                            status=503, mimetype='text/plain')
+        body, content_type = rendered
+        return Response(body, content_type=content_type)
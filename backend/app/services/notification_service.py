@@ -17,10 +17,20 @@ Both are fixed here. The console provider now refuses to run outside
 development, providers are built from environment variables at startup, and
 :meth:`NotificationService.can_deliver` lets a caller find out whether delivery
 is actually possible *before* it promises a member anything.
+
+Sending no longer happens in the request either: the routes queue a rendered
+message (app/services/message_outbox.py) and the dispatcher calls
+:meth:`NotificationService.deliver`. Each provider says how many sends it may
+have in flight at once (``max_concurrency``), and the SMTP provider keeps its
+connections open between sends instead of paying for TCP, TLS and login on
+every code.
 """
 import os
 import smtplib
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 from email.message import EmailMessage
 from typing import Optional
 
@@ -32,6 +42,25 @@ class NotificationProvider(ABC):
     #: development console, which only prints.
     delivers = True
 
+    #: How many sends through this provider may be in flight at once, across
+    #: every dispatcher in the process. A mail server that allows a handful of
+    #: connections per account, or an SMS API with a rate limit, is better
+    #: served by a queue than by a burst of parallel attempts it will refuse.
+    max_concurrency = 4
+
+    _slots_lock = threading.Lock()
+
+    def slot(self):
+        """A semaphore held for the duration of one send."""
+        slots = self.__dict__.get('_slots')
+        if slots is None:
+            with NotificationProvider._slots_lock:
+                slots = self.__dict__.get('_slots')
+                if slots is None:
+                    slots = threading.BoundedSemaphore(max(1, self.max_concurrency))
+                    self._slots = slots
+        return slots
+
     @abstractmethod
     def send_sms(self, phone: str, message: str) -> bool:
         """Send SMS message.
@@ -59,6 +88,7 @@ class ConsoleNotificationProvider(NotificationProvider):
     """
 
     delivers = False
+    max_concurrency = 1  # keeps the printed blocks from interleaving
 
     def send_sms(self, phone: str, message: str) -> bool:
         print(f"\n{'='*60}")
@@ -84,10 +114,17 @@ class SMTPNotificationProvider(NotificationProvider):
     Implemented rather than stubbed because it is the delivery channel that
     costs nothing to turn on — any mailbox provider's SMTP credentials will do.
     Configured from the environment; see :func:`provider_from_env`.
+
+    Connections are reused: a send takes an idle logged-in connection if there
+    is one younger than ``idle_seconds``, and gives it back afterwards. At most
+    ``max_connections`` sends run at once, so at most that many connections
+    are ever open. One the server has since dropped is replaced and the send
+    tried once more on the new one.
     """
 
     def __init__(self, host: str, port: int, username: str, password: str,
-                 from_address: str, use_tls: bool = True, timeout: int = 10):
+                 from_address: str, use_tls: bool = True, timeout: int = 10,
+                 max_connections: int = 2, idle_seconds: int = 60):
         self.host = host
         self.port = port
         self.username = username
@@ -95,6 +132,10 @@ class SMTPNotificationProvider(NotificationProvider):
         self.from_address = from_address
         self.use_tls = use_tls
         self.timeout = timeout
+        self.max_concurrency = max_connections
+        self.idle_seconds = idle_seconds
+        self._idle = []  # [(smtp, last_used)]
+        self._idle_lock = threading.Lock()
 
     def supports(self, delivery_method: str) -> bool:
         return delivery_method == 'email'
@@ -109,13 +150,76 @@ class SMTPNotificationProvider(NotificationProvider):
         message['To'] = email
         message.set_content(body)
 
-        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+        smtp, reused = self._checkout()
+        try:
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                if not reused:
+                    raise
+                # The server closed an idle connection; that says nothing
+                # about this message.
+                self._close(smtp)
+                smtp = self._connect()
+                smtp.send_message(message)
+        except BaseException:
+            self._close(smtp)
+            raise
+        self._checkin(smtp)
+        return True
+
+    def close_connections(self):
+        """Close every idle connection (at shutdown, or after a config change)."""
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            self._close(smtp)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
             if self.use_tls:
                 smtp.starttls()
             if self.username:
                 smtp.login(self.username, self.password)
-            smtp.send_message(message)
-        return True
+        except BaseException:
+            self._close(smtp)
+            raise
+        return smtp
+
+    def _checkout(self):
+        now = time.monotonic()
+        stale = []
+        found = None
+        with self._idle_lock:
+            while self._idle:
+                smtp, last_used = self._idle.pop()
+                if now - last_used < self.idle_seconds:
+                    found = smtp
+                    break
+                stale.append(smtp)
+        for smtp in stale:
+            self._close(smtp)
+        if found is not None:
+            return found, True
+        return self._connect(), False
+
+    def _checkin(self, smtp):
+        with self._idle_lock:
+            if len(self._idle) < max(1, self.max_concurrency):
+                self._idle.append((smtp, time.monotonic()))
+                return
+        self._close(smtp)
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
 
 
 class TwilioNotificationProvider(NotificationProvider):
@@ -175,15 +279,39 @@ class NotificationService:
         they asked to reset a password has no way to tell a real message from a
         phishing attempt.
         """
+        subject, body = self.render_activation_code(
+            delivery_method, code, customer_name, purpose)
+        return self.deliver(delivery_method, target, subject, body)
+
+    def render_activation_code(self, delivery_method: str, code: str,
+                               customer_name: str, purpose: str = 'login') -> tuple:
+        """The ``(subject, body)`` of a code message; subject is None for SMS.
+
+        Rendered when the code is queued, so the dispatcher needs nothing but
+        the row to send it.
+        """
         if delivery_method == 'sms':
-            message = self._format_sms_message(code, customer_name, purpose)
-            return self.provider.send_sms(target, message)
+            return None, self._format_sms_message(code, customer_name, purpose)
         elif delivery_method == 'email':
-            subject, body = self._format_email_message(code, customer_name, purpose)
-            return self.provider.send_email(target, subject, body)
+            return self._format_email_message(code, customer_name, purpose)
         else:
             raise ValueError(f"Unknown delivery method: {delivery_method}")
 
+    def deliver(self, delivery_method: str, target: str,
+                subject: Optional[str], body: str) -> bool:
+        """Send an already-rendered message, within the provider's concurrency
+        limit. Raises on failure, like the providers themselves."""
+        provider = self.provider
+        # Providers are duck-typed; one that is not a NotificationProvider
+        # gets no limit of its own.
+        slot = getattr(provider, 'slot', None)
+        with slot() if slot else nullcontext():
+            if delivery_method == 'sms':
+                return provider.send_sms(target, body)
+            elif delivery_method == 'email':
+                return provider.send_email(target, subject, body)
+        raise ValueError(f"Unknown delivery method: {delivery_method}")
+
     def _format_sms_message(self, code: str, customer_name: str,
                             purpose: str = 'login') -> str:
         what = ('password reset code' if purpose == 'password_reset'
@@ -223,15 +351,22 @@ For your security, please do not share it with anyone.
 """
         return subject, body.strip()
 
+    def max_concurrency(self) -> int:
+        """How many sends the dispatcher should run at once."""
+        return max(1, getattr(self.provider, 'max_concurrency', 1))
+
     def set_provider(self, provider: NotificationProvider):
-        self.provider = provider
+        previous, self.provider = self.provider, provider
+        if previous is not provider and hasattr(previous, 'close_connections'):
+            previous.close_connections()
 
 
 def provider_from_env():
     """Build a provider from environment variables, or None if unconfigured.
 
     Email needs ``SMTP_HOST``, ``SMTP_USERNAME``, ``SMTP_PASSWORD`` and
-    ``SMTP_FROM`` (``SMTP_PORT`` defaults to 587). Returning None leaves the
+    ``SMTP_FROM`` (``SMTP_PORT`` defaults to 587; ``SMTP_MAX_CONNECTIONS``,
+    default 2, caps the connections kept open to it). Returning None leaves the
     console provider in place, which reports that it cannot deliver — so an
     unconfigured deployment says "contact your gym" instead of pretending.
     """
@@ -245,6 +380,7 @@ def provider_from_env():
             password=os.environ.get('SMTP_PASSWORD', ''),
             from_address=from_address,
             use_tls=os.environ.get('SMTP_USE_TLS', 'true').lower() != 'false',
+            max_connections=int(os.environ.get('SMTP_MAX_CONNECTIONS', 2)),
         )
     return None
 
@@ -0,0 +1,309 @@
+"""How busy a branch is right now, without counting the entry logs per poll.
+
+``/api/client/branch-activity`` answers "is it busy?" for the member app, and
+the app asks on every open of the home screen. It used to be a ``COUNT(*)``
+over the trailing hour of ``entry_logs`` for the branch — cheap once, but at
+the peak hour hundreds of members ask within the same minute, and each one was
+a range scan over the busiest rows in the table.
+
+Two layers replace it:
+
+* **Minute buckets in the database** (``branch_occupancy_buckets``). A mapper
+  listener on ``EntryLog`` adds each approved check-in to its branch's minute
+  in the same flush as the entry, so every worker reads the same figures and a
+  restarted worker has nothing to rebuild: the buckets are the fallback it
+  reconciles from. Edits and deletions take the entry back out. The
+  prune-occupancy job drops buckets older than ``RETENTION_HOURS``.
+* **A sliding window per worker.** The last ``OCCUPANCY_CACHE_SECONDS`` of
+  reads for a branch are answered from the buckets this worker last loaded —
+  a sum over at most an hour of minutes, whatever the traffic. Check-ins
+  committed through this worker are added to its window as they commit, so a
+  member who has just come in sees themselves counted; other workers' arrive
+  with the next reload.
+
+Besides the trailing-hour count, :func:`branch_activity` estimates how many
+members are inside: those who came in within the last
+``OCCUPANCY_VISIT_MINUTES``, a typical visit's length. There is no exit scan
+to do better with. 0 leaves the estimate out.
+
+``flask rebuild-occupancy`` recounts the buckets from ``entry_logs``, for
+check-ins written below the ORM or history that predates the table.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect as sa_inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db
+from app.utils.upsert import upsert
+
+#: The member app's figure: check-ins in the trailing hour.
+WINDOW_MINUTES = 60
+
+#: How long buckets are kept. The window only needs the last hour or two;
+#: the rest is there for a reconciliation that wants to look back.
+RETENTION_HOURS = 24
+
+#: How long the app may reuse an answer before asking again. The level moves
+#: over minutes, not seconds.
+CLIENT_MAX_AGE_SECONDS = 60
+
+#: The entry attributes a bucket is derived from.
+_TRACKED = ('branch_id', 'entry_time', 'entry_status')
+
+#: Session.info key the flush collects check-ins under until commit.
+_PENDING = 'occupancy_pending'
+
+_clock = time.monotonic
+
+
+def _minute(when):
+    return when.replace(second=0, microsecond=0)
+
+
+def _config(key, default):
+    from flask import current_app
+    return current_app.config.get(key, default)
+
+
+def _span_minutes():
+    return max(WINDOW_MINUTES, _config('OCCUPANCY_VISIT_MINUTES', 0) or 0)
+
+
+# ───────────────────────────── the buckets ──────────────────────────────────
+
+def _bump(connection, branch_id, minute, delta):
+    """Add ``delta`` check-ins to one bucket, creating it if need be."""
+    from app.models.branch_occupancy import BranchOccupancyBucket
+
+    table = BranchOccupancyBucket.__table__
+    match = (table.c.branch_id == branch_id) & (table.c.minute == minute)
+    if delta < 0:
+        # Taking one back: never create a bucket for it, and drop one that
+        # reaches nothing, so an empty minute reads the same however it came
+        # about.
+        connection.execute(table.update().where(match).values(
+            entries=table.c.entries + delta))
+        connection.execute(table.delete().where(match, table.c.entries <= 0))
+        return
+
+    upsert(connection, table, {'branch_id': branch_id, 'minute': minute, 'entries': delta},
+           ['branch_id', 'minute'],
+           lambda new: {'entries': table.c.entries + new.entries})
+
+
+def _counts(fields):
+    """The (branch_id, minute) an entry counts toward, or None if it does not."""
+    from app.models.entry_log import EntryStatus
+
+    if (fields['entry_status'] != EntryStatus.APPROVED or fields['branch_id'] is None
+            or fields['entry_time'] is None):
+        return None
+    minute = _minute(fields['entry_time'])
+    if minute < _minute(datetime.utcnow()) - timedelta(hours=RETENTION_HOURS):
+        return None  # Older than anything kept; nothing to add to or take from.
+    return fields['branch_id'], minute
+
+
+def _apply(connection, target, fields, delta):
+    key = _counts(fields)
+    if key is None:
+        return
+    _bump(connection, key[0], key[1], delta)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING, []).append((key[0], key[1], delta))
+
+
+def _current(target):
+    return {name: getattr(target, name) for name in _TRACKED}
+
+
+def _stored(connection, entry_id):
+    """The tracked fields as the database holds them, before this flush.
+
+    Read from the row rather than from attribute history, for the reason given
+    in app/services/revenue_rollup.py: after a commit, an edit records no
+    previous value.
+    """
+    from app.models.entry_log import EntryLog
+
+    row = connection.execute(
+        select(*(getattr(EntryLog, name) for name in _TRACKED))
+        .where(EntryLog.id == entry_id)
+    ).first()
+    return dict(zip(_TRACKED, row)) if row is not None else None
+
+
+def _on_insert(mapper, connection, target):
+    _apply(connection, target, _current(target), 1)
+
+
+def _before_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _TRACKED):
+        return
+    stored = _stored(connection, target.id)
+    if stored is not None:
+        _apply(connection, target, stored, -1)
+    _apply(connection, target, _current(target), 1)
+
+
+def _before_delete(mapper, connection, target):
+    stored = _stored(connection, target.id)
+    if stored is not None:
+        _apply(connection, target, stored, -1)
+
+
+# ───────────────────────────── each worker's window ─────────────────────────
+
+class _Windows:
+    def __init__(self):
+        self.branches = {}  # branch_id -> (loaded_at, {minute: entries})
+        self.lock = threading.Lock()
+
+
+def _windows():
+    from flask import current_app
+
+    windows = current_app.extensions.get('branch_occupancy')
+    if windows is None:
+        windows = current_app.extensions.setdefault('branch_occupancy', _Windows())
+    return windows
+
+
+def _load(branch_id, now):
+    from app.models.branch_occupancy import BranchOccupancyBucket as B
+
+    since = _minute(now) - timedelta(minutes=_span_minutes())
+    return dict(db.session.execute(
+        select(B.minute, B.entries).where(B.branch_id == branch_id, B.minute > since)
+    ).all())
+
+
+def _commit_pending(session):
+    """Add this worker's committed check-ins to the windows it holds."""
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        windows = _windows()
+    except RuntimeError:
+        return  # No app context: no windows here to feed.
+    with windows.lock:
+        for branch_id, minute, delta in pending:
+            held = windows.branches.get(branch_id)
+            if held is not None:
+                held[1][minute] = held[1].get(minute, 0) + delta
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def reset():
+    """Forget every window in this worker (tests, mostly)."""
+    try:
+        windows = _windows()
+    except RuntimeError:
+        return
+    with windows.lock:
+        windows.branches.clear()
+
+
+def branch_activity(branch_id, now=None):
+    """Check-ins over the trailing hour, and an estimate of who is inside.
+
+    ``estimated_inside`` is None when ``OCCUPANCY_VISIT_MINUTES`` is 0.
+    """
+    now = now or datetime.utcnow()
+    ttl = _config('OCCUPANCY_CACHE_SECONDS', 0)
+    windows = _windows()
+
+    with windows.lock:
+        held = windows.branches.get(branch_id)
+    if held is None or not ttl or _clock() - held[0] >= ttl:
+        held = (_clock(), _load(branch_id, now))
+        if ttl:
+            with windows.lock:
+                windows.branches[branch_id] = held
+
+    def within(minutes):
+        since = _minute(now) - timedelta(minutes=minutes)
+        return sum(count for minute, count in list(held[1].items()) if minute > since)
+
+    visit_minutes = _config('OCCUPANCY_VISIT_MINUTES', 0) or 0
+    return {
+        'entries_last_hour': within(WINDOW_MINUTES),
+        'estimated_inside': within(visit_minutes) if visit_minutes else None,
+        'visit_minutes': visit_minutes or None,
+    }
+
+
+# ───────────────────────────── upkeep ───────────────────────────────────────
+
+def prune(limit=5000, now=None):
+    """Drop about ``limit`` of the buckets older than ``RETENTION_HOURS``.
+
+    Returns how many went. Oldest first, cut at a whole minute, so a call can
+    run a few rows over ``limit`` rather than split a minute across branches.
+    """
+    from app.models.branch_occupancy import BranchOccupancyBucket as B
+
+    cutoff = _minute(now or datetime.utcnow()) - timedelta(hours=RETENTION_HOURS)
+    expired = B.query.filter(B.minute < cutoff)
+    last = db.session.query(B.minute).filter(B.minute < cutoff).order_by(
+        B.minute).offset(limit - 1).limit(1).scalar()
+    if last is not None:
+        expired = B.query.filter(B.minute <= last)
+    removed = expired.delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def rebuild(now=None):
+    """Recount the buckets for the retention period from ``entry_logs``.
+
+    Returns the number of buckets written. One transaction: readers see the
+    old counts until it commits.
+    """
+    from app.models.branch_occupancy import BranchOccupancyBucket
+    from app.models.entry_log import EntryLog, EntryStatus
+
+    since = _minute(now or datetime.utcnow()) - timedelta(hours=RETENTION_HOURS)
+    counts = {}
+    for branch_id, when in db.session.execute(
+        select(EntryLog.branch_id, EntryLog.entry_time).where(
+            EntryLog.entry_status == EntryStatus.APPROVED,
+            EntryLog.entry_time >= since,
+        )
+    ):
+        key = (branch_id, _minute(when))
+        counts[key] = counts.get(key, 0) + 1
+
+    table = BranchOccupancyBucket.__table__
+    db.session.execute(table.delete())
+    if counts:
+        db.session.execute(table.insert(), [
+            {'branch_id': branch_id, 'minute': minute, 'entries': entries}
+            for (branch_id, minute), entries in counts.items()
+        ])
+    db.session.commit()
+    reset()
+    return len(counts)
+
+
+def register_occupancy_maintenance():
+    from app.models.entry_log import EntryLog
+
+    for target, event_name, listener in (
+        (EntryLog, 'after_insert', _on_insert),
+        (EntryLog, 'before_update', _before_update),
+        (EntryLog, 'before_delete', _before_delete),
+        (Session, 'after_commit', _commit_pending),
+        (Session, 'after_rollback', _discard_pending),
+    ):
+        if not event.contains(target, event_name, listener):
+            event.listen(target, event_name, listener)
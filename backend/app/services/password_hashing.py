@@ -0,0 +1,129 @@
+"""Password hashing off the request thread, at a cost each deployment chooses.
+
+``pbkdf2_sha256`` is meant to be slow — tens of milliseconds of pure CPU per
+hash or verify — and it ran inline in the request. At shift change the whole
+front desk logs in at once, members open the app as they arrive, and every
+other request in that worker queued behind the key derivations.
+
+Two things change:
+
+* **A bounded process pool.** Hashes and verifies run in
+  ``PASSWORD_HASH_WORKERS`` child processes per worker, with at most
+  ``PASSWORD_HASH_MAX_PENDING`` waiting. The request thread waits on the
+  result without holding the CPU or the GIL, so the worker's other threads
+  keep serving (the Dockerfile runs gunicorn with threads for this), and a
+  login storm can never take more than the pool's share of the machine.
+  0 workers hashes inline, as before — the test suite, and any process with no
+  app context (the seed and repair scripts), do that.
+* **Rounds per deployment.** ``PASSWORD_HASH_ROUNDS`` sets the cost of new
+  hashes. A stored hash made at any other cost still verifies, and is
+  re-derived at the configured cost on the account's next successful login
+  (``User.check_password`` / ``Customer.check_password``), so raising or
+  lowering the cost needs no migration and no password resets.
+
+The pool is created lazily in each process that uses it (never before
+gunicorn forks) with the ``spawn`` start method, which does not copy the
+parent's threads, locks or database connections into the children.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.hash import pbkdf2_sha256
+
+#: passlib's own default, used when there is no app config to ask.
+DEFAULT_ROUNDS = pbkdf2_sha256.default_rounds
+
+_state = {'pool': None, 'pid': None, 'workers': 0, 'slots': None}
+_lock = threading.Lock()
+
+
+def _hash(rounds, password):
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+
+def _verify(rounds, password, stored_hash):
+    """(matches, needs_rehash) — the second only meaningful when it matches."""
+    if not pbkdf2_sha256.verify(password, stored_hash):
+        return False, False
+    return True, pbkdf2_sha256.using(rounds=rounds).needs_update(stored_hash)
+
+
+def _settings():
+    """(rounds, workers, max_pending) from the app config, or inline at the
+    default cost outside an app context."""
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return DEFAULT_ROUNDS, 0, 0
+    config = current_app.config
+    return (
+        config.get('PASSWORD_HASH_ROUNDS') or DEFAULT_ROUNDS,
+        config.get('PASSWORD_HASH_WORKERS', 0),
+        config.get('PASSWORD_HASH_MAX_PENDING', 0),
+    )
+
+
+def _executor(workers, max_pending):
+    with _lock:
+        if (_state['pool'] is None or _state['pid'] != os.getpid()
+                or _state['workers'] != workers):
+            if _state['pool'] is not None and _state['pid'] == os.getpid():
+                _state['pool'].shutdown(wait=False, cancel_futures=True)
+            _state['pool'] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _state['pid'] = os.getpid()
+            _state['workers'] = workers
+            _state['slots'] = threading.BoundedSemaphore(workers + max(max_pending, 0))
+        return _state['pool'], _state['slots']
+
+
+def _run(fn, *args):
+    rounds, workers, max_pending = _settings()
+    if workers <= 0:
+        return fn(rounds, *args)
+    pool, slots = _executor(workers, max_pending)
+    # Waiting here is the back-pressure: beyond the pool's queue, further
+    # logins wait their turn instead of piling up work the pool cannot reach.
+    with slots:
+        try:
+            return pool.submit(fn, rounds, *args).result()
+        except BrokenProcessPool:
+            # A child was killed (OOM, a deploy). Start a fresh pool next time
+            # and do this one inline rather than fail the login.
+            with _lock:
+                if _state['pool'] is pool:
+                    _state['pool'] = None
+            return fn(rounds, *args)
+
+
+def hash_password(password):
+    """A new ``pbkdf2_sha256`` hash at the configured cost."""
+    return _run(_hash, password)
+
+
+def verify_password(password, stored_hash):
+    """``(matches, needs_rehash)`` for a password against a stored hash.
+
+    ``needs_rehash`` is True when the password matched but the hash was made at
+    a cost other than the configured one; the caller should then store
+    :func:`hash_password` of it. A missing or malformed hash never matches.
+    """
+    if not stored_hash or password is None:
+        return False, False
+    try:
+        return _run(_verify, password, stored_hash)
+    except ValueError:
+        return False, False
+
+
+def shutdown():
+    """Stop this process's pool, if it has one (tests, mostly)."""
+    with _lock:
+        pool, _state['pool'] = _state['pool'], None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,219 @@
+"""The signed-in account, resolved once per request.
+
+Every authenticated request used to read its account two or three times:
+``register_active_account_guard`` selected ``is_active`` and
+``sessions_valid_from``; ``role_required`` (or ``get_current_user()``, or
+``branch_access_required``) then loaded the same ``User`` with
+``db.session.get``, and that load pulled ``managed_branches`` along with it,
+being selectin-eager. Two or three round trips to say who is calling.
+
+Two layers take that down to zero or one:
+
+* **The principal.** Whoever loads the ``User`` first in a request — the guard
+  on a cold cache, otherwise the first decorator or ``get_current_user()`` —
+  leaves it on ``flask.g``, and everyone after reuses it. It is loaded without
+  ``managed_branches``; regional roles fetch their group when it is read, and
+  the branch-scope cache (app/services/scope_cache.py) means that is rarely.
+* **The revocation cache.** Each worker remembers an account's ``is_active``
+  and ``sessions_valid_from`` for ``PRINCIPAL_CACHE_SECONDS``, so the guard can
+  answer from memory. A committed change to either — logout and password
+  changes through :func:`app.services.session_service.revoke_sessions`,
+  deactivation by hand or through ``cascade_service`` — drops the entry in
+  this worker at commit, so the next request there sees it. Other workers see
+  it when their entry expires: the interval is the bound on how long a revoked
+  token can keep working elsewhere, which is why it is seconds, not minutes.
+  0 turns the layer off and the guard reads the row every time (one query,
+  shared with the principal).
+
+**The trade-off.** With the layer on, logout is immediate in the worker that
+handled it and takes up to ``PRINCIPAL_CACHE_SECONDS`` in the others
+(tests/test_principal.py holds both). Making it immediate everywhere would
+need every request to ask something shared whether anything was revoked — a
+query per request, which is what this layer exists to save — so the bound is
+kept short instead. A deployment that cannot accept even that sets it to 0.
+"""
+import time
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import lazyload
+
+from app.services import worker_cache
+
+#: Accounts remembered per worker; least recently used go first.
+MAX_ENTRIES = 8192
+
+#: Where this request's principal lives on ``flask.g`` (cleared per request by
+#: register_request_cache_reset).
+REQUEST_ATTR = '_principal'
+
+#: Session.info key the flush collects revocations under until commit.
+_PENDING = 'principal_revocations'
+
+USER = 'user'
+CUSTOMER = 'customer'
+
+_clock = time.monotonic
+
+
+def _cache():
+    return worker_cache.for_app('principal_cache', MAX_ENTRIES, metric='principal')
+
+
+def _ttl():
+    return worker_cache.seconds('PRINCIPAL_CACHE_SECONDS')
+
+
+# ───────────────────────────── the principal ────────────────────────────────
+
+def _remember(user):
+    from flask import g
+    setattr(g, REQUEST_ATTR, user)
+    return user
+
+
+def _load_user(user_id, refresh=False):
+    """The ``User`` row, without its selectin-eager branch group.
+
+    ``refresh`` re-reads an instance the session already holds rather than
+    trusting it — the guard needs the stored flags, not whatever an app
+    context left over from an earlier request remembers.
+    """
+    from app.extensions import db
+    from app.models.user import User
+
+    query = db.session.query(User).options(lazyload(User.managed_branches))
+    if refresh:
+        query = query.populate_existing()
+    return query.filter(User.id == user_id).first()
+
+
+def current_user(user_id):
+    """This request's ``User`` for ``user_id``, loading it on first use."""
+    from flask import g
+
+    user = getattr(g, REQUEST_ATTR, None)
+    if user is not None and sa_inspect(user).identity == (user_id,):
+        return user
+    from app.extensions import db
+    from app.models.user import User
+
+    user = db.session.get(User, user_id, options=[lazyload(User.managed_branches)])
+    return _remember(user) if user is not None else None
+
+
+# ───────────────────────────── revocation cache ─────────────────────────────
+
+def _cached(key):
+    ttl = _ttl()
+    if not ttl:
+        return None
+    status = _cache().get(key, ttl, _clock())
+    return None if status is worker_cache.MISSING else status
+
+
+def _store(key, status):
+    if not _ttl():
+        return status
+    return _cache().put(key, status, _clock())
+
+
+def user_status(user_id):
+    """``(is_active, sessions_valid_from)`` for a staff account, or None if
+    there is no such user.
+
+    From this worker's cache when fresh; otherwise one SELECT of the whole row,
+    which then serves as the request's principal too.
+    """
+    status = _cached((USER, user_id))
+    if status is not None:
+        return status
+    user = _load_user(user_id, refresh=True)
+    if user is None:
+        return None
+    _remember(user)
+    return _store((USER, user_id), (user.is_active, user.sessions_valid_from))
+
+
+def customer_status(customer_id):
+    """``(is_active, sessions_valid_from)`` for a member, or None."""
+    status = _cached((CUSTOMER, customer_id))
+    if status is not None:
+        return status
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    # Scalars, not the ORM object: a session that already holds this member
+    # would answer db.session.get() from its identity map, flags and all.
+    row = db.session.query(
+        Customer.is_active, Customer.sessions_valid_from
+    ).filter(Customer.id == customer_id).first()
+    if row is None:
+        return None
+    return _store((CUSTOMER, customer_id), tuple(row))
+
+
+def invalidate(user_ids=(), customer_ids=(), everything=False):
+    """Forget these accounts' cached flags in this worker. With no arguments
+    (or ``everything``), forget them all."""
+    everything = everything or (not user_ids and not customer_ids)
+    if everything:
+        _cache().drop()
+    else:
+        _cache().discard({(USER, i) for i in user_ids} | {(CUSTOMER, i) for i in customer_ids})
+
+
+def invalidate_on_commit(session, user_ids=(), customer_ids=(), everything=False):
+    """Have :func:`invalidate` run when ``session`` commits — for writes the
+    flush cannot see, such as bulk UPDATEs, and for callers that want to be
+    explicit. Nothing happens if it rolls back."""
+    pending = _tracker.pending(session)
+    pending[USER] |= set(user_ids)
+    pending[CUSTOMER] |= set(customer_ids)
+    pending['all'] = pending['all'] or everything
+
+
+def stats():
+    """Hit/miss counters for this worker, for monitoring."""
+    return _cache().stats(_ttl())
+
+
+def reset():
+    """Forget every account and zero the counters (tests, mostly)."""
+    _cache().clear()
+
+
+# ───────────────────────────── invalidation ─────────────────────────────────
+#
+# Collected at flush, applied at commit (app/services/worker_cache.py).
+# Applying any earlier would let a request in this worker re-cache the old
+# flags between the write and its commit, and keep them for a whole interval.
+
+_FIELDS = ('is_active', 'sessions_valid_from')
+
+
+def _collect(session, pending):
+    from app.models.customer import Customer
+    from app.models.user import User
+
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            kind = USER
+        elif isinstance(obj, Customer):
+            kind = CUSTOMER
+        else:
+            continue
+        state = sa_inspect(obj)
+        if obj in session.deleted or any(state.attrs[f].history.has_changes() for f in _FIELDS):
+            pending[kind].add(state.identity[0])
+
+
+def _apply(pending):
+    invalidate(user_ids=pending[USER], customer_ids=pending[CUSTOMER],
+               everything=pending['all'])
+
+
+_tracker = worker_cache.CommitTracker(_PENDING, (USER, CUSTOMER), _collect, _apply)
+
+
+def register_revocation_tracking():
+    _tracker.register()
@@ -0,0 +1,363 @@
+"""Queueing push notifications, and the dispatcher that delivers them.
+
+``notify_user``, ``notify_customer`` and ``notify_role`` (app/services/
+fcm_service.py) used to call Firebase once per device, in series, inside the
+request that triggered them, and ``_deactivate_token`` committed once per dead
+token on the way. Now they call :func:`enqueue`, which writes one
+``push_outbox`` row, and the request is done.
+
+:func:`dispatch_once` does the delivering:
+
+* claims a batch of due rows (``claimed_by``/``claimed_until``, so two
+  dispatchers — two workers, or a worker and ``flask dispatch-push`` — never
+  send the same row);
+* resolves each row's recipients to their active device tokens, merges rows
+  carrying the same message, and sends ``send_each_for_multicast`` batches of
+  up to ``PUSH_BATCH_SIZE`` (FCM's limit is 500) tokens;
+* deactivates every token FCM reports as gone in a single UPDATE;
+* keeps the tokens that failed for a retryable reason on the row and tries
+  again after ``PUSH_RETRY_BASE_SECONDS`` × 2ⁿ, giving up after
+  ``PUSH_MAX_ATTEMPTS``.
+
+What calls it is ``PUSH_DISPATCHER``: ``thread`` (the default) runs a daemon
+thread per worker, started by the first request the worker serves — so rows
+left pending across a deploy or restart go out without waiting for a new
+enqueue — woken after each enqueue and every ``PUSH_POLL_SECONDS`` for
+retries; ``manual`` leaves it to ``flask dispatch-push`` or a caller. The
+transport is pluggable: :class:`FirebaseTransport` in production, and
+:class:`FakeTransport` — which records what it was asked to send and fails on
+request — everywhere nothing should reach Firebase (``PUSH_TRANSPORT=fake``).
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+#: FCM's own cap on tokens per multicast.
+FCM_MULTICAST_LIMIT = 500
+
+#: How long a claim lasts before another dispatcher may take the row over.
+CLAIM_SECONDS = 120
+
+#: Longest wait between retries, however many attempts there have been.
+MAX_BACKOFF_SECONDS = 6 * 3600
+
+#: A per-token outcome meaning "this device is gone; stop sending to it".
+DEAD = 'dead'
+
+
+def _config(key, default):
+    from flask import current_app
+    return current_app.config.get(key, default)
+
+
+# ───────────────────────────── transports ───────────────────────────────────
+#
+# A transport sends one message to a list of tokens and returns, in the same
+# order, None for a delivery, DEAD for a token that no longer exists, or an
+# error string for anything worth retrying. Raising means the whole call
+# failed and every token is retried.
+
+class FirebaseTransport:
+    """``firebase_admin.messaging.send_each_for_multicast``."""
+
+    def send(self, tokens, title, body, data):
+        from app.services.fcm_service import _init_firebase
+
+        if not _init_firebase():
+            raise RuntimeError('Firebase is not configured')
+
+        from firebase_admin import messaging
+
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(title=title, body=body),
+            data=data or {},
+            android=messaging.AndroidConfig(
+                priority='high',
+                notification=messaging.AndroidNotification(
+                    channel_id='default_channel',
+                    sound='default',
+                ),
+            ),
+            tokens=list(tokens),
+        )
+        response = messaging.send_each_for_multicast(message)
+        gone = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+        outcomes = []
+        for result in response.responses:
+            if result.success:
+                outcomes.append(None)
+            elif isinstance(result.exception, gone):
+                outcomes.append(DEAD)
+            else:
+                outcomes.append(str(result.exception)[:200] or 'send failed')
+        return outcomes
+
+
+class FakeTransport:
+    """Delivers nothing; remembers every call. For tests and local runs.
+
+    ``dead`` tokens are reported gone, ``flaky`` ones fail (retryably) that many
+    more times, and ``fail_next`` makes the next N calls raise outright.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.dead = set()
+        self.flaky = {}
+        self.fail_next = 0
+        self.lock = threading.Lock()
+
+    def send(self, tokens, title, body, data):
+        with self.lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                raise RuntimeError('fake transport outage')
+            self.sent.append({'tokens': list(tokens), 'title': title,
+                              'body': body, 'data': dict(data or {})})
+            outcomes = []
+            for token in tokens:
+                if token in self.dead:
+                    outcomes.append(DEAD)
+                elif self.flaky.get(token):
+                    self.flaky[token] -= 1
+                    outcomes.append('unavailable')
+                else:
+                    outcomes.append(None)
+            return outcomes
+
+    def delivered_to(self, token):
+        """How many messages reached ``token``."""
+        return sum(1 for call in self.sent for t in call['tokens'] if t == token)
+
+
+_TRANSPORTS = {'firebase': FirebaseTransport, 'fake': FakeTransport}
+
+
+def get_transport():
+    """This app's transport, built from ``PUSH_TRANSPORT`` on first use."""
+    from flask import current_app
+
+    transport = current_app.extensions.get('push_transport')
+    if transport is None:
+        kind = current_app.config.get('PUSH_TRANSPORT', 'firebase')
+        transport = current_app.extensions.setdefault('push_transport', _TRANSPORTS[kind]())
+    return transport
+
+
+# ───────────────────────────── enqueueing ───────────────────────────────────
+
+def enqueue(recipient_type, recipient_ids, title, body, data=None):
+    """Queue one push for these users or customers, and commit it.
+
+    Call it after committing whatever the push is about — it commits. Returns
+    the row's id, or None when there was nobody to send to. FCM data values
+    must be strings, so they are made strings here.
+    """
+    from app.models.push_outbox import PushOutbox
+
+    ids = sorted({int(i) for i in recipient_ids if i is not None})
+    if not ids:
+        return None
+    row = PushOutbox(
+        recipient_type=recipient_type,
+        recipient_ids=ids,
+        title=title,
+        body=body,
+        data={str(k): str(v) for k, v in (data or {}).items()},
+        next_attempt_at=datetime.utcnow(),
+    )
+    try:
+        db.session.add(row)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    wake()
+    return row.id
+
+
+def deactivate_tokens(tokens):
+    """Mark these FCM tokens inactive, in one UPDATE. Does not commit."""
+    from app.models.device_token import DeviceToken
+
+    tokens = sorted(set(tokens))
+    if not tokens:
+        return 0
+    return DeviceToken.query.filter(
+        DeviceToken.fcm_token.in_(tokens),
+        DeviceToken.is_active == True,  # noqa: E712 (SQL boolean, not Python)
+    ).update({'is_active': False}, synchronize_session=False)
+
+
+# ───────────────────────────── dispatching ──────────────────────────────────
+
+def _claim(limit):
+    from app.models.push_outbox import PushOutbox, PushStatus
+
+    now = datetime.utcnow()
+    due = (
+        PushOutbox.status == PushStatus.PENDING,
+        PushOutbox.next_attempt_at <= now,
+        db.or_(PushOutbox.claimed_until.is_(None), PushOutbox.claimed_until < now),
+    )
+    ids = [row[0] for row in db.session.query(PushOutbox.id).filter(*due)
+           .order_by(PushOutbox.next_attempt_at, PushOutbox.id).limit(limit)]
+    if not ids:
+        db.session.rollback()
+        return []
+    claim = uuid.uuid4().hex
+    # The same conditions again: a row another dispatcher claimed since the
+    # SELECT no longer matches, and is left to it.
+    PushOutbox.query.filter(PushOutbox.id.in_(ids), *due).update(
+        {'claimed_by': claim, 'claimed_until': now + timedelta(seconds=CLAIM_SECONDS)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return PushOutbox.query.filter(PushOutbox.claimed_by == claim).order_by(PushOutbox.id).all()
+
+
+def _resolve_tokens(rows):
+    """Fill in ``tokens`` for rows on their first attempt, one query per kind."""
+    from app.models.device_token import DeviceToken
+    from app.models.push_outbox import PushRecipient
+
+    columns = {PushRecipient.USER: DeviceToken.user_id,
+               PushRecipient.CUSTOMER: DeviceToken.customer_id}
+    fresh = [row for row in rows if row.tokens is None]
+    for kind, column in columns.items():
+        wanted = {i for row in fresh if row.recipient_type == kind for i in row.recipient_ids}
+        if not wanted:
+            continue
+        by_owner = {}
+        for owner_id, token in db.session.query(column, DeviceToken.fcm_token).filter(
+            column.in_(sorted(wanted)),
+            DeviceToken.is_active == True,  # noqa: E712
+        ).order_by(DeviceToken.id):
+            by_owner.setdefault(owner_id, []).append(token)
+        for row in fresh:
+            if row.recipient_type == kind:
+                tokens = []
+                for i in row.recipient_ids:
+                    tokens.extend(t for t in by_owner.get(i, ()) if t not in tokens)
+                row.tokens = tokens
+
+
+def _message_key(row):
+    return (row.title, row.body, json.dumps(row.data or {}, sort_keys=True))
+
+
+def _backoff(attempts):
+    base = _config('PUSH_RETRY_BASE_SECONDS', 30)
+    return min(base * (2 ** max(attempts - 1, 0)), MAX_BACKOFF_SECONDS)
+
+
+def dispatch_once(limit=None):
+    """Deliver one batch of due pushes. Returns how many rows it handled."""
+    from app.models.push_outbox import PushStatus
+
+    batch_size = min(_config('PUSH_BATCH_SIZE', FCM_MULTICAST_LIMIT), FCM_MULTICAST_LIMIT)
+    rows = _claim(limit or batch_size)
+    if not rows:
+        return 0
+
+    _resolve_tokens(rows)
+    transport = get_transport()
+    delivered = {row.id: 0 for row in rows}
+    retry = {row.id: [] for row in rows}
+    errors = {}
+    dead = set()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(_message_key(row), []).append(row)
+
+    for group in groups.values():
+        # Every (row, token) pair to send this message to, chunked to FCM's cap.
+        pairs = [(row, token) for row in group for token in row.tokens]
+        first = group[0]
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            try:
+                outcomes = transport.send([t for _, t in chunk], first.title,
+                                          first.body, first.data)
+            except Exception as e:
+                logger.warning('Push batch failed: %s', e)
+                outcomes = [str(e)[:200] or 'send failed'] * len(chunk)
+            for (row, token), outcome in zip(chunk, outcomes):
+                if outcome is None:
+                    delivered[row.id] += 1
+                elif outcome == DEAD:
+                    dead.add(token)
+                else:
+                    retry[row.id].append(token)
+                    errors[row.id] = outcome
+
+    now = datetime.utcnow()
+    max_attempts = _config('PUSH_MAX_ATTEMPTS', 6)
+    for row in rows:
+        row.attempts += 1
+        row.sent_count += delivered[row.id]
+        row.tokens = retry[row.id]
+        row.claimed_by = row.claimed_until = None
+        if not row.tokens:
+            row.status = PushStatus.SENT
+            row.sent_at = now
+            row.last_error = None
+        elif row.attempts >= max_attempts:
+            row.status = PushStatus.FAILED
+            row.last_error = errors[row.id]
+        else:
+            row.next_attempt_at = now + timedelta(seconds=_backoff(row.attempts))
+            row.last_error = errors[row.id]
+    deactivate_tokens(dead)
+    db.session.commit()
+
+    logger.info('Push dispatch: %s row(s), %s delivered, %s retrying, %s dead token(s)',
+                len(rows), sum(delivered.values()),
+                sum(1 for r in rows if r.status == PushStatus.PENDING), len(dead))
+    return len(rows)
+
+
+def dispatch_pending(max_batches=100):
+    """Keep dispatching until nothing is due (or ``max_batches``). Returns rows."""
+    total = 0
+    for _ in range(max_batches):
+        handled = dispatch_once()
+        if not handled:
+            break
+        total += handled
+    return total
+
+
+# ───────────────────────────── the background thread ────────────────────────
+
+def wake():
+    """Nudge this worker's push dispatcher thread (app/services/dispatcher.py)."""
+    from app.services.dispatcher import wake as wake_thread
+    wake_thread('push_dispatcher', dispatch_pending, 'PUSH_DISPATCHER', 'PUSH_POLL_SECONDS')
+
+
+def ensure_started():
+    """Start this worker's push dispatcher thread if it is not running."""
+    from app.services.dispatcher import wake as wake_thread
+    wake_thread('push_dispatcher', dispatch_pending, 'PUSH_DISPATCHER', 'PUSH_POLL_SECONDS',
+                nudge=False)
+
+
+def register_push_dispatcher(app):
+    """Start the dispatcher thread from the first request a worker serves.
+
+    Waiting for the first enqueue left whatever was pending at a restart, and
+    every retry coming due, undelivered until someone happened to trigger a
+    new push. Started from a request, as the job scheduler is, so the thread
+    is created in the worker after gunicorn forks.
+    """
+    @app.before_request
+    def _start_push_dispatcher():
+        ensure_started()
@@ -10,7 +10,11 @@ from app.models import Subscription, SubscriptionStatus, Customer
 
 class QRService:
     """Service for QR code generation and validation"""
-    
+
+    #: Counters whose running out ends the subscription. Coins and sessions are
+    #: topped up on the same subscription, so reaching zero there is not an end.
+    EXPIRING_COUNTERS = ('remaining_visits', 'remaining_classes')
+
     @staticmethod
     def generate_qr_token(customer_id: int, subscription_id: int = None, 
                          expiry_minutes: int = 5) -> str:
@@ -84,89 +88,72 @@ class QRService:
         Returns:
             tuple: (is_valid: bool, reason: str, subscription: Subscription, coins_to_deduct: int)
         """
-        from app.models import Customer, Subscription
+        # One query for the customer, their gym's entry rule and every
+        # candidate subscription with its service — see admission_service.
+        from app.services.admission_service import admit
+        return admit(customer_id, subscription_id, branch_id)
+
+    @staticmethod
+    def meter(subscription: Subscription, counter: str, amount: int = 1):
+        """Atomically take ``amount`` off one of the subscription's counters.
+
+        A single conditional UPDATE — ``SET counter = counter - :n WHERE id = :id
+        AND counter >= :n`` — instead of reading the counter into Python and
+        writing back the difference. Two turnstiles scanning the same member at
+        once both read 1 visit left and both wrote 0: two entries, one visit
+        paid for. Here the database decides, so the second scan simply matches
+        no row.
+
+        Counters in :data:`EXPIRING_COUNTERS` also flip the subscription to
+        EXPIRED in the same statement when they reach zero, so the status can
+        never disagree with the count.
+
+        Returns the counter's new value, or None when there was not enough left
+        (or the counter is NULL, i.e. untracked). The in-memory subscription is
+        brought up to date without being marked dirty, so a later flush cannot
+        write a stale value back over the one the database computed.
+        """
+        from sqlalchemy import case, literal, select, update
+        from sqlalchemy.orm.attributes import set_committed_value
         from app.extensions import db
-        
-        # Get customer
-        customer = db.session.get(Customer, customer_id)
-        if not customer:
-            return False, "Customer not found", None, 0
-        
-        if not customer.is_active:
-            return False, "Customer account is inactive", None, 0
-        
-        from app.services.gym_rules import gym_rule
-        allow_non_entry = gym_rule(
-            customer.branch.gym_id if customer.branch else None,
-            'pt_only_members_may_enter',
+
+        column = getattr(Subscription, counter)
+        values = {counter: column - amount}
+        if counter in QRService.EXPIRING_COUNTERS:
+            values['status'] = case(
+                (column == amount,
+                 literal(SubscriptionStatus.EXPIRED, Subscription.status.type)),
+                else_=Subscription.status,
+            )
+
+        statement = (
+            update(Subscription)
+            .where(Subscription.id == subscription.id, column >= amount)
+            .values(**values)
+            .execution_options(synchronize_session=False)
         )
 
-        # If no subscription_id provided, find active subscription
-        if subscription_id:
-            subscription = db.session.get(Subscription, subscription_id)
-            # Belongs-to check: without it, a request naming someone else's
-            # subscription id would admit this customer and spend the other
-            # member's visits.
-            if subscription and subscription.customer_id != customer_id:
-                return False, "Subscription does not belong to this customer", None, 0
-            # Grants-entry check: the caller supplied this id (a QR token carries
-            # it), so the entry rule has to be re-applied here rather than
-            # trusted from whoever minted it. Without this, a token naming the
-            # member's own private-training package would open the door and
-            # meter sessions their captain never delivered.
-            if (
-                subscription is not None
-                and not allow_non_entry
-                and subscription.service is not None
-                and not subscription.service.grants_gym_entry
-            ):
-                return False, "This subscription does not grant gym entry", subscription, 0
+        if db.engine.dialect.update_returning:
+            row = db.session.execute(
+                statement.returning(column, Subscription.status)).first()
         else:
-            # The one that grants entry: a member holding gym *and* private
-            # training has more than one, and only the gym package should be
-            # metered by a scan at the door.
-            subscription = Subscription.entry_subscription_for(
-                customer_id,
-                allow_non_entry=allow_non_entry,
-            )
+            # MySQL has no UPDATE ... RETURNING. The row is still locked by this
+            # transaction after the UPDATE, so reading it back is just as safe.
+            if db.session.execute(statement).rowcount != 1:
+                row = None
+            else:
+                row = db.session.execute(
+                    select(column, Subscription.status)
+                    .where(Subscription.id == subscription.id)
+                ).first()
 
-        if not subscription:
-            return False, "No active subscription found", None, 0
-        
-        # Check subscription status (includes frozen, stopped, expired)
-        if subscription.status != SubscriptionStatus.ACTIVE:
-            return False, f"Subscription is {subscription.status.value}", subscription, 0
-        
-        # Check if subscription is expired by date
-        if subscription.end_date and subscription.end_date < datetime.utcnow().date():
-            return False, "Subscription expired", subscription, 0
-        
-        # Check branch access (if branch_id provided)
-        if branch_id and subscription.branch_id != branch_id:
-            return False, "Subscription not valid for this branch", subscription, 0
-        
-        # Check remaining visits/coins.
-        #
-        # A NULL counter means the subscription does not meter that thing —
-        # a time-based membership has unlimited visits, and a coin package is
-        # metered through remaining_coins instead. Comparing NULL with <= 0
-        # raises TypeError, which surfaced as a 500 at the front desk rather
-        # than a denial, so the None case has to be handled before the compare.
-        coins_to_deduct = 0
-        if subscription.service.has_visits and subscription.remaining_visits is not None:
-            if subscription.remaining_visits <= 0:
-                return False, "No remaining visits on subscription", subscription, 0
-            coins_to_deduct = 1
+        if row is None:
+            return None
 
-        # Check class-based limits
-        if subscription.service.has_classes and subscription.remaining_classes is not None:
-            if subscription.remaining_classes <= 0:
-                return False, "No remaining classes on subscription", subscription, 0
-            coins_to_deduct = 1
+        set_committed_value(subscription, counter, row[0])
+        set_committed_value(subscription, 'status', row[1])
+        return row[0]
 
-        # All checks passed
-        return True, "Entry approved", subscription, coins_to_deduct
-    
     @staticmethod
     def deduct_entry(subscription: Subscription, coins: int = 1):
         """
@@ -175,24 +162,25 @@ class QRService:
         Args:
             subscription: Subscription object
             coins: Number of visits/classes to deduct
+
+        Returns:
+            tuple: (deducted: bool, reason: str or None). False only when a
+            concurrent scan took the last visit/class after this one was
+            validated — the caller should refuse entry with ``reason``.
         """
         # NULL counters are untracked, not zero — see validate_entry. Decrementing
         # one would raise, and setting it to a number would silently start
         # metering a membership that was sold as unlimited.
         if subscription.service.has_visits and subscription.remaining_visits is not None:
-            subscription.remaining_visits = max(0, subscription.remaining_visits - coins)
-
-            # Auto-expire if no visits left
-            if subscription.remaining_visits == 0:
-                subscription.status = SubscriptionStatus.EXPIRED
+            if QRService.meter(subscription, 'remaining_visits', coins) is None:
+                return False, "No remaining visits on subscription"
 
         if subscription.service.has_classes and subscription.remaining_classes is not None:
-            subscription.remaining_classes = max(0, subscription.remaining_classes - coins)
+            if QRService.meter(subscription, 'remaining_classes', coins) is None:
+                return False, "No remaining classes on subscription"
+
+        return True, None
 
-            # Auto-expire if no classes left
-            if subscription.remaining_classes == 0:
-                subscription.status = SubscriptionStatus.EXPIRED
-    
     @staticmethod
     def generate_barcode(customer_id: int) -> str:
         """
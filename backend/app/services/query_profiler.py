@@ -0,0 +1,212 @@
+"""Queries per request: counted, timed, and checked for N+1s.
+
+Most of the slow endpoints fixed so far were N+1s — a query per branch in
+``compare_branches_performance``, per thread in the message lists, per member
+in ``batch_has_active_subscription`` — and every one was found by reading the
+code. This makes them visible instead:
+
+* **Per request.** With ``QUERY_PROFILING`` on (everywhere but production by
+  default), every response carries a ``Server-Timing`` header with the number
+  of statements, the time spent in the database and the time spent in all, so
+  the browser's network panel or a ``curl -I`` shows what an endpoint costs.
+* **Likely N+1s.** A statement run ``QUERY_REPEAT_THRESHOLD`` times or more in
+  one request, with only its parameters changing, is logged as a warning with
+  the endpoint and the statement.
+* **Budgets in tests.** :func:`query_budget` fails a test whose block runs
+  more statements than declared, listing them. tests/test_query_budgets.py
+  holds the door scan, the dashboards and the member app's home screen to
+  theirs.
+* **Measurements.** :func:`collect_queries` only counts, for the endpoint
+  benchmarks (benchmarks/endpoints.py) to record next to the latencies.
+
+The counting is two cursor events on every engine, and costs nothing while no
+log is collecting: outside a profiled request or a budget, each event is one
+context-variable read.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+#: The logs collecting in this context: a profiled request's, and any budget
+#: opened inside it. Each statement is added to all of them.
+_collecting = ContextVar('query_profiler_logs', default=())
+
+#: Where a statement's start time is kept between the two cursor events.
+_STARTED = '_query_profiler_started'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryLog:
+    """The statements run while a log was collecting, with their durations."""
+
+    def __init__(self):
+        self.statements = []  # (statement, seconds)
+
+    def add(self, statement, seconds):
+        self.statements.append((_WHITESPACE.sub(' ', statement).strip(), seconds))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def sql(self):
+        """The statements alone, in the order they ran."""
+        return [statement for statement, _ in self.statements]
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self, threshold):
+        """[(statement, times)] for statements run ``threshold`` times or more,
+        most repeated first. The parameters are not part of the statement, so
+        a loop of lookups by id counts as one statement repeated."""
+        counts = Counter(statement for statement, _ in self.statements)
+        return [(statement, times) for statement, times in counts.most_common()
+                if times >= threshold]
+
+    def describe(self, limit=None):
+        """The statements as numbered lines, for a failure message."""
+        lines = [f'{n:3d}. {statement}' for n, (statement, _) in
+                 enumerate(self.statements[:limit], 1)]
+        if limit is not None and self.count > limit:
+            lines.append(f'     ... and {self.count - limit} more')
+        return '\n'.join(lines)
+
+
+def _push(log):
+    return _collecting.set(_collecting.get() + (log,))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collecting.get() and context is not None:
+        setattr(context, _STARTED, time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    logs = _collecting.get()
+    started = getattr(context, _STARTED, None) if context is not None else None
+    if not logs or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    for log in logs:
+        log.add(statement, elapsed)
+
+
+@contextmanager
+def collect_queries():
+    """Collect the block's statements into a :class:`QueryLog`, with no budget."""
+    log = QueryLog()
+    token = _push(log)
+    try:
+        yield log
+    finally:
+        _collecting.reset(token)
+
+
+# ───────────────────────────── budgets ──────────────────────────────────────
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more statements than its budget allows."""
+
+
+class query_budget(ContextDecorator):
+    """Fail when the block (or decorated function) runs more than ``limit``
+    statements, or repeats one more than ``max_repeats`` times if given.
+
+    ``with query_budget(3) as log:`` leaves the :class:`QueryLog` in ``log``
+    for assertions of the test's own.
+    """
+
+    def __init__(self, limit, max_repeats=None):
+        self.limit = limit
+        self.max_repeats = max_repeats
+        self.log = None
+        self._token = None
+
+    def __enter__(self):
+        self.log = QueryLog()
+        self._token = _push(self.log)
+        return self.log
+
+    def __exit__(self, exc_type, exc, tb):
+        _collecting.reset(self._token)
+        if exc_type is not None:
+            return False
+        if self.log.count > self.limit:
+            raise QueryBudgetExceeded(
+                f'{self.log.count} queries, budget {self.limit}:\n'
+                + self.log.describe())
+        if self.max_repeats is not None:
+            repeated = self.log.repeated(self.max_repeats + 1)
+            if repeated:
+                statement, times = repeated[0]
+                raise QueryBudgetExceeded(
+                    f'Statement run {times} times, at most {self.max_repeats} '
+                    f'allowed (likely N+1):\n     {statement}')
+        return False
+
+
+# ───────────────────────────── per request ──────────────────────────────────
+
+def _server_timing(log, total_seconds):
+    return (f'db;dur={log.seconds * 1000:.1f};desc="{log.count} queries", '
+            f'app;dur={total_seconds * 1000:.1f}')
+
+
+def register_query_profiler(app):
+    """Count every request's statements and report them, if profiling is on."""
+    for event_name, listener in (
+        ('before_cursor_execute', _before_cursor_execute),
+        ('after_cursor_execute', _after_cursor_execute),
+    ):
+        if not event.contains(Engine, event_name, listener):
+            event.listen(Engine, event_name, listener)
+
+    if not app.config.get('QUERY_PROFILING'):
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_query_log():
+        log = QueryLog()
+        g._query_profile = (log, _push(log), time.perf_counter())
+
+    @app.after_request
+    def _report_query_log(response):
+        profile = g.get('_query_profile')
+        if profile is None:
+            return response
+        log, _, started = profile
+        response.headers['Server-Timing'] = _server_timing(
+            log, time.perf_counter() - started)
+
+        threshold = app.config.get('QUERY_REPEAT_THRESHOLD') or 0
+        if threshold:
+            for statement, times in log.repeated(threshold):
+                logger.warning('Likely N+1 in %s %s: %d runs of %s',
+                               request.method, request.endpoint or request.path,
+                               times, statement[:300])
+        return response
+
+    @app.teardown_request
+    def _stop_query_log(exc):
+        profile = g.pop('_query_profile', None)
+        if profile is not None:
+            try:
+                _collecting.reset(profile[1])
+            except ValueError:
+                # Torn down in another context than it started in; the
+                # context it was set in is gone with its log.
+                pass
@@ -0,0 +1,138 @@
+"""Time buckets for reports, computed by the database.
+
+A trend chart wants one number per day, week or month. Grouping by the bucket
+in SQL means the database returns exactly those numbers — (bucket, net revenue,
+count) — instead of handing every row in the window to Python to be sorted
+into buckets there.
+
+The buckets are taken over the rollups' ``business_date``, which is already
+the gym's local day (app/services/revenue_rollup), so truncating it to a week
+or a month is a pure calendar operation with no timezone left to apply. That is
+what lets the same expression be written for every dialect — SQLite has no
+named time zones, so truncating a UTC timestamp "in Cairo" there would mean a
+fixed offset that is wrong for half the year.
+
+Each dialect gets its own spelling of the same three functions:
+
+=========  ==================  ==============================  ====================
+period     Postgres            SQLite                          MySQL
+=========  ==================  ==============================  ====================
+daily      the date            ``date(d)``                     the date
+weekly     ``date_trunc``      ``date(d, '-6 days',            ``subdate(d,
+           ('week')            'weekday 1')``                  weekday(d))``
+monthly    ``date_trunc``      ``date(d, 'start of month')``   ``subdate(d,
+           ('month')                                           dayofmonth(d) - 1)``
+=========  ==================  ==============================  ====================
+
+Weeks start on Monday everywhere, as ``date.weekday()`` and Postgres's ISO
+``date_trunc('week')`` both have it. :func:`bucket_start` is the Python twin of
+the SQL, used to lay out the axis and held equal to it by
+tests/test_report_buckets.py.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, cast, func, literal_column, type_coerce
+
+from app.extensions import db
+
+PERIODS = ('daily', 'weekly', 'monthly')
+
+
+def bucket_start(period, day):
+    """The first day of the bucket ``day`` falls in."""
+    if period == 'daily':
+        return day
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    raise ValueError(f'unknown period: {period}')
+
+
+def bucket_starts(period, today, buckets):
+    """The first day of each of the last ``buckets`` periods, oldest first,
+    ending with the one containing ``today``."""
+    if period == 'daily':
+        return [today - timedelta(days=i) for i in range(buckets - 1, -1, -1)]
+    if period == 'weekly':
+        current_week = bucket_start('weekly', today)
+        return [current_week - timedelta(weeks=i) for i in range(buckets - 1, -1, -1)]
+    if period == 'monthly':
+        starts = []
+        for i in range(buckets - 1, -1, -1):
+            month = today.month - i
+            year = today.year
+            while month <= 0:
+                month += 12
+                year -= 1
+            starts.append(date(year, month, 1))
+        return starts
+    raise ValueError(f'unknown period: {period}')
+
+
+def bucket_expression(period, column, dialect=None):
+    """SQL for the first day of ``column``'s bucket, typed as a Date.
+
+    ``column`` must be a DATE. ``dialect`` defaults to the session's.
+
+    Constants are inlined rather than bound: the expression appears in both
+    the SELECT list and the GROUP BY, and Postgres only accepts that when the
+    two are textually identical — two separately bound ``'week'`` parameters
+    are not.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'unknown period: {period}')
+    if dialect is None:
+        dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        if period == 'daily':
+            return column
+        unit = literal_column("'week'" if period == 'weekly' else "'month'")
+        return cast(func.date_trunc(unit, cast(column, DateTime)), Date)
+
+    if dialect == 'sqlite':
+        # SQLite's date() returns text; coercing to Date makes the result
+        # processor hand back a datetime.date like the other dialects do.
+        modifiers = {
+            'daily': (),
+            'weekly': ("'-6 days'", "'weekday 1'"),
+            'monthly': ("'start of month'",),
+        }[period]
+        return type_coerce(
+            func.date(column, *map(literal_column, modifiers)), Date)
+
+    if dialect in ('mysql', 'mariadb'):
+        if period == 'daily':
+            return column
+        if period == 'weekly':
+            return func.subdate(column, func.weekday(column))
+        return func.subdate(column, func.dayofmonth(column) - literal_column('1'))
+
+    raise NotImplementedError(f'no date bucketing for dialect {dialect!r}')
+
+
+def as_day(value):
+    """A bucket value as a date, whatever the driver returned it as."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def revenue_buckets(period, start=None, end=None, branch_ids=None):
+    """A query for (bucket, net, discount, count) per ``period`` bucket.
+
+    Built on ``rollup_sums``, so it takes the same inclusive business-date
+    window and branch filter, and callers can narrow it further (a gym join,
+    ``scope_query_to_branches``) before running it. Ordered oldest first; pass
+    each row's bucket through :func:`as_day` when reading.
+    """
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+    from app.services.revenue_rollup import rollup_sums
+
+    bucket = bucket_expression(period, DailyRevenueRollup.business_date).label('bucket')
+    return rollup_sums(
+        bucket, start=start, end=end, branch_ids=branch_ids,
+    ).order_by(bucket)
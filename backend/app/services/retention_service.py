@@ -11,10 +11,18 @@ has to actually go. Two things were wrong with how that worked:
   address and health notes all remained on the row.
 
 This module does the erasure, and :func:`purge_due_accounts` is safe to call
-from anywhere — a CLI command, a boot hook, or the opportunistic sweep in the
-request guard — because it is idempotent and only ever touches rows whose
+from anywhere — a CLI command or the scheduled purge-deleted-accounts job —
+because it is idempotent and only ever touches rows whose
 grace period has already elapsed.
 
+A pending request is ``customers.deletion_requested_at``, indexed, so the
+purge is a range scan over the requests that have come due however large the
+members table grows. It used to be a ``[DELETE_REQUEST]`` line inside
+health_notes, which the purge found with ``LIKE '%...%'`` — a full scan of
+every member on every run — and which a receptionist editing the notes could
+wipe without knowing it was there. :func:`backfill_requests` moves those lines
+into the column, once, when the column is added.
+
 The customer row itself is kept. Transactions, entry logs and subscriptions
 reference it, and deleting it would either cascade away a gym's financial
 history or leave dangling references. Emptying it of personal data is the
@@ -24,33 +32,95 @@ from datetime import datetime, timedelta
 
 from app.extensions import db
 
-#: Marker written into health_notes when a deletion is requested.
+#: The line that recorded a deletion request in health_notes before
+#: ``deletion_requested_at`` existed. Only read now, by the backfill.
 DELETE_REQUEST_PREFIX = '[DELETE_REQUEST]'
 
+#: The placeholder an erased member's phone number is replaced with, followed
+#: by their id (phone has to stay unique, so it cannot simply be NULL).
+ANONYMISED_PHONE_PREFIX = 'deleted-'
+
 #: How long a member has to change their mind.
 GRACE_DAYS = 90
 
 
-def _requested_at(customer):
-    """When deletion was requested, or None."""
-    for line in (customer.health_notes or '').splitlines():
+def _parse_note(notes):
+    """Split a legacy marker out of health notes: ``(requested_at, rest)``.
+
+    The app wrote ``[DELETE_REQUEST]: <iso>``; older callers wrote it without
+    the colon. A marker whose timestamp will not parse still comes out of the
+    notes, with ``requested_at`` None.
+    """
+    requested, kept = None, []
+    for line in (notes or '').splitlines():
         if line.startswith(DELETE_REQUEST_PREFIX):
-            stamp = line[len(DELETE_REQUEST_PREFIX):].strip()
+            stamp = line[len(DELETE_REQUEST_PREFIX):].lstrip(':').strip()
             try:
-                return datetime.fromisoformat(stamp)
+                requested = datetime.fromisoformat(stamp)
             except ValueError:
-                return None
-    return None
+                pass
+        elif line:
+            kept.append(line)
+    return requested, '\n'.join(kept).strip() or None
+
+
+def backfill_requests(batch_size=500):
+    """Move legacy health_notes markers into ``deletion_requested_at``.
+
+    Run by the auto-migration when it adds the column; the LIKE scan it needs
+    is the last one. The marker is taken out of the notes as it is moved, so
+    running this again finds nothing. Returns the number of requests moved.
+    """
+    from app.models.customer import Customer
+
+    moved, last_id = 0, 0
+    while True:
+        rows = Customer.query.filter(
+            Customer.id > last_id,
+            Customer.health_notes.like(f'%{DELETE_REQUEST_PREFIX}%'),
+        ).order_by(Customer.id).limit(batch_size).all()
+        if not rows:
+            return moved
+        for customer in rows:
+            requested, rest = _parse_note(customer.health_notes)
+            customer.health_notes = rest
+            if requested is not None and customer.deletion_requested_at is None:
+                customer.deletion_requested_at = requested
+                moved += 1
+        last_id = rows[-1].id
+        db.session.commit()
 
 
 def is_due(customer, now=None):
     """Has this member's grace period elapsed?"""
-    requested = _requested_at(customer)
+    requested = customer.deletion_requested_at
     if requested is None:
         return False
     return (now or datetime.utcnow()) >= requested + timedelta(days=GRACE_DAYS)
 
 
+def deletion_status(customer, now=None):
+    """The member's pending deletion request, as the client app shows it."""
+    requested = customer.deletion_requested_at
+    if requested is None:
+        return {
+            'requested': False,
+            'requested_at': None,
+            'scheduled_delete_at': None,
+            'days_remaining': None,
+            'is_due': False,
+        }
+    now = now or datetime.utcnow()
+    scheduled = requested + timedelta(days=GRACE_DAYS)
+    return {
+        'requested': True,
+        'requested_at': requested.isoformat(),
+        'scheduled_delete_at': scheduled.isoformat(),
+        'days_remaining': max((scheduled - now).days, 0),
+        'is_due': now >= scheduled,
+    }
+
+
 def anonymise(customer):
     """Strip every piece of personal data from a member record.
 
@@ -59,7 +129,7 @@ def anonymise(customer):
     becomes a per-id placeholder instead of NULL, which would collide the
     moment a second account was deleted.
     """
-    marker = f'deleted-{customer.id}'
+    marker = f'{ANONYMISED_PHONE_PREFIX}{customer.id}'
 
     customer.full_name = 'Deleted member'
     customer.phone = marker
@@ -87,6 +157,8 @@ def anonymise(customer):
     customer.password_changed = True
 
     customer.is_active = False
+    # Carried out: leaving it set would have the purge pick the row up again.
+    customer.deletion_requested_at = None
 
     # And any token already in the wild must stop working now, rather than
     # continuing to authenticate a member who no longer exists. Deactivation
@@ -111,7 +183,11 @@ def anonymise(customer):
     # Likewise their conversations with a captain. Deleted rather than
     # anonymised: a message body is free text the member wrote about
     # themselves, and there is no way to redact that field by field.
+    # Their thread summaries go first: they point at the messages.
     from app.models.message import Message
+    from app.models.message_thread import MessageThread
+    MessageThread.query.filter_by(customer_id=customer.id).delete(
+        synchronize_session=False)
     Message.query.filter_by(customer_id=customer.id).delete(
         synchronize_session=False)
 
@@ -127,28 +203,22 @@ def anonymise(customer):
 def purge_due_accounts(now=None, limit=200):
     """Erase every account whose grace period has elapsed.
 
-    Returns the number erased. Bounded by ``limit`` so an opportunistic caller
-    on a request path can never turn into a long transaction.
+    Returns the number erased. Bounded by ``limit`` so no single call turns
+    into a long transaction; the scheduled job calls again while it is full.
     """
     from app.models.customer import Customer
 
     now = now or datetime.utcnow()
     cutoff = now - timedelta(days=GRACE_DAYS)
 
-    # Narrow in SQL to rows that carry the marker at all; the exact timestamp
-    # is parsed per row because it lives inside a text field.
-    candidates = Customer.query.filter(
-        Customer.health_notes.like(f'%{DELETE_REQUEST_PREFIX}%')
-    ).limit(limit).all()
-
-    purged = 0
-    for customer in candidates:
-        requested = _requested_at(customer)
-        if requested is None or requested > cutoff:
-            continue
+    # Only rows already due, oldest first, straight off the index.
+    due = Customer.query.filter(
+        Customer.deletion_requested_at <= cutoff
+    ).order_by(Customer.deletion_requested_at, Customer.id).limit(limit).all()
+
+    for customer in due:
         anonymise(customer)
-        purged += 1
 
-    if purged:
+    if due:
         db.session.commit()
-    return purged
+    return len(due)
@@ -0,0 +1,278 @@
+"""Daily revenue, kept pre-aggregated alongside the ledger.
+
+The owner dashboard, the accountant dashboard and every revenue report used to
+answer by summing ``transactions`` over their window on each page load —
+``/revenue-trend`` went further and loaded every transaction in the window into
+Python. The ledger only grows, so those screens got slower every month a gym
+traded.
+
+``daily_revenue_rollups`` holds one row per (branch, the gym's local business
+day, payment method, transaction type) with the net amount, the discount and
+the count. Readers sum those instead: days x branches rows, however long the
+history.
+
+Keeping it correct:
+
+* **Incrementally.** Mapper listeners on ``Transaction`` upsert the affected
+  row in the *same flush* as the transaction, so the two commit or roll back
+  together — whoever records the money (payments, renewals, freezes, a test
+  fixture) and without any of them having to remember to.
+* **From scratch.** ``flask rebuild-revenue-rollups`` recomputes every row from
+  the ledger: the backfill for history that predates the table, and the repair
+  after a gym changes its ``timezone`` setting (rows already written stay on the
+  days they were dated under the old zone until then).
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import and_, event, func, inspect as sa_inspect, select
+
+from app.extensions import db
+from app.utils.upsert import upsert
+
+#: The columns a rollup row is keyed by, in constraint order.
+KEY_COLUMNS = ('branch_id', 'business_date', 'payment_method', 'transaction_type')
+
+#: The transaction attributes a rollup row is derived from. A change to any of
+#: these moves money between rows; a change to anything else (notes, the
+#: description) does not touch the rollups at all.
+_TRACKED = ('branch_id', 'transaction_date', 'payment_method', 'transaction_type',
+            'amount', 'discount')
+
+_ZERO = Decimal('0')
+
+
+def business_date(tz, when):
+    """The gym-local calendar day a stored (naive UTC) timestamp falls on."""
+    return when.replace(tzinfo=timezone.utc).astimezone(tz).date()
+
+
+def as_date(value):
+    """A report bound as a date — callers pass either."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _money(value):
+    return Decimal(str(value)) if value is not None else _ZERO
+
+
+# ───────────────────────────── incremental ──────────────────────────────────
+
+def _branch_timezone(connection, branch_id):
+    """The branch's gym timezone, read on the flushing connection.
+
+    Not through ``gym_timezone``: that reads via the session, and this runs in
+    the middle of the session's flush. Same setting, same resolution.
+    """
+    from app.models.branch import Branch
+    from app.models.gym_setting import GymSetting
+    from app.services.business_time import _resolve_timezone
+
+    value = connection.execute(
+        select(GymSetting.value)
+        .select_from(Branch)
+        .join(GymSetting, and_(GymSetting.gym_id == Branch.gym_id,
+                               GymSetting.key == 'timezone'))
+        .where(Branch.id == branch_id)
+    ).scalar()
+    return _resolve_timezone({'timezone': value} if value else {})
+
+
+def _upsert(connection, key, net, discount, count):
+    """Add (net, discount, count) to one rollup row, creating it if needed.
+
+    A single statement where the dialect has one, so two tills recording on
+    the same branch and day cannot both miss the row and both insert it.
+    """
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+
+    table = DailyRevenueRollup.__table__
+    upsert(connection, table,
+           dict(key, net_amount=net, discount=discount, transaction_count=count),
+           KEY_COLUMNS,
+           lambda new: {
+               'net_amount': table.c.net_amount + new.net_amount,
+               'discount': table.c.discount + new.discount,
+               'transaction_count': table.c.transaction_count + new.transaction_count,
+           })
+
+
+def _apply(connection, fields, sign):
+    """Add (sign=1) or remove (sign=-1) one transaction's contribution."""
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+
+    if fields['branch_id'] is None or fields['transaction_date'] is None:
+        return
+
+    tz = _branch_timezone(connection, fields['branch_id'])
+    key = {
+        'branch_id': fields['branch_id'],
+        'business_date': business_date(tz, fields['transaction_date']),
+        'payment_method': fields['payment_method'],
+        'transaction_type': fields['transaction_type'],
+    }
+    discount = _money(fields['discount'])
+    net = _money(fields['amount']) - discount
+    _upsert(connection, key, sign * net, sign * discount, sign)
+
+    if sign < 0:
+        # A row whose last transaction has gone should go with it, so "no
+        # takings that day" reads the same however it came about.
+        table = DailyRevenueRollup.__table__
+        connection.execute(table.delete().where(
+            and_(*(table.c[name] == key[name] for name in KEY_COLUMNS)),
+            table.c.transaction_count <= 0,
+        ))
+
+
+def _current(target):
+    return {name: getattr(target, name) for name in _TRACKED}
+
+
+def _stored(connection, transaction_id):
+    """The tracked fields as the database holds them, before this flush.
+
+    Read from the row rather than from attribute history: after a commit every
+    attribute is expired, and assigning to an expired attribute records no
+    previous value — so an edit made after a commit (the usual case) would
+    have no "before" to take back out of the rollups.
+    """
+    from app.models.transaction import Transaction
+
+    row = connection.execute(
+        select(*(getattr(Transaction, name) for name in _TRACKED))
+        .where(Transaction.id == transaction_id)
+    ).first()
+    return dict(zip(_TRACKED, row)) if row is not None else None
+
+
+def _on_insert(mapper, connection, target):
+    _apply(connection, _current(target), 1)
+
+
+def _before_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _TRACKED):
+        return
+    stored = _stored(connection, target.id)
+    if stored is not None:
+        _apply(connection, stored, -1)
+    _apply(connection, _current(target), 1)
+
+
+def _before_delete(mapper, connection, target):
+    stored = _stored(connection, target.id)
+    if stored is not None:
+        _apply(connection, stored, -1)
+
+
+def register_rollup_maintenance():
+    from app.models.transaction import Transaction
+
+    for event_name, listener in (
+        ('after_insert', _on_insert),
+        ('before_update', _before_update),
+        ('before_delete', _before_delete),
+    ):
+        if not event.contains(Transaction, event_name, listener):
+            event.listen(Transaction, event_name, listener)
+
+
+# ─────────────────────────────── rebuild ────────────────────────────────────
+
+def rebuild(gym_id=None, batch_size=5000):
+    """Recompute the rollups from the ledger, for one gym or for every branch.
+
+    Streams the transactions in batches rather than loading them, so a backfill
+    over years of history holds only the aggregates in memory. Runs in one
+    database transaction: readers see the old rows until it commits. Returns
+    the number of rollup rows written.
+
+    A transaction recorded while this runs is counted by whichever of the two
+    sees it last; run it at a quiet hour, or simply run it again.
+    """
+    from app.models.branch import Branch
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+    from app.models.transaction import Transaction
+    from app.services.business_time import gym_timezone
+
+    branches = db.session.query(Branch.id, Branch.gym_id)
+    if gym_id is not None:
+        branches = branches.filter(Branch.gym_id == gym_id)
+    zones = {}
+    branch_zone = {}
+    for branch_id, branch_gym_id in branches.all():
+        if branch_gym_id not in zones:
+            zones[branch_gym_id] = gym_timezone(branch_gym_id)
+        branch_zone[branch_id] = zones[branch_gym_id]
+
+    rollups = DailyRevenueRollup.query
+    if gym_id is not None:
+        rollups = rollups.filter(DailyRevenueRollup.branch_id.in_(list(branch_zone)))
+    rollups.delete(synchronize_session=False)
+
+    ledger = select(
+        Transaction.branch_id, Transaction.transaction_date,
+        Transaction.payment_method, Transaction.transaction_type,
+        Transaction.amount, Transaction.discount,
+    )
+    if gym_id is not None:
+        ledger = ledger.where(Transaction.branch_id.in_(list(branch_zone)))
+
+    totals = {}
+    rows = db.session.execute(ledger.execution_options(yield_per=batch_size))
+    for branch_id, when, method, kind, amount, discount in rows:
+        tz = branch_zone.get(branch_id)
+        if tz is None:
+            continue
+        key = (branch_id, business_date(tz, when), method, kind)
+        entry = totals.setdefault(key, [_ZERO, _ZERO, 0])
+        entry[0] += _money(amount) - _money(discount)
+        entry[1] += _money(discount)
+        entry[2] += 1
+
+    records = [
+        dict(zip(KEY_COLUMNS, key), net_amount=net, discount=discount,
+             transaction_count=count)
+        for key, (net, discount, count) in totals.items()
+    ]
+    for start in range(0, len(records), batch_size):
+        db.session.execute(DailyRevenueRollup.__table__.insert(),
+                           records[start:start + batch_size])
+    db.session.commit()
+    return len(records)
+
+
+# ──────────────────────────────── reading ───────────────────────────────────
+
+def rollup_sums(*group_by, start=None, end=None, branch_ids=None):
+    """A query for (group_by..., net, discount, count) over the rollups.
+
+    ``start`` and ``end`` are inclusive business dates (datetimes are taken at
+    their date). ``branch_ids`` of None means every branch; callers applying a
+    user's scope pass the query through ``scope_query_to_branches`` instead.
+    Sums are NULL over an empty window — the callers' ``or 0`` handles it.
+    """
+    from app.models.daily_revenue_rollup import DailyRevenueRollup as R
+
+    query = db.session.query(
+        *group_by,
+        func.sum(R.net_amount),
+        func.sum(R.discount),
+        func.sum(R.transaction_count),
+    )
+    if start is not None:
+        query = query.filter(R.business_date >= as_date(start))
+    if end is not None:
+        query = query.filter(R.business_date <= as_date(end))
+    if branch_ids is not None:
+        query = query.filter(R.branch_id.in_(branch_ids))
+    if group_by:
+        query = query.group_by(*group_by)
+    return query
+
+
+def net_revenue(start=None, end=None, branch_ids=None):
+    """Net revenue over an inclusive business-date window, as a float."""
+    total = rollup_sums(start=start, end=end, branch_ids=branch_ids).one()[0]
+    return float(total) if total else 0.0
@@ -0,0 +1,303 @@
+"""Running periodic housekeeping jobs, once per interval across every worker.
+
+There is still no separate worker process in this deployment, so the scheduler
+lives in the web workers: one thread per worker (app/services/dispatcher.py),
+started by the first request it serves and waking every ``JOBS_POLL_SECONDS``
+to run whatever is due. With several workers on several instances, two things
+keep a job to one runner at a time:
+
+* **a lock per job** — ``pg_try_advisory_lock`` on Postgres, held on its own
+  connection for the length of the run; an exclusive ``flock`` on a file
+  beside the database on SQLite. A worker that cannot take it skips the job,
+  it does not wait;
+* **the timetable** — under the lock, a run is claimed by moving the job's
+  ``next_run_at`` forward with a conditional UPDATE. Only a worker whose
+  UPDATE matched runs it, so a job is run once per interval however many
+  workers looked.
+
+A job is a function that processes at most ``batch_size`` rows in its own
+transaction and reports how many it handled. The runner calls it again while
+it keeps returning full batches, up to ``JOBS_MAX_BATCHES`` per run, so no
+single transaction is long and a backlog is still worked through. Each run is
+recorded in ``job_runs``, which ``flask jobs history`` reads.
+
+Jobs are registered with :func:`job`; the housekeeping ones live in
+app/services/housekeeping.py.
+"""
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.extensions import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, the timetable alone has to do
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+#: Added to a job name's CRC to make its advisory lock key, well clear of the
+#: schema-migration lock in app/__init__.py.
+_LOCK_KEY_BASE = 7_300_000_000
+
+#: How long run history is kept.
+HISTORY_DAYS = 30
+
+
+class Job:
+    def __init__(self, name, func, every, batch_size, description):
+        self.name = name
+        self.func = func
+        self.every = every
+        self.batch_size = batch_size
+        self.description = description
+
+
+#: Every registered job, by name.
+JOBS = {}
+
+
+def job(name, every, batch_size):
+    """Register ``func(batch_size)`` to run every ``every`` seconds.
+
+    It returns the number of rows it handled, or ``(count, detail)`` where
+    detail is a dict of further counts to add up across batches.
+    """
+    def register(func):
+        description = ((func.__doc__ or '').strip().splitlines() or [''])[0]
+        JOBS[name] = Job(name, func, every, batch_size, description)
+        return func
+    return register
+
+
+def registered_jobs():
+    """The registry, with the housekeeping jobs loaded into it."""
+    import app.services.housekeeping  # noqa: F401 (registers on import)
+    return JOBS
+
+
+def _config(key, default):
+    from flask import current_app
+    return current_app.config.get(key, default)
+
+
+# ───────────────────────────── the per-job lock ─────────────────────────────
+
+class JobLock:
+    """Held by whichever worker is running a job. Never waits."""
+
+    def __init__(self, name):
+        self.name = name
+        self._connection = None
+        self._file = None
+
+    def _is_postgres(self):
+        try:
+            return db.engine.url.get_backend_name().startswith('postgres')
+        except Exception:
+            return False
+
+    def _key(self):
+        return _LOCK_KEY_BASE + zlib.crc32(self.name.encode())
+
+    def _path(self):
+        lock_dir = _config('JOBS_LOCK_DIR', None) or tempfile.gettempdir()
+        # One set of locks per database, so two apps on one host do not
+        # block each other.
+        digest = hashlib.sha1(str(db.engine.url).encode()).hexdigest()[:12]
+        return os.path.join(lock_dir, f'gym-jobs-{digest}-{self.name}.lock')
+
+    def acquire(self):
+        if self._is_postgres():
+            connection = db.engine.connect()
+            got = connection.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': self._key()}
+            ).scalar()
+            if not got:
+                connection.close()
+                return False
+            self._connection = connection
+            return True
+        if fcntl is None:
+            return True
+        handle = open(self._path(), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(
+                    text('SELECT pg_advisory_unlock(:key)'), {'key': self._key()})
+            finally:
+                self._connection.close()
+                self._connection = None
+        if self._file is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            finally:
+                self._file.close()
+                self._file = None
+
+
+# ───────────────────────────── running ──────────────────────────────────────
+
+def _runner_name():
+    return f'{socket.gethostname()}:{os.getpid()}'[:120]
+
+
+def ensure_job_rows():
+    """Give every registered job a row in ``scheduled_jobs``, due now."""
+    from sqlalchemy.exc import IntegrityError
+    from app.models.scheduled_job import ScheduledJob
+
+    known = {name for (name,) in db.session.query(ScheduledJob.name)}
+    missing = [name for name in registered_jobs() if name not in known]
+    if not missing:
+        return
+    for name in missing:
+        db.session.add(ScheduledJob(name=name, next_run_at=datetime.utcnow()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker added them first.
+        db.session.rollback()
+
+
+def _merge(total, detail):
+    for key, value in (detail or {}).items():
+        if isinstance(value, dict):
+            _merge(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+        else:
+            total[key] = value
+
+
+def run_job(name, force=False):
+    """Run one job if it is due (or ``force``) and nobody else is running it.
+
+    Returns the ``JobRun`` recorded, or None when the job was skipped. A job
+    that raises is recorded as failed, not re-raised: the next one still runs.
+    """
+    from app.models.scheduled_job import JobRun, JobRunStatus, ScheduledJob
+
+    spec = registered_jobs()[name]
+    ensure_job_rows()
+    lock = JobLock(name)
+    if not lock.acquire():
+        return None
+    try:
+        now = datetime.utcnow()
+        claim = ScheduledJob.query.filter(ScheduledJob.name == name)
+        if not force:
+            claim = claim.filter(ScheduledJob.enabled.is_(True),
+                                 ScheduledJob.next_run_at <= now)
+        claimed = claim.update(
+            {'next_run_at': now + timedelta(seconds=spec.every),
+             'last_started_at': now,
+             'last_status': JobRunStatus.RUNNING},
+            synchronize_session=False,
+        )
+        if not claimed:
+            db.session.rollback()
+            return None
+
+        # We hold the lock, so anything still marked running died mid-run.
+        JobRun.query.filter_by(job_name=name, status=JobRunStatus.RUNNING).update(
+            {'status': JobRunStatus.FAILED, 'error': 'abandoned: the runner stopped'},
+            synchronize_session=False,
+        )
+        run = JobRun(job_name=name, runner=_runner_name(), started_at=now)
+        db.session.add(run)
+        db.session.commit()
+        run_id = run.id
+
+        processed, batches, detail, error = 0, 0, {}, None
+        try:
+            for _ in range(max(1, _config('JOBS_MAX_BATCHES', 20))):
+                result = spec.func(spec.batch_size)
+                count, extra = result if isinstance(result, tuple) else (result, None)
+                batches += 1
+                processed += count or 0
+                _merge(detail, extra)
+                if (count or 0) < spec.batch_size:
+                    break
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Job %s failed', name)
+            error = f'{type(e).__name__}: {e}'[:1000]
+
+        finished = datetime.utcnow()
+        status = JobRunStatus.FAILED if error else JobRunStatus.SUCCEEDED
+        run = db.session.get(JobRun, run_id)
+        run.status = status
+        run.finished_at = finished
+        run.batches = batches
+        run.processed = processed
+        run.detail = detail or None
+        run.error = error
+        ScheduledJob.query.filter_by(name=name).update(
+            {'last_finished_at': finished, 'last_status': status},
+            synchronize_session=False,
+        )
+        JobRun.query.filter(
+            JobRun.job_name == name,
+            JobRun.started_at < finished - timedelta(days=HISTORY_DAYS),
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if processed or error:
+            logger.info('Job %s: %s row(s) in %s batch(es)%s', name, processed,
+                        batches, f', failed: {error}' if error else '')
+        return run
+    finally:
+        lock.release()
+
+
+def run_due_jobs():
+    """Run every job that is due. Returns the runs recorded."""
+    from app.models.scheduled_job import ScheduledJob
+
+    ensure_job_rows()
+    now = datetime.utcnow()
+    due = [name for (name,) in db.session.query(ScheduledJob.name).filter(
+        ScheduledJob.enabled.is_(True), ScheduledJob.next_run_at <= now,
+    ).order_by(ScheduledJob.next_run_at)]
+    db.session.rollback()  # end the read before the runs take their locks
+    runs = []
+    for name in due:
+        if name in JOBS:
+            run = run_job(name)
+            if run is not None:
+                runs.append(run)
+    return runs
+
+
+def ensure_started():
+    """Start this worker's scheduler thread if it is not running."""
+    from app.services.dispatcher import wake
+    wake('job_scheduler', run_due_jobs, 'JOBS_SCHEDULER', 'JOBS_POLL_SECONDS',
+         nudge=False)
+
+
+def register_job_scheduler(app):
+    """Start the scheduler thread from the first request a worker serves.
+
+    Started from a request rather than here so it is created in the worker
+    after gunicorn forks, not in the master where it would be lost.
+    """
+    @app.before_request
+    def _start_job_scheduler():
+        ensure_started()
@@ -0,0 +1,202 @@
+"""Who can see which branches, remembered across requests.
+
+Nearly every staff endpoint starts by working out the caller's scope: an
+owner's gym (``Gym.query.filter_by(owner_id=...)``), then that gym's branch
+list, and — since both were asked from several places per request — the gym
+lookup more than once. Only the branch list was cached, and only for the one
+request. An owner's scope changes when a branch is opened or closed, which
+happens a few times a year; it was being recomputed several times a second.
+
+Each worker now keeps the resolved scope — gym id and branch ids — per
+(user id, role) for ``BRANCH_SCOPE_CACHE_SECONDS``, in front of the existing
+per-request cache on ``flask.g``. A committed change that moves a scope
+drops the affected entries in this worker at once:
+
+* a branch created, deleted, deactivated or moved between gyms — every entry
+  for that gym (``branches_routes``; ``cascade_service``'s bulk deactivation
+  calls :func:`invalidate` itself, being below the ORM);
+* a gym created or changing owner — everything;
+* a user's role, gym, branch, active flag or ``managed_branches`` — that
+  user's entries.
+
+Other workers pick the change up when their entry expires, so the interval is
+how long a narrowed scope can linger elsewhere; keep it short. 0 turns the
+cross-request layer off and leaves the per-request one. :func:`stats` reports
+the hit rate.
+"""
+import time
+from collections import namedtuple
+
+from sqlalchemy import inspect as sa_inspect
+
+from app.services import worker_cache
+
+#: Users' scopes kept per worker; least recently used go first.
+MAX_ENTRIES = 4096
+
+#: Session.info key the flush collects invalidations under until commit.
+_PENDING = 'branch_scope_invalidations'
+
+#: The per-request layer on flask.g (cleared by register_request_cache_reset).
+REQUEST_ATTR = '_branch_scope_cache'
+
+_clock = time.monotonic
+
+#: gym_id: the user's gym (None if it cannot be resolved). branch_ids: tuple of
+#: every branch id they may see.
+Scope = namedtuple('Scope', 'gym_id branch_ids')
+
+
+def _cache():
+    return worker_cache.for_app('branch_scope_cache', MAX_ENTRIES, metric='branch_scope')
+
+
+def _ttl():
+    return worker_cache.seconds('BRANCH_SCOPE_CACHE_SECONDS')
+
+
+def _request_cache():
+    from flask import g
+
+    cache = getattr(g, REQUEST_ATTR, None)
+    if cache is None:
+        cache = {}
+        setattr(g, REQUEST_ATTR, cache)
+    return cache
+
+
+def _compute(user):
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.user import BRANCH_GROUP_ROLES, UserRole
+
+    if user.role in BRANCH_GROUP_ROLES:
+        return Scope(user.gym_id, tuple(user.managed_branch_ids))
+
+    gym_id = user.gym_id
+    if user.role == UserRole.OWNER:
+        from app.models.gym import Gym
+        gym_id = db.session.query(Gym.id).filter(Gym.owner_id == user.id).scalar()
+    if gym_id is None:
+        return Scope(None, ())
+    branch_ids = db.session.query(Branch.id).filter(Branch.gym_id == gym_id).all()
+    return Scope(gym_id, tuple(row[0] for row in branch_ids))
+
+
+def scope_for(user):
+    """The :class:`Scope` of an owner, central accountant or branch-group role.
+
+    Answered from this request's cache, then this worker's, and only then the
+    database. Other roles' scopes are plain columns on the user and never need
+    this.
+    """
+    key = (user.id, user.role.value)
+    local = _request_cache()
+    if key in local:
+        return local[key]
+
+    ttl = _ttl()
+    if not ttl:
+        local[key] = _compute(user)
+        return local[key]
+
+    cache = _cache()
+    now = _clock()
+    scope = cache.get(key, ttl, now)
+    if scope is worker_cache.MISSING:
+        scope = cache.put(key, _compute(user), now)
+    local[key] = scope
+    return scope
+
+
+def invalidate(user_ids=None, gym_ids=None, everything=False):
+    """Drop the scopes of these users and of everyone in these gyms, in this
+    worker and this request. With no arguments (or ``everything``), drop all."""
+    from flask import g
+
+    everything = everything or (not user_ids and not gym_ids)
+    user_ids = set(user_ids or ())
+    gym_ids = set(gym_ids or ())
+
+    def stale(key, scope):
+        return everything or key[0] in user_ids or scope.gym_id in gym_ids
+
+    local = getattr(g, REQUEST_ATTR, None)
+    if local:
+        for key in [k for k, scope in local.items() if stale(k, scope)]:
+            del local[key]
+
+    _cache().drop(stale)
+
+
+def stats():
+    """Hit/miss counters for this worker, for monitoring."""
+    return _cache().stats(_ttl())
+
+
+def reset():
+    """Forget every scope and zero the counters (tests, mostly)."""
+    _cache().clear()
+
+
+# ───────────────────────────── invalidation ─────────────────────────────────
+#
+# Collected at flush, applied at commit (app/services/worker_cache.py), the
+# same way the owner dashboard's snapshots are dropped.
+
+_USER_FIELDS = ('role', 'gym_id', 'branch_id', 'is_active', 'managed_branches')
+
+
+def _values(obj, attribute):
+    history = sa_inspect(obj).attrs[attribute].history
+    return set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+
+
+def _changed(obj, attribute):
+    return sa_inspect(obj).attrs[attribute].history.has_changes()
+
+
+def _add_gyms(pending, branch):
+    gyms = _values(branch, 'gym_id') - {None}
+    if not gyms:
+        pending['all'] = True  # Expired and never reloaded: no telling whose.
+    pending['gyms'] |= gyms
+
+
+def _collect(session, pending):
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.user import User
+
+    for obj in session.new:
+        if isinstance(obj, Branch):
+            _add_gyms(pending, obj)
+        elif isinstance(obj, Gym):
+            pending['all'] = True
+    for obj in session.dirty:
+        if isinstance(obj, Branch) and (_changed(obj, 'gym_id') or _changed(obj, 'is_active')):
+            _add_gyms(pending, obj)
+        elif isinstance(obj, Gym) and _changed(obj, 'owner_id'):
+            pending['all'] = True
+        elif isinstance(obj, User) and any(_changed(obj, f) for f in _USER_FIELDS):
+            pending['users'].add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Branch):
+            _add_gyms(pending, obj)
+        elif isinstance(obj, Gym):
+            pending['all'] = True
+        elif isinstance(obj, User):
+            pending['users'].add(obj.id)
+    pending['gyms'].discard(None)
+
+
+def _apply(pending):
+    invalidate(user_ids=pending['users'], gym_ids=pending['gyms'],
+               everything=pending['all'])
+
+
+_tracker = worker_cache.CommitTracker(_PENDING, ('users', 'gyms'), _collect, _apply)
+
+
+def register_scope_invalidation():
+    _tracker.register()
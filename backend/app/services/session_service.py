@@ -49,9 +49,17 @@ def revoke_sessions(account):
     """Invalidate every token issued to this user or customer so far.
 
     Takes either a ``User`` or a ``Customer`` — both carry the column. Does not
-    commit; the caller decides the transaction boundary.
+    commit; the caller decides the transaction boundary. The guard's cached
+    copy of the cutoff (app/services/principal.py) is dropped when it does.
     """
+    from app.models.customer import Customer
+    from app.services.principal import invalidate_on_commit
+
     account.sessions_valid_from = _cutoff_now()
+    if isinstance(account, Customer):
+        invalidate_on_commit(db.session, customer_ids=[account.id])
+    else:
+        invalidate_on_commit(db.session, user_ids=[account.id])
     return account.sessions_valid_from
 
 
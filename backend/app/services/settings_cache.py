@@ -0,0 +1,178 @@
+"""Each gym's settings, cached for the life of the worker process.
+
+Gym settings change a few times a year and are read on every check-in, every
+daily closing and every accountant dashboard — ``gym_rule`` only remembered
+them for one request, and ``gym_timezone`` did not remember them at all. This
+keeps each gym's whole ``gym_settings`` map (and anything derived from it, such
+as the resolved ``ZoneInfo``) in process memory.
+
+Keeping it correct across workers is the hard part. Gunicorn runs several
+processes, and an owner's write lands in only one of them. Every write bumps
+``gyms.settings_version`` in the same transaction (the listeners at the bottom
+of this module see to that, whoever does the writing), and a cached entry older
+than ``GYM_SETTINGS_CACHE_SECONDS`` re-reads that one integer before it is
+trusted again. So:
+
+* the worker that made the change sees it immediately — the listener drops its
+  entry outright;
+* every other worker sees it within ``GYM_SETTINGS_CACHE_SECONDS``, which is
+  the bound on a stale read;
+* an unchanged gym costs one primary-key SELECT per interval, not a settings
+  scan per request.
+
+Set ``GYM_SETTINGS_CACHE_SECONDS`` to 0 to turn the cache off entirely.
+"""
+import time
+from types import MappingProxyType
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.services import worker_cache
+
+#: Gyms kept per process. Least recently used are evicted first; a chain with
+#: more gyms than this just reloads the quiet ones.
+MAX_GYMS = 1024
+
+_EMPTY = MappingProxyType({})
+
+#: Monotonic, so a wall-clock change cannot make a stale entry look fresh.
+_clock = time.monotonic
+
+
+class _Entry:
+    __slots__ = ('values', 'version', 'checked_at', 'derived')
+
+    def __init__(self, values, version, checked_at):
+        self.values = values
+        self.version = version
+        self.checked_at = checked_at
+        self.derived = {}
+
+
+def _cache():
+    # One per Flask app (app/services/worker_cache.py). Entries are never
+    # expired by age here: past the interval they are revalidated against the
+    # gym's settings_version instead, and kept if it has not moved.
+    return worker_cache.for_app('gym_settings_cache', MAX_GYMS)
+
+
+def _ttl():
+    return worker_cache.seconds('GYM_SETTINGS_CACHE_SECONDS')
+
+
+def _read_version(gym_id):
+    from app.models.gym import Gym
+    return db.session.query(Gym.settings_version).filter(Gym.id == gym_id).scalar()
+
+
+def _read_values(gym_id):
+    from app.models.gym_setting import GymSetting
+    return MappingProxyType(dict(
+        db.session.query(GymSetting.key, GymSetting.value)
+        .filter(GymSetting.gym_id == gym_id).all()
+    ))
+
+
+def _entry(gym_id):
+    """The cached entry for this gym, loading or revalidating it as needed.
+
+    None when the cache is off. Raises whatever the database raises; callers
+    decide how to degrade.
+    """
+    ttl = _ttl()
+    if not ttl:
+        return None
+
+    cache = _cache()
+    now = _clock()
+    entry = cache.peek(gym_id)
+    if entry is not None and now - entry.checked_at < ttl:
+        return entry
+
+    # Past its interval (or absent): one indexed read tells us whether the
+    # settings moved. Version first, values second — a write that lands in
+    # between leaves us holding newer values under an older version, which the
+    # next check reloads, rather than the other way round.
+    version = _read_version(gym_id)
+    if entry is not None and entry.version == version:
+        entry.checked_at = now
+        return entry
+
+    return cache.put(gym_id, _Entry(_read_values(gym_id), version, now), now)
+
+
+def settings_for(gym_id):
+    """Every stored setting for this gym, as a read-only key -> value map.
+
+    Empty for ``None`` and for a gym whose settings cannot be read — callers
+    apply their own defaults, and an unreadable setting must never take down a
+    check-in or a closing.
+    """
+    if gym_id is None:
+        return _EMPTY
+    try:
+        entry = _entry(gym_id)
+        return entry.values if entry is not None else _read_values(gym_id)
+    except Exception:
+        return _EMPTY
+
+
+def derived(gym_id, name, compute):
+    """``compute(settings)``, cached alongside the settings it was built from.
+
+    For values that are expensive or pointless to rebuild on every call — the
+    resolved ``ZoneInfo`` — and that must be thrown away together with the
+    settings when they change.
+    """
+    try:
+        entry = _entry(gym_id) if gym_id is not None else None
+    except Exception:
+        entry = None
+    if entry is None:
+        return compute(settings_for(gym_id))
+    if name not in entry.derived:
+        entry.derived[name] = compute(entry.values)
+    return entry.derived[name]
+
+
+def invalidate(gym_id=None):
+    """Forget one gym's settings in this process, or every gym's."""
+    try:
+        cache = _cache()
+    except RuntimeError:
+        return  # No app context: nothing cached to drop.
+    if gym_id is None:
+        cache.drop()
+    else:
+        cache.discard([gym_id])
+
+
+# ──────────────────────────── write-through ─────────────────────────────────
+#
+# Attached to the model rather than to set_rules, so that every writer — the
+# settings routes, a migration, a test fixture adding a row by hand — bumps the
+# version other workers check. The UPDATE rides in the writer's own flush, so
+# it commits or rolls back with the setting itself.
+
+def _bump_version(connection, gym_id):
+    from app.models.gym import Gym
+
+    connection.execute(
+        Gym.__table__.update()
+        .where(Gym.__table__.c.id == gym_id)
+        .values(settings_version=Gym.__table__.c.settings_version + 1)
+    )
+    invalidate(gym_id)
+
+
+def _on_setting_write(mapper, connection, target):
+    _bump_version(connection, target.gym_id)
+
+
+def register_write_through():
+    from app.models.gym_setting import GymSetting
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        if not event.contains(GymSetting, event_name, _on_setting_write):
+            event.listen(GymSetting, event_name, _on_setting_write)
@@ -0,0 +1,206 @@
+"""What the per-worker caches share: the store, and dropping entries at commit.
+
+Four caches keep something in each worker's memory between requests — owner
+dashboard snapshots (app/services/dashboard_cache.py), branch scopes
+(app/services/scope_cache.py), gym settings (app/services/settings_cache.py)
+and accounts' revocation flags (app/services/principal.py). They differ in what
+they hold and in what makes an entry stale, and are alike in everything else:
+
+* :class:`WorkerCache` — an LRU map per Flask app (the test suite boots one app
+  per module, each on its own database, and they must not read each other's
+  entries), behind a lock, whose entries expire a configured number of seconds
+  after they were stored, with the hit/miss counters ``stats()`` reports and
+  ``gym_cache_lookups_total`` exports;
+* :class:`CommitTracker` — what a flush wrote is collected into
+  ``Session.info``, and the entries it moves are dropped when the session
+  commits, not before: dropped at flush, a request in this worker could
+  re-cache the old value between the write and its commit and keep it for a
+  whole interval. A rollback drops nothing.
+
+The caller passes the time in, from its own ``_clock``, so a test can move one
+cache's clock without touching the others.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services import metrics
+
+#: What :meth:`WorkerCache.get` returns for an absent or expired entry, so that
+#: None can be cached.
+MISSING = object()
+
+
+class WorkerCache:
+    """One cache's entries and counters, in one worker, for one app."""
+
+    def __init__(self, max_entries, metric=None):
+        self.max_entries = max_entries
+        self.metric = metric
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.invalidations = 0
+
+    def get(self, key, ttl, now):
+        """The value stored under ``key`` less than ``ttl`` seconds before
+        ``now``, or :data:`MISSING`. Counted as a hit or a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[1] < ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                value = entry[0]
+            else:
+                self.misses += 1
+                value = MISSING
+        if self.metric:
+            metrics.cache_lookup(self.metric, hit=value is not MISSING)
+        return value
+
+    def peek(self, key):
+        """The value under ``key`` whatever its age, or None; not counted.
+
+        For a cache that revalidates old entries rather than dropping them.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def bypass(self):
+        """Count a read that skipped the cache on purpose."""
+        with self.lock:
+            self.bypasses += 1
+
+    def put(self, key, value, now):
+        """Store ``value`` under ``key`` as of ``now``, evicting the least
+        recently used past ``max_entries``. Returns ``value``."""
+        with self.lock:
+            self.entries[key] = (value, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def discard(self, keys):
+        """Drop these keys. Returns how many were there."""
+        with self.lock:
+            dropped = [key for key in keys if key in self.entries]
+            for key in dropped:
+                del self.entries[key]
+            self.invalidations += len(dropped)
+        return len(dropped)
+
+    def drop(self, stale=None):
+        """Drop every entry ``stale(key, value)`` is true of, or every entry
+        without ``stale``. Returns how many went."""
+        with self.lock:
+            dropped = [key for key, (value, _) in self.entries.items()
+                       if stale is None or stale(key, value)]
+            for key in dropped:
+                del self.entries[key]
+            self.invalidations += len(dropped)
+        return len(dropped)
+
+    def clear(self):
+        """Forget every entry and zero the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.bypasses = self.invalidations = 0
+
+    def stats(self, ttl, size_key='entries'):
+        """Hit/miss counters for monitoring; ``size_key`` names the entry count."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': bool(ttl),
+                'ttl_seconds': ttl,
+                size_key: len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': (self.hits / lookups) if lookups else None,
+            }
+
+
+def for_app(extension_key, max_entries, metric=None):
+    """The current app's :class:`WorkerCache` under ``extension_key``, created
+    on first use. Raises RuntimeError outside an app context."""
+    from flask import current_app
+
+    cache = current_app.extensions.get(extension_key)
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            extension_key, WorkerCache(max_entries, metric))
+    return cache
+
+
+def seconds(config_key):
+    """A cache's interval from the app config; 0 (off) when unset."""
+    from flask import current_app
+    return current_app.config.get(config_key, 0)
+
+
+# ───────────────────────────── commit tracking ──────────────────────────────
+
+class CommitTracker:
+    """Collect at flush, apply at commit, forget at rollback.
+
+    The pending set lives in ``session.info[info_key]``: a set per name in
+    ``kinds``, plus an ``'all'`` flag for a write whose reach could not be
+    told. ``collect(session, pending)`` adds to it after each flush;
+    ``apply(pending)`` drops the cached entries once the session commits.
+    """
+
+    def __init__(self, info_key, kinds, collect, apply):
+        self.info_key = info_key
+        self.kinds = tuple(kinds)
+        self.collect = collect
+        self.apply = apply
+
+    def pending(self, session):
+        """This session's pending set, for writes the flush cannot see (bulk
+        UPDATEs) to be added to by hand."""
+        pending = session.info.get(self.info_key)
+        if pending is None:
+            pending = {kind: set() for kind in self.kinds}
+            pending['all'] = False
+            session.info[self.info_key] = pending
+        return pending
+
+    def _empty(self, pending):
+        return not pending['all'] and not any(pending[kind] for kind in self.kinds)
+
+    def _on_flush(self, session, flush_context):
+        pending = self.pending(session)
+        self.collect(session, pending)
+        if self._empty(pending):
+            session.info.pop(self.info_key, None)
+
+    def _on_commit(self, session):
+        pending = session.info.pop(self.info_key, None)
+        if pending is None or self._empty(pending):
+            return
+        try:
+            self.apply(pending)
+        except RuntimeError:
+            pass  # No app context: nothing cached here to drop.
+
+    def _on_rollback(self, session):
+        session.info.pop(self.info_key, None)
+
+    def register(self):
+        for event_name, listener in (
+            ('after_flush', self._on_flush),
+            ('after_commit', self._on_commit),
+            ('after_rollback', self._on_rollback),
+        ):
+            if not event.contains(Session, event_name, listener):
+                event.listen(Session, event_name, listener)
@@ -28,6 +28,14 @@ from .helpers import (
     auto_expire_subscriptions
 )
 
+from .cursor_pagination import (
+    InvalidCursor,
+    keyset_paginate,
+    format_cursor_pagination,
+    cursor_requested,
+    total_requested
+)
+
 from .client_auth import (
     client_token_required,
     get_current_client,
@@ -45,6 +53,11 @@ __all__ = [
     'user_can_access_branch',
     'paginate',
     'format_pagination_response',
+    'InvalidCursor',
+    'keyset_paginate',
+    'format_cursor_pagination',
+    'cursor_requested',
+    'total_requested',
     'success_response',
     'error_response',
     'calculate_branch_revenue',
@@ -4,8 +4,8 @@ Utility functions and decorators
 from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models.user import User, UserRole, BRANCH_GROUP_ROLES
-from app.extensions import db
+from app.models.user import UserRole, BRANCH_GROUP_ROLES
+from app.services.principal import current_user
 
 
 def role_required(*allowed_roles):
@@ -39,8 +39,7 @@ def role_required(*allowed_roles):
                     'error': 'Client access is not permitted on this endpoint',
                 }), 403
 
-            user_id = int(get_jwt_identity())
-            user = db.session.get(User, user_id)
+            user = current_user(int(get_jwt_identity()))
 
             if not user:
                 return jsonify({'success': False, 'error': 'Session expired. Please log in again.'}), 401
@@ -77,8 +76,7 @@ def branch_access_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
         verify_jwt_in_request()
-        user_id = int(get_jwt_identity())
-        user = db.session.get(User, user_id)
+        user = current_user(int(get_jwt_identity()))
         
         if not user:
             return jsonify({'success': False, 'error': 'Session expired. Please log in again.'}), 401
@@ -108,10 +106,13 @@ def branch_access_required(fn):
 
 
 def get_current_user():
-    """Get current authenticated user"""
+    """Get current authenticated user.
+
+    The request's principal (app/services/principal.py): loaded at most once
+    per request and shared with the account guard and the decorators above.
+    """
     verify_jwt_in_request()
-    user_id = int(get_jwt_identity())
-    return db.session.get(User, user_id)
+    return current_user(int(get_jwt_identity()))
 
 
 def get_accessible_branch_ids(user=None):
@@ -134,42 +135,19 @@ def get_accessible_branch_ids(user=None):
         user = get_current_user()
     if user.role == UserRole.SUPER_ADMIN:
         return None
-    if user.role in BRANCH_GROUP_ROLES:
-        return user.managed_branch_ids
-    # Gym-wide, but still only their own gym.
-    if user.role in (UserRole.OWNER, UserRole.CENTRAL_ACCOUNTANT):
-        return _gym_branch_ids(user)
+    # Gym-wide (but still only their own gym), or a managed group. Resolved
+    # through the scope cache: gym-wide roles hit this on most queries, and
+    # several endpoints call it more than once while assembling a response.
+    #
+    # Fails closed — a user whose gym cannot be resolved gets an empty list
+    # and therefore sees nothing, rather than falling back to "everything".
+    if user.role in BRANCH_GROUP_ROLES or user.role in (
+            UserRole.OWNER, UserRole.CENTRAL_ACCOUNTANT):
+        from app.services.scope_cache import scope_for
+        return list(scope_for(user).branch_ids)
     return [user.branch_id] if user.branch_id else []
 
 
-def _gym_branch_ids(user):
-    """Every branch id belonging to this user's gym.
-
-    Cached per request: gym-wide roles hit this on most queries, and several
-    endpoints call it more than once while assembling a response.
-
-    Fails closed — a user whose gym cannot be resolved gets an empty list and
-    therefore sees nothing, rather than falling back to "everything".
-    """
-    from flask import g
-
-    gym_id = get_current_gym_id(user)
-    if gym_id is None:
-        return []
-
-    cache = getattr(g, '_gym_branch_ids_cache', None)
-    if cache is None:
-        cache = {}
-        g._gym_branch_ids_cache = cache
-    if gym_id not in cache:
-        from app.models.branch import Branch
-        cache[gym_id] = [
-            row[0] for row in
-            db.session.query(Branch.id).filter(Branch.gym_id == gym_id).all()
-        ]
-    return cache[gym_id]
-
-
 def user_can_access_branch(branch, user=None):
     """Whether the user may read/write this specific branch.
 
@@ -220,9 +198,8 @@ def get_current_gym_id(user=None):
     if user.role == UserRole.SUPER_ADMIN:
         return None  # super admin is above gym scope
     if user.role == UserRole.OWNER:
-        from app.models.gym import Gym
-        gym = Gym.query.filter_by(owner_id=user.id).first()
-        return gym.id if gym else None
+        from app.services.scope_cache import scope_for
+        return scope_for(user).gym_id
     return user.gym_id
 
 
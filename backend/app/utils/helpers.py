@@ -3,28 +3,22 @@ Helper utility functions
 """
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select, update
 from app.extensions import db
 from app.models.transaction import Transaction, PaymentMethod, TransactionType
 from app.models.subscription import Subscription, SubscriptionStatus
 from app.models.expense import Expense, ExpenseStatus
 from app.models.complaint import Complaint, ComplaintStatus
-from app.models.transaction import net_amount
 
 
 def calculate_branch_revenue(branch_id, start_date=None, end_date=None):
-    """Calculate total revenue for a branch in date range, net of discount."""
-    total = db.session.query(func.sum(net_amount())).filter(
-        Transaction.branch_id == branch_id
-    )
-    
-    if start_date:
-        total = total.filter(Transaction.transaction_date >= start_date)
-    if end_date:
-        total = total.filter(Transaction.transaction_date <= end_date)
-    
-    result = total.scalar()
-    return float(result) if result else 0.0
+    """Calculate total revenue for a branch in date range, net of discount.
+
+    Both bounds are inclusive business days in the gym's timezone (a datetime
+    is taken at its date), read from the daily revenue rollups.
+    """
+    from app.services.revenue_rollup import net_revenue
+    return net_revenue(start=start_date, end=end_date, branch_ids=[branch_id])
 
 
 def get_expiring_subscriptions(days=7, branch_id=None):
@@ -132,6 +126,9 @@ def get_active_customers_count(branch_id=None):
 def compare_branches_performance(start_date=None, end_date=None):
     """Compare revenue performance across all branches.
 
+    start_date and end_date are inclusive business days (see
+    calculate_branch_revenue).
+
     One grouped query per metric across every branch, instead of the
     previous 5-queries-per-branch loop (calculate_branch_revenue,
     get_active_customers_count, plus 3 more .count() calls each) — this
@@ -147,14 +144,16 @@ def compare_branches_performance(start_date=None, end_date=None):
     if not branch_ids:
         return []
 
-    revenue_query = db.session.query(
-        Transaction.branch_id, func.sum(net_amount())
-    ).filter(Transaction.branch_id.in_(branch_ids))
-    if start_date:
-        revenue_query = revenue_query.filter(Transaction.transaction_date >= start_date)
-    if end_date:
-        revenue_query = revenue_query.filter(Transaction.transaction_date <= end_date)
-    revenue_by_branch = dict(revenue_query.group_by(Transaction.branch_id).all())
+    # Revenue from the daily rollups: inclusive business days, one row per
+    # branch and day however many transactions those days hold.
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+    from app.services.revenue_rollup import rollup_sums
+    revenue_by_branch = {
+        row[0]: row[1] for row in rollup_sums(
+            DailyRevenueRollup.branch_id, start=start_date, end=end_date,
+            branch_ids=branch_ids,
+        ).all()
+    }
 
     active_customers_by_branch = dict(
         db.session.query(Customer.branch_id, func.count(func.distinct(Customer.id)))
@@ -262,40 +261,99 @@ def validate_subscription_dates(start_date, end_date):
     return True, None
 
 
-def auto_expire_subscriptions():
-    """Auto-expire subscriptions that have passed their end date"""
-    today = date.today()
-    
-    expired = Subscription.query.filter(
-        Subscription.status == SubscriptionStatus.ACTIVE,
-        Subscription.end_date < today
-    ).all()
-    
-    count = 0
-    for sub in expired:
-        sub.status = SubscriptionStatus.EXPIRED
-        
-        # Deactivate associated fingerprints
-        from app.models.fingerprint import Fingerprint
-        fingerprints = Fingerprint.query.filter_by(
-            customer_id=sub.customer_id,
-            is_active=True
-        ).all()
-        
-        for fp in fingerprints:
-            # Check if customer has other active subscriptions
-            other_active = Subscription.query.filter(
-                Subscription.customer_id == sub.customer_id,
-                Subscription.id != sub.id,
-                Subscription.status == SubscriptionStatus.ACTIVE
-            ).first()
-            
-            if not other_active:
-                fp.deactivate("Subscription expired")
-        
-        count += 1
-    
-    if count > 0:
+#: Subscriptions expired per transaction by auto_expire_subscriptions.
+EXPIRY_CHUNK_SIZE = 1000
+
+
+def auto_expire_subscriptions(limit=None, chunk_size=EXPIRY_CHUNK_SIZE, today=None):
+    """Expire active subscriptions past their end date, and lock out members
+    left with nothing that opens the door.
+
+    Set-based, a chunk at a time: one SELECT pages through the overdue ids by
+    keyset (``id > last``), one UPDATE expires the chunk, and one UPDATE
+    deactivates the fingerprints of that chunk's members who no longer hold a
+    current active subscription whose service grants entry. Three statements
+    and a commit per ``chunk_size`` rows, however many fingerprints there are.
+    It used to load every overdue row and run two queries per fingerprint.
+
+    ``limit`` caps the rows handled in this call; the scheduled job
+    (app/services/housekeeping.py) passes its batch size and calls again.
+
+    Returns ``{'expired': n, 'fingerprints_deactivated': n, 'by_gym': {gym_id:
+    n}}``; a branch with no gym counts under None.
+    """
+    from app.models.branch import Branch
+    from app.models.fingerprint import Fingerprint
+    from app.models.service import Service
+
+    today = today or date.today()
+    result = {'expired': 0, 'fingerprints_deactivated': 0, 'by_gym': {}}
+    last_id = 0
+
+    while limit is None or result['expired'] < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - result['expired'])
+        chunk = db.session.query(
+            Subscription.id, Subscription.customer_id, Branch.gym_id,
+        ).outerjoin(Branch, Subscription.branch_id == Branch.id).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.end_date < today,
+            Subscription.id > last_id,
+        ).order_by(Subscription.id).limit(size).all()
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        # Whole seconds: the MySQL read-back below matches on this stamp, and
+        # a DATETIME column there keeps no fractions.
+        now = datetime.utcnow().replace(microsecond=0)
+
+        gym_of = {row.id: row.gym_id for row in chunk}
+        expire = update(Subscription).where(
+            Subscription.id.in_(list(gym_of)),
+            # Re-checked, so a row renewed since the SELECT is left alone.
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.end_date < today,
+        ).values(
+            status=SubscriptionStatus.EXPIRED, updated_at=now,
+        ).execution_options(synchronize_session=False)
+        if db.engine.dialect.update_returning:
+            expired_ids = db.session.execute(
+                expire.returning(Subscription.id)).scalars().all()
+        else:
+            # MySQL has no UPDATE ... RETURNING. The rows this UPDATE expired
+            # are still locked by this transaction, so reading back the
+            # chunk's rows carrying its stamp finds exactly those.
+            db.session.execute(expire)
+            expired_ids = db.session.execute(
+                select(Subscription.id).where(
+                    Subscription.id.in_(list(gym_of)),
+                    Subscription.status == SubscriptionStatus.EXPIRED,
+                    Subscription.updated_at == now,
+                )
+            ).scalars().all()
+
+        still_admitted = db.session.query(Subscription.id).join(
+            Service, Subscription.service_id == Service.id,
+        ).filter(
+            Subscription.customer_id == Fingerprint.customer_id,
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.end_date >= today,
+            Service.grants_gym_entry.is_(True),
+        ).exists()
+        deactivated = Fingerprint.query.filter(
+            Fingerprint.customer_id.in_(sorted({row.customer_id for row in chunk})),
+            Fingerprint.is_active.is_(True),
+            ~still_admitted,
+        ).update({'is_active': False, 'deactivated_at': now,
+                  'deactivation_reason': 'Subscription expired'},
+                 synchronize_session=False)
         db.session.commit()
-    
-    return count
+
+        result['expired'] += len(expired_ids)
+        result['fingerprints_deactivated'] += deactivated
+        for subscription_id in expired_ids:
+            gym_id = gym_of[subscription_id]
+            result['by_gym'][gym_id] = result['by_gym'].get(gym_id, 0) + 1
+        if len(chunk) < size:
+            break
+
+    return result
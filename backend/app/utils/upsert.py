@@ -0,0 +1,72 @@
+"""
+One INSERT ... ON CONFLICT for every dialect the app runs on.
+
+The summary tables — revenue rollups, attendance summaries, occupancy
+buckets, customer search entries, message threads — are kept by listeners
+that add to a row or create it, inside the writer's flush. Doing that as
+"UPDATE, and INSERT if nothing matched" lets two writers flushing at once both
+miss the row and both insert it, so where the database has a single-statement
+upsert it is used: ``ON CONFLICT DO UPDATE`` on Postgres and SQLite,
+``ON DUPLICATE KEY UPDATE`` on MySQL. Anything else gets the two statements.
+
+:func:`upsert` writes whichever applies. ``set_`` says what a conflicting row
+becomes; it is called with the incoming row (``excluded`` / ``inserted``, or
+the values themselves where there is neither), so the same expression — a
+running total, a "keep the newer one" CASE — serves every dialect::
+
+    upsert(connection, table, values, ['branch_id', 'minute'],
+           lambda new: {'entries': table.c.entries + new.entries})
+"""
+from sqlalchemy import and_, literal
+
+
+class _Incoming:
+    """The incoming row's values as typed literals, for the two-statement
+    path: ``new.entries`` and ``new['entries']`` as on ``excluded``."""
+
+    def __init__(self, table, values):
+        self._table = table
+        self._values = values
+
+    def __getitem__(self, name):
+        return literal(self._values[name], self._table.c[name].type)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def upsert(connection, table, values, index_elements, set_):
+    """Insert ``values`` into ``table``, or update the row they collide with.
+
+    ``index_elements`` names the columns of the unique key the collision is
+    on; ``set_(new)`` returns ``{column name: expression}`` for the existing
+    row, ``new`` being the incoming one.
+    """
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c[name] for name in index_elements],
+            set_=set_(statement.excluded),
+        ))
+        return
+
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(**values)
+        connection.execute(statement.on_duplicate_key_update(**set_(statement.inserted)))
+        return
+
+    match = and_(*(table.c[name] == values[name] for name in index_elements))
+    updated = connection.execute(
+        table.update().where(match).values(**set_(_Incoming(table, values))))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(**values))
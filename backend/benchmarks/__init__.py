@@ -0,0 +1 @@
+"""Load benchmarks, run by hand against a throwaway database (see each module)."""
@@ -0,0 +1,372 @@
+"""Hot endpoints on a production-sized database, measured against a baseline.
+
+Builds a synthetic database with seed.py's scale mode (``--scale`` gyms of
+~7,500 members and ~220,000 check-ins each; kept in the temp directory and
+reused by later runs of the same size on the same day), boots
+``create_app('testing')`` on it, and times each endpoint below through the
+Flask test client: the two door scans, the member app's stats and QR, the
+owner and accountant dashboards, the reports, customer search and the first
+page of each staff list. For each it records the p50 and p95 latency and the
+statements one request runs.
+
+The two halves of the result are kept apart, because only one of them
+travels:
+
+* **query counts** are the same on every machine, so they are checked in, in
+  benchmarks/endpoint_queries.json. A run that makes any endpoint run more
+  statements than that file says exits 1, on a fresh clone as anywhere else;
+  a change that means to alter them records them again (``--update-baseline``
+  rewrites both files) and commits the file with it;
+* **latencies** belong to the machine, so they stay in
+  benchmarks/baselines/endpoints.json, which is git-ignored. The first run
+  records it; a later one exits 1 if any endpoint got slower than
+  ``--threshold`` (25% by default, plus ``--noise-ms`` of slack for the
+  sub-millisecond ones). Record it on the branch you start from, then run
+  again on your change:
+
+    python -m benchmarks.endpoints --update-baseline
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --only dashboard_owner --iterations 100
+
+The dashboards are measured uncached (the testing config turns the owner
+dashboard cache off), which is the cost a cache miss pays.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baselines', 'endpoints.json')
+QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'endpoint_queries.json')
+
+#: The settings a baseline or a set of query counts is only comparable at.
+COMPARABLE = ('scale', 'seed', 'members_per_branch')
+
+
+class BenchmarkError(Exception):
+    """An endpoint answered with an error, so its timing means nothing."""
+
+
+# ───────────────────────────── the endpoints ────────────────────────────────
+
+def _cases(world):
+    """(name, who, method, path, body) for every endpoint measured.
+
+    ``who`` is 'owner', 'accountant', 'desk' or 'member'. ``path`` and
+    ``body`` may be functions of the iteration number, so the door scans let a
+    different member in each time rather than the same one over and over.
+    """
+    branch_id = world['branch_id']
+    members = world['members']
+
+    def member(i):
+        return members[i % len(members)]
+
+    return [
+        ('qr_scan', 'desk', 'POST', '/api/qr/scan',
+         lambda i: {'qr_code': f'GYM-{member(i)}', 'branch_id': branch_id}),
+        ('entry_log_scan', 'desk', 'POST', '/api/entry-logs/scan',
+         lambda i: {'customer_id': member(i + len(members) // 2)}),
+        ('client_stats', 'member', 'GET', '/api/client/stats', None),
+        ('client_qr', 'member', 'GET', '/api/client/qr', None),
+        ('dashboard_owner', 'owner', 'GET', '/api/dashboards/owner', None),
+        ('dashboard_accountant', 'accountant', 'GET', '/api/dashboards/accountant', None),
+        ('reports_revenue', 'accountant', 'GET', '/api/reports/revenue', None),
+        ('reports_daily', 'accountant', 'GET', '/api/reports/daily', None),
+        ('reports_weekly', 'accountant', 'GET', '/api/reports/weekly', None),
+        ('reports_monthly', 'accountant', 'GET', '/api/reports/monthly', None),
+        ('reports_revenue_trend', 'accountant', 'GET', '/api/reports/revenue-trend', None),
+        ('reports_expenses_by_category', 'accountant', 'GET',
+         '/api/reports/expenses-by-category', None),
+        ('reports_branch_comparison', 'owner', 'GET', '/api/reports/branch-comparison', None),
+        ('reports_employee_performance', 'owner', 'GET',
+         '/api/reports/employee-performance', None),
+        ('customer_search_name', 'desk', 'GET',
+         f"/api/customers/search?q={world['last_name']}", None),
+        ('customer_search_phone', 'desk', 'GET',
+         f"/api/customers/search?q={world['phone_prefix']}", None),
+        ('list_transactions', 'accountant', 'GET', '/api/transactions', None),
+        ('list_payments', 'accountant', 'GET', '/api/payments', None),
+        ('list_subscriptions', 'desk', 'GET', '/api/subscriptions', None),
+        ('list_customers', 'desk', 'GET', '/api/customers', None),
+        ('list_entry_logs', 'desk', 'GET', '/api/validation/entry-logs', None),
+    ]
+
+
+# ───────────────────────────── the database ─────────────────────────────────
+
+def build_app(scale, seed, members_per_branch, fresh=False):
+    """The testing app on a synthetic database of ``scale`` gyms.
+
+    The database file is named after its settings and today's date (the data
+    is dated relative to today), so a second run reuses the first's.
+    """
+    path = os.path.join(tempfile.gettempdir(), (
+        f'gym-bench-{scale}x{members_per_branch}-seed{seed}-'
+        f'{date.today().isoformat()}.db'))
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    existing = os.path.exists(path)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path.replace(os.sep, '/')
+
+    import seed as seed_script
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app('testing')
+    if not existing:
+        print(f'Building {scale} synthetic gym(s) in {path}...', file=sys.stderr)
+        with app.app_context():
+            db.create_all()
+            seed_script.build_at_scale(scale, seed=seed,
+                                       members_per_branch=members_per_branch)
+            db.session.commit()
+            seed_script.rebuild_summaries()
+    return app
+
+
+def _world(app):
+    """The accounts and ids the cases need, all from the first gym."""
+    from sqlalchemy import func
+    from app.extensions import db
+    from app.models import Customer, EntryLog, Subscription, SubscriptionStatus, User
+
+    with app.app_context():
+        desk = User.query.filter_by(username='scale1_desk1').one()
+        members = [customer_id for (customer_id,) in db.session.query(Subscription.customer_id)
+                   .filter(Subscription.branch_id == desk.branch_id,
+                           Subscription.status == SubscriptionStatus.ACTIVE,
+                           Subscription.end_date >= date.today())
+                   .order_by(Subscription.customer_id)]
+        if not members:
+            raise BenchmarkError('No member with an active subscription at the first branch')
+        # The member app is measured as the most frequent visitor still
+        # holding a membership: the heaviest stats screen there is.
+        regular = db.session.query(EntryLog.customer_id) \
+            .filter(EntryLog.customer_id.in_(members)) \
+            .group_by(EntryLog.customer_id) \
+            .order_by(func.count(EntryLog.id).desc(), EntryLog.customer_id).first()[0]
+        last_name = db.session.get(Customer, members[0]).full_name.split()[-1]
+        phone = db.session.get(Customer, members[0]).phone
+        return {
+            'branch_id': desk.branch_id,
+            'members': members,
+            'regular': regular,
+            'last_name': last_name,
+            'phone_prefix': phone[:7],
+        }
+
+
+def _headers(app, world):
+    from app.utils.client_auth import create_client_token
+
+    client = app.test_client()
+    headers = {}
+    for who, username in (('owner', 'scale1_owner'), ('accountant', 'scale1_accountant'),
+                          ('desk', 'scale1_desk1')):
+        response = client.post('/api/auth/login',
+                               json={'username': username, 'password': 'scale123'})
+        if response.status_code != 200:
+            raise BenchmarkError(f'{username} could not sign in: {response.get_json()}')
+        headers[who] = {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+    with app.app_context():
+        headers['member'] = {'Authorization': 'Bearer ' + create_client_token(world['regular'])}
+    return headers
+
+
+# ───────────────────────────── measuring ────────────────────────────────────
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def measure(app, case, headers, iterations, warmup):
+    """Time one endpoint: {'p50_ms', 'p95_ms', 'queries', 'n'}."""
+    from app.services.query_profiler import collect_queries
+
+    name, who, method, path, body = case
+    client = app.test_client()
+    timings, queries = [], []
+    for i in range(warmup + iterations):
+        url = path(i) if callable(path) else path
+        payload = body(i) if callable(body) else body
+        with collect_queries() as log:
+            started = time.perf_counter()
+            response = client.open(url, method=method, headers=headers[who], json=payload)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise BenchmarkError(
+                f'{name}: {method} {url} answered {response.status_code}: '
+                f'{response.get_data(as_text=True)[:300]}')
+        if i >= warmup:
+            timings.append(elapsed)
+            queries.append(log.count)
+
+    timings.sort()
+    return {
+        'p50_ms': round(_percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        # The most any one request ran: the scans vary by member.
+        'queries': max(queries),
+        'n': len(timings),
+    }
+
+
+def run(app, iterations=30, warmup=3, only=None):
+    """Measure every endpoint (or those named in ``only``): {name: result}."""
+    world = _world(app)
+    headers = _headers(app, world)
+    results = {}
+    for case in _cases(world):
+        if only and case[0] not in only:
+            continue
+        results[case[0]] = measure(app, case, headers, iterations, warmup)
+    return results
+
+
+def compare(results, baseline=None, threshold=0.25, noise_ms=2.0, queries=None):
+    """The regressions: [(name, measure, before, now)].
+
+    A latency regresses against ``baseline`` past ``before * (1 + threshold)
+    + noise_ms``; a query count regresses against ``queries`` (the checked-in
+    counts) by going up at all. Either may be None, and endpoints missing
+    from either side are not compared.
+    """
+    latencies = (baseline or {}).get('endpoints', {})
+    counts = (queries or {}).get('endpoints', {})
+    regressions = []
+    for name, now in results.items():
+        if name in counts and now['queries'] > counts[name]:
+            regressions.append((name, 'queries', counts[name], now['queries']))
+        before = latencies.get(name)
+        if before is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if now[key] > before[key] * (1 + threshold) + noise_ms:
+                regressions.append((name, key, before[key], now[key]))
+    return regressions
+
+
+def _report(results, baseline, queries):
+    latencies = (baseline or {}).get('endpoints', {})
+    counts = (queries or {}).get('endpoints', {})
+    print(f"{'endpoint':<32}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}   baseline p50/p95/queries")
+    for name, now in results.items():
+        before = latencies.get(name)
+        was = (f"{before['p50_ms']:.1f} / {before['p95_ms']:.1f}" if before else '- / -')
+        was += f" / {counts.get(name, '-')}"
+        print(f"{name:<32}{now['p50_ms']:>10.1f}{now['p95_ms']:>10.1f}{now['queries']:>9}   {was}")
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _comparable(recorded, settings):
+    return recorded is None or all(recorded.get(key) == settings[key] for key in COMPARABLE)
+
+
+def _record(path, recorded, previous, partial):
+    """Write ``recorded`` to ``path``; a ``partial`` run (``--only``) keeps the
+    endpoints it did not measure from ``previous``."""
+    if previous is not None and partial:
+        recorded['endpoints'] = dict(previous.get('endpoints', {}), **recorded['endpoints'])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(recorded, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1, help='synthetic gyms (default: 1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--members-per-branch', type=int, default=None,
+                        help="members per branch (default: seed.py's)")
+    parser.add_argument('--iterations', type=int, default=30,
+                        help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='untimed requests per endpoint first')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='measure only these endpoints')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='latency baseline JSON file (per machine)')
+    parser.add_argument('--queries', default=QUERIES,
+                        help='query count JSON file (checked in)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='record this run as the baseline and the query counts '
+                             'instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='latency growth allowed, as a fraction (default: 0.25)')
+    parser.add_argument('--noise-ms', type=float, default=2.0,
+                        help='latency growth always allowed, in ms (default: 2)')
+    parser.add_argument('--fresh', action='store_true',
+                        help='rebuild the synthetic database even if one exists')
+    args = parser.parse_args(argv)
+
+    import seed as seed_script
+
+    logging.getLogger('app.services.query_profiler').setLevel(logging.ERROR)
+    settings = {
+        'scale': args.scale,
+        'seed': args.seed,
+        'members_per_branch': args.members_per_branch or seed_script.SCALE_MEMBERS_PER_BRANCH,
+    }
+    app = build_app(fresh=args.fresh, **settings)
+    results = run(app, iterations=args.iterations, warmup=args.warmup, only=args.only)
+
+    baseline = _load(args.baseline)
+    queries = _load(args.queries)
+    for name, loaded in (('latencies', baseline), ('query counts', queries)):
+        if not args.update_baseline and not _comparable(loaded, settings):
+            mismatched = [key for key in COMPARABLE if loaded.get(key) != settings[key]]
+            print(f"The {name} were taken at other settings ({', '.join(mismatched)}); "
+                  'rerun with those, or record new ones with --update-baseline.')
+            return 2
+    _report(results, baseline, queries)
+
+    if args.update_baseline:
+        # A new recording at other settings starts over rather than merging.
+        baseline = baseline if _comparable(baseline, settings) else None
+        queries = queries if _comparable(queries, settings) else None
+    if args.update_baseline or baseline is None:
+        _record(args.baseline, dict(
+            settings, recorded_at=datetime.utcnow().isoformat(timespec='seconds'),
+            machine=platform.node(), python=platform.python_version(),
+            iterations=args.iterations,
+            endpoints={name: {key: result[key] for key in ('p50_ms', 'p95_ms', 'n')}
+                       for name, result in results.items()},
+        ), baseline, args.only)
+        print(f'\nBaseline recorded in {args.baseline}')
+        baseline = None  # Nothing to compare latencies with: they were just taken.
+    if args.update_baseline or queries is None:
+        _record(args.queries, dict(
+            settings, endpoints={name: result['queries'] for name, result in results.items()},
+        ), queries, args.only)
+        print(f'Query counts recorded in {args.queries}')
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.noise_ms, queries)
+    if not regressions:
+        print('\nNo regressions against the baseline.')
+        return 0
+    print(f'\n{len(regressions)} regression(s):')
+    for name, key, before, now in regressions:
+        print(f'  {name}: {key} {before} -> {now}')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
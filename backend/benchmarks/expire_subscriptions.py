@@ -0,0 +1,186 @@
+"""Subscription expiry at scale: the set-based pipeline against the old loop.
+
+Builds a throwaway SQLite database with ``--subscriptions`` subscriptions
+(100,000 by default) spread over ``--gyms`` gyms: two per member, a
+fingerprint each, and ``--overdue`` of the members holding only lapsed ones.
+Then times ``auto_expire_subscriptions`` — the chunked UPDATEs — and reports
+statements issued, wall time and the per-gym counts.
+
+``--compare`` also times the previous row-by-row implementation (kept below
+for exactly this) on an identical copy of the database. It issues a couple
+of queries per fingerprint, so expect it to take minutes at 100k.
+
+    python -m benchmarks.expire_subscriptions
+    python -m benchmarks.expire_subscriptions --subscriptions 20000 --compare
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TODAY = date(2026, 3, 15)
+
+
+def _build(path, args):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path.replace(os.sep, '/')
+    from sqlalchemy import insert
+
+    from app import create_app
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.fingerprint import Fingerprint
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription
+    from app.models.user import User, UserRole
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        branches = []
+        for g in range(args.gyms):
+            owner = User(username=f'bench{g}', email=f'bench{g}@example.com',
+                         full_name='Owner', role=UserRole.OWNER, is_active=True,
+                         password_hash='x')
+            db.session.add(owner)
+            db.session.flush()
+            gym = Gym(name=f'Bench gym {g}', owner_id=owner.id, is_setup_complete=True)
+            db.session.add(gym)
+            db.session.flush()
+            branch = Branch(name=f'Bench branch {g}', code=f'B{g}', gym_id=gym.id,
+                            is_active=True)
+            db.session.add(branch)
+            db.session.flush()
+            branches.append(branch.id)
+        service = Service(name='Gym', service_type=ServiceType.GYM, price=500,
+                          duration_days=30, allowed_days_per_week=7, grants_gym_entry=True)
+        db.session.add(service)
+        db.session.commit()
+
+        members = args.subscriptions // 2
+        now = datetime.utcnow()
+        db.session.execute(insert(Customer), [
+            {'full_name': f'Member {n}', 'phone': f'07{n:09d}',
+             'branch_id': branches[n % len(branches)], 'is_active': True,
+             'created_at': now}
+            for n in range(members)
+        ])
+        first_id = db.session.query(db.func.min(Customer.id)).scalar()
+        db.session.execute(insert(Fingerprint), [
+            {'customer_id': first_id + n, 'fingerprint_hash': f'print-{n}',
+             'template_hash': f'tmpl-{n}', 'is_active': True, 'created_at': now}
+            for n in range(members)
+        ])
+        overdue_every = max(1, round(1 / args.overdue)) if args.overdue else 0
+        db.session.execute(insert(Subscription), [
+            {'customer_id': first_id + (n % members), 'service_id': service.id,
+             'branch_id': branches[(n % members) % len(branches)],
+             'start_date': TODAY - timedelta(days=60),
+             'end_date': TODAY - timedelta(days=1 + n % 20)
+             if overdue_every and (n % members) % overdue_every == 0
+             else TODAY + timedelta(days=1 + n % 20),
+             'status': 'ACTIVE', 'subscription_type': 'time_based',
+             'created_at': now, 'updated_at': now}
+            for n in range(args.subscriptions)
+        ])
+        db.session.commit()
+    return app
+
+
+def _legacy_expire(today):
+    """The implementation this replaced: ORM rows, queries per fingerprint."""
+    from app.extensions import db
+    from app.models.fingerprint import Fingerprint
+    from app.models.subscription import Subscription, SubscriptionStatus
+
+    expired = Subscription.query.filter(
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.end_date < today,
+    ).all()
+    count = 0
+    for sub in expired:
+        sub.status = SubscriptionStatus.EXPIRED
+        for fp in Fingerprint.query.filter_by(customer_id=sub.customer_id, is_active=True).all():
+            other_active = Subscription.query.filter(
+                Subscription.customer_id == sub.customer_id,
+                Subscription.id != sub.id,
+                Subscription.status == SubscriptionStatus.ACTIVE,
+            ).first()
+            if not other_active:
+                fp.deactivate('Subscription expired')
+        count += 1
+    db.session.commit()
+    return {'expired': count}
+
+
+def _timed(app, label, fn):
+    from sqlalchemy import event
+    from app.extensions import db
+
+    with app.app_context():
+        statements = [0]
+
+        def _count(*_):
+            statements[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', _count)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            elapsed = time.perf_counter() - started
+            event.remove(db.engine, 'before_cursor_execute', _count)
+        print(f'{label:<12} {elapsed:8.2f}s  {statements[0]:>8} statement(s)  '
+              f'expired {result["expired"]}')
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--subscriptions', type=int, default=100_000)
+    parser.add_argument('--gyms', type=int, default=10)
+    parser.add_argument('--overdue', type=float, default=0.3,
+                        help='Fraction of members whose subscriptions have all lapsed.')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--compare', action='store_true',
+                        help='Also time the previous row-by-row implementation.')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'expiry.db')
+    started = time.perf_counter()
+    app = _build(path, args)
+    print(f'Built {args.subscriptions} subscriptions over {args.gyms} gyms '
+          f'in {time.perf_counter() - started:.1f}s')
+    if args.compare:
+        shutil.copy(path, path + '.legacy')
+
+    from app.utils.helpers import auto_expire_subscriptions
+    result = _timed(app, 'set-based', lambda: auto_expire_subscriptions(
+        chunk_size=args.chunk_size, today=TODAY))
+    print(f'             fingerprints deactivated {result["fingerprints_deactivated"]}')
+    for gym_id, count in sorted(result['by_gym'].items()):
+        print(f'             gym {gym_id}: {count}')
+
+    if args.compare:
+        _timed(_legacy_app(path + '.legacy'), 'row-by-row', lambda: _legacy_expire(TODAY))
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _legacy_app(path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path.replace(os.sep, '/')
+    from app import create_app
+    return create_app('testing')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Login storm: how logins and everything else fare when the front desk signs in.
+
+Starts the app on a threaded local server (standing in for a gunicorn
+``gthread`` worker), then fires a burst of concurrent logins while a steady
+trickle of ordinary authenticated requests (``GET /api/auth/me``) measures
+what the rest of the API feels like meanwhile. Reports login throughput and
+the latency percentiles of the ordinary requests, before and during the
+storm.
+
+Run it twice to compare hashing inline with hashing in the pool:
+
+    python -m benchmarks.login_storm --hash-workers 0
+    python -m benchmarks.login_storm --hash-workers 2
+
+``--rounds`` sets PASSWORD_HASH_ROUNDS, so the cost of a deployment's chosen
+setting can be measured before it is chosen.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _build_app(args):
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+    from app.models.user import User, UserRole
+
+    app = create_app('testing')
+    app.config['PASSWORD_HASH_WORKERS'] = args.hash_workers
+    app.config['PASSWORD_HASH_ROUNDS'] = args.rounds
+    with app.app_context():
+        db.create_all()
+        for n in range(args.accounts):
+            user = User(username=f'storm{n}', email=f'storm{n}@example.com',
+                        full_name=f'Storm {n}', role=UserRole.SUPER_ADMIN, is_active=True)
+            user.set_password('secret123')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def _request(base, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base + path, data=data, headers=headers)
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def _login(base, n):
+    return _request(base, '/api/auth/login',
+                    {'username': f'storm{n}', 'password': 'secret123'})['data']['access_token']
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'n': len(ordered), 'p50_ms': round(pick(0.50), 1),
+            'p95_ms': round(pick(0.95), 1), 'p99_ms': round(pick(0.99), 1),
+            'max_ms': round(ordered[-1] * 1000, 1)}
+
+
+def _probe(base, token, stop, samples, interval):
+    while not stop.is_set():
+        started = time.perf_counter()
+        _request(base, '/api/auth/me', token=token)
+        samples.append(time.perf_counter() - started)
+        time.sleep(interval)
+
+
+def _measure_probe(base, token, seconds, interval):
+    samples, stop = [], threading.Event()
+    thread = threading.Thread(target=_probe, args=(base, token, stop, samples, interval))
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hash-workers', type=int, default=1,
+                        help='PASSWORD_HASH_WORKERS (0 hashes inline)')
+    parser.add_argument('--rounds', type=int, default=29000,
+                        help='PASSWORD_HASH_ROUNDS')
+    parser.add_argument('--logins', type=int, default=200,
+                        help='logins in the storm')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='logins in flight at once')
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--probe-interval', type=float, default=0.01,
+                        help='seconds between ordinary requests')
+    args = parser.parse_args(argv)
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = _build_app(args)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    try:
+        token = _login(base, 0)  # also warms the pool
+        baseline = _measure_probe(base, token, 2.0, args.probe_interval)
+
+        samples, stop = [], threading.Event()
+        probe = threading.Thread(target=_probe,
+                                 args=(base, token, stop, samples, args.probe_interval))
+        probe.start()
+        login_times = []
+
+        def one_login(i):
+            started = time.perf_counter()
+            _login(base, i % args.accounts)
+            login_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(one_login, range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+    finally:
+        server.shutdown()
+        from app.services.password_hashing import shutdown
+        shutdown()
+
+    report = {
+        'hash_workers': args.hash_workers,
+        'rounds': args.rounds,
+        'logins': args.logins,
+        'concurrency': args.concurrency,
+        'logins_per_second': round(args.logins / elapsed, 1),
+        'login_latency': _percentiles(login_times),
+        'other_requests_before': _percentiles(baseline),
+        'other_requests_during': _percentiles(samples),
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""The list serializers, old against new, on a production-sized database.
+
+Reads one page of each staff list (transactions, subscriptions, entry logs,
+customers) both ways, on the synthetic database benchmarks/endpoints.py
+builds:
+
+* **objects** — the route as it was: model objects loaded by the query (with
+  the eager loads the route had), then ``TransactionSchema``/``SubscriptionSchema``
+  or ``to_dict()``;
+* **rows** — app/schemas/rows.py: ``RowSerializer.select`` on the same query,
+  then ``RowSerializer.dump``.
+
+For each it reports the p50 time to a list of dicts and the statements run,
+at each ``--per-page``, and fails if the two lists differ. Each
+iteration starts from an empty session, as a request does, so the identity
+map does not flatter the objects path.
+
+    python -m benchmarks.serializers
+    python -m benchmarks.serializers --per-page 20 100 --iterations 50
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _lists():
+    """(name, query, dump objects, row serializer, dump rows) per list."""
+    from sqlalchemy.orm import joinedload
+    from app.models import Customer, EntryLog, Subscription, Transaction
+    from app.schemas import SubscriptionSchema, TransactionSchema
+    from app.schemas.rows import (
+        CUSTOMER_ROWS, ENTRY_LOG_ROWS, SUBSCRIPTION_ROWS, TRANSACTION_ROWS, customer_items,
+    )
+
+    def customers_as_objects(customers):
+        active = Customer.batch_has_active_subscription([c.id for c in customers])
+        return [c.to_dict(include_temp_password=True, has_active_subscription=c.id in active)
+                for c in customers]
+
+    def customers_as_rows(rows):
+        active = Customer.batch_has_active_subscription([row.id for row in rows])
+        return customer_items(rows, True, active)
+
+    return [
+        ('transactions',
+         lambda: Transaction.query.order_by(Transaction.transaction_date.desc(),
+                                            Transaction.id.desc()),
+         lambda items: TransactionSchema().dump(items, many=True),
+         TRANSACTION_ROWS, TRANSACTION_ROWS.dump),
+        ('subscriptions',
+         lambda: Subscription.query.options(
+             joinedload(Subscription.customer), joinedload(Subscription.service),
+             joinedload(Subscription.branch)).order_by(Subscription.created_at.desc()),
+         lambda items: SubscriptionSchema().dump(items, many=True),
+         SUBSCRIPTION_ROWS, SUBSCRIPTION_ROWS.dump),
+        ('entry_logs',
+         lambda: EntryLog.query.order_by(EntryLog.entry_time.desc(), EntryLog.id.desc()),
+         lambda items: [entry.to_dict() for entry in items],
+         ENTRY_LOG_ROWS, ENTRY_LOG_ROWS.dump),
+        ('customers',
+         lambda: Customer.query.options(joinedload(Customer.branch))
+         .order_by(Customer.created_at.desc()),
+         customers_as_objects,
+         CUSTOMER_ROWS, customers_as_rows),
+    ]
+
+
+def _time(read, iterations, warmup):
+    """(p50 ms, statements of the last run, the last result) of ``read()``."""
+    from app.extensions import db
+    from app.services.query_profiler import collect_queries
+
+    timings = []
+    for i in range(warmup + iterations):
+        db.session.remove()
+        with collect_queries() as log:
+            started = time.perf_counter()
+            result = read()
+            elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return round(timings[len(timings) // 2] * 1000, 2), log.count, result
+
+
+def run(app, per_pages=(20, 100), iterations=30, warmup=3):
+    """[(list, per_page, objects (ms, queries), rows (ms, queries))]."""
+    results = []
+    with app.app_context():
+        for name, query, as_objects, rows, as_rows in _lists():
+            for per_page in per_pages:
+                old_ms, old_queries, old = _time(
+                    lambda: as_objects(query().limit(per_page).all()), iterations, warmup)
+                new_ms, new_queries, new = _time(
+                    lambda: as_rows(rows.select(query()).limit(per_page).all()),
+                    iterations, warmup)
+                if old != new:
+                    raise AssertionError(f'{name}: the two serializers disagree')
+                results.append((name, per_page, (old_ms, old_queries), (new_ms, new_queries)))
+    return results
+
+
+def main(argv=None):
+    from benchmarks.endpoints import build_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1, help='synthetic gyms (default: 1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--members-per-branch', type=int, default=None,
+                        help="members per branch (default: seed.py's)")
+    parser.add_argument('--per-page', type=int, nargs='+', default=[20, 100],
+                        help='page sizes to read (default: 20 100)')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    import seed as seed_script
+
+    logging.getLogger('app.services.query_profiler').setLevel(logging.ERROR)
+    app = build_app(args.scale, args.seed,
+                    args.members_per_branch or seed_script.SCALE_MEMBERS_PER_BRANCH)
+    results = run(app, args.per_page, args.iterations, args.warmup)
+
+    print(f"{'list':<16}{'per page':>9}{'objects ms':>12}{'queries':>9}"
+          f"{'rows ms':>10}{'queries':>9}{'speedup':>9}")
+    for name, per_page, (old_ms, old_queries), (new_ms, new_queries) in results:
+        print(f'{name:<16}{per_page:>9}{old_ms:>12.2f}{old_queries:>9}'
+              f'{new_ms:>10.2f}{new_queries:>9}{old_ms / max(new_ms, 0.01):>8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Gunicorn hooks, read from the working directory when gunicorn starts.
+
+The Dockerfile's command line still sets workers, threads and the bind; this
+only looks after the per-worker metric files (app/services/metrics.py).
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    """Empty the metrics directory: counters from the last boot's workers
+    would otherwise be summed into this one's."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (pool connections) from the sum."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
@@ -16,12 +16,17 @@ setup wizard and the super admin's activate/deactivate control.
 Money data spans ~8 months so the daily/weekly/monthly revenue trend has points
 in every bucket, and expenses carry the full category chart (salaries and rent
 dominate, as they do in a real P&L) rather than only ad-hoc spending.
+
+``python seed.py --scale N`` builds N synthetic gyms of production-sized data
+instead, in bulk; see SCALE MODE below.
 """
 from datetime import datetime, date, timedelta
+import enum
 import os
 import random
 import string
 import sys
+import time
 
 from app import create_app
 from app.extensions import db
@@ -1862,6 +1867,436 @@ def create_entry_logs(subscriptions, branches, spec):
     return entry_logs
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# SCALE MODE  (python seed.py --scale N)
+#
+# The demo above is built object by object through the ORM, which is right for
+# a few hundred members with hand-written credentials and wrong for the
+# millions of check-ins a production-sized gym chain has. Scale mode builds N
+# synthetic gyms instead: the handful of gyms, branches and staff through the
+# ORM as above, and the members, subscriptions, payments and check-ins as plain
+# rows written in batches — executemany on SQLite, COPY on Postgres.
+#
+# Each unit of scale is one gym of SCALE_BRANCHES_PER_GYM branches with
+# SCALE_MEMBERS_PER_BRANCH members each, 7,500 members in all, with roughly
+# 18,000 subscriptions, 40,000 transactions and 220,000 entry logs over
+# HISTORY_DAYS: --scale 8 is nearly two million check-ins. The generator draws
+# from its own random.Random(seed), so the same --scale and --seed give the
+# same rows, ids included, on any machine and either database.
+# ─────────────────────────────────────────────────────────────────────────────
+
+SCALE_BRANCHES_PER_GYM = 5
+SCALE_MEMBERS_PER_BRANCH = 1500
+
+# Share of memberships renewed when they run out; the rest lapse for good.
+SCALE_RENEWAL_RATE = 0.8
+
+# Share of door scans refused (expired card scanned, wrong branch and so on).
+SCALE_DENIED_RATE = 0.03
+
+# Share of visits that also buy something at the desk (MISC_SALES).
+SCALE_COUNTER_SALE_RATE = 0.1
+
+# Check-ins by hour of day: a morning peak before work and the evening rush.
+SCALE_VISIT_HOURS = list(range(6, 23))
+SCALE_VISIT_HOUR_WEIGHTS = [4, 7, 8, 6, 4, 3, 3, 3, 3, 4, 5, 7, 10, 11, 10, 7, 4]
+
+# The sellable gym-access packages members rotate through, by popularity.
+SCALE_PACKAGES = [
+    ('Monthly Gym Membership', 60),
+    ('Quarterly Gym Membership', 20),
+    ('Gym + Swimming Bundle', 15),
+    ('Swimming Recreation - Monthly', 5),
+]
+
+SCALE_DENIAL_REASONS = [
+    'Subscription expired',
+    'Subscription is frozen',
+    'Not allowed at this branch',
+]
+
+# Every synthetic account signs in with one of these, so any of them can be
+# used to poke at the app; hashing once per password keeps the run fast.
+SCALE_STAFF_PASSWORD = 'scale123'
+SCALE_MEMBER_PASSWORD = 'member123'
+
+
+class BulkLoader:
+    """Rows buffered per table and written in batches, parents first.
+
+    Rows carry their own ids, so children can point at parents that are still
+    in a buffer; a flush writes every table's buffer in the order given, which
+    keeps foreign keys satisfied whichever buffer filled up first. On Postgres
+    each batch is one ``COPY ... FROM STDIN``; elsewhere it is one executemany
+    of the table's INSERT.
+
+    Rows are written below the ORM, so no mapper listener sees them: the
+    summaries they feed are rebuilt afterwards (:func:`rebuild_summaries`).
+    """
+
+    def __init__(self, tables, batch_size):
+        self.connection = db.session.connection()
+        self.tables = tables
+        self.batch_size = batch_size
+        self.buffers = {table.name: [] for table in tables}
+        self.written = {table.name: 0 for table in tables}
+        self.copy = self.connection.dialect.name == 'postgresql'
+
+    def add(self, table, row):
+        buffer = self.buffers[table.name]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for table in self.tables:
+            rows = self.buffers[table.name]
+            if not rows:
+                continue
+            if self.copy:
+                self._copy(table, rows)
+            else:
+                self.connection.execute(table.insert(), rows)
+            self.written[table.name] += len(rows)
+            self.buffers[table.name] = []
+
+    def _copy(self, table, rows):
+        import csv
+        import io
+
+        columns = list(rows[0])
+        data = io.StringIO()
+        writer = csv.writer(data)
+        for row in rows:
+            writer.writerow([_copy_value(row[column]) for column in columns])
+        data.seek(0)
+
+        # The session's own DBAPI connection, so the COPY is part of the same
+        # transaction as the ORM-built gyms and staff it refers to.
+        cursor = self.connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f'COPY "{table.name}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+                data,
+            )
+        finally:
+            cursor.close()
+
+
+def _copy_value(value):
+    """A Python value as COPY's CSV format expects it. None is an empty field."""
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        return value.name  # SQLAlchemy stores enums by name.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def seed_at_scale(scale, seed=42, batch_size=10000):
+    """Rebuild the database as ``scale`` synthetic gyms. See SCALE MODE above."""
+    env = os.getenv('FLASK_ENV', 'development')
+    print(f'[+] Using environment: {env}')
+    app = create_app(env)
+
+    with app.app_context():
+        print('\n' + '=' * 70)
+        print(f'[*] SEEDING DATABASE - {scale} SYNTHETIC GYM(S), SEED {seed}')
+        print('=' * 70 + '\n')
+
+        print('  > Clearing existing data...')
+        db.drop_all()
+        db.create_all()
+        enable_row_level_security()
+
+        started = time.perf_counter()
+        counts = build_at_scale(scale, seed=seed, batch_size=batch_size)
+        db.session.commit()
+        print(f'  ✓ Loaded in {time.perf_counter() - started:.1f}s')
+
+        rebuild_summaries()
+        print_scale_summary(counts)
+
+
+def build_at_scale(scale, seed=42, batch_size=10000,
+                   members_per_branch=SCALE_MEMBERS_PER_BRANCH, today=None):
+    """Write ``scale`` synthetic gyms into the current (empty) database.
+
+    Returns rows written per bulk table. Does not commit, and does not rebuild
+    the summaries: :func:`seed_at_scale` does both.
+    """
+    from passlib.hash import pbkdf2_sha256
+
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    # The module's own random drives the shared catalog and the super admin;
+    # reseed it so they come out the same whatever ran before.
+    random.seed(seed)
+    create_super_admin()
+    services = {service.name: service for service in create_services()}
+    packages = [services[name] for name, _ in SCALE_PACKAGES]
+    package_weights = [weight for _, weight in SCALE_PACKAGES]
+
+    staff_hash = pbkdf2_sha256.hash(SCALE_STAFF_PASSWORD)
+    member_hash = pbkdf2_sha256.hash(SCALE_MEMBER_PASSWORD)
+
+    tables = [Customer.__table__, Subscription.__table__,
+              Transaction.__table__, EntryLog.__table__]
+    loader = BulkLoader(tables, batch_size)
+    ids = {table.name: _next_id(table) for table in tables}
+
+    def next_id(table):
+        value = ids[table.name]
+        ids[table.name] += 1
+        return value
+
+    for g in range(1, scale + 1):
+        gym, desks = _scale_gym(g, staff_hash)
+        print(f'  > Gym {g}/{scale}: {gym.name}')
+        for branch_id, desk_id in desks:
+            for _ in range(members_per_branch):
+                _scale_member(rng, loader, next_id, today, branch_id, desk_id,
+                              packages, package_weights, member_hash)
+        loader.flush()
+        print(f"    {loader.written['customers']} members, "
+              f"{loader.written['entry_logs']} entry logs so far")
+
+    loader.flush()
+    if loader.copy:
+        _advance_sequences(tables)
+    return loader.written
+
+
+def _next_id(table):
+    from sqlalchemy import func, select
+    return (db.session.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _advance_sequences(tables):
+    """Move each table's id sequence past the ids written by COPY."""
+    from sqlalchemy import text
+
+    for table in tables:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f'(SELECT MAX(id) FROM "{table.name}"))'
+        ))
+
+
+def _scale_gym(g, staff_hash):
+    """One synthetic gym through the ORM: owner, central accountant, branches,
+    a manager and a front desk per branch. Returns the gym and its (branch id,
+    desk id) pairs.
+    """
+    def user(username, role, gym_id=None, branch_id=None):
+        account = User(
+            username=username,
+            email=f'{username}@scale.example.com',
+            full_name=username.replace('_', ' ').title(),
+            role=role,
+            gym_id=gym_id,
+            branch_id=branch_id,
+            is_active=True,
+        )
+        account.password_hash = staff_hash
+        db.session.add(account)
+        return account
+
+    owner = user(f'scale{g}_owner', UserRole.OWNER)
+    db.session.flush()
+    gym = Gym(name=f'Scale Gym {g}', owner_id=owner.id,
+              is_setup_complete=True, is_active=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+    user(f'scale{g}_accountant', UserRole.CENTRAL_ACCOUNTANT, gym.id)
+
+    desks = []
+    for b in range(1, SCALE_BRANCHES_PER_GYM + 1):
+        branch = Branch(name=f'Scale Gym {g} Branch {b}', code=f'S{g:03d}B{b}',
+                        city='Cairo', gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        if b == 1:
+            owner.branch_id = branch.id
+        user(f'scale{g}_manager{b}', UserRole.BRANCH_MANAGER, gym.id, branch.id)
+        desk = user(f'scale{g}_desk{b}', UserRole.FRONT_DESK, gym.id, branch.id)
+        db.session.flush()
+        desks.append((branch.id, desk.id))
+    return gym, desks
+
+
+def _scale_member(rng, loader, next_id, today, branch_id, desk_id,
+                  packages, package_weights, member_hash):
+    """One member's history: a join date, back-to-back memberships until one
+    lapses or reaches today, a payment for each, and their visits.
+
+    Each member keeps a habit — the chance they come in on a day they hold a
+    membership — so the data has regulars and rarely-seens, as a real member
+    base does, rather than visits spread evenly over everyone.
+    """
+    customer_id = next_id(Customer.__table__)
+    joined = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+    gender = rng.choice((Gender.MALE, Gender.FEMALE))
+    first_name = rng.choice(MALE_NAMES if gender == Gender.MALE else FEMALE_NAMES)
+    joined_at = _scale_time(rng, joined)
+
+    loader.add(Customer.__table__, {
+        'id': customer_id,
+        'full_name': f'{first_name} {rng.choice(LAST_NAMES)}',
+        'phone': f'015{customer_id:08d}',
+        'gender': gender,
+        'branch_id': branch_id,
+        'qr_code': f'GYM-{customer_id}',
+        'password_hash': member_hash,
+        'password_changed': True,
+        'is_active': True,
+        'created_at': joined_at,
+        'updated_at': joined_at,
+    })
+
+    habit = rng.uniform(0.08, 0.6)
+    start = joined
+    first = True
+    while start <= today:
+        service = rng.choices(packages, weights=package_weights)[0]
+        end = start + timedelta(days=service.duration_days)
+        bought_at = _scale_time(rng, start)
+        subscription_id = next_id(Subscription.__table__)
+        loader.add(Subscription.__table__, {
+            'id': subscription_id,
+            'customer_id': customer_id,
+            'service_id': service.id,
+            'branch_id': branch_id,
+            'start_date': start,
+            'end_date': end,
+            'status': SubscriptionStatus.ACTIVE if end >= today else SubscriptionStatus.EXPIRED,
+            'freeze_count': 0,
+            'total_frozen_days': 0,
+            'classes_attended': 0,
+            'subscription_type': 'time_based',
+            'created_by': desk_id,
+            'created_at': bought_at,
+            'updated_at': bought_at,
+        })
+        _scale_payment(rng, loader, next_id, branch_id, desk_id, customer_id,
+                       subscription_id, service.price, bought_at,
+                       TransactionType.SUBSCRIPTION if first else TransactionType.RENEWAL,
+                       service.name)
+
+        day = start
+        last = min(end, today)
+        while day <= last:
+            if rng.random() < habit:
+                _scale_visit(rng, loader, next_id, branch_id, desk_id,
+                             customer_id, subscription_id, day)
+            day += timedelta(days=1)
+
+        if end >= today or rng.random() >= SCALE_RENEWAL_RATE:
+            break
+        # Most renew on the day; some come back after a gap.
+        start = end + timedelta(days=rng.choice((1, 1, 1, 2, 4, 8, 15)))
+        first = False
+
+
+def _scale_payment(rng, loader, next_id, branch_id, desk_id, customer_id,
+                   subscription_id, amount, when, kind, description):
+    method = rng.choices(
+        (PaymentMethod.CASH, PaymentMethod.NETWORK, PaymentMethod.TRANSFER),
+        weights=(40, 40, 20),
+    )[0]
+    loader.add(Transaction.__table__, {
+        'id': next_id(Transaction.__table__),
+        'amount': amount,
+        'discount': 0,
+        'payment_method': method,
+        'transaction_type': kind,
+        'branch_id': branch_id,
+        'customer_id': customer_id,
+        'subscription_id': subscription_id,
+        'created_by': desk_id,
+        'description': description,
+        'reference_number': None if method == PaymentMethod.CASH
+        else f'TXN{rng.randint(100000, 999999)}',
+        'transaction_date': when,
+        'created_at': when,
+    })
+
+
+def _scale_visit(rng, loader, next_id, branch_id, desk_id, customer_id,
+                 subscription_id, day):
+    entered_at = datetime.combine(day, datetime.min.time()) + timedelta(
+        hours=rng.choices(SCALE_VISIT_HOURS, weights=SCALE_VISIT_HOUR_WEIGHTS)[0],
+        minutes=rng.randint(0, 59), seconds=rng.randint(0, 59),
+    )
+    denied = rng.random() < SCALE_DENIED_RATE
+    entry_type = rng.choices(
+        (EntryType.QR_SCAN, EntryType.FINGERPRINT, EntryType.MANUAL),
+        weights=(85, 10, 5),
+    )[0]
+    loader.add(EntryLog.__table__, {
+        'id': next_id(EntryLog.__table__),
+        'customer_id': customer_id,
+        'subscription_id': subscription_id,
+        'entry_type': entry_type,
+        'entry_status': EntryStatus.DENIED if denied else EntryStatus.APPROVED,
+        'branch_id': branch_id,
+        'validation_token': f'GYM-{customer_id}' if entry_type == EntryType.QR_SCAN else None,
+        'coins_deducted': 0,
+        'denial_reason': rng.choice(SCALE_DENIAL_REASONS) if denied else None,
+        'processed_by_user_id': desk_id if entry_type == EntryType.MANUAL else None,
+        'entry_time': entered_at,
+        'created_at': entered_at,
+    })
+    if not denied and rng.random() < SCALE_COUNTER_SALE_RATE:
+        description, low, high = rng.choice(MISC_SALES)
+        _scale_payment(rng, loader, next_id, branch_id, desk_id, customer_id, None,
+                       rng.randint(low, high), entered_at + timedelta(minutes=2),
+                       TransactionType.OTHER, description)
+
+
+def _scale_time(rng, day):
+    """A datetime in opening hours on ``day``, from the scale generator."""
+    return datetime.combine(day, datetime.min.time()) + timedelta(
+        hours=rng.randint(8, 20), minutes=rng.randint(0, 59))
+
+
+def rebuild_summaries():
+    """Rebuild what the bulk rows bypassed: the summaries the ORM listeners
+    keep for revenue, attendance, occupancy and customer search."""
+    from app.services import attendance_summary, customer_search, occupancy, revenue_rollup
+
+    for label, rebuild in (
+        ('Revenue rollups', revenue_rollup.rebuild),
+        ('Attendance summaries', attendance_summary.rebuild),
+        ('Occupancy buckets', occupancy.rebuild),
+        ('Customer search', customer_search.rebuild),
+    ):
+        started = time.perf_counter()
+        written = rebuild()
+        db.session.commit()
+        print(f'  ✓ {label}: {written} row(s) in {time.perf_counter() - started:.1f}s')
+
+
+def print_scale_summary(counts):
+    print('\n' + '=' * 70)
+    print('[*] DATABASE TOTALS')
+    print('=' * 70)
+    print(f'  Gyms:          {Gym.query.count()}')
+    print(f'  Branches:      {Branch.query.count()}')
+    print(f'  Users:         {User.query.count()}')
+    print(f"  Customers:     {counts['customers']}")
+    print(f"  Subscriptions: {counts['subscriptions']}")
+    print(f"  Transactions:  {counts['transactions']}")
+    print(f"  Entry logs:    {counts['entry_logs']}")
+    print('\n  Staff sign in as scale<G>_owner, scale<G>_accountant, scale<G>_manager<B>')
+    print('  or scale<G>_desk<B>')
+    print(f'  with {SCALE_STAFF_PASSWORD}; members by phone with {SCALE_MEMBER_PASSWORD}.')
+    print('=' * 70 + '\n')
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SUMMARY
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1982,4 +2417,19 @@ def print_summary(worlds):
 
 
 if __name__ == '__main__':
-    seed_database()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild the database with seed data.')
+    parser.add_argument('--scale', type=int, metavar='N',
+                        help='N synthetic gyms of bulk data instead of the demo gyms '
+                             '(~220,000 entry logs each)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='random seed for --scale (default: 42)')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='rows per bulk write for --scale (default: 10000)')
+    args = parser.parse_args()
+
+    if args.scale:
+        seed_at_scale(args.scale, seed=args.seed, batch_size=args.batch_size)
+    else:
+        seed_database()
@@ -0,0 +1,246 @@
+"""Door admission: the same answers, in one query.
+
+``QRService.validate_entry`` is on every check-in. It used to load the member,
+their branch, the gym's rules, the candidate subscriptions and each one's
+service in separate round trips; it now asks for all of them at once (see
+app/services/admission_service.py). These tests hold both halves of that: the
+decisions are the ones the door has always made, and the query count per scan
+stays at one.
+
+The query count is measured on SQLite always, and on Postgres too when
+ADMISSION_BENCH_POSTGRES_URL points at a scratch database — the statement is
+the one place where the two dialects could plausibly diverge.
+
+Run with:  pytest backend/tests/test_admission.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: A scan that needs more than this has regressed. One statement for the
+#: admission decision itself; nothing else on the happy path.
+QUERIES_PER_SCAN = 1
+
+
+def _backends():
+    yield 'sqlite'
+    if os.environ.get('ADMISSION_BENCH_POSTGRES_URL'):
+        yield 'postgresql'
+
+
+@pytest.fixture(scope='module', params=list(_backends()))
+def app(request):
+    if request.param == 'sqlite':
+        os.environ['DATABASE_URL'] = (
+            'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+        )
+    else:
+        os.environ['DATABASE_URL'] = os.environ['ADMISSION_BENCH_POSTGRES_URL']
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.freeze_history import FreezeHistory
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.user import User, UserRole
+
+    owner = User(username='adm_owner', email='adm@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Admission Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+
+    main = Branch(name='Main', code='AD1', gym_id=gym.id, is_active=True)
+    other = Branch(name='Other', code='AD2', gym_id=gym.id, is_active=True)
+    db.session.add_all([main, other])
+    db.session.flush()
+
+    gym_svc = Service(name='Gym', service_type=ServiceType.GYM, price=500,
+                      duration_days=30, allowed_days_per_week=7,
+                      grants_gym_entry=True)
+    pt_svc = Service(name='PT', service_type=ServiceType.PERSONAL_TRAINING,
+                     price=2000, duration_days=90, allowed_days_per_week=7,
+                     grants_gym_entry=False)
+    class_svc = Service(name='Classes', service_type=ServiceType.KARATE, price=300,
+                        duration_days=30, allowed_days_per_week=7, class_limit=8,
+                        grants_gym_entry=True)
+    db.session.add_all([gym_svc, pt_svc, class_svc])
+    db.session.flush()
+
+    today = date.today()
+    ids = {'gym': gym.id, 'main': main.id, 'other': other.id}
+
+    def member(tag, active=True):
+        customer = Customer(full_name=f'Adm {tag}', phone=f'0155{len(ids):07d}',
+                            branch_id=main.id, is_active=active)
+        db.session.add(customer)
+        db.session.flush()
+        ids[tag] = customer.id
+        return customer
+
+    def subscribe(customer, service, key=None, **overrides):
+        fields = dict(
+            customer_id=customer.id, service_id=service.id, branch_id=main.id,
+            start_date=today, end_date=today + timedelta(days=30),
+            status=SubscriptionStatus.ACTIVE, subscription_type='time_based',
+        )
+        fields.update(overrides)
+        subscription = Subscription(**fields)
+        db.session.add(subscription)
+        db.session.flush()
+        if key:
+            ids[key] = subscription.id
+        return subscription
+
+    both = member('both')
+    subscribe(both, gym_svc, 'both_gym', remaining_visits=5,
+              end_date=today + timedelta(days=10))
+    subscribe(both, pt_svc, 'both_pt', end_date=today + timedelta(days=60))
+
+    subscribe(member('pt_only'), pt_svc, 'pt_only_sub')
+    member('inactive', active=False)
+    member('nothing')
+
+    subscribe(member('spent'), gym_svc, remaining_visits=0)
+    subscribe(member('classes_spent'), class_svc, remaining_classes=0)
+    subscribe(member('elsewhere'), gym_svc, branch_id=other.id)
+    subscribe(member('lapsed'), gym_svc, end_date=today - timedelta(days=1))
+
+    # Frozen, with a freeze that ran out yesterday: settled on read, then admitted.
+    thawed = subscribe(member('thawed'), gym_svc, status=SubscriptionStatus.FROZEN)
+    db.session.add(FreezeHistory(
+        subscription_id=thawed.id, freeze_start=today - timedelta(days=8),
+        freeze_end=today - timedelta(days=1), freeze_days=7, is_active=True,
+    ))
+    # Frozen, freeze still running: refused with the freeze as the reason.
+    frozen = subscribe(member('frozen'), gym_svc, status=SubscriptionStatus.FROZEN)
+    db.session.add(FreezeHistory(
+        subscription_id=frozen.id, freeze_start=today,
+        freeze_end=today + timedelta(days=7), freeze_days=7, is_active=True,
+    ))
+
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _scan(app, who, **kwargs):
+    from app.extensions import db
+    from app.services.qr_service import QRService
+
+    with app.app_context():
+        db.session.expunge_all()
+        is_valid, reason, subscription, coins = QRService.validate_entry(
+            IDS[who], **kwargs)
+        return is_valid, reason, subscription.id if subscription else None, coins
+
+
+# ─────────────────────────────── decisions ───────────────────────────────────
+
+def test_gym_plus_training_meters_the_gym_package(app):
+    assert _scan(app, 'both') == (True, 'Entry approved', IDS['both_gym'], 1)
+
+
+@pytest.mark.parametrize('who, reason', [
+    ('pt_only', 'No active subscription found'),
+    ('nothing', 'No active subscription found'),
+    ('inactive', 'Customer account is inactive'),
+    ('spent', 'No remaining visits on subscription'),
+    ('classes_spent', 'No remaining classes on subscription'),
+    ('lapsed', 'Subscription expired'),
+    ('frozen', 'Subscription is frozen'),
+])
+def test_refusals_keep_their_reasons(app, who, reason):
+    is_valid, got, _, coins = _scan(app, who)
+    assert (is_valid, got, coins) == (False, reason, 0)
+
+
+def test_an_unknown_member_is_not_found(app):
+    from app.services.qr_service import QRService
+
+    with app.app_context():
+        assert QRService.validate_entry(999999) == (
+            False, 'Customer not found', None, 0)
+
+
+def test_a_lapsed_freeze_is_settled_and_admitted(app):
+    is_valid, reason, _, _ = _scan(app, 'thawed')
+    assert (is_valid, reason) == (True, 'Entry approved')
+
+
+def test_the_branch_is_still_checked(app):
+    is_valid, reason, _, _ = _scan(app, 'elsewhere', branch_id=IDS['main'])
+    assert (is_valid, reason) == (False, 'Subscription not valid for this branch')
+    assert _scan(app, 'elsewhere', branch_id=IDS['other'])[0] is True
+
+
+def test_a_named_subscription_must_be_the_members_own(app):
+    is_valid, reason, subscription, _ = _scan(
+        app, 'nothing', subscription_id=IDS['both_gym'])
+    assert (is_valid, reason, subscription) == (
+        False, 'Subscription does not belong to this customer', None)
+
+
+def test_a_named_training_package_does_not_open_the_door(app):
+    is_valid, reason, subscription, _ = _scan(
+        app, 'both', subscription_id=IDS['both_pt'])
+    assert (is_valid, reason, subscription) == (
+        False, 'This subscription does not grant gym entry', IDS['both_pt'])
+
+
+def test_the_gym_rule_admits_training_only_members(app):
+    from app.services.gym_rules import set_rules
+
+    with app.app_context():
+        set_rules(IDS['gym'], {'pt_only_members_may_enter': True})
+    try:
+        assert _scan(app, 'pt_only')[:3] == (
+            True, 'Entry approved', IDS['pt_only_sub'])
+    finally:
+        with app.app_context():
+            set_rules(IDS['gym'], {'pt_only_members_may_enter': False})
+
+
+# ──────────────────────────────── budget ─────────────────────────────────────
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'branch_id': 'main'},
+    {'subscription_id': 'both_gym'},
+])
+def test_a_scan_costs_one_query(app, kwargs):
+    """Including the ``subscription.service`` the callers read afterwards —
+    that used to be a lazy load of its own."""
+    from app.extensions import db
+    from app.services.qr_service import QRService
+    from app.services.query_profiler import query_budget
+
+    resolved = {key: IDS[value] for key, value in kwargs.items()}
+    with app.app_context():
+        db.session.expunge_all()
+        with query_budget(QUERIES_PER_SCAN):
+            is_valid, _, subscription, _ = QRService.validate_entry(
+                IDS['both'], **resolved)
+            assert subscription.service.grants_gym_entry is True
+        assert is_valid
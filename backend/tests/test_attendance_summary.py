@@ -0,0 +1,251 @@
+"""Attendance summaries: the member app's visit counts and streaks, pre-computed.
+
+app/services/attendance_summary.py keeps one row per member in step with the
+entry logs. These tests hold it to that:
+
+* visits, the month's visits, streaks and the last visit are counted in the
+  gym's local day, and a streak is not cut off at 30 days;
+* an entry that arrives out of order, is edited or is deleted still leaves the
+  row what a recount would give, and denied entries never count;
+* ``rebuild`` agrees with the incremental rows;
+* on MySQL, which applies an UPDATE's assignments in order, every column is
+  set after the ones that read its old value;
+* ``/api/client/stats`` answers without reading ``entry_logs`` at all.
+
+Run with:  pytest backend/tests/test_attendance_summary.py
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='as_owner', email='as_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='attendance gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    branch = Branch(name='attendance branch', code='AS1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.commit()
+    globals()['IDS'] = {'branch': branch.id}
+
+
+_phones = iter(range(10_000))
+
+
+def _member():
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    customer = Customer(full_name='Member', phone=f'0166{next(_phones):07d}',
+                        branch_id=IDS['branch'], is_active=True)
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+
+def _visit(customer, when, approved=True):
+    from app.extensions import db
+    from app.models.entry_log import EntryLog, EntryStatus, EntryType
+
+    entry = EntryLog(customer_id=customer.id, branch_id=IDS['branch'],
+                     entry_type=EntryType.QR_SCAN, entry_time=when,
+                     entry_status=EntryStatus.APPROVED if approved else EntryStatus.DENIED)
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+def _row(customer_id):
+    from app.extensions import db
+    from app.models.attendance_summary import AttendanceSummary
+
+    db.session.expire_all()
+    row = db.session.get(AttendanceSummary, customer_id)
+    return row and {name: getattr(row, name) for name in (
+        'total_visits', 'month_start', 'month_visits', 'last_visit_date',
+        'current_streak', 'longest_streak')}
+
+
+def _recount(customer):
+    from app.extensions import db
+    from app.services.attendance_summary import recompute
+
+    recompute(db.session.connection(), customer.id)
+    return _row(customer.id)
+
+
+# ───────────────────────────── counting ─────────────────────────────────────
+
+def test_visits_and_streaks_follow_the_gyms_day(app):
+    """Cairo is UTC+2 in January: 21:30 and 22:30 UTC on the 9th are 23:30 on
+    the 9th and 00:30 on the 10th there — two days, not one."""
+    with app.app_context():
+        member = _member()
+        _visit(member, datetime(2026, 1, 8, 10, 0))
+        _visit(member, datetime(2026, 1, 9, 21, 30))
+        _visit(member, datetime(2026, 1, 9, 22, 30))
+        _visit(member, datetime(2026, 1, 10, 9, 0))  # a second visit the same day
+        _visit(member, datetime(2026, 1, 13, 9, 0))
+        _visit(member, datetime(2026, 1, 14, 9, 0), approved=False)
+
+        assert _row(member.id) == {
+            'total_visits': 5, 'month_start': date(2026, 1, 1), 'month_visits': 5,
+            'last_visit_date': date(2026, 1, 13), 'current_streak': 1,
+            'longest_streak': 3,
+        }
+
+
+def test_a_streak_longer_than_thirty_days_is_counted_in_full(app):
+    from app.services.attendance_summary import stats_for
+
+    with app.app_context():
+        member = _member()
+        first = date(2026, 1, 20)
+        for offset in range(45):
+            _visit(member, datetime.combine(first + timedelta(days=offset),
+                                            datetime.min.time()) + timedelta(hours=8))
+        last = first + timedelta(days=44)
+
+        stats = stats_for(member, today=last + timedelta(days=1))
+        assert stats['current_streak'] == 45
+        assert stats['longest_streak'] == 45
+        assert stats['visits_this_month'] == 5  # the 1st to the 5th of March
+        assert stats['total_visits'] == 45
+
+        # Missing a whole day ends it; missing only today does not, yet.
+        assert stats_for(member, today=last + timedelta(days=2))['current_streak'] == 0
+        assert stats_for(member, today=date(2026, 4, 1))['visits_this_month'] == 0
+
+
+def test_an_entry_out_of_order_leaves_what_a_recount_would(app):
+    with app.app_context():
+        member = _member()
+        _visit(member, datetime(2026, 2, 1, 9, 0))
+        _visit(member, datetime(2026, 2, 3, 9, 0))
+        _visit(member, datetime(2026, 2, 2, 9, 0))  # synced late from a device
+
+        row = _row(member.id)
+        assert row['current_streak'] == row['longest_streak'] == 3
+        assert row == _recount(member)
+
+
+def test_mysql_reads_each_old_value_before_it_is_overwritten():
+    """MySQL applies SET left to right, each assignment seeing those before it."""
+    from sqlalchemy.dialects import mysql
+    from app.services.attendance_summary import _fold_in
+
+    executed = []
+
+    class _Recording:
+        dialect = mysql.dialect()
+
+        def execute(self, statement):
+            executed.append(statement)
+
+            class _Result:
+                rowcount = 1
+            return _Result()
+
+    assert _fold_in(_Recording(), 1, date(2026, 3, 2), datetime(2026, 3, 2, 9, 0))
+
+    [statement] = executed
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assigned = re.findall(r'(?<![.\w])(\w+)=', sql[sql.index(' SET '):sql.index(' WHERE ')])
+    assert assigned == ['total_visits', 'month_visits', 'month_start', 'longest_streak',
+                        'current_streak', 'last_visit_at', 'last_visit_date'], sql
+
+
+def test_edits_and_deletions_are_taken_back_out(app):
+    from app.extensions import db
+    from app.models.entry_log import EntryStatus
+
+    with app.app_context():
+        member = _member()
+        _visit(member, datetime(2026, 2, 10, 9, 0))
+        middle = _visit(member, datetime(2026, 2, 11, 9, 0))
+        last = _visit(member, datetime(2026, 2, 12, 9, 0))
+        assert _row(member.id)['current_streak'] == 3
+
+        middle.entry_status = EntryStatus.DENIED
+        db.session.commit()
+        assert (_row(member.id)['current_streak'], _row(member.id)['total_visits']) == (1, 2)
+
+        db.session.delete(last)
+        db.session.commit()
+        assert _row(member.id)['last_visit_date'] == date(2026, 2, 10)
+        assert _row(member.id) == _recount(member)
+
+
+def test_rebuild_agrees_with_the_incremental_rows(app):
+    from app.extensions import db
+    from app.models.attendance_summary import AttendanceSummary
+    from app.services.attendance_summary import rebuild
+
+    with app.app_context():
+        member = _member()
+        for day in (1, 2, 3, 7, 8):
+            _visit(member, datetime(2026, 3, day, 7, 0))
+        members = [customer_id for (customer_id,) in
+                   db.session.query(AttendanceSummary.customer_id)]
+        before = {customer_id: _row(customer_id) for customer_id in members}
+
+        assert rebuild(batch_size=2) == len(members)
+        after = {customer_id: _row(customer_id) for customer_id in members}
+    assert after == before
+
+
+# ───────────────────────────── the endpoint ─────────────────────────────────
+
+def test_stats_are_read_from_the_summary_alone(app):
+    from app.services.query_profiler import collect_queries
+    from app.utils.client_auth import create_client_token
+
+    with app.app_context():
+        member = _member()
+        now = datetime.utcnow()
+        for days_ago in (2, 1, 0):
+            _visit(member, now - timedelta(days=days_ago))
+        headers = {'Authorization': 'Bearer ' + create_client_token(member.id)}
+
+    client = app.test_client()
+    client.get('/api/client/stats', headers=headers)  # warm the settings cache
+    with app.app_context(), collect_queries() as log:
+        response = client.get('/api/client/stats', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert data['total_visits'] == 3
+    assert data['current_streak'] in (2, 3)  # 3 unless the gym's day just turned
+    assert data['longest_streak'] >= data['current_streak']
+    assert data['last_visit_at'] is not None
+    assert not [s for s in log.sql if 'entry_logs' in s], log.describe()
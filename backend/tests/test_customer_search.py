@@ -0,0 +1,283 @@
+"""Customer search: folded, indexed, ranked, and kept in step with the members.
+
+``/api/customers/search`` and ``GET /api/customers?search=`` go through
+``customer_search_entries`` (app/services/customer_search.py). These tests
+hold it to what the front desk needs:
+
+* Arabic spellings that differ only in alef/ya/ta-marbuta forms, tashkeel or
+  tatweel find each other; so do phone numbers however they are spaced, in
+  Western or Eastern Arabic digits;
+* exact matches outrank prefixes, which outrank matches mid-name;
+* renaming a member moves their entry, and an erased member cannot be found
+  by anything they used to be called;
+* on SQLite the FTS5 trigram table does the narrowing, and stays in step.
+
+Run with:  pytest backend/tests/test_customer_search.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+MEMBERS = {
+    'ahmed': ('أحمد علي', '01001234567', 'ahmed@example.com', '29801011234567', 'GYM-A1'),
+    'fatma': ('فاطمة محمود', '01112223334', None, None, None),
+    'mostafa': ('مُصطفى حسن', '01223334445', None, None, None),
+    'sara': ('Sara Ahmed', '01556667778', 'sara@example.com', None, 'GYM-S9'),
+    'ahmad': ('Ahmad', '01000000001', None, None, None),
+    'ahmadi': ('Ahmadi Karim', '01000000002', None, None, None),
+    'karim': ('Karim Ahmad', '01000000003', None, None, None),
+}
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    ids = {}
+    gyms = []
+    for name in ('home', 'other'):
+        owner = User(username=f'cs_{name}', email=f'cs_{name}@example.com',
+                     full_name='Owner', role=UserRole.OWNER, is_active=True)
+        owner.set_password('secret123')
+        db.session.add(owner)
+        db.session.flush()
+        gym = Gym(name=f'{name} gym', owner_id=owner.id, is_setup_complete=True)
+        db.session.add(gym)
+        db.session.flush()
+        owner.gym_id = gym.id
+        branch = Branch(name=f'{name} branch', code=f'CS{name[0].upper()}',
+                        gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        owner.branch_id = branch.id
+        gyms.append(branch)
+
+    for key, (full_name, phone, email, national_id, qr) in MEMBERS.items():
+        customer = Customer(full_name=full_name, phone=phone, email=email,
+                            national_id=national_id, qr_code=qr,
+                            gender=Gender.MALE, branch_id=gyms[0].id, is_active=True)
+        db.session.add(customer)
+        db.session.flush()
+        ids[key] = customer.id
+
+    # Same name, another gym: never in the home owner's results.
+    stranger = Customer(full_name='أحمد علي', phone='01009999999', gender=Gender.MALE,
+                        branch_id=gyms[1].id, is_active=True)
+    db.session.add(stranger)
+    db.session.flush()
+    ids['stranger'] = stranger.id
+
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+@pytest.fixture(scope='module')
+def owner(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'cs_home', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+def _search(app, owner, term):
+    response = app.test_client().get('/api/customers/search', query_string={'q': term},
+                                     headers=owner)
+    assert response.status_code == 200, response.get_json()
+    return [item['id'] for item in response.get_json()['data']['items']]
+
+
+# ───────────────────────────── folding ──────────────────────────────────────
+
+@pytest.mark.parametrize('a, b', [
+    ('أحمد', 'احمد'),
+    ('إيمان', 'ايمان'),
+    ('آمال', 'امال'),
+    ('فاطمة', 'فاطمه'),
+    ('مصطفى', 'مصطفي'),
+    ('مُحَمَّد', 'محمد'),
+    ('محـــمد', 'محمد'),
+    ('SARA  Ahmed', 'sara ahmed'),
+    ('José', 'jose'),
+])
+def test_spellings_fold_together(a, b):
+    from app.services.customer_search import normalize_text
+    assert normalize_text(a) == normalize_text(b)
+
+
+def test_phone_digits_ignore_spacing_and_script():
+    from app.services.customer_search import phone_digits
+    assert phone_digits('0100 123-4567') == '01001234567'
+    assert phone_digits('٠١٠٠١٢٣٤٥٦٧') == '01001234567'
+    assert phone_digits('+20 (100) 123 4567') == '201001234567'
+
+
+# ───────────────────────────── finding ──────────────────────────────────────
+
+@pytest.mark.parametrize('term, member', [
+    ('احمد', 'ahmed'),
+    ('أحمد', 'ahmed'),
+    ('علي احمد', 'ahmed'),
+    ('فاطمه', 'fatma'),
+    ('مصطفي', 'mostafa'),
+    ('0100 123 4567', 'ahmed'),
+    ('٠١٠٠١٢٣٤٥٦٧', 'ahmed'),
+    ('1234567', 'ahmed'),
+    ('AHMED@example', 'ahmed'),
+    ('29801011234567', 'ahmed'),
+    ('gym-s9', 'sara'),
+    ('sara', 'sara'),
+])
+def test_a_member_is_found_by(app, owner, term, member):
+    assert IDS[member] in _search(app, owner, term)
+
+
+def test_other_gyms_members_stay_out(app, owner):
+    assert IDS['stranger'] not in _search(app, owner, 'احمد علي')
+
+
+def test_short_terms_still_match(app, owner):
+    assert IDS['ahmed'] in _search(app, owner, 'عل')
+
+
+def test_wildcards_in_the_term_are_literal(app, owner):
+    assert _search(app, owner, '%') == []
+    assert _search(app, owner, 'a_m') == []
+
+
+def test_results_are_ranked(app, owner):
+    results = _search(app, owner, 'ahmad')
+    # Exact name, then name prefix, then a later word; "Sara Ahmed" does not
+    # contain "ahmad" at all.
+    assert results[:3] == [IDS['ahmad'], IDS['ahmadi'], IDS['karim']]
+    assert IDS['sara'] not in results
+
+
+def test_an_exact_phone_comes_first(app, owner):
+    assert _search(app, owner, '01000000002')[0] == IDS['ahmadi']
+
+
+def test_the_list_endpoint_searches_the_same_way(app, owner):
+    response = app.test_client().get('/api/customers', query_string={'search': 'فاطمه'},
+                                     headers=owner)
+    data = response.get_json()['data']
+    assert [item['id'] for item in data['items']] == [IDS['fatma']]
+    assert data['pagination']['total'] == 1
+
+
+def test_sqlite_narrows_through_the_trigram_table(app, owner):
+    from app.services.query_profiler import collect_queries
+
+    with app.app_context():
+        with collect_queries() as log:
+            _search(app, owner, 'فاطمه')
+    assert any('customer_search_fts MATCH' in s for s in log.sql)
+    # And the wide table is no longer scanned with a leading wildcard.
+    assert not any('lower(customers.full_name) LIKE' in s for s in log.sql)
+
+
+# ───────────────────────────── staying in step ──────────────────────────────
+
+def test_a_new_member_is_searchable_at_once(app, owner):
+    from app.extensions import db
+    from app.models.customer import Customer, Gender
+
+    with app.app_context():
+        customer = Customer(full_name='يوسف إبراهيم', phone='01777777777',
+                            gender=Gender.MALE, branch_id=_home_branch(), is_active=True)
+        db.session.add(customer)
+        db.session.commit()
+        new_id = customer.id
+    assert _search(app, owner, 'ابراهيم') == [new_id]
+
+
+def test_a_rename_moves_the_entry(app, owner):
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    with app.app_context():
+        customer = db.session.get(Customer, IDS['mostafa'])
+        db.session.commit()  # expired, as at the end of a request
+        customer.full_name = 'مصطفى النجار'
+        customer.phone = '01220000000'
+        db.session.commit()
+
+    assert IDS['mostafa'] in _search(app, owner, 'النجار')
+    assert IDS['mostafa'] not in _search(app, owner, 'حسن')
+    assert IDS['mostafa'] not in _search(app, owner, '01223334445')
+
+
+def test_an_erased_member_cannot_be_found(app, owner):
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.models.customer_search_entry import CustomerSearchEntry
+    from app.services.retention_service import anonymise
+
+    with app.app_context():
+        anonymise(db.session.get(Customer, IDS['sara']))
+        db.session.commit()
+        assert db.session.get(CustomerSearchEntry, IDS['sara']) is None
+
+    assert IDS['sara'] not in _search(app, owner, 'sara')
+    assert IDS['sara'] not in _search(app, owner, '01556667778')
+    assert IDS['sara'] not in _search(app, owner, 'sara@example.com')
+
+
+def test_the_trigram_table_matches_the_entries(app):
+    from sqlalchemy import text
+    from app.extensions import db
+
+    with app.app_context():
+        entries = db.session.execute(text(
+            'SELECT customer_id, search_text, phone_digits FROM customer_search_entries '
+            'ORDER BY customer_id')).all()
+        indexed = db.session.execute(text(
+            'SELECT rowid, search_text, phone_digits FROM customer_search_fts '
+            'ORDER BY rowid')).all()
+        assert [tuple(r) for r in indexed] == [tuple(r) for r in entries]
+        db.session.execute(text(
+            "INSERT INTO customer_search_fts(customer_search_fts) VALUES ('integrity-check')"))
+
+
+def test_rebuild_reproduces_the_entries(app):
+    from app.extensions import db
+    from app.models.customer_search_entry import CustomerSearchEntry
+    from app.services.customer_search import rebuild
+
+    def snapshot():
+        return sorted((e.customer_id, e.name_key, e.search_text, e.phone_digits)
+                      for e in CustomerSearchEntry.query.all())
+
+    with app.app_context():
+        before = snapshot()
+        assert rebuild() == len(before)
+        db.session.expire_all()
+        assert snapshot() == before
+
+
+def _home_branch():
+    from app.models.customer import Customer
+    from app.extensions import db
+    return db.session.get(Customer, IDS['ahmed']).branch_id
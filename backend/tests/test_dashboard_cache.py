@@ -0,0 +1,318 @@
+"""Owner dashboard snapshots: served while fresh, dropped when the numbers move.
+
+The owner dashboard is cached per branch scope for
+OWNER_DASHBOARD_CACHE_SECONDS (app/services/dashboard_cache.py). These tests
+switch it on and hold it to its promises:
+
+* a repeat read inside the interval runs no queries at all;
+* once the interval passes, or on ``?fresh=1``, it is recomputed;
+* a committed write to anything the dashboard counts drops the snapshots that
+  cover that branch — and only those; a rolled-back write drops nothing;
+* the hit/miss counters add up, and are readable over the API.
+
+Run with:  pytest backend/tests/test_dashboard_cache.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TTL = 30
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['OWNER_DASHBOARD_CACHE_SECONDS'] = TTL
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.gym import Gym
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+    from app.models.user import User, UserRole
+
+    admin = User(username='dc_admin', email='dc_admin@example.com',
+                 full_name='Admin', role=UserRole.SUPER_ADMIN, is_active=True)
+    admin.set_password('secret123')
+    db.session.add(admin)
+
+    ids = {'branches': {}}
+    for n, name in enumerate(('north', 'south')):
+        owner = User(username=f'dc_{name}', email=f'dc_{name}@example.com',
+                     full_name=f'Owner {name}', role=UserRole.OWNER, is_active=True)
+        owner.set_password('secret123')
+        db.session.add(owner)
+        db.session.flush()
+
+        gym = Gym(name=f'{name} gym', owner_id=owner.id, is_setup_complete=True)
+        db.session.add(gym)
+        db.session.flush()
+        owner.gym_id = gym.id
+
+        branch = Branch(name=f'{name} branch', code=f'DC{name[0].upper()}',
+                        gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        owner.branch_id = branch.id
+
+        db.session.add(Customer(full_name=f'{name} member', phone=f'0100000000{n}',
+                                gender=Gender.MALE, branch_id=branch.id, is_active=True))
+        db.session.add(Transaction(
+            amount=500, payment_method=PaymentMethod.CASH,
+            transaction_type=TransactionType.SUBSCRIPTION,
+            branch_id=branch.id, created_by=owner.id,
+        ))
+        ids['branches'][name] = branch.id
+        ids[name] = owner.id
+
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _login(app, username):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': username, 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+@pytest.fixture(scope='module')
+def north(app):
+    return _login(app, 'dc_north')
+
+
+@pytest.fixture(scope='module')
+def south(app):
+    return _login(app, 'dc_south')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache."""
+    from app.services import dashboard_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(dashboard_cache, '_clock', lambda: now[0])
+    yield now
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Counts how many times the dashboard is really computed."""
+    from app.services.dashboard_service import DashboardService
+
+    calls = []
+    original = DashboardService.get_owner_dashboard
+
+    def _counting(branch_ids=None):
+        calls.append(branch_ids)
+        return original(branch_ids=branch_ids)
+
+    monkeypatch.setattr(DashboardService, 'get_owner_dashboard', staticmethod(_counting))
+    yield calls
+
+
+@pytest.fixture(autouse=True)
+def _cold_cache(app):
+    from app.services.dashboard_cache import reset
+
+    with app.app_context():
+        reset()
+
+
+def _dashboard(app, headers, query=''):
+    response = app.test_client().get('/api/dashboards/owner' + query, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def _write(app, make):
+    from app.extensions import db
+
+    with app.app_context():
+        db.session.add(make())
+        db.session.commit()
+
+
+def _expense(branch):
+    from app.models.expense import Expense
+
+    def make():
+        return Expense(title='Towels', amount=120, branch_id=IDS['branches'][branch],
+                       created_by_id=IDS[branch], expense_date=date.today())
+    return make
+
+
+def _sale(branch, amount=250):
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+
+    def make():
+        return Transaction(amount=amount, payment_method=PaymentMethod.CASH,
+                           transaction_type=TransactionType.OTHER,
+                           branch_id=IDS['branches'][branch], created_by=IDS[branch])
+    return make
+
+
+# ───────────────────────────── serving snapshots ────────────────────────────
+
+def test_a_repeat_read_runs_no_queries(app, clock):
+    from app.services.dashboard_cache import owner_dashboard
+    from app.services.query_profiler import query_budget
+
+    scope = [IDS['branches']['north']]
+    with app.app_context():
+        first = owner_dashboard(scope)
+        with query_budget(0):
+            again = owner_dashboard(scope)
+        assert again == first
+
+
+def test_the_endpoint_computes_once_inside_the_interval(app, north, clock, computed):
+    first = _dashboard(app, north)
+    for _ in range(5):
+        assert _dashboard(app, north) == first
+    assert len(computed) == 1
+
+
+def test_after_the_interval_it_is_recomputed(app, north, clock, computed):
+    _dashboard(app, north)
+    clock[0] += TTL - 1
+    _dashboard(app, north)
+    assert len(computed) == 1
+
+    clock[0] += 2
+    _dashboard(app, north)
+    assert len(computed) == 2
+
+
+def test_fresh_bypasses_and_refills(app, north, clock, computed):
+    _dashboard(app, north)
+    _dashboard(app, north, '?fresh=1')
+    assert len(computed) == 2
+    _dashboard(app, north)
+    assert len(computed) == 2
+
+
+def test_scopes_are_cached_apart(app, north, south, clock, computed):
+    _dashboard(app, north)
+    _dashboard(app, south)
+    assert len(computed) == 2
+    assert computed[0] != computed[1]
+
+
+# ───────────────────────────── dirty marking ────────────────────────────────
+
+@pytest.mark.parametrize('make', [
+    lambda: _sale('north'),
+    lambda: _expense('north'),
+], ids=['transaction', 'expense'])
+def test_a_committed_write_shows_up_at_once(app, north, clock, computed, make):
+    before = _dashboard(app, north)
+    _write(app, make())
+    after = _dashboard(app, north)
+    assert len(computed) == 2
+    assert after != before
+
+
+def test_the_new_sale_is_in_the_next_read(app, north, clock):
+    before = _dashboard(app, north)['revenue']['total_30_days']
+    _write(app, _sale('north', amount=1000))
+    assert _dashboard(app, north)['revenue']['total_30_days'] == before + 1000
+
+
+def test_a_write_in_another_gym_keeps_the_snapshot(app, north, south, clock, computed):
+    _dashboard(app, north)
+    _dashboard(app, south)
+    _write(app, _sale('south'))
+
+    _dashboard(app, north)
+    assert len(computed) == 2
+    _dashboard(app, south)
+    assert len(computed) == 3
+
+
+def test_an_edit_after_commit_dirties_the_branch(app, north, clock, computed):
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    _dashboard(app, north)
+    with app.app_context():
+        member = Customer.query.filter_by(branch_id=IDS['branches']['north']).first()
+        db.session.commit()  # expire everything, as the end of a request does
+        member.full_name = 'Renamed'
+        db.session.commit()
+    _dashboard(app, north)
+    assert len(computed) == 2
+
+
+def test_a_rolled_back_write_keeps_the_snapshot(app, north, clock, computed):
+    from app.extensions import db
+
+    _dashboard(app, north)
+    with app.app_context():
+        db.session.add(_sale('north')())
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+    _dashboard(app, north)
+    assert len(computed) == 1
+
+
+# ───────────────────────────── monitoring ───────────────────────────────────
+
+def test_the_counters_add_up(app, north, clock):
+    from app.services.dashboard_cache import stats
+
+    _dashboard(app, north)
+    _dashboard(app, north)
+    _dashboard(app, north)
+    _dashboard(app, north, '?fresh=1')
+    _write(app, _sale('north'))
+
+    with app.app_context():
+        counters = stats()
+    assert counters['misses'] == 1
+    assert counters['hits'] == 2
+    assert counters['bypasses'] == 1
+    assert counters['invalidations'] == 1
+    assert counters['snapshots'] == 0
+    assert counters['hit_ratio'] == pytest.approx(2 / 3)
+
+
+def test_the_counters_are_readable_by_the_platform_admin(app, north, clock):
+    _dashboard(app, north)
+    admin = _login(app, 'dc_admin')
+
+    response = app.test_client().get('/api/dashboards/cache-stats', headers=admin)
+    assert response.status_code == 200
+    assert response.get_json()['data']['misses'] == 1
+
+    response = app.test_client().get('/api/dashboards/cache-stats', headers=north)
+    assert response.status_code == 403
+
+
+def test_zero_turns_it_off(app, north, computed):
+    app.config['OWNER_DASHBOARD_CACHE_SECONDS'] = 0
+    try:
+        _dashboard(app, north)
+        _dashboard(app, north)
+    finally:
+        app.config['OWNER_DASHBOARD_CACHE_SECONDS'] = TTL
+    assert len(computed) == 2
@@ -0,0 +1,110 @@
+"""The endpoint benchmarks (benchmarks/endpoints.py), run small.
+
+Timings are not asserted — they belong to the machine — but the machinery is:
+
+* every endpoint in the suite answers successfully on a synthetic database,
+  with its latencies and query count recorded;
+* a query more than the checked-in counts, or a latency past the threshold,
+  is a regression, and noise within the slack is not;
+* a run records the latencies locally and the query counts apart, the next
+  compares with both, and either taken at other settings is refused rather
+  than compared;
+* benchmarks/endpoint_queries.json has a count for every endpoint measured.
+
+Run with:  pytest backend/tests/test_endpoint_benchmarks.py
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MEMBERS_PER_BRANCH = 15
+
+
+@pytest.fixture(scope='module')
+def app():
+    from benchmarks.endpoints import build_app
+
+    return build_app(scale=1, seed=42, members_per_branch=MEMBERS_PER_BRANCH, fresh=True)
+
+
+def test_every_endpoint_is_measured(app):
+    from benchmarks.endpoints import run
+
+    results = run(app, iterations=2, warmup=0)
+    assert {'qr_scan', 'entry_log_scan', 'client_stats', 'client_qr', 'dashboard_owner',
+            'dashboard_accountant', 'reports_revenue', 'customer_search_name',
+            'customer_search_phone'} <= set(results)
+    for name, result in results.items():
+        assert result['n'] == 2, name
+        assert 0 < result['p50_ms'] <= result['p95_ms'], name
+        assert result['queries'] > 0, name
+
+    from benchmarks.endpoints import QUERIES
+    checked_in = json.load(open(QUERIES))
+    assert set(checked_in['endpoints']) == set(results)
+
+
+def test_regressions_are_queries_up_or_latency_past_the_threshold():
+    from benchmarks.endpoints import compare
+
+    baseline = {'endpoints': {
+        'door': {'p50_ms': 10.0, 'p95_ms': 20.0},
+        'stats': {'p50_ms': 1.0, 'p95_ms': 1.5},
+    }}
+    queries = {'endpoints': {'door': 12, 'stats': 5}}
+    assert compare({
+        'door': {'p50_ms': 14.0, 'p95_ms': 26.0, 'queries': 12},  # within 25% + 2ms
+        'stats': {'p50_ms': 2.5, 'p95_ms': 3.0, 'queries': 4},    # noise, and fewer
+        'new': {'p50_ms': 99.0, 'p95_ms': 99.0, 'queries': 99},   # no baseline yet
+    }, baseline, queries=queries) == []
+
+    assert compare({
+        'door': {'p50_ms': 10.0, 'p95_ms': 30.0, 'queries': 13},
+    }, baseline, queries=queries) == [('door', 'queries', 12, 13),
+                                      ('door', 'p95_ms', 20.0, 30.0)]
+
+    # A fresh clone has the checked-in counts and no latencies yet.
+    assert compare({'door': {'p50_ms': 99.0, 'p95_ms': 99.0, 'queries': 13}},
+                   None, queries=queries) == [('door', 'queries', 12, 13)]
+
+
+def test_a_run_records_a_baseline_and_the_next_compares(app, tmp_path, capsys):
+    from benchmarks.endpoints import main
+
+    baseline = str(tmp_path / 'endpoints.json')
+    queries = str(tmp_path / 'endpoint_queries.json')
+    argv = ['--members-per-branch', str(MEMBERS_PER_BRANCH), '--iterations', '2',
+            '--warmup', '0', '--only', 'client_qr', 'reports_weekly',
+            '--baseline', baseline, '--queries', queries]
+
+    assert main(argv) == 0
+    latencies, counts = json.load(open(baseline)), json.load(open(queries))
+    assert set(latencies['endpoints']) == set(counts['endpoints']) == {
+        'client_qr', 'reports_weekly'}
+    assert 'queries' not in latencies['endpoints']['client_qr']
+    assert counts['endpoints']['client_qr'] > 0
+    # Nothing machine-specific goes in the file that is checked in.
+    assert set(counts) == {'scale', 'seed', 'members_per_branch', 'endpoints'}
+    assert latencies['members_per_branch'] == counts['members_per_branch'] == MEMBERS_PER_BRANCH
+
+    assert main(argv + ['--threshold', '100']) == 0
+    assert 'No regressions' in capsys.readouterr().out
+
+    counts['endpoints']['client_qr'] -= 1
+    json.dump(counts, open(queries, 'w'))
+    assert main(argv + ['--threshold', '100']) == 1
+    assert 'client_qr: queries' in capsys.readouterr().out
+
+    # Another machine: no latencies of its own, the same counts to meet.
+    os.remove(baseline)
+    assert main(argv + ['--threshold', '100']) == 1
+    assert 'client_qr: queries' in capsys.readouterr().out
+    assert os.path.exists(baseline)
+
+    counts['scale'] = 3
+    json.dump(counts, open(queries, 'w'))
+    assert main(argv) == 2
@@ -0,0 +1,291 @@
+"""Cursor (keyset) pages on the long lists: every row once, at any depth.
+
+/api/validation/entry-logs, /api/transactions, /api/payments and
+/api/client/history take ``?cursor=`` as an alternative to page/per_page
+(app/utils/cursor_pagination.py). These tests walk each list to the end by
+cursor and hold it to the offset pages it sits beside:
+
+* the same rows in the same order, none skipped or repeated — including rows
+  that share a timestamp across a page boundary;
+* a deep page runs the same statements as the first: a seek, no COUNT;
+* a total only when asked for; a bad cursor is a 400, not a 500;
+* the page/per_page contract is untouched.
+
+Run with:  pytest backend/tests/test_keyset_pagination.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: Rows per list: enough for several pages at the largest page size.
+ROWS = 230
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.entry_log import EntryLog, EntryStatus, EntryType
+    from app.models.gym import Gym
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+    from app.models.user import User, UserRole
+
+    owner = User(username='ks_owner', email='ks@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Keyset Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    branches = [Branch(name=f'KS{i}', code=f'KS{i}', gym_id=gym.id, is_active=True)
+                for i in range(2)]
+    db.session.add_all(branches)
+    db.session.flush()
+    owner.branch_id = branches[0].id
+
+    members = []
+    for i, branch in enumerate(branches):
+        member = Customer(full_name=f'Member {i}', phone=f'0155500000{i}',
+                          gender=Gender.MALE, branch_id=branch.id, is_active=True)
+        member.set_password('secret123')
+        members.append(member)
+    db.session.add_all(members)
+    db.session.flush()
+
+    # Every fifth row shares its timestamp with the next few, so page
+    # boundaries land inside runs of identical times.
+    base = datetime(2026, 3, 1, 12, 0, 0)
+    for i in range(ROWS):
+        when = base - timedelta(minutes=i - i % 5)
+        branch = branches[i % 2]
+        member = members[i % 2]
+        db.session.add(EntryLog(
+            customer_id=member.id, branch_id=branch.id, entry_time=when,
+            entry_type=EntryType.QR_SCAN, entry_status=EntryStatus.APPROVED,
+        ))
+        db.session.add(Transaction(
+            amount=100 + i, payment_method=PaymentMethod.CASH,
+            transaction_type=TransactionType.OTHER, branch_id=branch.id,
+            created_by=owner.id, transaction_date=when, created_at=when,
+        ))
+
+    db.session.commit()
+    globals()['IDS'] = {
+        'branches': [b.id for b in branches],
+        'members': [m.id for m in members],
+        'phones': [m.phone for m in members],
+    }
+
+
+@pytest.fixture(scope='module')
+def owner(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'ks_owner', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+@pytest.fixture(scope='module')
+def member(app):
+    response = app.test_client().post(
+        '/api/client/auth/login', json={'phone': IDS['phones'][0], 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+def _get(app, url, headers):
+    response = app.test_client().get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def _walk(app, url, headers, key, per_page):
+    """Every row of a list, following next_cursor to the end."""
+    rows, cursor, pages = [], '', 0
+    separator = '&' if '?' in url else '?'
+    while True:
+        data = _get(app, f'{url}{separator}per_page={per_page}&cursor={cursor}', headers)
+        pages += 1
+        rows.extend(data[key])
+        pagination = data['pagination']
+        assert pagination['mode'] == 'cursor'
+        assert pagination['has_more'] == (pagination['next_cursor'] is not None)
+        if not pagination['has_more']:
+            return rows, pages
+        cursor = pagination['next_cursor']
+
+
+def _offset_walk(app, url, headers, key):
+    rows, page = [], 1
+    separator = '&' if '?' in url else '?'
+    while True:
+        data = _get(app, f'{url}{separator}per_page=100&page={page}', headers)
+        if not data[key]:
+            return rows
+        rows.extend(data[key])
+        page += 1
+
+
+# ───────────────────────────── every row, once ──────────────────────────────
+
+LISTS = [
+    ('/api/validation/entry-logs', 'entries', 'entry_time'),
+    ('/api/transactions', 'items', 'transaction_date'),
+    ('/api/payments', 'items', 'transaction_date'),
+]
+
+
+@pytest.mark.parametrize('url, key, stamp', LISTS)
+@pytest.mark.parametrize('per_page', [7, 20, 100])
+def test_cursor_pages_cover_every_row_once(app, owner, url, key, stamp, per_page):
+    rows, pages = _walk(app, url, owner, key, per_page)
+    ids = [row['id'] for row in rows]
+
+    assert len(ids) == ROWS
+    assert len(set(ids)) == ROWS
+    assert pages == -(-ROWS // per_page)
+
+    # Newest first, id descending within a shared instant.
+    keys = [(row[stamp], row['id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize('url, key, stamp', LISTS)
+def test_the_same_rows_as_the_offset_pages(app, owner, url, key, stamp):
+    by_cursor, _ = _walk(app, url, owner, key, 50)
+    by_offset = _offset_walk(app, url, owner, key)
+    assert {row['id'] for row in by_cursor} == {row['id'] for row in by_offset}
+
+
+def test_filters_still_apply(app, owner):
+    branch = IDS['branches'][1]
+    rows, _ = _walk(app, f'/api/validation/entry-logs?branch_id={branch}',
+                    owner, 'entries', 25)
+    assert len(rows) == ROWS // 2
+    assert {row['branch_id'] for row in rows} == {branch}
+
+
+def test_a_member_scrolls_their_own_history(app, member):
+    rows, _ = _walk(app, '/api/client/history', member, 'entries', 30)
+    assert len(rows) == ROWS // 2
+    assert len({row['id'] for row in rows}) == ROWS // 2
+    assert {row['branch_id'] for row in rows} == {IDS['branches'][0]}
+
+
+# ───────────────────────────── constant page cost ───────────────────────────
+
+def test_a_deep_page_costs_what_the_first_does(app, owner):
+    from app.services.query_profiler import collect_queries, query_budget
+
+    url = '/api/validation/entry-logs?per_page=10&cursor='
+    first = _get(app, url, owner)
+    deep = first
+    for _ in range(15):
+        deep = _get(app, url + deep['pagination']['next_cursor'], owner)
+
+    with app.app_context():
+        with collect_queries() as first_page:
+            _get(app, url, owner)
+        with query_budget(first_page.count) as deep_page:
+            _get(app, url + deep['pagination']['next_cursor'], owner)
+
+    assert deep_page.count == first_page.count
+    listing = [s for s in deep_page.sql if 'FROM entry_logs' in s]
+    assert len(listing) == 1
+    # A seek on the timestamp, not a skip: SQLite spells every LIMIT with an
+    # OFFSET, so the sign to look for is the range predicate.
+    assert 'entry_logs.entry_time <=' in listing[0]
+    assert 'count(' not in ' '.join(deep_page.sql).lower()
+
+
+def test_the_total_only_when_asked(app, owner):
+    plain = _get(app, '/api/transactions?cursor=', owner)['pagination']
+    assert 'total' not in plain
+
+    counted = _get(app, '/api/transactions?cursor=&with_total=1', owner)['pagination']
+    assert counted['total'] == ROWS
+    assert counted['total_is_estimate'] is False  # SQLite: the exact count
+
+
+def test_payments_carry_the_range_total_on_the_first_page(app, owner):
+    first = _get(app, '/api/payments?cursor=&per_page=10', owner)
+    assert first['total_amount'] == sum(100 + i for i in range(ROWS))
+
+    second = _get(app, '/api/payments?per_page=10&cursor='
+                  + first['pagination']['next_cursor'], owner)
+    assert 'total_amount' not in second
+
+
+# ───────────────────────────── contract edges ───────────────────────────────
+
+@pytest.mark.parametrize('token', ['garbage', 'bm90IGpzb24', 'WzksIjIwMjYiLDFd'])
+def test_a_bad_cursor_is_a_400(app, owner, token):
+    response = app.test_client().get(f'/api/transactions?cursor={token}', headers=owner)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_the_cursor_round_trips(app):
+    from app.utils.cursor_pagination import decode_cursor, encode_cursor
+
+    when = datetime(2026, 3, 1, 9, 30, 15, 123456)
+    token = encode_cursor(when, 4242)
+    assert '=' not in token and '/' not in token and '+' not in token
+    assert decode_cursor(token) == (when, 4242)
+
+
+def test_page_and_per_page_are_unchanged(app, owner):
+    data = _get(app, '/api/validation/entry-logs?page=3&per_page=20', owner)
+    assert data['pagination']['total'] == ROWS
+    assert data['pagination']['current_page'] == 3
+    assert len(data['entries']) == 20
+
+    history = app.test_client().post(
+        '/api/client/auth/login', json={'phone': IDS['phones'][1], 'password': 'secret123'})
+    token = history.get_json()['data']['access_token']
+    assert isinstance(_get(app, '/api/client/history',
+                           {'Authorization': 'Bearer ' + token}), list)
+
+
+def test_the_postgres_estimate_compiles_to_plain_sql(app):
+    """The estimate EXPLAINs the query with its values inlined; make sure the
+    filters these lists use have a literal form on Postgres."""
+    from sqlalchemy.dialects import postgresql
+    from app.models.entry_log import EntryLog, EntryStatus
+
+    with app.app_context():
+        query = EntryLog.query.filter(
+            EntryLog.branch_id.in_(IDS['branches']),
+            EntryLog.entry_status == EntryStatus.APPROVED,
+            EntryLog.entry_time >= datetime(2026, 1, 1),
+        )
+        sql = str(query.statement.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={'literal_binds': True, 'render_postcompile': True},
+        ))
+    assert '%(' not in sql and 'POSTCOMPILE' not in sql
+    assert "'2026-01-01" in sql
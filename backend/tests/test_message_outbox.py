@@ -0,0 +1,360 @@
+"""One-time codes: persisted and queued by the request, sent by the dispatcher.
+
+``/api/client/auth/request-code`` and ``/forgot-password`` no longer talk to
+the SMS/email provider; app/services/message_outbox.py does, afterwards. These
+tests hold it to that:
+
+* the request returns with a ``delivery_id`` before anything is sent, and the
+  app can poll it from queued to sent — a stranger's identifier included;
+* a failed send is retried with backoff; a permanent failure, or running out
+  of attempts, dead-letters the row and burns its code;
+* a code replaced before it went out is not sent at all;
+* no more sends run at once than the provider's ``max_concurrency``;
+* a worker's first request starts its dispatcher thread, so a code queued
+  before a restart is sent without waiting for another to be requested;
+* the SMTP provider reuses one logged-in connection across sends, and
+  replaces one the server has dropped.
+
+Run with:  pytest backend/tests/test_message_outbox.py
+"""
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PHONE = '01000000041'
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='mo_owner', email='mo_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='message gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    branch = Branch(name='message branch', code='MO1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.flush()
+    member = Customer(full_name='Member', phone=PHONE, email='member@example.com',
+                      gender=Gender.MALE, branch_id=branch.id, is_active=True)
+    db.session.add(member)
+    db.session.commit()
+    globals()['IDS'] = {'member': member.id}
+
+
+class _Recording:
+    """Delivers by any method, remembers what, and fails on request."""
+
+    def __init__(self, max_concurrency=4):
+        from app.services.notification_service import NotificationProvider
+
+        # A real NotificationProvider, so sends go through its slot() limit.
+        self.impl = type('RecordingProvider', (NotificationProvider,), {
+            'max_concurrency': max_concurrency,
+            'send_sms': lambda _, phone, message: self._send('sms', phone, message),
+            'send_email': lambda _, email, subject, body: self._send('email', email, body),
+        })()
+        self.sent = []
+        self.fail = []  # exceptions to raise, in order, before succeeding
+        self.delay = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _send(self, method, target, body):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            error = self.fail.pop(0) if self.fail else None
+        try:
+            time.sleep(self.delay)
+            if error is not None:
+                raise error
+            with self.lock:
+                self.sent.append((method, target, body))
+            return True
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def provider(app):
+    from app.extensions import db
+    from app.models.activation_code import ActivationCode
+    from app.models.message_delivery import MessageDelivery
+    from app.services.notification_service import get_notification_service
+
+    with app.app_context():
+        MessageDelivery.query.delete()
+        ActivationCode.query.delete()
+        db.session.commit()
+    service = get_notification_service()
+    original = service.provider
+    recording = _Recording()
+    service.set_provider(recording.impl)
+    yield recording
+    service.set_provider(original)
+
+
+def _request_code(app, identifier=PHONE):
+    response = app.test_client().post('/api/client/auth/request-code',
+                                      json={'identifier': identifier})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']['delivery_id']
+
+
+def _poll(app, delivery_id):
+    response = app.test_client().get(f'/api/client/auth/deliveries/{delivery_id}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']['status']
+
+
+def _dispatch(app):
+    from app.services.message_outbox import dispatch_pending
+    with app.app_context():
+        return dispatch_pending()
+
+
+def _delivery(app, delivery_id):
+    from app.services.message_outbox import get_delivery
+    with app.app_context():
+        row = get_delivery(delivery_id)
+        return row, (row.activation_code.is_used if row.activation_code else None)
+
+
+def _make_due(app):
+    from app.extensions import db
+    from app.models.message_delivery import MessageDelivery
+    with app.app_context():
+        MessageDelivery.query.update(
+            {'next_attempt_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+
+
+# ───────────────────────────── the request only queues ──────────────────────
+
+def test_the_request_returns_before_the_code_is_sent(app, provider):
+    delivery_id = _request_code(app)
+    assert provider.sent == []
+    assert _poll(app, delivery_id) == 'queued'
+
+    assert _dispatch(app) == 1
+    [(method, target, body)] = provider.sent
+    assert (method, target) == ('sms', PHONE)
+    assert _poll(app, delivery_id) == 'sent'
+
+    row, _ = _delivery(app, delivery_id)
+    assert row.body is None  # the code does not outlive its delivery here
+
+
+def test_a_strangers_delivery_polls_like_a_members(app, provider):
+    delivery_id = _request_code(app, identifier='01999000999')
+    assert _poll(app, delivery_id) == 'queued'
+    _dispatch(app)
+    assert _poll(app, delivery_id) == 'sent'
+    assert provider.sent == []
+
+
+def test_an_unknown_reference_is_not_found(app, provider):
+    response = app.test_client().get('/api/client/auth/deliveries/nope')
+    assert response.status_code == 404
+
+
+def test_forgot_password_queues_the_reset_code(app, provider):
+    response = app.test_client().post('/api/client/auth/forgot-password',
+                                      json={'identifier': 'member@example.com'})
+    assert response.status_code == 200, response.get_json()
+    assert provider.sent == []
+    _dispatch(app)
+    [(method, target, body)] = provider.sent
+    assert (method, target) == ('email', 'member@example.com')
+    assert 'reset' in body.lower()
+
+
+# ───────────────────────────── failures ─────────────────────────────────────
+
+def test_a_failed_send_is_retried_after_a_backoff(app, provider):
+    provider.fail = [smtplib.SMTPServerDisconnected('gone away')]
+    delivery_id = _request_code(app)
+    _dispatch(app)
+    assert _poll(app, delivery_id) == 'retrying'
+    row, burned = _delivery(app, delivery_id)
+    assert row.next_attempt_at > datetime.utcnow()
+    assert 'gone away' in row.last_error
+    assert burned is False
+    assert _dispatch(app) == 0  # not due yet
+
+    _make_due(app)
+    _dispatch(app)
+    assert _poll(app, delivery_id) == 'sent'
+    assert len(provider.sent) == 1
+
+
+def test_a_permanent_failure_is_dead_lettered_and_burns_the_code(app, provider):
+    provider.fail = [NotImplementedError('no SMS here')]
+    delivery_id = _request_code(app)
+    _dispatch(app)
+    assert _poll(app, delivery_id) == 'failed'
+    row, burned = _delivery(app, delivery_id)
+    assert row.attempts == 1 and row.body is None
+    assert burned is True
+
+
+def test_running_out_of_attempts_is_dead_lettered(app, provider):
+    app.config['MESSAGE_MAX_ATTEMPTS'] = 2
+    provider.fail = [RuntimeError('timeout'), RuntimeError('timeout')]
+    try:
+        delivery_id = _request_code(app)
+        _dispatch(app)
+        _make_due(app)
+        _dispatch(app)
+    finally:
+        app.config['MESSAGE_MAX_ATTEMPTS'] = 5
+    assert _poll(app, delivery_id) == 'failed'
+    row, burned = _delivery(app, delivery_id)
+    assert row.attempts == 2 and burned is True
+
+
+def test_a_replaced_code_is_not_sent(app, provider):
+    first = _request_code(app)
+    second = _request_code(app)
+    _dispatch(app)
+    assert _poll(app, first) == 'cancelled'
+    assert _poll(app, second) == 'sent'
+    assert len(provider.sent) == 1
+
+
+# ───────────────────────────── concurrency ──────────────────────────────────
+
+def test_sends_stay_within_the_providers_concurrency(app, provider):
+    from app.extensions import db
+    from app.models.activation_code import ActivationCode
+    from app.services.message_outbox import queue_activation_code
+    from app.services.notification_service import get_notification_service
+
+    limited = _Recording(max_concurrency=2)
+    limited.delay = 0.05
+    get_notification_service().set_provider(limited.impl)
+    with app.app_context():
+        for n in range(6):
+            code, plain = ActivationCode.create_code(
+                customer_id=IDS['member'], delivery_method='sms',
+                delivery_target=f'0100000010{n}')
+            queue_activation_code(code, plain, 'Member')
+        db.session.commit()
+    _dispatch(app)
+    assert len(limited.sent) == 6
+    assert limited.peak == 2  # in parallel, but no more than allowed
+
+
+def test_the_cli_drains_the_queue(app, provider):
+    _request_code(app)
+    result = app.test_cli_runner().invoke(args=['dispatch-messages'])
+    assert 'Dispatched 1' in result.output
+    assert len(provider.sent) == 1
+
+
+def test_a_restarted_worker_sends_what_was_left_queued(app, provider):
+    delivery_id = _request_code(app)  # with MESSAGE_DISPATCHER=manual: no thread
+    assert 'message_dispatcher' not in app.extensions
+
+    app.config['MESSAGE_DISPATCHER'] = 'thread'
+    try:
+        assert app.test_client().get('/health').status_code == 200
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and _poll(app, delivery_id) != 'sent':
+            time.sleep(0.05)
+        assert _poll(app, delivery_id) == 'sent'
+    finally:
+        app.config['MESSAGE_DISPATCHER'] = 'manual'
+
+
+# ───────────────────────────── SMTP connection reuse ────────────────────────
+
+class _FakeSMTP:
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.messages = []
+        self.dropped = False
+        _FakeSMTP.opened.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def send_message(self, message):
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected('idle timeout')
+        self.messages.append(message['To'])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    from app.services.notification_service import SMTPNotificationProvider
+
+    _FakeSMTP.opened = []
+    monkeypatch.setattr(smtplib, 'SMTP', _FakeSMTP)
+    return SMTPNotificationProvider('mail.example.com', 587, 'user', 'pass',
+                                    'gym@example.com', max_connections=2)
+
+
+def test_smtp_sends_reuse_one_connection(smtp):
+    for n in range(3):
+        smtp.send_email(f'm{n}@example.com', 'Code', 'Body')
+    assert len(_FakeSMTP.opened) == 1
+    assert _FakeSMTP.opened[0].messages == [f'm{n}@example.com' for n in range(3)]
+
+
+def test_a_dropped_smtp_connection_is_replaced(smtp):
+    smtp.send_email('a@example.com', 'Code', 'Body')
+    _FakeSMTP.opened[0].dropped = True
+    smtp.send_email('b@example.com', 'Code', 'Body')
+    assert len(_FakeSMTP.opened) == 2
+    assert _FakeSMTP.opened[1].messages == ['b@example.com']
+
+
+def test_an_idle_smtp_connection_is_not_reused(smtp):
+    smtp.idle_seconds = 0
+    smtp.send_email('a@example.com', 'Code', 'Body')
+    smtp.send_email('b@example.com', 'Code', 'Body')
+    assert len(_FakeSMTP.opened) == 2
@@ -0,0 +1,299 @@
+"""Message thread summaries: the thread lists without reading the messages.
+
+app/services/message_threads.py keeps one ``message_threads`` row per
+(captain, member) pair — the latest message and each side's unread count — in
+step with the messages. These tests hold it to that:
+
+* sending moves the last message and counts it unread for the other side, and
+  opening the thread takes what it marked read off the reader's count — not
+  a message that arrived in between;
+* the lists page by keyset, most recent first, with never-messaged members
+  after the last thread, and read nothing from ``messages`` but the last
+  message of each thread on the page;
+* ``rebuild`` writes what the listener wrote, and erasing a member takes
+  their threads with their messages.
+
+Run with:  pytest backend/tests/test_message_threads.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.user import User, UserRole
+
+    owner = User(username='mt_owner', email='mt_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='threads gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    branch = Branch(name='threads branch', code='MT1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.flush()
+
+    def trainer(username):
+        user = User(username=username, email=f'{username}@example.com',
+                    full_name=username.title(), role=UserRole.TRAINER,
+                    gym_id=gym.id, branch_id=branch.id, is_active=True)
+        user.set_password('secret123')
+        db.session.add(user)
+        db.session.flush()
+        return user
+
+    captain = trainer('mt_captain')
+    second = trainer('mt_second')
+    service = Service(name='PT', service_type=ServiceType.PERSONAL_TRAINING,
+                      price=1000, duration_days=30, gym_id=gym.id)
+    db.session.add(service)
+    db.session.flush()
+
+    ids = {'captain': captain.id, 'second': second.id, 'members': []}
+    for n in range(6):
+        member = Customer(full_name=f'Member {n}', phone=f'0166000000{n}',
+                          branch_id=branch.id, is_active=True)
+        member.set_password('secret123')
+        db.session.add(member)
+        db.session.flush()
+        for coach in (captain, second) if n == 0 else (captain,):
+            db.session.add(Subscription(
+                customer_id=member.id, service_id=service.id, branch_id=branch.id,
+                trainer_id=coach.id, start_date=date.today() - timedelta(days=5),
+                end_date=date.today() + timedelta(days=25),
+                status=SubscriptionStatus.ACTIVE,
+            ))
+        ids['members'].append(member.id)
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _staff(app, username):
+    r = app.test_client().post('/api/auth/login',
+                               json={'username': username, 'password': 'secret123'})
+    assert r.status_code == 200, r.get_json()
+    return {'Authorization': 'Bearer ' + r.get_json()['data']['access_token']}
+
+
+def _member(app, n):
+    from app.utils.client_auth import create_client_token
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_client_token(IDS['members'][n])}
+
+
+def _thread(trainer_id, customer_id):
+    from app.models.message_thread import MessageThread
+    return MessageThread.query.filter_by(
+        trainer_id=trainer_id, customer_id=customer_id).one_or_none()
+
+
+def _say(trainer_id, customer_id, sender, body, minutes_ago):
+    from app.extensions import db
+    from app.models.message import Message
+
+    db.session.add(Message(
+        trainer_id=trainer_id, customer_id=customer_id, sender=sender, body=body,
+        created_at=datetime.utcnow() - timedelta(minutes=minutes_ago)))
+    db.session.commit()
+
+
+# ───────────────────────────── send and read ────────────────────────────────
+
+def test_sending_moves_the_summary_and_reading_clears_it(app):
+    client = app.test_client()
+    captain = _staff(app, 'mt_captain')
+    member = _member(app, 0)
+    member_id = IDS['members'][0]
+
+    client.post(f"/api/client/messages/{IDS['captain']}", json={'body': 'first'},
+                headers=member)
+    client.post(f"/api/client/messages/{IDS['captain']}", json={'body': 'second'},
+                headers=member)
+    client.post(f"/api/private-training/messages/{member_id}", json={'body': 'reply'},
+                headers=captain)
+
+    with app.app_context():
+        thread = _thread(IDS['captain'], member_id)
+        assert (thread.trainer_unread, thread.member_unread) == (2, 1)
+        assert thread.last_message.body == 'reply'
+        assert thread.last_message_at == thread.last_message.created_at
+
+    client.get(f"/api/private-training/messages/{member_id}", headers=captain)
+    with app.app_context():
+        thread = _thread(IDS['captain'], member_id)
+        assert (thread.trainer_unread, thread.member_unread) == (0, 1)
+
+    # The member's list counts only their side, and only current captains'.
+    data = client.get('/api/client/messages/threads', headers=member).get_json()['data']
+    by_trainer = {t['trainer_id']: t for t in data['items']}
+    assert set(by_trainer) == {IDS['captain'], IDS['second']}
+    assert by_trainer[IDS['captain']]['unread_count'] == 1
+    assert by_trainer[IDS['captain']]['last_message']['body'] == 'reply'
+    assert by_trainer[IDS['second']]['last_message'] is None
+    assert data['total_unread'] == 1
+
+    client.get(f"/api/client/messages/{IDS['captain']}", headers=member)
+    with app.app_context():
+        assert _thread(IDS['captain'], member_id).member_unread == 0
+
+
+def test_a_message_sent_while_the_thread_is_read_stays_unread(app):
+    from types import SimpleNamespace
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app.extensions import db
+    from app.models.message import Message, MessageSender
+    from app.services import message_threads
+
+    captain, member_id = IDS['second'], IDS['members'][2]
+    sent = []
+
+    def _send_in_between(update_context):
+        # The member's next message lands between marking the messages read
+        # and updating the count, as another request's commit could.
+        if sent or update_context.mapper.class_ is not Message:
+            return
+        connection = update_context.session.connection()
+        now = datetime.utcnow()
+        message_id = connection.execute(Message.__table__.insert().values(
+            trainer_id=captain, customer_id=member_id, sender=MessageSender.MEMBER,
+            body='one more', created_at=now)).inserted_primary_key[0]
+        message_threads._on_insert(None, connection, SimpleNamespace(
+            id=message_id, trainer_id=captain, customer_id=member_id,
+            sender=MessageSender.MEMBER, read_at=None, created_at=now))
+        sent.append(message_id)
+
+    with app.app_context():
+        _say(captain, member_id, MessageSender.MEMBER, 'hello', 2)
+        _say(captain, member_id, MessageSender.MEMBER, 'anyone?', 1)
+        event.listen(Session, 'after_bulk_update', _send_in_between)
+        try:
+            assert message_threads.mark_read(captain, member_id, MessageSender.TRAINER) == 2
+        finally:
+            event.remove(Session, 'after_bulk_update', _send_in_between)
+        db.session.expire_all()
+        assert sent and _thread(captain, member_id).trainer_unread == 1
+        assert db.session.get(Message, sent[0]).read_at is None
+
+
+# ───────────────────────────── the lists ────────────────────────────────────
+
+def test_the_captains_list_pages_by_recency(app):
+    from app.models.message import MessageSender
+
+    members = IDS['members']
+    with app.app_context():
+        # Member 0 spoke a moment ago (above); 1-3 earlier, in that order; 4
+        # and 5 never.
+        for n, minutes_ago in ((1, 30), (2, 20), (3, 10)):
+            _say(IDS['captain'], members[n], MessageSender.MEMBER, f'hi {n}', minutes_ago)
+
+    client = app.test_client()
+    captain = _staff(app, 'mt_captain')
+    seen = []
+    cursor = ''
+    while True:
+        response = client.get('/api/private-training/messages/threads',
+                              query_string={'cursor': cursor, 'per_page': 2},
+                              headers=captain)
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()['data']
+        seen.append([t['customer_id'] for t in data['items']])
+        if not data['pagination']['has_more']:
+            break
+        cursor = data['pagination']['next_cursor']
+
+    # The never-messaged come on the last page of threads, after them.
+    assert seen == [[members[0], members[3]],
+                    [members[2], members[1], members[4], members[5]]]
+
+    # Unpaged, it is the same list in one go.
+    data = client.get('/api/private-training/messages/threads',
+                      headers=captain).get_json()['data']
+    assert [t['customer_id'] for t in data['items']] == seen[0] + seen[1]
+    assert 'pagination' not in data
+    assert data['total_unread'] == 3
+
+
+def test_a_list_reads_no_messages_but_the_last_ones(app):
+    from app.services.query_profiler import query_budget
+
+    client = app.test_client()
+    captain = _staff(app, 'mt_captain')
+    # Roster, threads with their last message, names, and the unread sum:
+    # not one per member.
+    with app.app_context(), query_budget(6) as log:
+        response = client.get('/api/private-training/messages/threads',
+                              query_string={'cursor': '', 'per_page': 3},
+                              headers=captain)
+    assert response.status_code == 200
+    assert not [s for s in log.sql if 'FROM messages' in s], log.describe()
+
+
+def test_a_bad_cursor_is_a_400(app):
+    response = app.test_client().get('/api/private-training/messages/threads',
+                                     query_string={'cursor': 'not-a-cursor'},
+                                     headers=_staff(app, 'mt_captain'))
+    assert response.status_code == 400
+
+
+# ───────────────────────────── upkeep ───────────────────────────────────────
+
+def _snapshot():
+    from app.extensions import db
+    from app.models.message_thread import MessageThread as T
+    return sorted(db.session.query(
+        T.trainer_id, T.customer_id, T.last_message_id, T.last_message_at,
+        T.trainer_unread, T.member_unread))
+
+
+def test_rebuild_writes_what_the_listener_wrote(app):
+    from app.services.message_threads import rebuild
+
+    with app.app_context():
+        before = _snapshot()
+        assert rebuild() == len(before)
+        assert _snapshot() == before
+
+
+def test_erasing_a_member_takes_their_threads(app):
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.models.message_thread import MessageThread
+    from app.services.retention_service import anonymise
+
+    member_id = IDS['members'][1]
+    with app.app_context():
+        assert _thread(IDS['captain'], member_id) is not None
+        anonymise(db.session.get(Customer, member_id))
+        db.session.commit()
+        assert MessageThread.query.filter_by(customer_id=member_id).count() == 0
+        assert MessageThread.query.filter_by(customer_id=IDS['members'][0]).count() == 1
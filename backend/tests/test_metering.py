@@ -0,0 +1,186 @@
+"""Visit and coin metering under concurrent scans.
+
+Two turnstiles scanning the same member at the same moment used to both read
+"1 visit left", both write 0 and both open — the classic lost update. Metering
+is now one conditional UPDATE per scan (``QRService.meter``), so the database
+settles every race. These tests fire hundreds of parallel scans at a single
+subscription and count: exactly as many admissions as there were visits, no
+counter below zero, and the subscription expired when the last one is spent.
+
+Run with:  pytest backend/tests/test_metering.py
+"""
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: Scans fired at each subscription, and the allowance they compete for.
+SCANS = 300
+ALLOWANCE = 120
+
+#: Parallel clients. Enough to interleave every step of the request, few
+#: enough that SQLite's single writer does not hit its busy timeout.
+WORKERS = 16
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.user import User, UserRole
+
+    owner = User(username='meter_owner', email='mo@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Meter Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    branch = Branch(name='Main', code='MT1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.flush()
+
+    desk = User(username='meter_desk', email='md@example.com', full_name='Desk',
+                role=UserRole.FRONT_DESK, gym_id=gym.id, branch_id=branch.id,
+                is_active=True)
+    desk.set_password('secret123')
+    db.session.add(desk)
+
+    service = Service(name='Ten Visits', service_type=ServiceType.GYM, price=300,
+                      duration_days=30, allowed_days_per_week=7,
+                      grants_gym_entry=True)
+    db.session.add(service)
+    db.session.flush()
+
+    ids = {'branch': branch.id}
+    for tag, fields in (
+        ('visits', {'subscription_type': 'time_based', 'remaining_visits': ALLOWANCE}),
+        ('coins', {'subscription_type': 'coins', 'remaining_coins': ALLOWANCE,
+                   'total_coins': ALLOWANCE}),
+    ):
+        member = Customer(full_name=f'Meter {tag}', phone=f'0166{len(ids):07d}',
+                          branch_id=branch.id, qr_code=f'GYM-METER-{tag}',
+                          is_active=True)
+        db.session.add(member)
+        db.session.flush()
+        subscription = Subscription(
+            customer_id=member.id, service_id=service.id, branch_id=branch.id,
+            start_date=date.today(), end_date=date.today() + timedelta(days=30),
+            status=SubscriptionStatus.ACTIVE, **fields,
+        )
+        db.session.add(subscription)
+        db.session.flush()
+        ids[tag] = {'member': member.id, 'subscription': subscription.id}
+
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _headers(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'meter_desk', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+def _storm(app, path, body):
+    headers = _headers(app)
+
+    def scan(_):
+        return app.test_client().post(path, json=body, headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(scan, range(SCANS)))
+
+
+def _subscription(app, tag):
+    from app.extensions import db
+    from app.models.entry_log import EntryLog, EntryStatus
+    from app.models.subscription import Subscription
+
+    with app.app_context():
+        db.session.expunge_all()
+        subscription = db.session.get(Subscription, IDS[tag]['subscription'])
+        approved = EntryLog.query.filter_by(
+            subscription_id=subscription.id, entry_status=EntryStatus.APPROVED,
+        ).count()
+        return subscription.remaining_visits, subscription.remaining_coins, \
+            subscription.status.value, approved
+
+
+def test_parallel_door_scans_admit_exactly_the_visits_paid_for(app):
+    statuses = _storm(app, '/api/validation/manual', {
+        'customer_id': IDS['visits']['member'], 'branch_id': IDS['branch'],
+    })
+
+    # Every scan got an answer — a 500 here would be a lock timeout or a
+    # constraint error hiding a race, not a refusal.
+    assert set(statuses) <= {200, 403}, statuses
+    assert statuses.count(200) == ALLOWANCE
+
+    remaining, _, status, approved = _subscription(app, 'visits')
+    assert remaining == 0, 'a visit was lost or spent twice'
+    assert approved == ALLOWANCE
+    assert status == 'expired'
+
+
+def test_parallel_coin_deductions_never_overdraw(app):
+    statuses = _storm(app, '/api/qr/deduct-coins', {
+        'qr_code': 'GYM-METER-coins', 'coins_to_deduct': 1,
+    })
+
+    assert set(statuses) <= {200, 403}, statuses
+    assert statuses.count(200) == ALLOWANCE
+
+    _, remaining, status, _ = _subscription(app, 'coins')
+    assert remaining == 0
+    # Coin packages are topped up, not ended, when they run dry.
+    assert status == 'active'
+
+
+def test_meter_refuses_more_than_is_left(app):
+    from app.extensions import db
+    from app.models.subscription import Subscription
+    from app.services.qr_service import QRService
+
+    with app.app_context():
+        subscription = db.session.get(Subscription, IDS['coins']['subscription'])
+        assert QRService.meter(subscription, 'remaining_coins', 1) is None
+        db.session.rollback()
+
+        subscription.remaining_coins = 3
+        db.session.commit()
+        assert QRService.meter(subscription, 'remaining_coins', 5) is None
+        assert QRService.meter(subscription, 'remaining_coins', 2) == 1
+        db.session.commit()
+
+        db.session.expunge_all()
+        assert db.session.get(
+            Subscription, IDS['coins']['subscription']).remaining_coins == 1
@@ -0,0 +1,257 @@
+"""Prometheus metrics: what GET /metrics reports, and that workers add up.
+
+app/services/metrics.py counts every request by endpoint and status, times it
+into a histogram, follows the connection pool, the per-worker caches and the
+door's decisions per branch. These tests read the text exposition back:
+
+* a request shows up under its blueprint and endpoint, with its status and
+  in the latency histogram;
+* approved and denied scans are counted per branch, and only once committed;
+* cache hits and misses and the pool gauges are exported;
+* ``METRICS_TOKEN`` closes the endpoint to anyone without it, and production
+  will not start without one;
+* with ``PROMETHEUS_MULTIPROC_DIR``, counters written by separate processes
+  are summed by whichever one is scraped.
+
+Counters are process-wide, so each test compares against what it read before.
+
+Run with:  pytest backend/tests/test_metrics.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='mx_owner', email='mx_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='metrics gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+    ids = {}
+    for code in ('MX1', 'MX2'):
+        branch = Branch(name=code, code=code, gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        member = Customer(full_name='Member', phone=f'0188{branch.id:07d}',
+                          branch_id=branch.id, is_active=True)
+        db.session.add(member)
+        db.session.flush()
+        ids[code] = {'branch': branch.id, 'member': member.id}
+    owner.branch_id = ids['MX1']['branch']
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _sample(app, name, **labels):
+    """One sample's value from /metrics, 0 if it is not there yet."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    for family in text_string_to_metric_families(response.get_data(as_text=True)):
+        for sample in family.samples:
+            if sample.name == name and all(
+                    sample.labels.get(key) == value for key, value in labels.items()):
+                return sample.value
+    return 0
+
+
+def _entry(code, status):
+    from app.models.entry_log import EntryLog, EntryType
+    return EntryLog(customer_id=IDS[code]['member'], branch_id=IDS[code]['branch'],
+                    entry_type=EntryType.QR_SCAN, entry_status=status,
+                    entry_time=datetime.utcnow())
+
+
+# ───────────────────────────── requests ─────────────────────────────────────
+
+def test_requests_are_counted_and_timed_by_endpoint(app):
+    labels = {'blueprint': 'auth', 'endpoint': 'auth.login'}
+    before = _sample(app, 'gym_requests_total', method='POST', status='401', **labels)
+    observed = _sample(app, 'gym_request_duration_seconds_count', **labels)
+
+    client = app.test_client()
+    for _ in range(3):
+        client.post('/api/auth/login', json={'username': 'mx_owner', 'password': 'wrong'})
+
+    assert _sample(app, 'gym_requests_total', method='POST', status='401', **labels) \
+        == before + 3
+    assert _sample(app, 'gym_request_duration_seconds_count', **labels) == observed + 3
+    assert _sample(app, 'gym_request_duration_seconds_bucket', le='+Inf', **labels) \
+        >= observed + 3
+
+    client.get('/health')
+    assert _sample(app, 'gym_requests_total', blueprint='app', endpoint='health',
+                   status='200') >= 1
+    client.get('/no/such/route')
+    assert _sample(app, 'gym_requests_total', blueprint='unmatched', status='404') >= 1
+
+
+# ───────────────────────────── the door ─────────────────────────────────────
+
+def test_door_decisions_are_counted_per_branch_once_committed(app):
+    from app.extensions import db
+    from app.models.entry_log import EntryStatus
+
+    def scans(code, result):
+        return _sample(app, 'gym_door_scans_total',
+                       branch_id=str(IDS[code]['branch']), result=result)
+
+    before = {(code, result): scans(code, result)
+              for code in ('MX1', 'MX2') for result in ('approved', 'denied')}
+
+    with app.app_context():
+        db.session.add_all([_entry('MX1', EntryStatus.APPROVED),
+                            _entry('MX1', EntryStatus.APPROVED),
+                            _entry('MX1', EntryStatus.DENIED),
+                            _entry('MX2', EntryStatus.DENIED)])
+        db.session.commit()
+
+        db.session.add(_entry('MX2', EntryStatus.APPROVED))
+        db.session.flush()
+        db.session.rollback()
+
+    assert scans('MX1', 'approved') == before[('MX1', 'approved')] + 2
+    assert scans('MX1', 'denied') == before[('MX1', 'denied')] + 1
+    assert scans('MX2', 'denied') == before[('MX2', 'denied')] + 1
+    assert scans('MX2', 'approved') == before[('MX2', 'approved')]
+
+
+# ───────────────────────────── caches and the pool ──────────────────────────
+
+def test_cache_lookups_and_pool_gauges_are_exported(app):
+    app.config['OWNER_DASHBOARD_CACHE_SECONDS'] = 30
+    try:
+        hits = _sample(app, 'gym_cache_lookups_total', cache='owner_dashboard', result='hit')
+        misses = _sample(app, 'gym_cache_lookups_total', cache='owner_dashboard',
+                         result='miss')
+
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={
+            'username': 'mx_owner', 'password': 'secret123'}).get_json()['data']['access_token']
+        for _ in range(2):
+            response = client.get('/api/dashboards/owner',
+                                  headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200
+    finally:
+        app.config['OWNER_DASHBOARD_CACHE_SECONDS'] = 0
+
+    assert _sample(app, 'gym_cache_lookups_total', cache='owner_dashboard',
+                   result='miss') == misses + 1
+    assert _sample(app, 'gym_cache_lookups_total', cache='owner_dashboard',
+                   result='hit') == hits + 1
+
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'gym_db_pool_checked_out' in body
+    assert 'gym_db_pool_overflow' in body
+
+
+def test_a_metrics_token_is_required_when_set(app):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    try:
+        client = app.test_client()
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={
+            'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/metrics', headers={
+            'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    finally:
+        app.config['METRICS_TOKEN'] = None
+
+
+def test_production_does_not_serve_metrics_without_a_token(tmp_path):
+    """In a fresh process: ProductionConfig reads its environment at import."""
+    env = dict(os.environ, SECRET_KEY='s', JWT_SECRET_KEY='j', METRICS_ENABLED='1',
+               DATABASE_URL='sqlite:///' + str(tmp_path / 'prod.db').replace(os.sep, '/'))
+    env.pop('METRICS_TOKEN', None)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    code = textwrap.dedent('''
+        from app import create_app
+        from app.config import ConfigError
+        try:
+            app = create_app('production')
+        except ConfigError as error:
+            print('refused:', error)
+        else:
+            client = app.test_client()
+            print(client.get('/metrics').status_code,
+                  client.get('/metrics', headers={
+                      'Authorization': 'Bearer scrape-secret'}).status_code)
+    ''')
+
+    def run(**overrides):
+        result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND,
+                                env=dict(env, **overrides), capture_output=True,
+                                text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        return result.stdout.strip().splitlines()[-1]
+
+    refused = run()
+    assert refused.startswith('refused:') and 'METRICS_TOKEN' in refused
+    assert run(METRICS_TOKEN='scrape-secret') == '401 200'
+    assert not run(METRICS_ENABLED='0').startswith('refused:')
+
+
+# ───────────────────────────── across workers ───────────────────────────────
+
+def test_separate_processes_are_summed_in_multiprocess_mode(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+
+    def run(code):
+        result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)],
+                                cwd=BACKEND, env=env, capture_output=True, text=True,
+                                timeout=60)
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+
+    for scans in (2, 3):  # two "workers"
+        run(f'''
+            from app.services import metrics
+            for _ in range({scans}):
+                metrics.door_scan(7, 'approved')
+            metrics.door_scan(7, 'denied')
+        ''')
+
+    body = run('''
+        from app.services import metrics
+        print(metrics.render()[0].decode())
+    ''')
+    assert 'gym_door_scans_total{branch_id="7",result="approved"} 5.0' in body
+    assert 'gym_door_scans_total{branch_id="7",result="denied"} 2.0' in body
@@ -0,0 +1,229 @@
+"""Branch occupancy: "is it busy?" without counting the entry logs per poll.
+
+app/services/occupancy.py keeps per-branch, per-minute check-in counts in step
+with the entry logs, and each worker answers from the last of them it loaded.
+These tests hold it to that:
+
+* the trailing-hour count and the "inside" estimate match the approved
+  check-ins, and edits and deletions are taken back out;
+* ``/api/client/branch-activity`` reads no entry logs and says how long the
+  answer may be reused;
+* with the window cache on, a worker's own check-ins count at once, another
+  worker's after the interval, and a fresh worker starts from the buckets;
+* ``rebuild`` recounts what the listeners wrote, and ``prune`` drops old
+  minutes.
+
+Run with:  pytest backend/tests/test_occupancy.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['OCCUPANCY_VISIT_MINUTES'] = 90
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='oc_owner', email='oc_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='occupancy gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    ids = {}
+    for code in ('OC1', 'OC2', 'OC3', 'OC4', 'OC5'):
+        branch = Branch(name=f'branch {code}', code=code, gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        member = Customer(full_name='Member', phone=f'0155{branch.id:07d}',
+                          branch_id=branch.id, is_active=True)
+        db.session.add(member)
+        db.session.flush()
+        ids[code] = {'branch': branch.id, 'member': member.id}
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _checkin(code, minutes_ago=0, approved=True):
+    from app.extensions import db
+    from app.models.entry_log import EntryLog, EntryStatus, EntryType
+
+    entry = EntryLog(customer_id=IDS[code]['member'], branch_id=IDS[code]['branch'],
+                     entry_type=EntryType.QR_SCAN,
+                     entry_time=datetime.utcnow() - timedelta(minutes=minutes_ago),
+                     entry_status=EntryStatus.APPROVED if approved else EntryStatus.DENIED)
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+def _activity(code):
+    from app.services.occupancy import branch_activity
+    return branch_activity(IDS[code]['branch'])
+
+
+@pytest.fixture
+def window_cache(app):
+    from app.services import occupancy
+
+    app.config['OCCUPANCY_CACHE_SECONDS'] = 15
+    with app.app_context():
+        occupancy.reset()
+    yield
+    app.config['OCCUPANCY_CACHE_SECONDS'] = 0
+    with app.app_context():
+        occupancy.reset()
+
+
+# ───────────────────────────── counting ─────────────────────────────────────
+
+def test_the_hour_and_the_estimate_count_approved_checkins(app):
+    with app.app_context():
+        for minutes_ago in (1, 5, 30, 59):
+            _checkin('OC1', minutes_ago)
+        _checkin('OC1', 80)   # inside a 90-minute visit, outside the hour
+        _checkin('OC1', 200)  # gone home
+        _checkin('OC1', 2, approved=False)
+        _checkin('OC2', 2)    # another branch
+
+        assert _activity('OC1') == {
+            'entries_last_hour': 4, 'estimated_inside': 5, 'visit_minutes': 90,
+        }
+
+
+def test_edits_and_deletions_are_taken_back_out(app):
+    from app.extensions import db
+    from app.models.entry_log import EntryStatus
+
+    with app.app_context():
+        denied_later = _checkin('OC3', 3)
+        removed = _checkin('OC3', 4)
+        moved = _checkin('OC3', 5)
+        assert _activity('OC3')['entries_last_hour'] == 3
+
+        denied_later.entry_status = EntryStatus.DENIED
+        db.session.delete(removed)
+        moved.entry_time = datetime.utcnow() - timedelta(hours=3)
+        db.session.commit()
+        assert _activity('OC3')['entries_last_hour'] == 0
+        assert _activity('OC3')['estimated_inside'] == 0
+
+
+def test_the_endpoint_reads_no_entry_logs_and_can_be_cached(app):
+    from app.services.query_profiler import collect_queries
+    from app.utils.client_auth import create_client_token
+
+    with app.app_context():
+        _checkin('OC2', 10)
+        headers = {'Authorization': 'Bearer ' + create_client_token(IDS['OC2']['member'])}
+
+    client = app.test_client()
+    with app.app_context(), collect_queries() as log:
+        response = client.get('/api/client/branch-activity', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert data['branch_id'] == IDS['OC2']['branch']
+    assert data['entries_last_hour'] == 2
+    assert data['level'] == 'quiet'
+    assert response.headers['Cache-Control'] == 'private, max-age=60'
+    assert not [s for s in log.sql if 'entry_logs' in s], log.describe()
+
+
+# ───────────────────────────── each worker's window ─────────────────────────
+
+def test_a_workers_window_answers_without_the_database(app, window_cache, monkeypatch):
+    from app.extensions import db
+    from app.models.branch_occupancy import BranchOccupancyBucket
+    from app.services import occupancy
+    from app.services.query_profiler import collect_queries, query_budget
+
+    now = [1000.0]
+    monkeypatch.setattr(occupancy, '_clock', lambda: now[0])
+
+    with app.app_context():
+        _checkin('OC4', 1)
+        assert _activity('OC4')['entries_last_hour'] == 1
+
+        with query_budget(0):
+            assert _activity('OC4')['entries_last_hour'] == 1
+
+        # Its own check-ins count as soon as they commit...
+        _checkin('OC4', 0)
+        with collect_queries() as log:
+            assert _activity('OC4')['entries_last_hour'] == 2
+        assert not [s for s in log.sql if 'occupancy' in s]
+
+        # ...another worker's once the interval is up.
+        minute = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=20)
+        db.session.add(BranchOccupancyBucket(branch_id=IDS['OC4']['branch'],
+                                             minute=minute, entries=3))
+        db.session.commit()
+        assert _activity('OC4')['entries_last_hour'] == 2
+        now[0] += 15
+        assert _activity('OC4')['entries_last_hour'] == 5
+
+        # A worker that has just started holds nothing and reads the buckets.
+        occupancy.reset()
+        assert _activity('OC4')['entries_last_hour'] == 5
+
+
+# ───────────────────────────── upkeep ───────────────────────────────────────
+
+def test_rebuild_recounts_what_the_listeners_wrote(app):
+    from app.extensions import db
+    from app.models.branch_occupancy import BranchOccupancyBucket as B
+    from app.services.occupancy import rebuild
+
+    with app.app_context():
+        _checkin('OC5', 7)
+        _checkin('OC5', 7)
+        before = sorted(db.session.query(B.branch_id, B.minute, B.entries).filter(
+            B.branch_id != IDS['OC4']['branch']))  # OC4 has a hand-written bucket
+        rebuild()
+        after = sorted(db.session.query(B.branch_id, B.minute, B.entries).filter(
+            B.branch_id != IDS['OC4']['branch']))
+    assert after == before
+
+
+def test_prune_drops_minutes_older_than_a_day(app):
+    from app.extensions import db
+    from app.models.branch_occupancy import BranchOccupancyBucket as B
+    from app.services.occupancy import prune
+
+    with app.app_context():
+        old = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(days=2)
+        db.session.add_all([B(branch_id=IDS['OC5']['branch'], minute=old + timedelta(minutes=m),
+                              entries=1) for m in range(5)])
+        db.session.commit()
+        kept = db.session.query(B).count() - 5
+
+        assert prune(limit=2) == 2
+        assert prune(limit=10) == 3
+        assert prune() == 0
+        assert db.session.query(B).count() == kept
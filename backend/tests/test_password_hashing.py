@@ -0,0 +1,160 @@
+"""Password hashing: the configured cost, the rehash on login, and the pool.
+
+app/services/password_hashing.py hashes at PASSWORD_HASH_ROUNDS, moves every
+stored hash to that cost on its owner's next successful login, and can do the
+work in a pool of child processes. These tests hold it to that:
+
+* new hashes carry the configured cost; outside an app context, passlib's;
+* a staff or member login against a hash of another cost succeeds and leaves
+  the configured cost stored — without touching a member's temporary-password
+  state — while a failed login changes nothing;
+* a malformed stored hash is a failed login, not a 500;
+* the pool produces hashes that verify inline, and the other way round.
+
+Run with:  pytest backend/tests/test_password_hashing.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUNDS = 1200
+OLD_ROUNDS = 1000
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['PASSWORD_HASH_ROUNDS'] = ROUNDS
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _old_hash(password):
+    from passlib.hash import pbkdf2_sha256
+    return pbkdf2_sha256.using(rounds=OLD_ROUNDS).hash(password)
+
+
+def _rounds(stored_hash):
+    return int(stored_hash.split('$')[2])
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='ph_owner', email='ph_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.password_hash = _old_hash('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='hash gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+    branch = Branch(name='hash branch', code='PH1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.flush()
+
+    member = Customer(full_name='Member', phone='01000000021', gender=Gender.MALE,
+                      branch_id=branch.id, is_active=True)
+    member.generate_temp_password()
+    member.password_hash = _old_hash('TEMP1234')
+    member.temp_password = 'TEMP1234'
+
+    broken = User(username='ph_broken', email='ph_broken@example.com',
+                  full_name='Broken', role=UserRole.OWNER, is_active=True,
+                  password_hash='not-a-hash')
+    db.session.add_all([member, broken])
+    db.session.commit()
+    globals()['IDS'] = {'owner': owner.id, 'member': member.id}
+
+
+def _stored(app, model, pk):
+    from app.extensions import db
+    with app.app_context():
+        return db.session.get(model, pk)
+
+
+def test_new_hashes_use_the_configured_cost(app):
+    from app.services.password_hashing import DEFAULT_ROUNDS, hash_password
+
+    with app.app_context():
+        assert _rounds(hash_password('x' * 10)) == ROUNDS
+    assert _rounds(hash_password('x' * 10)) == DEFAULT_ROUNDS
+
+
+def test_a_failed_login_changes_nothing(app):
+    from app.models.user import User
+
+    before = _stored(app, User, IDS['owner']).password_hash
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'ph_owner', 'password': 'wrong-one'})
+    assert response.status_code == 401
+    assert _stored(app, User, IDS['owner']).password_hash == before
+
+
+def test_a_staff_login_moves_the_hash_to_the_configured_cost(app):
+    from app.models.user import User
+
+    assert _rounds(_stored(app, User, IDS['owner']).password_hash) == OLD_ROUNDS
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'ph_owner', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    assert _rounds(_stored(app, User, IDS['owner']).password_hash) == ROUNDS
+
+    # And the new hash still lets them in.
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'ph_owner', 'password': 'secret123'})
+    assert response.status_code == 200
+
+
+def test_a_member_login_rehashes_but_keeps_the_temporary_password(app):
+    from app.models.customer import Customer
+
+    response = app.test_client().post(
+        '/api/client/auth/login', json={'phone': '01000000021', 'password': 'TEMP1234'})
+    assert response.status_code == 200, response.get_json()
+    member = _stored(app, Customer, IDS['member'])
+    assert _rounds(member.password_hash) == ROUNDS
+    assert member.temp_password == 'TEMP1234'
+    assert member.password_changed is False
+
+
+def test_a_malformed_hash_is_a_failed_login(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'ph_broken', 'password': 'anything'})
+    assert response.status_code == 401
+
+
+def test_the_pool_agrees_with_inline_hashing(app):
+    from app.services import password_hashing
+
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+    try:
+        with app.app_context():
+            pooled = password_hashing.hash_password('pooled-pass')
+            assert password_hashing.verify_password('pooled-pass', pooled) == (True, False)
+            assert password_hashing.verify_password('wrong', pooled) == (False, False)
+            assert password_hashing.verify_password('old-pass', _old_hash('old-pass')) == (True, True)
+        app.config['PASSWORD_HASH_WORKERS'] = 0
+        with app.app_context():
+            assert password_hashing.verify_password('pooled-pass', pooled) == (True, False)
+        assert _rounds(pooled) == ROUNDS
+    finally:
+        app.config['PASSWORD_HASH_WORKERS'] = 0
+        password_hashing.shutdown()
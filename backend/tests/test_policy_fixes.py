@@ -208,14 +208,11 @@ def test_a_due_deletion_erases_the_member_without_them_logging_in(app):
     comes back."""
     from app.extensions import db
     from app.models.customer import Customer
-    from app.services.retention_service import (
-        DELETE_REQUEST_PREFIX, purge_due_accounts,
-    )
+    from app.services.retention_service import purge_due_accounts
 
     with app.app_context():
         member = db.session.get(Customer, IDS['member'])
-        requested = datetime.utcnow() - timedelta(days=91)
-        member.health_notes = f'{DELETE_REQUEST_PREFIX} {requested.isoformat()}'
+        member.deletion_requested_at = datetime.utcnow() - timedelta(days=91)
         db.session.commit()
 
         assert purge_due_accounts() == 1
@@ -229,6 +226,7 @@ def test_a_due_deletion_erases_the_member_without_them_logging_in(app):
         assert member.address is None
         assert member.health_notes is None
         assert member.password_hash is None
+        assert member.deletion_requested_at is None, 'or the next run erases it again'
         assert 'leaving@example.com' not in str(member.to_dict())
 
 
@@ -242,17 +240,12 @@ def test_purging_is_idempotent(app):
 def test_a_member_still_inside_the_grace_period_is_untouched(app):
     from app.extensions import db
     from app.models.customer import Customer
-    from app.services.retention_service import (
-        DELETE_REQUEST_PREFIX, purge_due_accounts,
-    )
+    from app.services.retention_service import purge_due_accounts
 
     with app.app_context():
         keeper = Customer(full_name='Undecided Member', phone='01999000222',
-                          branch_id=IDS['R']['branch'], is_active=True)
-        keeper.health_notes = (
-            f'{DELETE_REQUEST_PREFIX} '
-            f'{(datetime.utcnow() - timedelta(days=10)).isoformat()}'
-        )
+                          branch_id=IDS['R']['branch'], is_active=True,
+                          deletion_requested_at=datetime.utcnow() - timedelta(days=10))
         db.session.add(keeper)
         db.session.commit()
         keeper_id = keeper.id
@@ -261,6 +254,106 @@ def test_a_member_still_inside_the_grace_period_is_untouched(app):
         assert db.session.get(Customer, keeper_id).full_name == 'Undecided Member'
 
 
+def test_requesting_and_cancelling_a_deletion_writes_the_column(app):
+    """The request used to be a line in health_notes, which staff can edit —
+    and so could wipe without knowing it was there."""
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.utils.client_auth import create_client_token
+
+    with app.app_context():
+        member = Customer(full_name='Wavering Member', phone='01999000333',
+                          health_notes='asthma', branch_id=IDS['R']['branch'],
+                          is_active=True)
+        db.session.add(member)
+        db.session.commit()
+        member_id = member.id
+        headers = {'Authorization': 'Bearer ' + create_client_token(member_id)}
+
+    client = app.test_client()
+    asked = client.post('/api/client/account/delete-request', headers=headers)
+    assert asked.status_code == 200, asked.get_json()
+    with app.app_context():
+        member = db.session.get(Customer, member_id)
+        assert member.deletion_requested_at.isoformat() == (
+            asked.get_json()['data']['requested_at'])
+        assert member.health_notes == 'asthma'
+
+    shown = client.get('/api/client/me', headers=headers).get_json()['data']
+    assert shown['account_deletion']['requested'] is True
+    assert shown['account_deletion']['days_remaining'] == 89
+
+    assert client.delete('/api/client/account/delete-request',
+                         headers=headers).status_code == 200
+    with app.app_context():
+        assert db.session.get(Customer, member_id).deletion_requested_at is None
+    assert client.delete('/api/client/account/delete-request',
+                         headers=headers).status_code == 404
+
+
+def test_requests_recorded_in_health_notes_are_moved_to_the_column(app):
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.services.retention_service import DELETE_REQUEST_PREFIX, backfill_requests
+
+    stamp = datetime(2026, 1, 5, 9, 30)
+    with app.app_context():
+        members = [
+            Customer(full_name='Colon Form', phone='01999000444', is_active=True,
+                     branch_id=IDS['R']['branch'],
+                     health_notes=f'bad back\n{DELETE_REQUEST_PREFIX}: {stamp.isoformat()}'),
+            Customer(full_name='Bare Form', phone='01999000555', is_active=True,
+                     branch_id=IDS['R']['branch'],
+                     health_notes=f'{DELETE_REQUEST_PREFIX} {stamp.isoformat()}'),
+            Customer(full_name='Garbled', phone='01999000666', is_active=True,
+                     branch_id=IDS['R']['branch'],
+                     health_notes=f'{DELETE_REQUEST_PREFIX}: yesterday'),
+        ]
+        db.session.add_all(members)
+        db.session.commit()
+        ids = [m.id for m in members]
+
+        assert backfill_requests(batch_size=2) == 2
+        assert backfill_requests() == 0
+
+        colon, bare, garbled = (db.session.get(Customer, i) for i in ids)
+        assert colon.deletion_requested_at == stamp
+        assert colon.health_notes == 'bad back'
+        assert bare.deletion_requested_at == stamp
+        assert bare.health_notes is None
+        assert garbled.deletion_requested_at is None
+        assert garbled.health_notes is None
+        for member in (colon, bare, garbled):
+            db.session.delete(member)
+        db.session.commit()
+
+
+def test_the_purge_is_a_range_scan_on_the_index(app):
+    """Not LIKE '%...%' over every member on every run."""
+    from sqlalchemy import event
+    from app.extensions import db
+    from app.services.retention_service import purge_due_accounts
+
+    with app.app_context():
+        seen = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            if 'deletion_requested_at <=' in statement:
+                seen.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            purge_due_accounts()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+
+        (statement, parameters), = seen
+        assert 'LIKE' not in statement.upper()
+        plan = ' '.join(str(row[-1]) for row in db.session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+        assert 'ix_customers_deletion_requested_at' in plan, plan
+
+
 # ──────────────────────────── service ownership ─────────────────────────────
 
 def test_a_gym_cannot_see_another_gyms_packages(app, owner_r):
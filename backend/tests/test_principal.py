@@ -0,0 +1,316 @@
+"""The request principal and the revocation cache in front of it.
+
+app/services/principal.py resolves the signed-in account once per request and
+lets each worker remember its active flag and sign-out cutoff for
+PRINCIPAL_CACHE_SECONDS. These tests switch the cache on and hold it to its
+promises:
+
+* a request reads ``users`` at most once — the guard, ``role_required`` and
+  ``get_current_user()`` share the row — and not at all for the guard when the
+  flags are cached; ``managed_branches`` is not loaded on the way;
+* logging out, deactivating an account (directly or through a branch/gym
+  cascade) and signing a member out all take effect on the very next request
+  in the worker that made the change, cache or no cache; a rolled-back change
+  drops nothing;
+* a change this worker never saw (another worker's logout, or a write below
+  the ORM) is picked up once the interval passes — that interval is the bound,
+  and within it another worker still honours the revoked token. That is the
+  trade-off the cache makes, and it is tested as one.
+
+Run with:  pytest backend/tests/test_principal.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TTL = 5
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['PRINCIPAL_CACHE_SECONDS'] = TTL
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='pr_owner', email='pr_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='principal gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    branches = []
+    for code in ('PR1', 'PR2'):
+        branch = Branch(name=f'branch {code}', code=code, gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        branches.append(branch)
+    db.session.flush()
+    owner.branch_id = branches[0].id
+
+    ids = {'gym': gym.id, 'owner': owner.id, 'branches': [b.id for b in branches]}
+    for name, role, branch in (('manager', UserRole.BRANCH_MANAGER, branches[0]),
+                               ('closing', UserRole.BRANCH_MANAGER, branches[1]),
+                               ('regional', UserRole.REGIONAL_MANAGER, None),
+                               ('leaving', UserRole.FRONT_DESK, branches[0])):
+        user = User(username=f'pr_{name}', email=f'pr_{name}@example.com',
+                    full_name=name.title(), role=role, gym_id=gym.id,
+                    branch_id=branch.id if branch else None, is_active=True)
+        user.set_password('secret123')
+        if role == UserRole.REGIONAL_MANAGER:
+            user.managed_branches = branches
+        db.session.add(user)
+        db.session.flush()
+        ids[name] = user.id
+
+    member = Customer(full_name='Member', phone='01000000011', gender=Gender.MALE,
+                      branch_id=branches[0].id, is_active=True)
+    db.session.add(member)
+    db.session.commit()
+    ids['member'] = member.id
+    globals()['IDS'] = ids
+
+
+def _login(app, username):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': username, 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(app):
+    from app.services import principal
+
+    with app.app_context():
+        principal.reset()
+    yield
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache."""
+    from app.services import principal
+
+    now = [1000.0]
+    monkeypatch.setattr(principal, '_clock', lambda: now[0])
+    yield now
+
+
+def _user_reads(log):
+    """Loads of a single account by id (not the dashboard's staff reports)."""
+    return [s for s in log.sql
+            if s.startswith('SELECT users.id AS users_id') and ' WHERE users.id = ?' in s]
+
+
+def _stats(app):
+    from app.services import principal
+    with app.app_context():
+        return principal.stats()
+
+
+# ───────────────────────────── one read per request ─────────────────────────
+
+def test_a_cold_request_reads_the_account_once(app):
+    from app.services.query_profiler import collect_queries
+
+    headers = _login(app, 'pr_owner')
+    with app.app_context():
+        with collect_queries() as log:
+            response = app.test_client().get('/api/dashboards/owner', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    # The guard's read served role_required and get_current_user() too.
+    assert len(_user_reads(log)) == 1
+    assert not any('regional_manager_branches.user_id' in s for s in log.sql)
+
+
+def test_a_warm_request_skips_the_guards_read(app):
+    from app.services.query_profiler import collect_queries
+
+    headers = _login(app, 'pr_manager')
+    client = app.test_client()
+    with app.app_context():
+        assert client.get('/api/auth/me', headers=headers).status_code == 200
+        with collect_queries() as log:
+            response = client.get('/api/auth/me', headers=headers)
+    assert response.status_code == 200
+    assert len(_user_reads(log)) == 1  # the principal; no guard SELECT
+    assert _stats(app)['hits'] == 1
+
+
+def test_regional_groups_still_load_when_read(app):
+    headers = _login(app, 'pr_regional')
+    response = app.test_client().get('/api/auth/me', headers=headers)
+    assert sorted(response.get_json()['data']['managed_branch_ids']) == sorted(IDS['branches'])
+
+
+def test_zero_turns_the_cache_off(app):
+    from app.services.query_profiler import collect_queries
+
+    headers = _login(app, 'pr_manager')
+    app.config['PRINCIPAL_CACHE_SECONDS'] = 0
+    try:
+        client = app.test_client()
+        with app.app_context():
+            client.get('/api/auth/me', headers=headers)
+            with collect_queries() as log:
+                assert client.get('/api/auth/me', headers=headers).status_code == 200
+        assert len(_user_reads(log)) == 1
+        assert _stats(app)['entries'] == 0
+    finally:
+        app.config['PRINCIPAL_CACHE_SECONDS'] = TTL
+
+
+# ───────────────────────────── revocation still bites ───────────────────────
+
+def test_logout_ends_the_session_at_once(app):
+    headers = _login(app, 'pr_manager')
+    client = app.test_client()
+    assert client.get('/api/auth/me', headers=headers).status_code == 200  # cached
+    # iat has one-second resolution; see test_sessions_and_reset.py.
+    time.sleep(1.05)
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+
+
+def test_deactivation_refuses_the_next_request(app):
+    from app.extensions import db
+    from app.models.user import User
+
+    headers = _login(app, 'pr_leaving')
+    client = app.test_client()
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+    with app.app_context():
+        db.session.get(User, IDS['leaving']).is_active = False
+        db.session.commit()
+    try:
+        assert client.get('/api/auth/me', headers=headers).status_code == 401
+    finally:
+        with app.app_context():
+            db.session.get(User, IDS['leaving']).is_active = True
+            db.session.commit()
+
+
+def test_a_branch_cascade_refuses_its_staff(app):
+    owner = _login(app, 'pr_owner')
+    headers = _login(app, 'pr_closing')
+    client = app.test_client()
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+    response = client.post(f"/api/branches/{IDS['branches'][1]}/deactivate", headers=owner)
+    assert response.status_code == 200, response.get_json()
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+
+
+def test_a_rolled_back_change_drops_nothing(app):
+    from app.extensions import db
+    from app.models.user import User
+
+    headers = _login(app, 'pr_manager')
+    app.test_client().get('/api/auth/me', headers=headers)
+    with app.app_context():
+        db.session.get(User, IDS['manager']).is_active = False
+        db.session.flush()
+        db.session.rollback()
+    assert _stats(app)['invalidations'] == 0
+    assert app.test_client().get('/api/auth/me', headers=headers).status_code == 200
+
+
+def test_a_members_revocation_is_dropped_on_commit(app):
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.services import principal
+    from app.services.session_service import revoke_sessions
+
+    with app.app_context():
+        assert principal.customer_status(IDS['member']) == (True, None)
+        revoke_sessions(db.session.get(Customer, IDS['member']))
+        assert principal.stats()['entries'] == 1  # not before the commit
+        db.session.commit()
+        assert principal.stats()['entries'] == 0
+        assert principal.customer_status(IDS['member'])[1] is not None
+
+
+# ───────────────────────────── the bound ────────────────────────────────────
+
+def test_an_unseen_change_lands_within_the_interval(app, clock):
+    from sqlalchemy import text
+    from app.extensions import db
+
+    headers = _login(app, 'pr_leaving')
+    client = app.test_client()
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+    with app.app_context():
+        # Below the ORM, as another worker's commit looks from here.
+        db.session.execute(text('UPDATE users SET is_active = 0 WHERE id = :id'),
+                           {'id': IDS['leaving']})
+        db.session.commit()
+    try:
+        clock[0] += TTL + 1
+        assert client.get('/api/auth/me', headers=headers).status_code == 401
+    finally:
+        with app.app_context():
+            db.session.execute(text('UPDATE users SET is_active = 1 WHERE id = :id'),
+                               {'id': IDS['leaving']})
+            db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def other_worker(app):
+    """A second app on the same database: another worker, with its own cache."""
+    from app import create_app
+
+    os.environ['DATABASE_URL'] = app.config['SQLALCHEMY_DATABASE_URI']
+    other = create_app('testing')
+    other.config['PRINCIPAL_CACHE_SECONDS'] = TTL
+    return other
+
+
+def test_a_logout_elsewhere_is_honoured_for_at_most_the_interval(app, other_worker, clock):
+    headers = _login(app, 'pr_manager')
+    elsewhere = other_worker.test_client()
+    assert elsewhere.get('/api/auth/me', headers=headers).status_code == 200  # cached there
+    time.sleep(1.05)
+    assert app.test_client().post('/api/auth/logout', headers=headers).status_code == 200
+    assert app.test_client().get('/api/auth/me', headers=headers).status_code == 401
+
+    # The other worker never saw the commit: it trusts its copy until it
+    # expires, and not a moment longer.
+    clock[0] += TTL - 1
+    assert elsewhere.get('/api/auth/me', headers=headers).status_code == 200
+    clock[0] += 2
+    assert elsewhere.get('/api/auth/me', headers=headers).status_code == 401
+
+
+def test_counters_add_up(app, clock):
+    headers = _login(app, 'pr_manager')
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/api/auth/me', headers=headers)
+    stats = _stats(app)
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    assert stats['hit_ratio'] == pytest.approx(2 / 3)
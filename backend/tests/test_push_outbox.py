@@ -0,0 +1,309 @@
+"""Push notifications: queued by the request, delivered in batches afterwards.
+
+``notify_*`` (app/services/fcm_service.py) only write ``push_outbox`` rows;
+app/services/push_outbox.py delivers them through a pluggable transport. With
+the recording FakeTransport these tests hold the dispatcher to its promises:
+
+* a request that raises a push never waits on the transport;
+* pending pushes with the same message go out together, in multicasts of at
+  most PUSH_BATCH_SIZE tokens;
+* tokens the transport reports gone are deactivated in one UPDATE;
+* a retryable failure keeps only the failed tokens, backs off, and gives up
+  after PUSH_MAX_ATTEMPTS; a row another dispatcher holds is left alone;
+* ``flask dispatch-push`` and the background thread both drain the queue, and
+  the thread starts with the worker's first request, so a push left pending
+  across a restart is not stranded until the next enqueue.
+
+Run with:  pytest backend/tests/test_push_outbox.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.device_token import DeviceToken
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    owner = User(username='po_owner', email='po_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='push gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+    branch = Branch(name='push branch', code='PO1', gym_id=gym.id, is_active=True)
+    db.session.add(branch)
+    db.session.flush()
+    owner.branch_id = branch.id
+    db.session.add(DeviceToken(user_id=owner.id, fcm_token='owner-phone',
+                               app_type='staff', is_active=True))
+
+    members = []
+    for n in range(5):
+        member = Customer(full_name=f'Member {n}', phone=f'0100000003{n}',
+                          gender=Gender.MALE, branch_id=branch.id, is_active=True)
+        db.session.add(member)
+        db.session.flush()
+        db.session.add(DeviceToken(customer_id=member.id, fcm_token=f'member-{n}',
+                                   app_type='client', is_active=True))
+        members.append(member.id)
+    db.session.commit()
+    globals()['IDS'] = {'owner': owner.id, 'branch': branch.id, 'members': members}
+
+
+@pytest.fixture
+def transport(app):
+    """A fresh recording transport, an empty queue, every token live again."""
+    from app.extensions import db
+    from app.models.device_token import DeviceToken
+    from app.models.push_outbox import PushOutbox
+    from app.services.push_outbox import FakeTransport
+
+    fake = FakeTransport()
+    app.extensions['push_transport'] = fake
+    with app.app_context():
+        PushOutbox.query.delete()
+        DeviceToken.query.update({'is_active': True})
+        db.session.commit()
+    yield fake
+
+
+def _rows():
+    from app.models.push_outbox import PushOutbox
+    return PushOutbox.query.order_by(PushOutbox.id).all()
+
+
+def _make_due(rows):
+    from app.extensions import db
+    for row in rows:
+        row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+# ───────────────────────────── the request only queues ──────────────────────
+
+def test_a_request_queues_the_push_and_returns(app, transport):
+    from app.models.push_outbox import PushRecipient, PushStatus
+
+    response = app.test_client().post('/api/auth/login', json={
+        'username': 'po_owner', 'password': 'secret123'})
+    headers = {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+    response = app.test_client().post('/api/complaints', headers=headers, json={
+        'title': 'Broken treadmill', 'description': 'The belt slips at speed.',
+        'complaint_type': 'DEVICE', 'branch_id': IDS['branch']})
+    assert response.status_code == 201, response.get_json()
+
+    assert transport.sent == []
+    with app.app_context():
+        [row] = _rows()
+        assert row.status == PushStatus.PENDING
+        assert row.recipient_type == PushRecipient.USER
+        assert row.recipient_ids == [IDS['owner']]
+        assert row.tokens is None  # resolved by the dispatcher, not the request
+
+
+def test_data_values_are_queued_as_strings(app, transport):
+    from app.services.fcm_service import notify_customer
+
+    with app.app_context():
+        notify_customer(IDS['members'][0], 'Hi', 'There', {'session_id': 42})
+        assert _rows()[0].data == {'session_id': '42'}
+
+
+# ───────────────────────────── batching ─────────────────────────────────────
+
+def test_the_same_message_goes_out_as_one_multicast(app, transport):
+    from app.models.push_outbox import PushStatus
+    from app.services.fcm_service import notify_customer, notify_customers
+    from app.services.push_outbox import dispatch_pending
+
+    with app.app_context():
+        notify_customers(IDS['members'][:3], 'Class closed', 'Rate it', {'type': 'x'})
+        notify_customer(IDS['members'][3], 'Class closed', 'Rate it', {'type': 'x'})
+        notify_customer(IDS['members'][4], 'Something else', 'Entirely')
+        assert dispatch_pending() == 3
+        assert {r.status for r in _rows()} == {PushStatus.SENT}
+        assert [r.sent_count for r in _rows()] == [3, 1, 1]
+
+    assert sorted(len(call['tokens']) for call in transport.sent) == [1, 4]
+
+
+def test_multicasts_are_capped_at_the_batch_size(app, transport):
+    from app.services.fcm_service import notify_customers
+    from app.services.push_outbox import dispatch_pending
+
+    app.config['PUSH_BATCH_SIZE'] = 2
+    try:
+        with app.app_context():
+            notify_customers(IDS['members'], 'Big news', 'For everyone')
+            dispatch_pending()
+    finally:
+        app.config['PUSH_BATCH_SIZE'] = 500
+    assert [len(call['tokens']) for call in transport.sent] == [2, 2, 1]
+
+
+# ───────────────────────────── failures ─────────────────────────────────────
+
+def test_dead_tokens_are_deactivated_in_one_update(app, transport):
+    from app.models.device_token import DeviceToken
+    from app.services.fcm_service import notify_customers
+    from app.services.push_outbox import dispatch_pending
+    from app.services.query_profiler import collect_queries
+
+    transport.dead = {'member-1', 'member-2', 'member-3'}
+    with app.app_context():
+        notify_customers(IDS['members'], 'Hello', 'World')
+        with collect_queries() as log:
+            dispatch_pending()
+        updates = [s for s in log.sql if s.startswith('UPDATE device_tokens')]
+        assert len(updates) == 1
+        inactive = {t.fcm_token for t in DeviceToken.query.filter_by(is_active=False)}
+        assert inactive == transport.dead
+        assert _rows()[0].sent_count == 2
+
+
+def test_retryable_failures_back_off_and_retry_only_what_failed(app, transport):
+    from app.models.push_outbox import PushStatus
+    from app.services.fcm_service import notify_customers
+    from app.services.push_outbox import dispatch_pending
+
+    transport.flaky = {'member-0': 1}
+    with app.app_context():
+        notify_customers(IDS['members'][:2], 'Hello', 'World')
+        dispatch_pending()
+        [row] = _rows()
+        assert row.status == PushStatus.PENDING
+        assert row.tokens == ['member-0']
+        assert row.next_attempt_at > datetime.utcnow()
+        assert dispatch_pending() == 0  # not due yet
+
+        _make_due([row])
+        assert dispatch_pending() == 1
+        assert row.status == PushStatus.SENT
+        assert (row.attempts, row.sent_count) == (2, 2)
+    assert transport.delivered_to('member-1') == 1
+
+
+def test_an_outage_is_retried_then_given_up_on(app, transport):
+    from app.models.push_outbox import PushStatus
+    from app.services.fcm_service import notify_customer
+    from app.services.push_outbox import dispatch_pending
+
+    app.config['PUSH_MAX_ATTEMPTS'] = 2
+    transport.fail_next = 5
+    try:
+        with app.app_context():
+            notify_customer(IDS['members'][0], 'Hello', 'World')
+            dispatch_pending()
+            [row] = _rows()
+            assert (row.status, row.attempts) == (PushStatus.PENDING, 1)
+            first_wait = row.next_attempt_at
+            _make_due([row])
+            dispatch_pending()
+            assert (row.status, row.attempts) == (PushStatus.FAILED, 2)
+            assert 'outage' in row.last_error
+            assert first_wait > datetime.utcnow() - timedelta(minutes=5)
+    finally:
+        app.config['PUSH_MAX_ATTEMPTS'] = 6
+
+
+def test_a_row_claimed_elsewhere_is_left_alone(app, transport):
+    from app.extensions import db
+    from app.services.fcm_service import notify_customer
+    from app.services.push_outbox import dispatch_pending
+
+    with app.app_context():
+        notify_customer(IDS['members'][0], 'Hello', 'World')
+        [row] = _rows()
+        row.claimed_by = 'another-worker'
+        row.claimed_until = datetime.utcnow() + timedelta(minutes=1)
+        db.session.commit()
+        assert dispatch_pending() == 0
+
+        row.claimed_until = datetime.utcnow() - timedelta(seconds=1)  # it died
+        db.session.commit()
+        assert dispatch_pending() == 1
+    assert transport.delivered_to('member-0') == 1
+
+
+# ───────────────────────────── who dispatches ───────────────────────────────
+
+def test_the_cli_drains_the_queue(app, transport):
+    from app.services.fcm_service import notify_customers
+
+    with app.app_context():
+        notify_customers(IDS['members'], 'Hello', 'World')
+    result = app.test_cli_runner().invoke(args=['dispatch-push'])
+    assert 'Dispatched 1' in result.output
+    assert len(transport.sent) == 1
+
+
+def _wait_until_sent():
+    from app.extensions import db
+    from app.models.push_outbox import PushStatus
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        if _rows()[0].status == PushStatus.SENT:
+            break
+        time.sleep(0.05)
+    assert _rows()[0].status == PushStatus.SENT
+
+
+def test_a_restarted_worker_delivers_what_was_left_pending(app, transport):
+    from app.services.fcm_service import notify_customer
+
+    with app.app_context():
+        # Queued before the "restart": no thread has been started in this app.
+        notify_customer(IDS['members'][0], 'Hello', 'World')
+    assert 'push_dispatcher' not in app.extensions
+
+    app.config['PUSH_DISPATCHER'] = 'thread'
+    try:
+        # Any request will do; nothing is enqueued by it.
+        assert app.test_client().get('/health').status_code == 200
+        with app.app_context():
+            _wait_until_sent()
+    finally:
+        app.config['PUSH_DISPATCHER'] = 'manual'
+
+
+def test_the_background_thread_delivers(app, transport):
+    from app.services.fcm_service import notify_customer
+
+    app.config['PUSH_DISPATCHER'] = 'thread'
+    try:
+        with app.app_context():
+            notify_customer(IDS['members'][0], 'Hello', 'World')
+            _wait_until_sent()
+    finally:
+        app.config['PUSH_DISPATCHER'] = 'manual'
@@ -0,0 +1,258 @@
+"""Query budgets for the endpoints that run most often.
+
+Each endpoint here has a declared number of statements it may run per request
+(app/services/query_profiler.py), sized on a gym with several branches and a
+handful of members in each: an N+1 that creeps back in adds a statement per
+member or per branch and fails the budget, with the statements listed. The
+door scan, the owner and branch dashboards and the member app's home screen
+are covered; raise a budget here, in review, when an endpoint legitimately
+needs more.
+
+The profiler's own pieces — the Server-Timing header, the N+1 warning and the
+budget failing — are tested at the bottom.
+
+Run with:  pytest backend/tests/test_query_budgets.py
+"""
+import logging
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: Branches in the gym, and members with a subscription in each.
+BRANCHES = 3
+MEMBERS_PER_BRANCH = 4
+
+#: Statements each endpoint may run, authentication included. Measured, not
+#: aspirational: each is what the endpoint runs today, the same at any number
+#: of branches and members.
+BUDGETS = {
+    # Staff lookup, member, scope, the admission decision, the entry with its
+    # summaries, and the response re-reading what the commit expired.
+    'door_barcode': 19,
+    'door_qr': 12,
+    'dashboard_overview': 12,
+    'dashboard_owner': 22,
+    'dashboard_branch': 9,
+    'dashboard_branch_manager': 9,
+    'client_me': 10,
+    'client_subscription': 8,
+    'client_stats': 10,
+    'client_qr': 7,
+    'client_branch_activity': 5,
+}
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.add_url_rule('/_test/n-plus-one', view_func=_n_plus_one)
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _n_plus_one():
+    """A lookup per member: what the N+1 warning is there to catch."""
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    for customer_id in IDS['members']:
+        db.session.get(Customer, customer_id)
+    return 'ok'
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.entry_log import EntryLog, EntryStatus, EntryType
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+    from app.models.user import User, UserRole
+
+    owner = User(username='qb_owner', email='qb_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='budget gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    service = Service(name='Monthly', service_type=ServiceType.GYM, price=500,
+                      duration_days=30, allowed_days_per_week=7,
+                      grants_gym_entry=True, gym_id=gym.id)
+    db.session.add(service)
+    db.session.flush()
+
+    ids = {'branches': [], 'members': []}
+    today = date.today()
+    for b in range(BRANCHES):
+        branch = Branch(name=f'branch {b}', code=f'QB{b}', gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        ids['branches'].append(branch.id)
+        if b == 0:
+            owner.branch_id = branch.id
+            for username, role in (('qb_manager', UserRole.BRANCH_MANAGER),
+                                   ('qb_desk', UserRole.FRONT_DESK)):
+                staff = User(username=username, email=f'{username}@example.com',
+                             full_name=username, role=role, gym_id=gym.id,
+                             branch_id=branch.id, is_active=True)
+                staff.set_password('secret123')
+                db.session.add(staff)
+
+        for m in range(MEMBERS_PER_BRANCH):
+            member = Customer(full_name=f'Member {b}-{m}', phone=f'0177{b:03d}{m:04d}',
+                              gender=Gender.MALE, branch_id=branch.id,
+                              qr_code=f'GYM-QB-{b}-{m}', is_active=True)
+            member.set_password('secret123')
+            db.session.add(member)
+            db.session.flush()
+            subscription = Subscription(
+                customer_id=member.id, service_id=service.id, branch_id=branch.id,
+                start_date=today - timedelta(days=10), end_date=today + timedelta(days=20),
+                status=SubscriptionStatus.ACTIVE, subscription_type='time_based',
+            )
+            db.session.add(subscription)
+            db.session.flush()
+            db.session.add(Transaction(
+                amount=500, payment_method=PaymentMethod.CASH,
+                transaction_type=TransactionType.SUBSCRIPTION,
+                branch_id=branch.id, customer_id=member.id,
+                subscription_id=subscription.id, created_by=owner.id,
+            ))
+            for days_ago in (1, 2, 4):
+                db.session.add(EntryLog(
+                    customer_id=member.id, branch_id=branch.id,
+                    subscription_id=subscription.id, entry_type=EntryType.QR_SCAN,
+                    entry_status=EntryStatus.APPROVED,
+                    entry_time=datetime.utcnow() - timedelta(days=days_ago),
+                ))
+            ids['members'].append(member.id)
+
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _staff(app, username):
+    r = app.test_client().post('/api/auth/login',
+                               json={'username': username, 'password': 'secret123'})
+    assert r.status_code == 200, r.get_json()
+    return {'Authorization': 'Bearer ' + r.get_json()['data']['access_token']}
+
+
+def _member(app, n=0):
+    from app.utils.client_auth import create_client_token
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_client_token(IDS['members'][n])}
+
+
+def _within_budget(app, name, method, path, headers, **kwargs):
+    """Run one request under the endpoint's budget and return the response."""
+    from app.services.query_profiler import query_budget
+
+    client = app.test_client()
+    with query_budget(BUDGETS[name]):
+        response = client.open(path, method=method, headers=headers, **kwargs)
+    assert response.status_code < 400, response.get_json()
+    return response
+
+
+# ───────────────────────────── the door ─────────────────────────────────────
+
+def test_door_barcode_scan(app):
+    _within_budget(app, 'door_barcode', 'POST', '/api/validation/barcode',
+                   _staff(app, 'qb_desk'),
+                   json={'barcode': 'GYM-QB-0-1', 'branch_id': IDS['branches'][0]})
+
+
+def test_door_qr_scan(app):
+    token = app.test_client().get('/api/client/qr', headers=_member(app, 2)) \
+        .get_json()['data']['qr_token']
+    _within_budget(app, 'door_qr', 'POST', '/api/validation/qr',
+                   _staff(app, 'qb_desk'),
+                   json={'qr_token': token, 'branch_id': IDS['branches'][0]})
+
+
+# ───────────────────────────── dashboards ───────────────────────────────────
+
+@pytest.mark.parametrize('name, user, path', [
+    ('dashboard_overview', 'qb_owner', '/api/dashboards/overview'),
+    ('dashboard_owner', 'qb_owner', '/api/dashboards/owner'),
+    ('dashboard_branch', 'qb_manager', '/api/dashboards/branch/{branch}'),
+    ('dashboard_branch_manager', 'qb_manager', '/api/dashboards/branch-manager'),
+])
+def test_dashboards(app, name, user, path):
+    _within_budget(app, name, 'GET', path.format(branch=IDS['branches'][0]),
+                   _staff(app, user))
+
+
+# ───────────────────────────── the member app's home ────────────────────────
+
+@pytest.mark.parametrize('name, path', [
+    ('client_me', '/api/client/me'),
+    ('client_subscription', '/api/client/subscription'),
+    ('client_stats', '/api/client/stats'),
+    ('client_qr', '/api/client/qr'),
+    ('client_branch_activity', '/api/client/branch-activity'),
+])
+def test_client_home(app, name, path):
+    _within_budget(app, name, 'GET', path, _member(app))
+
+
+# ───────────────────────────── the profiler itself ──────────────────────────
+
+def test_responses_say_what_the_database_cost(app):
+    response = app.test_client().get('/api/client/me', headers=_member(app))
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=')
+    assert 'queries"' in timing and 'app;dur=' in timing
+
+
+def test_a_repeated_statement_is_reported_as_a_likely_n_plus_one(app, caplog):
+    with caplog.at_level(logging.WARNING, logger='app.services.query_profiler'):
+        app.test_client().get('/_test/n-plus-one')
+    warnings = [r.getMessage() for r in caplog.records if 'Likely N+1' in r.getMessage()]
+    assert len(warnings) == 1
+    assert f'{len(IDS["members"])} runs of SELECT' in warnings[0]
+
+
+def test_a_budget_fails_the_block_that_exceeds_it(app):
+    from app.extensions import db
+    from app.models.customer import Customer
+    from app.services.query_profiler import QueryBudgetExceeded, query_budget
+
+    with app.app_context():
+        with query_budget(3) as log:
+            Customer.query.limit(1).all()
+        assert log.count == 1
+
+        with pytest.raises(QueryBudgetExceeded, match='3 queries, budget 2'):
+            with query_budget(2):
+                for customer_id in IDS['members'][:3]:
+                    db.session.get(Customer, customer_id)
+
+        @query_budget(10, max_repeats=2)
+        def lookups():
+            db.session.expunge_all()
+            for customer_id in IDS['members'][:3]:
+                db.session.get(Customer, customer_id)
+
+        with pytest.raises(QueryBudgetExceeded, match='likely N\\+1'):
+            lookups()
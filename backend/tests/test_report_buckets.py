@@ -0,0 +1,205 @@
+"""Revenue-trend buckets computed in SQL: the same numbers as before.
+
+``/api/reports/revenue-trend`` used to load every transaction in its window and
+sort them into days, weeks or months in Python. It now asks the database for
+one row per bucket (app/services/report_buckets.py). These tests hold the two
+equal:
+
+* the SQL bucket of every calendar day across three years — leap day, year
+  ends, weeks straddling both — is the day Python's ``bucket_start`` gives;
+* the endpoint's series, for every period, matches a reference computed the
+  old way: every transaction in Python, dated in the gym's timezone.
+
+On SQLite always, and on Postgres too when REPORT_BUCKETS_POSTGRES_URL points
+at a scratch database.
+
+Run with:  pytest backend/tests/test_report_buckets.py
+"""
+import os
+import random
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: Enough sales to land in most days of three years, several per busy day.
+SALES = 2500
+
+
+def _backends():
+    yield 'sqlite'
+    if os.environ.get('REPORT_BUCKETS_POSTGRES_URL'):
+        yield 'postgresql'
+
+
+@pytest.fixture(scope='module', params=list(_backends()))
+def app(request):
+    if request.param == 'sqlite':
+        os.environ['DATABASE_URL'] = (
+            'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+        )
+    else:
+        os.environ['DATABASE_URL'] = os.environ['REPORT_BUCKETS_POSTGRES_URL']
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.transaction import (
+        PaymentMethod, Transaction, TransactionType,
+    )
+    from app.models.user import User, UserRole
+
+    owner = User(username='bucket_owner', email='bucket@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Bucket Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    branches = [Branch(name=f'B{i}', code=f'BK{i}', gym_id=gym.id, is_active=True)
+                for i in range(3)]
+    db.session.add_all(branches)
+    db.session.flush()
+    owner.branch_id = branches[0].id
+
+    # Seeded, so a failure reproduces. Times are spread over the whole day,
+    # so plenty fall in the hours where the UTC and Cairo dates differ.
+    rng = random.Random(20260310)
+    now = datetime.utcnow()
+    for _ in range(SALES):
+        when = now - timedelta(seconds=rng.randrange(3 * 366 * 86400))
+        amount = rng.choice([150, 300, 500, 1000, 2000])
+        db.session.add(Transaction(
+            amount=amount, discount=rng.choice([0, 0, 0, 50, 100]),
+            payment_method=rng.choice(list(PaymentMethod)),
+            transaction_type=rng.choice(list(TransactionType)),
+            branch_id=rng.choice(branches).id, created_by=owner.id,
+            transaction_date=when, created_at=when,
+        ))
+
+    db.session.commit()
+    globals()['IDS'] = {'gym': gym.id, 'branches': [b.id for b in branches]}
+
+
+@pytest.fixture
+def owner(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'bucket_owner', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+# ───────────────────────── the SQL against Python ───────────────────────────
+
+@pytest.mark.parametrize('period', ['daily', 'weekly', 'monthly'])
+def test_sql_buckets_every_day_as_python_does(app, period):
+    from sqlalchemy import Column, Date, MetaData, Table, select
+    from app.extensions import db
+    from app.services.report_buckets import as_day, bucket_expression, bucket_start
+
+    days = [date(2023, 12, 20) + timedelta(days=i) for i in range(3 * 366)]
+    calendar = Table('bucket_calendar', MetaData(), Column('day', Date))
+
+    with app.app_context():
+        calendar.create(db.engine, checkfirst=True)
+        try:
+            db.session.execute(calendar.delete())
+            db.session.execute(calendar.insert(), [{'day': d} for d in days])
+            got = db.session.execute(
+                select(calendar.c.day, bucket_expression(period, calendar.c.day))
+            ).all()
+        finally:
+            db.session.rollback()
+            calendar.drop(db.engine)
+
+    assert len(got) == len(days)
+    mismatches = [(as_day(d), as_day(b)) for d, b in got
+                  if as_day(b) != bucket_start(period, as_day(d))]
+    assert mismatches == []
+
+
+# ─────────────────────────── the endpoint's series ──────────────────────────
+
+def _reference(app, period, buckets, branch_id=None):
+    """The series the way revenue-trend used to build it: every transaction
+    loaded, dated in the gym's zone, sorted into buckets in Python."""
+    from app.models.transaction import Transaction
+    from app.services.business_time import gym_timezone, gym_today
+    from app.services.report_buckets import bucket_start, bucket_starts
+
+    with app.app_context():
+        tz = gym_timezone(IDS['gym'])
+        today = gym_today(IDS['gym'])
+        starts = bucket_starts(period, today, buckets)
+        query = Transaction.query
+        if branch_id:
+            query = query.filter(Transaction.branch_id == branch_id)
+
+        revenue = defaultdict(float)
+        count = defaultdict(int)
+        for t in query.all():
+            local = t.transaction_date.replace(tzinfo=timezone.utc).astimezone(tz).date()
+            if not starts[0] <= local <= today:
+                continue
+            key = bucket_start(period, local)
+            revenue[key] += float(t.amount) - float(t.discount or 0)
+            count[key] += 1
+
+    return [(s.isoformat(), round(revenue.get(s, 0.0), 2), count.get(s, 0))
+            for s in starts]
+
+
+@pytest.mark.parametrize('period, buckets', [
+    ('daily', 36), ('weekly', 36), ('monthly', 36), ('monthly', 1),
+])
+def test_the_trend_matches_the_ledger(app, owner, period, buckets):
+    data = app.test_client().get(
+        f'/api/reports/revenue-trend?period={period}&buckets={buckets}',
+        headers=owner).get_json()['data']
+
+    got = [(p['date'], round(p['revenue'], 2), p['transactions'])
+           for p in data['points']]
+    assert got == _reference(app, period, buckets)
+    assert sum(p[2] for p in got) > 0, 'the window held no sales to compare'
+
+
+def test_the_trend_matches_the_ledger_for_one_branch(app, owner):
+    branch = IDS['branches'][1]
+    data = app.test_client().get(
+        f'/api/reports/revenue-trend?period=weekly&buckets=36&branch_id={branch}',
+        headers=owner).get_json()['data']
+
+    got = [(p['date'], round(p['revenue'], 2), p['transactions'])
+           for p in data['points']]
+    assert got == _reference(app, 'weekly', 36, branch_id=branch)
+
+
+def test_the_database_returns_one_row_per_bucket(app):
+    from app.services.business_time import gym_today
+    from app.services.report_buckets import bucket_starts, revenue_buckets
+
+    with app.app_context():
+        today = gym_today(IDS['gym'])
+        starts = bucket_starts('monthly', today, 36)
+        rows = revenue_buckets('monthly', start=starts[0], end=today).all()
+
+    assert 0 < len(rows) <= 36
@@ -0,0 +1,246 @@
+"""Daily revenue rollups: kept in step with the ledger, and read by the reports.
+
+Every revenue screen now sums ``daily_revenue_rollups`` instead of the
+``transactions`` ledger (see app/services/revenue_rollup.py). That is only
+safe if the rollups never disagree with the ledger, so these tests hold:
+
+* recording, editing and deleting a transaction moves the rollups with it, on
+  the gym's local day;
+* a rebuild from scratch lands on exactly what the incremental path built;
+* the reports answer from the rollups, and their figures match the ledger.
+
+Run with:  pytest backend/tests/test_revenue_rollups.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: 2026-03-10 in Cairo (UTC+2). The late sale is 00:30 local on the 11th.
+DAY = date(2026, 3, 10)
+NOON_UTC = datetime(2026, 3, 10, 10, 0)
+LATE_UTC = datetime(2026, 3, 10, 22, 30)
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.transaction import (
+        PaymentMethod, Transaction, TransactionType,
+    )
+    from app.models.user import User, UserRole
+
+    owner = User(username='roll_owner', email='roll@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Rollup Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    main = Branch(name='Main', code='RL1', gym_id=gym.id, is_active=True)
+    second = Branch(name='Second', code='RL2', gym_id=gym.id, is_active=True)
+    db.session.add_all([main, second])
+    db.session.flush()
+    owner.branch_id = main.id
+
+    def take(branch, amount, discount, method, when,
+             kind=TransactionType.SUBSCRIPTION):
+        db.session.add(Transaction(
+            amount=amount, discount=discount, payment_method=method,
+            transaction_type=kind, branch_id=branch.id, created_by=owner.id,
+            transaction_date=when, created_at=when,
+        ))
+
+    # Main on the 10th: (1000 - 250) cash + 500 network = 1250 net, 2 sales.
+    take(main, 1000, 250, PaymentMethod.CASH, NOON_UTC)
+    take(main, 500, 0, PaymentMethod.NETWORK, NOON_UTC)
+    # Second on the 10th: 300 cash renewal.
+    take(second, 300, 0, PaymentMethod.CASH, NOON_UTC, TransactionType.RENEWAL)
+    # Late night: the 10th in UTC, the 11th in Cairo.
+    take(main, 200, 0, PaymentMethod.CASH, LATE_UTC)
+
+    db.session.commit()
+    globals()['IDS'] = {'gym': gym.id, 'main': main.id, 'second': second.id,
+                        'owner': owner.id}
+
+
+@pytest.fixture
+def owner(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'roll_owner', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+def _rollups():
+    """{(branch tag, day, method, type): (net, discount, count)}."""
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+
+    tags = {IDS['main']: 'main', IDS['second']: 'second'}
+    return {
+        (tags[r.branch_id], r.business_date.isoformat(), r.payment_method.value,
+         r.transaction_type.value):
+            (float(r.net_amount), float(r.discount), r.transaction_count)
+        for r in DailyRevenueRollup.query.all()
+    }
+
+
+EXPECTED = {
+    ('main', '2026-03-10', 'cash', 'subscription'): (750.0, 250.0, 1),
+    ('main', '2026-03-10', 'network', 'subscription'): (500.0, 0.0, 1),
+    ('second', '2026-03-10', 'cash', 'renewal'): (300.0, 0.0, 1),
+    ('main', '2026-03-11', 'cash', 'subscription'): (200.0, 0.0, 1),
+}
+
+
+# ─────────────────────────────── upkeep ──────────────────────────────────────
+
+def test_recording_a_sale_rolls_it_up_on_the_gyms_day(app):
+    with app.app_context():
+        assert _rollups() == EXPECTED
+
+
+def test_edits_and_deletions_move_the_money_with_them(app):
+    from app.extensions import db
+    from app.models.transaction import (
+        PaymentMethod, Transaction, TransactionType,
+    )
+
+    with app.app_context():
+        sale = Transaction(
+            amount=400, discount=100, payment_method=PaymentMethod.CASH,
+            transaction_type=TransactionType.SUBSCRIPTION,
+            branch_id=IDS['main'], created_by=IDS['owner'],
+            transaction_date=NOON_UTC, created_at=NOON_UTC,
+        )
+        db.session.add(sale)
+        db.session.commit()
+        key = ('main', '2026-03-10', 'cash', 'subscription')
+        assert _rollups()[key] == (1050.0, 350.0, 2)
+
+        # Re-entered as a transfer: it leaves cash and lands in transfer.
+        sale.payment_method = PaymentMethod.TRANSFER
+        db.session.commit()
+        assert _rollups()[key] == EXPECTED[key]
+        assert _rollups()[('main', '2026-03-10', 'transfer', 'subscription')] == (
+            300.0, 100.0, 1)
+
+        # Deleted: the row it alone created goes with it.
+        db.session.delete(sale)
+        db.session.commit()
+        assert _rollups() == EXPECTED
+
+
+def test_a_rebuild_lands_on_what_the_listeners_built(app):
+    from app.services.revenue_rollup import rebuild
+
+    with app.app_context():
+        assert rebuild() == len(EXPECTED)
+        assert _rollups() == EXPECTED
+        assert rebuild(gym_id=IDS['gym']) == len(EXPECTED)
+        assert _rollups() == EXPECTED
+
+
+def test_the_cli_rebuilds_from_an_empty_table(app):
+    from app.extensions import db
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+
+    with app.app_context():
+        DailyRevenueRollup.query.delete()
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-revenue-rollups'])
+    assert result.exit_code == 0, result.output
+    assert f'Wrote {len(EXPECTED)}' in result.output
+
+    with app.app_context():
+        assert _rollups() == EXPECTED
+
+
+# ─────────────────────────────── reading ─────────────────────────────────────
+
+def test_the_daily_report_matches_the_ledger(app, owner):
+    data = app.test_client().get(
+        '/api/reports/daily?date=2026-03-10', headers=owner).get_json()['data']
+
+    assert data['total_revenue'] == pytest.approx(1550.0)
+    assert data['total_discount'] == pytest.approx(250.0)
+    assert data['total_transactions'] == 3 == len(data['transactions'])
+    assert data['payment_breakdown'] == {
+        'cash': pytest.approx(1050.0), 'network': pytest.approx(500.0),
+        'transfer': 0.0,
+    }
+
+
+def test_the_weekly_report_splits_days_in_local_time(app, owner):
+    data = app.test_client().get(
+        '/api/reports/weekly?week_start=2026-03-09', headers=owner).get_json()['data']
+
+    assert data['daily_breakdown'] == [
+        {'date': '2026-03-10', 'revenue': pytest.approx(1550.0)},
+        {'date': '2026-03-11', 'revenue': pytest.approx(200.0)},
+    ]
+    assert data['total_transactions'] == 4
+
+
+def test_the_monthly_report_and_branch_filter(app, owner):
+    client = app.test_client()
+    whole = client.get('/api/reports/monthly?month=2026-03',
+                       headers=owner).get_json()['data']
+    second = client.get(f'/api/reports/monthly?month=2026-03&branch_id={IDS["second"]}',
+                        headers=owner).get_json()['data']
+
+    assert (whole['total_revenue'], whole['total_transactions']) == (1750.0, 4)
+    assert (second['total_revenue'], second['total_transactions']) == (300.0, 1)
+
+
+def test_reports_do_not_read_the_ledger(app, owner):
+    """The point of the table: these never scan ``transactions``."""
+    from app.services.query_profiler import collect_queries
+
+    client = app.test_client()
+    with app.app_context():
+        with collect_queries() as log:
+            for path in ('/api/reports/weekly?week_start=2026-03-09',
+                         '/api/reports/monthly?month=2026-03',
+                         '/api/reports/revenue-trend?period=monthly',
+                         '/api/dashboards/owner'):
+                assert client.get(path, headers=owner).status_code == 200, path
+
+    ledger_scans = [s for s in log.sql
+                    if 'FROM transactions' in s and 'SUM(' in s.upper()
+                    and 'users' not in s]
+    assert ledger_scans == []
+
+
+def test_helpers_read_business_days(app):
+    from app.utils.helpers import calculate_branch_revenue
+
+    with app.app_context():
+        assert calculate_branch_revenue(IDS['main'], DAY, DAY) == 1250.0
+        assert calculate_branch_revenue(
+            IDS['main'], datetime(2026, 3, 11), datetime(2026, 3, 11, 23, 59)) == 200.0
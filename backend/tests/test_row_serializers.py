@@ -0,0 +1,330 @@
+"""Row serializers: the list endpoints' output, byte for byte, from bare columns.
+
+app/schemas/rows.py reads the transaction, payment, subscription, entry log,
+visit history and customer lists as plain columns instead of dumping model
+objects through marshmallow or ``to_dict()``. These tests hold each list to
+what the old serializer makes of the same records — serialised the way the
+response is, so a float that became a string, an enum that lost its value or
+a missing key fails — over rows chosen for their awkward cases: no customer,
+a discount, a denied scan with no subscription, a member with no date of
+birth or QR code, a subscription expired by date but still marked active.
+
+They also check the lists no longer load anything per row.
+
+Run with:  pytest backend/tests/test_row_serializers.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer, Gender
+    from app.models.entry_log import EntryLog, EntryStatus, EntryType
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+    from app.models.user import User, UserRole
+
+    owner = User(username='rs_owner', email='rs_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='rows gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+    branches = []
+    for code in ('RS1', 'RS2'):
+        branch = Branch(name=f'Branch {code}', code=code, gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        branches.append(branch)
+    owner.branch_id = branches[0].id
+    desk = User(username='rs_desk', email='rs_desk@example.com', full_name='Desk Person',
+                role=UserRole.FRONT_DESK, gym_id=gym.id, branch_id=branches[0].id,
+                is_active=True)
+    desk.set_password('secret123')
+    db.session.add(desk)
+
+    monthly = Service(name='Monthly', service_type=ServiceType.GYM, price=500,
+                      duration_days=30, gym_id=gym.id)
+    swim = Service(name='Swim', service_type=ServiceType.SWIMMING_RECREATION, price=400,
+                   duration_days=30, gym_id=gym.id)
+    db.session.add_all([monthly, swim])
+    db.session.flush()
+
+    today = date.today()
+    members = []
+    for n in range(6):
+        member = Customer(
+            full_name=f'Member {n}', phone=f'0155000000{n}',
+            branch_id=branches[n % 2].id, is_active=True,
+            email=f'm{n}@example.com' if n % 2 else None,
+            gender=(Gender.MALE, Gender.FEMALE, None)[n % 3],
+            date_of_birth=date(1990 + n, 6, 15) if n != 3 else None,
+            height=170 + n if n != 4 else None, weight=70 + n if n != 4 else None,
+            health_notes='Knee' if n == 1 else None,
+            qr_code=f'GYM-RS-{n}' if n != 2 else None,
+            temp_password='TEMP12' if n < 3 else None,
+            password_changed=n >= 3,
+            created_at=datetime(2026, 1, 1, 9, n),
+        )
+        member.calculate_health_metrics()
+        db.session.add(member)
+        db.session.flush()
+        members.append(member)
+
+    subscriptions = []
+    for n, (service, start, end, status, stopped) in enumerate((
+        (monthly, today - timedelta(days=5), today + timedelta(days=25),
+         SubscriptionStatus.ACTIVE, False),
+        # Past its end date but never swept to EXPIRED.
+        (monthly, today - timedelta(days=40), today - timedelta(days=10),
+         SubscriptionStatus.ACTIVE, False),
+        (swim, today - timedelta(days=60), today - timedelta(days=30),
+         SubscriptionStatus.EXPIRED, False),
+        (monthly, today - timedelta(days=3), today + timedelta(days=27),
+         SubscriptionStatus.STOPPED, True),
+        (swim, today - timedelta(days=2), today + timedelta(days=28),
+         SubscriptionStatus.FROZEN, False),
+    )):
+        subscription = Subscription(
+            customer_id=members[n].id, service_id=service.id,
+            branch_id=members[n].branch_id, start_date=start, end_date=end,
+            status=status, subscription_type='time_based', created_by=desk.id,
+            freeze_count=1 if status == SubscriptionStatus.FROZEN else 0,
+            stop_reason='Moved away' if stopped else None,
+            stopped_at=datetime(2026, 2, 1, 12, 30, 15) if stopped else None,
+            created_at=datetime(2026, 1, 2, 10, n),
+        )
+        db.session.add(subscription)
+        db.session.flush()
+        subscriptions.append(subscription)
+
+    for n in range(8):
+        subscription = subscriptions[n % len(subscriptions)]
+        walk_in = n == 5
+        db.session.add(Transaction(
+            amount=(500, 1350.5, 400, 75)[n % 4], discount=50 if n == 2 else 0,
+            payment_method=(PaymentMethod.CASH, PaymentMethod.NETWORK,
+                            PaymentMethod.TRANSFER)[n % 3],
+            transaction_type=TransactionType.OTHER if walk_in else TransactionType.SUBSCRIPTION,
+            branch_id=branches[n % 2].id,
+            customer_id=None if walk_in else subscription.customer_id,
+            subscription_id=None if walk_in else subscription.id,
+            created_by=(owner.id, desk.id)[n % 2],
+            description='Protein shake' if walk_in else None,
+            reference_number=f'TXN{n}' if n % 3 else None,
+            notes='note' if n == 1 else None,
+            transaction_date=datetime(2026, 2, 1, 8, 0) + timedelta(hours=n),
+            created_at=datetime(2026, 2, 1, 8, 0, 30) + timedelta(hours=n),
+        ))
+
+    for n in range(10):
+        denied = n == 7
+        subscription = None if denied else subscriptions[n % 2]
+        member = members[5] if denied else members[n % 2]
+        db.session.add(EntryLog(
+            customer_id=member.id, branch_id=member.branch_id,
+            subscription_id=subscription.id if subscription else None,
+            entry_type=(EntryType.QR_SCAN, EntryType.MANUAL, EntryType.FINGERPRINT)[n % 3],
+            entry_status=EntryStatus.DENIED if denied else EntryStatus.APPROVED,
+            denial_reason='No active subscription' if denied else None,
+            processed_by_user_id=desk.id if n % 3 == 1 else None,
+            coins_deducted=n % 2,
+            notes='late' if n == 4 else None,
+            entry_time=datetime.utcnow() - timedelta(hours=n * 5, seconds=n),
+            created_at=datetime.utcnow() - timedelta(hours=n * 5),
+        ))
+    db.session.commit()
+    globals()['IDS'] = {'members': [m.id for m in members]}
+
+
+def _staff(app, username='rs_owner'):
+    r = app.test_client().post('/api/auth/login',
+                               json={'username': username, 'password': 'secret123'})
+    assert r.status_code == 200, r.get_json()
+    return {'Authorization': 'Bearer ' + r.get_json()['data']['access_token']}
+
+
+def _member(app, n):
+    from app.utils.client_auth import create_client_token
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_client_token(IDS['members'][n])}
+
+
+def _get(app, path, headers, **params):
+    response = app.test_client().get(path, headers=headers, query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def _same_bytes(app, served, expected):
+    """Both lists serialised as the response serialises them."""
+    assert served, 'nothing to compare'
+    with app.app_context():
+        assert app.json.dumps(served) == app.json.dumps(expected)
+
+
+def _objects(model, items, key='id'):
+    from app.extensions import db
+    db.session.expire_all()
+    return [db.session.get(model, item[key]) for item in items]
+
+
+# ───────────────────────────── money ────────────────────────────────────────
+
+@pytest.mark.parametrize('path, params', [
+    ('/api/transactions', {}),
+    ('/api/transactions', {'cursor': '', 'per_page': 5}),
+    ('/api/payments', {}),
+    ('/api/payments', {'cursor': ''}),
+])
+def test_transaction_lists_match_the_schema(app, path, params):
+    from app.models.transaction import Transaction
+    from app.schemas import TransactionSchema
+
+    items = _get(app, path, _staff(app), **params)['items']
+    with app.app_context():
+        expected = TransactionSchema().dump(_objects(Transaction, items), many=True)
+    _same_bytes(app, items, expected)
+    assert any(item['customer_id'] is None for item in items) or 'cursor' in params
+
+
+# ───────────────────────────── subscriptions ────────────────────────────────
+
+def test_the_subscription_list_matches_the_schema(app):
+    from app.models.subscription import Subscription
+    from app.schemas import SubscriptionSchema
+
+    items = _get(app, '/api/subscriptions', _staff(app))['items']
+    with app.app_context():
+        expected = SubscriptionSchema().dump(_objects(Subscription, items), many=True)
+    _same_bytes(app, items, expected)
+
+    # Read from the dates, not from whether the model has such a method.
+    by_member = {item['customer_id']: item for item in items}
+    members = IDS['members']
+    assert (by_member[members[0]]['is_expired'], by_member[members[0]]['can_access']) \
+        == (False, True)
+    assert (by_member[members[1]]['is_expired'], by_member[members[1]]['can_access']) \
+        == (True, False)
+    assert by_member[members[1]]['status'] == 'active'  # listing wrote nothing
+    assert by_member[members[3]]['can_access'] is False
+
+
+# ───────────────────────────── entry logs ───────────────────────────────────
+
+@pytest.mark.parametrize('params', [{}, {'cursor': '', 'per_page': 4}])
+def test_the_staff_entry_log_list_matches_to_dict(app, params):
+    from app.models.entry_log import EntryLog
+
+    entries = _get(app, '/api/validation/entry-logs', _staff(app), **params)['entries']
+    with app.app_context():
+        expected = [entry.to_dict() for entry in _objects(EntryLog, entries)]
+    _same_bytes(app, entries, expected)
+
+
+def _history_entry(entry):
+    """The visit history as the route built it from each EntryLog."""
+    service_name = 'Gym Access'
+    if entry.subscription and entry.subscription.service:
+        service_name = entry.subscription.service.name
+    return {
+        'id': entry.id,
+        'date': entry.entry_time.strftime('%Y-%m-%d') if entry.entry_time else '',
+        'time': entry.entry_time.strftime('%H:%M:%S') if entry.entry_time else '',
+        'datetime': entry.entry_time.isoformat() if entry.entry_time else '',
+        'branch': entry.branch.name if entry.branch else 'Unknown',
+        'branch_id': entry.branch_id,
+        'service': service_name,
+        'coins_used': entry.coins_deducted or 0,
+        'entry_type': entry.entry_type.value if entry.entry_type else 'QR_SCAN',
+        'entry_status': entry.entry_status.value if entry.entry_status else 'APPROVED',
+    }
+
+
+@pytest.mark.parametrize('n', [0, 5])
+def test_the_members_visit_history_matches(app, n):
+    from app.models.entry_log import EntryLog
+
+    entries = _get(app, '/api/client/history', _member(app, n))
+    assert entries == _get(app, '/api/client/history', _member(app, n),
+                           cursor='', per_page=50)['entries']
+    with app.app_context():
+        expected = [_history_entry(entry) for entry in _objects(EntryLog, entries)]
+    _same_bytes(app, entries, expected)
+
+
+# ───────────────────────────── customers ────────────────────────────────────
+
+@pytest.mark.parametrize('username, path, params', [
+    ('rs_owner', '/api/customers', {}),
+    ('rs_desk', '/api/customers', {}),
+    ('rs_owner', '/api/customers', {'search': 'member'}),
+    ('rs_owner', '/api/customers/search', {'q': 'Member'}),
+])
+def test_customer_lists_match_to_dict(app, username, path, params):
+    from app.models.customer import Customer
+    from app.routes.customers_routes import _may_see_temp_password
+    from app.utils import get_current_user
+
+    headers = _staff(app, username)
+    items = _get(app, path, headers, **params)['items']
+    with app.app_context(), app.test_request_context(headers=headers):
+        from flask_jwt_extended import verify_jwt_in_request
+        verify_jwt_in_request()
+        show_temp = _may_see_temp_password(get_current_user())
+        customers = _objects(Customer, items)
+        active = Customer.batch_has_active_subscription([c.id for c in customers])
+        expected = [c.to_dict(include_temp_password=show_temp,
+                              has_active_subscription=c.id in active)
+                    for c in customers]
+    _same_bytes(app, items, expected)
+
+
+# ───────────────────────────── cost ─────────────────────────────────────────
+
+@pytest.mark.parametrize('path, key', [
+    ('/api/transactions', 'items'),
+    ('/api/subscriptions', 'items'),
+    ('/api/validation/entry-logs', 'entries'),
+    ('/api/customers', 'items'),
+])
+def test_a_page_costs_the_same_whatever_its_size(app, path, key):
+    from app.services.query_profiler import collect_queries, query_budget
+
+    headers = _staff(app)
+    with app.app_context(), collect_queries() as small:
+        data = _get(app, path, headers, per_page=2)
+    assert len(data[key]) > 1
+    # Four times the rows, not one statement more.
+    with app.app_context(), query_budget(small.count) as large:
+        data = _get(app, path, headers, per_page=8)
+    assert len(data[key]) > 2
+    assert large.count == small.count
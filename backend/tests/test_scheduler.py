@@ -0,0 +1,282 @@
+"""The job scheduler: housekeeping on a timetable, one runner per job.
+
+app/services/scheduler.py runs the jobs registered in app/services/
+housekeeping.py. These tests hold it to its promises:
+
+* each job runs when due and not again until its interval has passed, and
+  every run is recorded in ``job_runs``;
+* the housekeeping jobs do their work — overdue subscriptions expire, lapsed
+  freezes end, accounts past the deletion grace period are erased — in
+  batches of the job's size, as many as it takes;
+* a job whose lock another worker holds is skipped without being claimed;
+* a failing job is recorded as failed and does not stop the others;
+* ``flask jobs`` lists, runs, disables and reports on them.
+
+Run with:  pytest backend/tests/test_scheduler.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['JOBS_LOCK_DIR'] = tempfile.mkdtemp()
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.user import User, UserRole
+
+    owner = User(username='js_owner', email='js_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+    gym = Gym(name='jobs gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    branch = Branch(name='jobs branch', code='JS1', gym_id=gym.id, is_active=True)
+    service = Service(name='Gym', service_type=ServiceType.GYM, price=500,
+                      duration_days=30, allowed_days_per_week=7, grants_gym_entry=True)
+    db.session.add_all([branch, service])
+    db.session.commit()
+    globals()['IDS'] = {'branch': branch.id, 'service': service.id}
+
+
+_members = iter(range(10_000))
+
+
+def _member(**fields):
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    customer = Customer(full_name='Member', phone=f'0177{next(_members):07d}',
+                        branch_id=IDS['branch'], is_active=True, **fields)
+    db.session.add(customer)
+    db.session.flush()
+    return customer
+
+
+def _subscription(customer, **fields):
+    from app.extensions import db
+    from app.models.subscription import Subscription, SubscriptionStatus
+
+    values = dict(customer_id=customer.id, service_id=IDS['service'],
+                  branch_id=IDS['branch'], start_date=date.today() - timedelta(days=40),
+                  end_date=date.today() + timedelta(days=30),
+                  status=SubscriptionStatus.ACTIVE, subscription_type='time_based')
+    values.update(fields)
+    subscription = Subscription(**values)
+    db.session.add(subscription)
+    db.session.flush()
+    return subscription
+
+
+@pytest.fixture
+def clean(app):
+    """Every job due now, no history, nothing left over from another test."""
+    from app.extensions import db
+    from app.models.scheduled_job import JobRun, ScheduledJob
+
+    with app.app_context():
+        JobRun.query.delete()
+        ScheduledJob.query.delete()
+        db.session.commit()
+    yield
+
+
+def _run_due(app):
+    from app.services.scheduler import run_due_jobs
+    with app.app_context():
+        return {run.job_name: run.to_dict() for run in run_due_jobs()}
+
+
+# ───────────────────────────── the timetable ────────────────────────────────
+
+def test_every_job_runs_once_per_interval(app, clean):
+    from app.models.scheduled_job import ScheduledJob
+
+    runs = _run_due(app)
+    assert set(runs) == {'purge-deleted-accounts', 'expire-subscriptions', 'settle-freezes',
+                         'prune-occupancy'}
+    assert {run['status'] for run in runs.values()} == {'succeeded'}
+    assert _run_due(app) == {}  # nothing is due again yet
+
+    with app.app_context():
+        row = ScheduledJob.query.get('expire-subscriptions')
+        assert row.next_run_at - row.last_started_at == timedelta(seconds=900)
+        assert row.last_status.value == 'succeeded'
+
+
+def test_a_disabled_job_is_not_run(app, clean):
+    from app.extensions import db
+    from app.models.scheduled_job import ScheduledJob
+    from app.services.scheduler import ensure_job_rows
+
+    with app.app_context():
+        ensure_job_rows()
+        db.session.get(ScheduledJob, 'settle-freezes').enabled = False
+        db.session.commit()
+    assert 'settle-freezes' not in _run_due(app)
+
+
+# ───────────────────────────── the housekeeping jobs ────────────────────────
+
+def test_overdue_subscriptions_expire_in_batches(app, clean):
+    from app.extensions import db
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.services.scheduler import JOBS, registered_jobs, run_job
+
+    with app.app_context():
+        ids = [_subscription(_member(), end_date=date.today() - timedelta(days=1)).id
+               for _ in range(3)]
+        current = _subscription(_member()).id
+        db.session.commit()
+
+    spec = registered_jobs()['expire-subscriptions']
+    original, spec.batch_size = spec.batch_size, 1
+    try:
+        with app.app_context():
+            run = run_job('expire-subscriptions', force=True)
+            assert (run.processed, run.batches) == (3, 4)
+            statuses = {s.id: s.status for s in Subscription.query.filter(
+                Subscription.id.in_(ids + [current]))}
+    finally:
+        JOBS['expire-subscriptions'].batch_size = original
+    assert [statuses[i] for i in ids] == [SubscriptionStatus.EXPIRED] * 3
+    assert statuses[current] == SubscriptionStatus.ACTIVE
+
+
+def test_lapsed_freezes_are_ended(app, clean):
+    from app.extensions import db
+    from app.models.freeze_history import FreezeHistory
+    from app.models.subscription import Subscription, SubscriptionStatus
+
+    today = date.today()
+    with app.app_context():
+        lapsed = _subscription(_member(), status=SubscriptionStatus.FROZEN)
+        running = _subscription(_member(), status=SubscriptionStatus.FROZEN)
+        db.session.add_all([
+            FreezeHistory(subscription_id=lapsed.id, freeze_start=today - timedelta(days=8),
+                          freeze_end=today - timedelta(days=1), freeze_days=7, is_active=True),
+            FreezeHistory(subscription_id=running.id, freeze_start=today,
+                          freeze_end=today + timedelta(days=7), freeze_days=7, is_active=True),
+        ])
+        db.session.commit()
+        ids = lapsed.id, running.id
+
+    assert _run_due(app)['settle-freezes']['processed'] == 1
+    with app.app_context():
+        assert db.session.get(Subscription, ids[0]).status == SubscriptionStatus.ACTIVE
+        assert db.session.get(Subscription, ids[1]).status == SubscriptionStatus.FROZEN
+
+
+def test_accounts_past_the_grace_period_are_erased(app, clean):
+    from app.extensions import db
+    from app.models.customer import Customer
+
+    with app.app_context():
+        member = _member(deletion_requested_at=datetime.utcnow() - timedelta(days=91))
+        db.session.commit()
+        member_id = member.id
+
+    assert _run_due(app)['purge-deleted-accounts']['processed'] == 1
+    with app.app_context():
+        assert db.session.get(Customer, member_id).full_name == 'Deleted member'
+
+
+# ───────────────────────────── one runner at a time ─────────────────────────
+
+def test_a_job_locked_elsewhere_is_skipped_and_stays_due(app, clean):
+    from app.models.scheduled_job import ScheduledJob
+    from app.services.scheduler import JobLock, ensure_job_rows, run_job
+
+    with app.app_context():
+        ensure_job_rows()
+        held = JobLock('settle-freezes')
+        assert held.acquire()
+        try:
+            assert not JobLock('settle-freezes').acquire()
+            assert run_job('settle-freezes') is None
+            row = ScheduledJob.query.get('settle-freezes')
+            assert row.next_run_at <= datetime.utcnow()  # not claimed
+            assert row.last_started_at is None
+        finally:
+            held.release()
+        assert run_job('settle-freezes') is not None
+
+
+def test_a_failing_job_is_recorded_and_the_rest_still_run(app, clean):
+    from app.models.scheduled_job import JobRun, JobRunStatus
+    from app.services.scheduler import JOBS, job
+
+    @job('explodes', every=60, batch_size=10)
+    def explodes(batch_size):
+        raise RuntimeError('boom')
+
+    try:
+        runs = _run_due(app)
+    finally:
+        del JOBS['explodes']
+    assert runs['explodes']['status'] == 'failed'
+    assert 'boom' in runs['explodes']['error']
+    assert runs['settle-freezes']['status'] == 'succeeded'
+
+    with app.app_context():
+        assert JobRun.query.filter_by(status=JobRunStatus.RUNNING).count() == 0
+
+
+def test_a_run_left_running_is_marked_abandoned(app, clean):
+    from app.extensions import db
+    from app.models.scheduled_job import JobRun, JobRunStatus
+    from app.services.scheduler import run_job
+
+    with app.app_context():
+        stale = JobRun(job_name='settle-freezes', status=JobRunStatus.RUNNING)
+        db.session.add(stale)
+        db.session.commit()
+        stale_id = stale.id
+        run_job('settle-freezes', force=True)
+        stale = db.session.get(JobRun, stale_id)
+        assert stale.status == JobRunStatus.FAILED
+        assert 'abandoned' in stale.error
+
+
+# ───────────────────────────── the CLI ──────────────────────────────────────
+
+def test_the_cli(app, clean):
+    runner = app.test_cli_runner()
+
+    listed = runner.invoke(args=['jobs', 'list']).output
+    assert 'expire-subscriptions' in listed and 'never run' in listed
+
+    assert 'settle-freezes: 0 row(s)' in runner.invoke(
+        args=['jobs', 'run', 'settle-freezes']).output
+    assert 'settle-freezes' in runner.invoke(args=['jobs', 'history']).output
+
+    runner.invoke(args=['jobs', 'disable', 'expire-subscriptions'])
+    assert 'DISABLED' in runner.invoke(args=['jobs', 'list']).output
+    ran = runner.invoke(args=['jobs', 'run', '--due']).output
+    assert 'purge-deleted-accounts' in ran and 'expire-subscriptions' not in ran
+
+    assert runner.invoke(args=['jobs', 'run', 'no-such-job']).exit_code != 0
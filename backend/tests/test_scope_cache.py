@@ -0,0 +1,310 @@
+"""Branch scopes: resolved once, reused across requests, dropped when they move.
+
+Who may see which branches is cached per (user, role) for
+BRANCH_SCOPE_CACHE_SECONDS (app/services/scope_cache.py). These tests switch
+it on and hold it to its promises:
+
+* a warm request resolves the caller's scope without touching ``gyms`` or
+  listing ``branches`` again, so it runs fewer queries than a cold one;
+* a branch created, deactivated or moved shows up in the owner's scope on the
+  very next request; so does a change to a regional manager's group;
+* entries expire after the interval, and the counters add up.
+
+Run with:  pytest backend/tests/test_scope_cache.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TTL = 30
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    application.config['BRANCH_SCOPE_CACHE_SECONDS'] = TTL
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+    from app.models.user import User, UserRole
+
+    admin = User(username='sc_admin', email='sc_admin@example.com',
+                 full_name='Admin', role=UserRole.SUPER_ADMIN, is_active=True)
+    admin.set_password('secret123')
+    db.session.add(admin)
+
+    owner = User(username='sc_owner', email='sc_owner@example.com',
+                 full_name='Owner', role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='scope gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    branches = []
+    for code in ('SC1', 'SC2', 'SC3'):
+        branch = Branch(name=f'branch {code}', code=code, gym_id=gym.id, is_active=True)
+        db.session.add(branch)
+        branches.append(branch)
+    db.session.flush()
+    owner.branch_id = branches[0].id
+
+    regional = User(username='sc_regional', email='sc_regional@example.com',
+                    full_name='Regional', role=UserRole.REGIONAL_MANAGER,
+                    gym_id=gym.id, is_active=True)
+    regional.set_password('secret123')
+    regional.managed_branches = [branches[0], branches[1]]
+    db.session.add(regional)
+
+    db.session.commit()
+    globals()['IDS'] = {
+        'admin': admin.id,
+        'gym': gym.id,
+        'owner': owner.id,
+        'regional': regional.id,
+        'branches': [b.id for b in branches],
+    }
+
+
+def _login(app, username):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': username, 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+@pytest.fixture(scope='module')
+def owner(app):
+    return _login(app, 'sc_owner')
+
+
+@pytest.fixture(scope='module')
+def regional(app):
+    return _login(app, 'sc_regional')
+
+
+@pytest.fixture(scope='module')
+def admin(app):
+    return _login(app, 'sc_admin')
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(app):
+    from app.services import scope_cache
+
+    with app.app_context():
+        scope_cache.reset()
+    yield
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache."""
+    from app.services import scope_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(scope_cache, '_clock', lambda: now[0])
+    yield now
+
+
+def _branch_ids(app, headers):
+    response = app.test_client().get('/api/branches', query_string={'per_page': 100},
+                                     headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return sorted(item['id'] for item in response.get_json()['data']['items'])
+
+
+def _stats(app):
+    from app.services import scope_cache
+    with app.app_context():
+        return scope_cache.stats()
+
+
+def _resolves_scope(statement):
+    return 'FROM gyms' in statement or statement.startswith('SELECT branches.id FROM')
+
+
+# ───────────────────────────── reuse ────────────────────────────────────────
+
+def test_a_warm_request_runs_fewer_queries(app, owner):
+    from app.services.query_profiler import collect_queries, query_budget
+
+    with app.app_context():
+        with collect_queries() as cold:
+            first = _branch_ids(app, owner)
+        with query_budget(cold.count - 1) as warm:
+            second = _branch_ids(app, owner)
+
+    assert first == second == sorted(IDS['branches'])
+    assert any(_resolves_scope(s) for s in cold.sql)
+    assert not any(_resolves_scope(s) for s in warm.sql)
+
+
+def test_entries_expire(app, owner, clock):
+    _branch_ids(app, owner)
+    clock[0] += TTL - 1
+    _branch_ids(app, owner)
+    assert _stats(app)['hits'] == 1
+
+    clock[0] += 2
+    _branch_ids(app, owner)
+    assert _stats(app)['misses'] == 2
+
+
+def test_zero_turns_it_off(app, owner):
+    app.config['BRANCH_SCOPE_CACHE_SECONDS'] = 0
+    try:
+        _branch_ids(app, owner)
+        _branch_ids(app, owner)
+        stats = _stats(app)
+        assert stats['enabled'] is False
+        assert stats['hits'] == stats['misses'] == 0
+    finally:
+        app.config['BRANCH_SCOPE_CACHE_SECONDS'] = TTL
+
+
+# ───────────────────────────── invalidation ─────────────────────────────────
+
+def test_a_new_branch_is_in_scope_at_once(app, owner):
+    before = _branch_ids(app, owner)
+    response = app.test_client().post('/api/branches', headers=owner,
+                                      json={'name': 'branch SC4', 'code': 'SC4'})
+    assert response.status_code == 201, response.get_json()
+    new_id = response.get_json()['data']['id']
+
+    assert _branch_ids(app, owner) == sorted(before + [new_id])
+    assert _stats(app)['invalidations'] >= 1
+
+
+def test_a_branch_moved_away_leaves_the_scope(app, owner):
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.gym import Gym
+
+    with app.app_context():
+        elsewhere = Gym(name='elsewhere gym', owner_id=IDS['admin'], is_setup_complete=False)
+        db.session.add(elsewhere)
+        stray = Branch(name='stray', code='SCX', gym_id=IDS['gym'], is_active=True)
+        db.session.add(stray)
+        db.session.commit()
+        stray_id, elsewhere_id = stray.id, elsewhere.id
+
+    assert stray_id in _branch_ids(app, owner)
+
+    with app.app_context():
+        db.session.get(Branch, stray_id).gym_id = elsewhere_id
+        db.session.commit()
+
+    assert stray_id not in _branch_ids(app, owner)
+
+
+def test_a_rolled_back_change_drops_nothing(app, owner):
+    from app.extensions import db
+    from app.models.branch import Branch
+
+    _branch_ids(app, owner)
+    with app.app_context():
+        db.session.add(Branch(name='never', code='SCN', gym_id=IDS['gym'], is_active=True))
+        db.session.flush()
+        db.session.rollback()
+
+    assert _stats(app)['invalidations'] == 0
+    assert _stats(app)['entries'] == 1
+
+
+def test_deactivating_a_branch_drops_the_gyms_scopes(app, owner):
+    _branch_ids(app, owner)
+    response = app.test_client().post(
+        f"/api/branches/{IDS['branches'][2]}/deactivate", headers=owner)
+    assert response.status_code == 200, response.get_json()
+    assert _stats(app)['entries'] == 0
+
+    response = app.test_client().post(
+        f"/api/branches/{IDS['branches'][2]}/activate", headers=owner)
+    assert response.status_code == 200, response.get_json()
+
+
+def test_deactivating_a_gym_drops_its_scopes(app, owner):
+    from app.extensions import db
+    from app.services.cascade_service import deactivate_gym_members
+
+    _branch_ids(app, owner)
+    with app.app_context():
+        deactivate_gym_members(IDS['gym'])
+        assert _stats(app)['entries'] == 0
+        db.session.rollback()
+
+
+def test_a_regional_group_change_applies_at_once(app, regional):
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.user import User
+
+    assert _branch_ids(app, regional) == sorted(IDS['branches'][:2])
+
+    with app.app_context():
+        user = db.session.get(User, IDS['regional'])
+        user.managed_branches.append(db.session.get(Branch, IDS['branches'][2]))
+        db.session.commit()
+
+    assert _branch_ids(app, regional) == sorted(IDS['branches'])
+
+    with app.app_context():
+        user = db.session.get(User, IDS['regional'])
+        user.managed_branches = [db.session.get(Branch, IDS['branches'][0])]
+        db.session.commit()
+
+    assert _branch_ids(app, regional) == [IDS['branches'][0]]
+
+
+def test_invalidate_only_drops_whats_named(app):
+    from flask import g
+    from app.extensions import db
+    from app.models.user import User
+    from app.services import scope_cache
+
+    with app.test_request_context():
+        scope_cache.scope_for(db.session.get(User, IDS['owner']))
+        scope_cache.scope_for(db.session.get(User, IDS['regional']))
+        g.pop(scope_cache.REQUEST_ATTR)
+        scope_cache.invalidate(user_ids=[IDS['regional']])
+        assert scope_cache.stats()['entries'] == 1
+        scope_cache.invalidate(gym_ids=[IDS['gym']])
+        assert scope_cache.stats()['entries'] == 0
+
+
+# ───────────────────────────── monitoring ───────────────────────────────────
+
+def test_counters_are_readable_over_the_api(app, owner, regional, admin):
+    _branch_ids(app, owner)
+    _branch_ids(app, owner)
+
+    response = app.test_client().get('/api/branches/scope-cache-stats', headers=admin)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['enabled'] is True
+    assert (data['hits'], data['misses']) == (1, 1)
+    assert data['hit_ratio'] == 0.5
+
+    response = app.test_client().get('/api/branches/scope-cache-stats', headers=regional)
+    assert response.status_code == 403
@@ -0,0 +1,148 @@
+"""seed.py --scale: bulk synthetic gyms, the same every time.
+
+``build_at_scale`` writes members, subscriptions, payments and check-ins as
+plain rows in batches, below the ORM. These tests run it small on SQLite and
+hold it to what the benchmarks rely on:
+
+* the same seed writes the same rows, ids included, and another seed does not;
+* the rows hang together — every check-in and payment points at a member and
+  subscription that exist, and a subscription's status follows its dates;
+* after ``rebuild_summaries`` the summaries the listeners would have kept
+  agree with the rows.
+
+Run with:  pytest backend/tests/test_seed_scale.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#: A fixed "today", so the dates are part of what must come out the same.
+TODAY = date(2026, 3, 15)
+MEMBERS_PER_BRANCH = 12
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+
+    return create_app('testing')
+
+
+def _build(app, seed, batch_size=50):
+    """A fresh database holding two synthetic gyms; returns the counts."""
+    import seed as seed_script
+    from app.extensions import db
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        counts = seed_script.build_at_scale(
+            2, seed=seed, batch_size=batch_size,
+            members_per_branch=MEMBERS_PER_BRANCH, today=TODAY)
+        db.session.commit()
+        return counts
+
+
+def _snapshot():
+    from app.extensions import db
+    from app.models import Customer, EntryLog, Subscription, Transaction
+
+    return (
+        db.session.query(Customer.id, Customer.full_name, Customer.phone,
+                         Customer.branch_id, Customer.created_at)
+        .order_by(Customer.id).all(),
+        db.session.query(Subscription.id, Subscription.customer_id,
+                         Subscription.service_id, Subscription.start_date,
+                         Subscription.end_date, Subscription.status)
+        .order_by(Subscription.id).all(),
+        db.session.query(Transaction.id, Transaction.amount, Transaction.transaction_type,
+                         Transaction.payment_method, Transaction.transaction_date)
+        .order_by(Transaction.id).all(),
+        db.session.query(EntryLog.id, EntryLog.customer_id, EntryLog.entry_status,
+                         EntryLog.entry_time)
+        .order_by(EntryLog.id).all(),
+    )
+
+
+def test_the_same_seed_writes_the_same_rows(app):
+    counts = _build(app, seed=7)
+    with app.app_context():
+        first = _snapshot()
+    assert counts['customers'] == 2 * 5 * MEMBERS_PER_BRANCH
+    assert [len(rows) for rows in first] == [
+        counts['customers'], counts['subscriptions'],
+        counts['transactions'], counts['entry_logs']]
+
+    # Batch size decides only when rows are written, not which.
+    _build(app, seed=7, batch_size=1000)
+    with app.app_context():
+        assert _snapshot() == first
+
+    _build(app, seed=8)
+    with app.app_context():
+        assert _snapshot() != first
+
+
+def test_the_rows_hang_together(app):
+    from sqlalchemy import func
+    from app.extensions import db
+    from app.models import (Branch, Customer, EntryLog, Subscription,
+                            SubscriptionStatus, Transaction, TransactionType)
+
+    counts = _build(app, seed=42)
+    with app.app_context():
+        assert counts['entry_logs'] > counts['customers']
+        assert Branch.query.count() == 10
+
+        # Every check-in falls inside the subscription it was let in on.
+        for entry, subscription in db.session.query(EntryLog, Subscription) \
+                .join(Subscription, EntryLog.subscription_id == Subscription.id):
+            assert entry.customer_id == subscription.customer_id
+            assert subscription.start_date <= entry.entry_time.date() <= subscription.end_date
+        assert EntryLog.query.filter(EntryLog.subscription_id.is_(None)).count() == 0
+
+        for subscription in Subscription.query:
+            expected = SubscriptionStatus.ACTIVE if subscription.end_date >= TODAY \
+                else SubscriptionStatus.EXPIRED
+            assert subscription.status == expected
+
+        # One signup per member, a payment per subscription, sales besides.
+        paid = db.session.query(func.count(Transaction.id)).filter(
+            Transaction.subscription_id.isnot(None)).scalar()
+        assert paid == counts['subscriptions']
+        assert Transaction.query.filter_by(
+            transaction_type=TransactionType.SUBSCRIPTION).count() == counts['customers']
+        assert db.session.query(func.count(Customer.id)).filter(
+            Customer.qr_code == 'GYM-' + func.cast(Customer.id, db.String)).scalar() \
+            == counts['customers']
+
+
+def test_rebuilt_summaries_agree_with_the_rows(app):
+    import seed as seed_script
+    from sqlalchemy import func
+    from app.extensions import db
+    from app.models import EntryLog, Transaction
+    from app.models.daily_revenue_rollup import DailyRevenueRollup
+    from app.models.entry_log import EntryStatus
+    from app.models.attendance_summary import AttendanceSummary
+
+    _build(app, seed=42)
+    with app.app_context():
+        seed_script.rebuild_summaries()
+
+        members_seen = db.session.query(func.count(func.distinct(EntryLog.customer_id))) \
+            .filter(EntryLog.entry_status == EntryStatus.APPROVED).scalar()
+        assert AttendanceSummary.query.count() == members_seen
+
+        ledger = db.session.query(func.sum(Transaction.amount)).scalar()
+        rolled = db.session.query(func.sum(DailyRevenueRollup.net_amount)).scalar()
+        assert float(rolled) == pytest.approx(float(ledger))
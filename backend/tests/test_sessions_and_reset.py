@@ -353,10 +353,14 @@ def provider():
     service.set_provider(original)
 
 
-def _code_from(provider):
-    """Pull the 6-digit code out of the message that was 'delivered'."""
+def _code_from(app, provider):
+    """Send what is queued, then pull the 6-digit code out of the message
+    that was 'delivered'."""
     import re
+    from app.services.message_outbox import dispatch_pending
 
+    with app.app_context():
+        dispatch_pending()
     assert provider.sent, 'nothing was sent'
     body = provider.sent[-1][2]
     match = re.search(r'\b(\d{6})\b', body)
@@ -390,7 +394,7 @@ def test_a_member_can_reset_their_own_password_with_a_code(app, provider):
                             json={'identifier': '01555000111'})
     assert requested.status_code == 200, requested.get_json()
 
-    code = _code_from(provider)
+    code = _code_from(app, provider)
 
     reset = client.post('/api/client/auth/reset-password',
                         json={'identifier': '01555000111', 'code': code,
@@ -412,7 +416,7 @@ def test_a_reset_code_cannot_be_used_to_log_in(app, provider):
 
     client.post('/api/client/auth/forgot-password',
                 json={'identifier': '01555000111'})
-    code = _code_from(provider)
+    code = _code_from(app, provider)
 
     response = client.post('/api/client/auth/verify-code',
                            json={'identifier': '01555000111', 'code': code})
@@ -437,7 +441,7 @@ def test_resetting_a_password_ends_existing_sessions(app, provider):
     time.sleep(1.05)
     client.post('/api/client/auth/forgot-password',
                 json={'identifier': '01555000111'})
-    code = _code_from(provider)
+    code = _code_from(app, provider)
     assert client.post('/api/client/auth/reset-password',
                        json={'identifier': '01555000111', 'code': code,
                              'new_password': 'anotherpassword1'}
@@ -495,7 +499,7 @@ def test_a_short_password_is_refused(app, provider):
 
     client.post('/api/client/auth/forgot-password',
                 json={'identifier': '01555000111'})
-    code = _code_from(provider)
+    code = _code_from(app, provider)
 
     response = client.post('/api/client/auth/reset-password',
                            json={'identifier': '01555000111', 'code': code,
@@ -0,0 +1,201 @@
+"""Gym settings cached per process, and kept honest across workers.
+
+Two apps on one database stand in for two gunicorn workers: each has its own
+cache, exactly as two processes would. An owner's change must be visible at
+once in the worker that made it, within GYM_SETTINGS_CACHE_SECONDS in every
+other worker, and an unchanged gym must not be re-read on every request.
+
+Run with:  pytest backend/tests/test_settings_cache.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TTL = 30
+
+
+@pytest.fixture(scope='module')
+def workers():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    first = create_app('testing')
+    second = create_app('testing')
+    for application in (first, second):
+        application.config['GYM_SETTINGS_CACHE_SECONDS'] = TTL
+    with first.app_context():
+        db.create_all()
+        _seed()
+    return first, second
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.gym import Gym
+    from app.models.gym_setting import GymSetting
+    from app.models.user import User, UserRole
+
+    owner = User(username='sc_owner', email='sc@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Cached Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    db.session.add(GymSetting(gym_id=gym.id, key='timezone', value='Asia/Dubai'))
+    db.session.commit()
+    globals()['GYM'] = gym.id
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache."""
+    from app.services import settings_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(settings_cache, '_clock', lambda: now[0])
+    yield now
+
+
+@pytest.fixture(autouse=True)
+def _cold_caches(workers):
+    from app.services.settings_cache import invalidate
+
+    for application in workers:
+        with application.app_context():
+            invalidate()
+
+
+def _rule(application, key='class_attendance_deducts_coin'):
+    from app.services.gym_rules import gym_rule
+
+    # A fresh app context each time, so the per-request cache on flask.g
+    # cannot be what answers.
+    with application.app_context(), application.test_request_context():
+        return gym_rule(GYM, key)
+
+
+def test_an_unchanged_gym_is_not_reread_on_every_request(workers, clock):
+    from app.services.query_profiler import query_budget
+
+    first, _ = workers
+    assert _rule(first) is False
+
+    with first.app_context():
+        with query_budget(0):
+            for _ in range(20):
+                assert _rule(first) is False
+
+
+def test_the_timezone_is_resolved_once(workers, clock):
+    from app.services.business_time import gym_timezone
+    from app.services.query_profiler import query_budget
+
+    first, _ = workers
+    with first.app_context():
+        assert str(gym_timezone(GYM)) == 'Asia/Dubai'
+        with query_budget(0):
+            assert gym_timezone(GYM) is gym_timezone(GYM)
+
+
+def test_after_the_interval_one_version_check_revalidates(workers, clock):
+    from app.services.query_profiler import query_budget
+
+    first, _ = workers
+    _rule(first)
+
+    clock[0] += TTL + 1
+    with first.app_context():
+        with query_budget(1) as log:
+            _rule(first)
+        assert log.count == 1
+        assert 'settings_version' in log.sql[0]
+
+
+def test_the_writing_worker_sees_its_change_at_once(workers, clock):
+    from app.services.gym_rules import set_rules
+
+    first, _ = workers
+    assert _rule(first) is False
+    try:
+        with first.app_context():
+            set_rules(GYM, {'class_attendance_deducts_coin': True})
+        assert _rule(first) is True
+    finally:
+        with first.app_context():
+            set_rules(GYM, {'class_attendance_deducts_coin': False})
+
+
+def test_other_workers_catch_up_within_the_interval(workers, clock):
+    from app.services.gym_rules import set_rules
+
+    first, second = workers
+    assert _rule(second) is False
+    try:
+        with first.app_context():
+            set_rules(GYM, {'class_attendance_deducts_coin': True})
+
+        # Inside the interval the other worker may still answer from memory...
+        clock[0] += TTL - 1
+        assert _rule(second) is False
+        # ...but not once it has passed.
+        clock[0] += 2
+        assert _rule(second) is True
+    finally:
+        with first.app_context():
+            set_rules(GYM, {'class_attendance_deducts_coin': False})
+
+
+def test_a_write_that_bypasses_set_rules_still_bumps_the_version(workers, clock):
+    """The version lives on the model's write path, not in set_rules, so a
+    setting changed any other way cannot go unnoticed."""
+    from app.extensions import db
+    from app.models.gym import Gym
+    from app.models.gym_setting import GymSetting
+    from app.services.business_time import gym_timezone
+
+    first, second = workers
+    with second.app_context():
+        assert str(gym_timezone(GYM)) == 'Asia/Dubai'
+
+    with first.app_context():
+        before = db.session.get(Gym, GYM).settings_version
+        row = GymSetting.query.filter_by(gym_id=GYM, key='timezone').one()
+        row.value = 'Africa/Cairo'
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(Gym, GYM).settings_version == before + 1
+
+    try:
+        clock[0] += TTL + 1
+        with second.app_context():
+            assert str(gym_timezone(GYM)) == 'Africa/Cairo'
+    finally:
+        with first.app_context():
+            row = GymSetting.query.filter_by(gym_id=GYM, key='timezone').one()
+            row.value = 'Asia/Dubai'
+            db.session.commit()
+
+
+def test_zero_turns_the_cache_off(workers, clock):
+    from app.services.query_profiler import query_budget
+
+    first, _ = workers
+    first.config['GYM_SETTINGS_CACHE_SECONDS'] = 0
+    try:
+        with first.app_context():
+            with query_budget(2) as log:
+                _rule(first)
+                _rule(first)
+            assert log.count == 2
+    finally:
+        first.config['GYM_SETTINGS_CACHE_SECONDS'] = TTL
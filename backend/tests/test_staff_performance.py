@@ -0,0 +1,327 @@
+"""Employee performance: the same figures, in a fixed number of queries.
+
+``/api/reports/employee-performance`` used to run three queries per staff
+member and load every row it counted. It now asks two grouped queries for the
+whole staff list (app/services/staff_performance.py). These tests hold:
+
+* every figure for every staff member equals what the old per-staff loop
+  computed — that loop is kept below as the reference;
+* the number of queries does not move between a handful of staff and
+  ``BENCH_STAFF`` staff over ``BENCH_TRANSACTIONS`` transactions.
+
+The benchmark rows are bulk-inserted below the ORM, so they skip the revenue
+rollup listeners — this report reads the ledger, not the rollups. The query
+count does not depend on the size of the ledger, so it is kept small by
+default; set EMPLOYEE_BENCH_TRANSACTIONS (500000, say) to run it at
+production size.
+
+Run with:  pytest backend/tests/test_staff_performance.py
+"""
+import os
+import random
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_STAFF = 200
+BENCH_TRANSACTIONS = int(os.environ.get('EMPLOYEE_BENCH_TRANSACTIONS', '5000'))
+
+#: Rows per INSERT batch when loading the benchmark ledger.
+_BATCH = 50000
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.transaction import (
+        PaymentMethod, Transaction, TransactionType,
+    )
+    from app.models.user import User, UserRole
+
+    owner = User(username='perf_owner', email='perf@example.com', full_name='Owner',
+                 role=UserRole.OWNER, is_active=True)
+    owner.set_password('secret123')
+    db.session.add(owner)
+    db.session.flush()
+
+    gym = Gym(name='Perf Gym', owner_id=owner.id, is_setup_complete=True)
+    db.session.add(gym)
+    db.session.flush()
+    owner.gym_id = gym.id
+
+    main = Branch(name='Main', code='PF1', gym_id=gym.id, is_active=True)
+    second = Branch(name='Second', code='PF2', gym_id=gym.id, is_active=True)
+    db.session.add_all([main, second])
+    db.session.flush()
+
+    staff = {}
+    for tag, role, branch in (
+        ('desk', UserRole.FRONT_DESK, main),
+        ('manager', UserRole.BRANCH_MANAGER, main),
+        ('accountant', UserRole.BRANCH_ACCOUNTANT, second),
+        ('central', UserRole.CENTRAL_ACCOUNTANT, None),
+        ('idle', UserRole.FRONT_DESK, second),
+        ('trainer', UserRole.TRAINER, main),  # not on the report
+    ):
+        user = User(username=f'perf_{tag}', email=f'perf_{tag}@example.com',
+                    full_name=f'Staff {tag}', role=role, gym_id=gym.id,
+                    branch_id=branch.id if branch else None, is_active=True)
+        user.set_password('secret123')
+        db.session.add(user)
+        db.session.flush()
+        staff[tag] = user.id
+
+    service = Service(name='Monthly', service_type=ServiceType.GYM, price=500,
+                      duration_days=30, is_active=True)
+    db.session.add(service)
+    db.session.flush()
+
+    today = date.today()
+    rng = random.Random(6)
+    sellers = ['desk', 'manager', 'accountant', 'central', 'trainer']
+
+    for n in range(40):
+        seller = staff[rng.choice(sellers)]
+        member = Customer(full_name=f'Perf {n}', phone=f'0177{n:07d}',
+                          branch_id=main.id, is_active=True)
+        db.session.add(member)
+        db.session.flush()
+
+        # A subscription that may have ended, and for some members a second
+        # one: sometimes after the first, sometimes active now, sometimes
+        # neither — every branch of "came back".
+        start = today - timedelta(days=rng.randrange(10, 80))
+        end = start + timedelta(days=rng.choice([5, 20, 30, 120]))
+        first = Subscription(
+            customer_id=member.id, service_id=service.id, branch_id=main.id,
+            start_date=start, end_date=end, created_by=seller,
+            status=SubscriptionStatus.EXPIRED if end < today else SubscriptionStatus.ACTIVE,
+            created_at=datetime.combine(start, datetime.min.time()),
+        )
+        db.session.add(first)
+        follow_up = rng.choice(['after', 'active', 'stopped', None])
+        if follow_up:
+            db.session.add(Subscription(
+                customer_id=member.id, service_id=service.id, branch_id=main.id,
+                start_date=end if follow_up == 'after' else start - timedelta(days=60),
+                end_date=end + timedelta(days=30),
+                created_by=staff[rng.choice(sellers)],
+                status={'after': SubscriptionStatus.EXPIRED,
+                        'active': SubscriptionStatus.ACTIVE,
+                        'stopped': SubscriptionStatus.STOPPED}[follow_up],
+                created_at=datetime.combine(start, datetime.min.time()),
+            ))
+
+    now = datetime.utcnow()
+    for n in range(300):
+        when = now - timedelta(days=rng.randrange(0, 120), minutes=rng.randrange(1440))
+        db.session.add(Transaction(
+            amount=rng.choice([100, 250.5, 500, 1000]),
+            discount=rng.choice([0, 0, 25.25, 50]),
+            payment_method=rng.choice(list(PaymentMethod)),
+            transaction_type=rng.choice(list(TransactionType)),
+            branch_id=rng.choice([main, second]).id,
+            created_by=staff[rng.choice(sellers)],
+            transaction_date=when, created_at=when,
+        ))
+
+    db.session.commit()
+    globals()['IDS'] = {'gym': gym.id, 'main': main.id, 'second': second.id,
+                        'owner': owner.id, **staff}
+
+
+@pytest.fixture
+def owner(app):
+    response = app.test_client().post(
+        '/api/auth/login', json={'username': 'perf_owner', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['access_token']}
+
+
+def _old_figures(staff_id, month_start, month_end):
+    """The per-staff loop the report used to run, verbatim in substance."""
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.transaction import Transaction, TransactionType
+
+    window = (datetime.combine(month_start.date(), datetime.min.time()),
+              datetime.combine(month_end.date(), datetime.max.time()))
+    transactions = Transaction.query.filter(
+        Transaction.created_by == staff_id,
+        Transaction.created_at >= window[0],
+        Transaction.created_at <= window[1],
+    ).all()
+    new_subs = sum(1 for t in transactions
+                   if t.transaction_type == TransactionType.SUBSCRIPTION)
+    renewals = sum(1 for t in transactions
+                   if t.transaction_type == TransactionType.RENEWAL)
+    created = Subscription.query.filter(
+        Subscription.created_by == staff_id,
+        Subscription.created_at >= window[0],
+        Subscription.created_at <= window[1],
+    ).all()
+    ended = [s for s in created if s.end_date and s.end_date < date.today()]
+    retained = 0
+    if ended:
+        candidates = defaultdict(list)
+        for cs in Subscription.query.filter(
+                Subscription.customer_id.in_({s.customer_id for s in ended})).all():
+            candidates[cs.customer_id].append(cs)
+        for sub in ended:
+            if any(cs.id != sub.id and (cs.start_date >= sub.end_date
+                                        or cs.status == SubscriptionStatus.ACTIVE)
+                   for cs in candidates.get(sub.customer_id, [])):
+                retained += 1
+    return {
+        'transactions_count': len(transactions),
+        'total_revenue': float(sum(float(t.amount) - float(t.discount or 0)
+                                   for t in transactions)),
+        'new_subscriptions': new_subs,
+        'renewals_count': renewals,
+        'renewal_rate': (renewals / (new_subs + renewals) * 100
+                         if new_subs + renewals else None),
+        'customers_signed': len(created),
+        'subscriptions_ended': len(ended),
+        'retention_rate': retained / len(ended) * 100 if ended else None,
+    }
+
+
+# ──────────────────────────────── parity ─────────────────────────────────────
+
+@pytest.mark.parametrize('query', ['', '?month={month}', '?start_date={start}&end_date={end}'])
+def test_every_figure_matches_the_per_staff_loop(app, owner, query):
+    today = date.today()
+    query = query.format(month=today.strftime('%Y-%m'),
+                         start=(today - timedelta(days=45)).isoformat(),
+                         end=today.isoformat())
+    response = app.test_client().get(
+        '/api/reports/employee-performance' + query, headers=owner)
+    assert response.status_code == 200, response.get_json()
+    rows = response.get_json()['data']
+
+    # The central accountant has no home branch, so the owner's branch scope
+    # has never listed them; the trainer is not a sales role.
+    assert {r['staff_id'] for r in rows} == {
+        IDS[tag] for tag in ('desk', 'manager', 'accountant', 'idle')}
+
+    with app.test_request_context('/api/reports/employee-performance' + query):
+        from flask import request
+        args = request.args
+    if 'month' in args:
+        month_start = datetime.strptime(args['month'], '%Y-%m')
+        nxt = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        month_end = nxt - timedelta(days=1)
+    elif 'start_date' in args:
+        month_start = datetime.strptime(args['start_date'], '%Y-%m-%d')
+        month_end = datetime.strptime(args['end_date'], '%Y-%m-%d')
+    else:
+        month_end = datetime.utcnow()
+        month_start = month_end - timedelta(days=90)
+
+    with app.app_context():
+        for row in rows:
+            expected = _old_figures(row['staff_id'], month_start, month_end)
+            got = {key: row[key] for key in expected}
+            assert got == pytest.approx(expected), row['full_name']
+
+    revenues = [r['total_revenue'] for r in rows]
+    assert revenues == sorted(revenues, reverse=True)
+    if not query:
+        assert any(r['retention_rate'] not in (None, 0.0, 100.0) for r in rows), (
+            'the fixture should exercise partial retention')
+
+
+def test_someone_who_sold_nothing_reads_as_nothing(app, owner):
+    rows = app.test_client().get(
+        '/api/reports/employee-performance', headers=owner).get_json()['data']
+    idle = next(r for r in rows if r['staff_id'] == IDS['idle'])
+
+    assert (idle['transactions_count'], idle['total_revenue']) == (0, 0.0)
+    assert idle['renewal_rate'] is None and idle['retention_rate'] is None
+
+
+# ──────────────────────────────── budget ─────────────────────────────────────
+
+def _report_queries(app, owner):
+    from app.services.query_profiler import collect_queries
+
+    client = app.test_client()
+    with app.app_context():
+        with collect_queries() as log:
+            response = client.get('/api/reports/employee-performance', headers=owner)
+    assert response.status_code == 200, response.get_json()
+    return log.count, len(response.get_json()['data'])
+
+
+def _load_bench(app):
+    """Top the staff up to BENCH_STAFF and the ledger to BENCH_TRANSACTIONS."""
+    from app.extensions import db
+    from app.models.transaction import PaymentMethod, Transaction, TransactionType
+    from app.models.user import User, UserRole
+
+    rng = random.Random(500)
+    with app.app_context():
+        existing = User.query.filter(User.gym_id == IDS['gym']).count()
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'bench_{n}', 'email': f'bench_{n}@example.com',
+             'password_hash': 'x', 'full_name': f'Bench {n}',
+             'role': UserRole.FRONT_DESK, 'gym_id': IDS['gym'],
+             'branch_id': rng.choice([IDS['main'], IDS['second']]), 'is_active': True}
+            for n in range(BENCH_STAFF - existing)
+        ])
+        staff_ids = [row[0] for row in db.session.query(User.id).filter(
+            User.gym_id == IDS['gym']).all()]
+
+        now = datetime.utcnow()
+        methods, kinds = list(PaymentMethod), list(TransactionType)
+        for offset in range(0, BENCH_TRANSACTIONS, _BATCH):
+            batch = []
+            for _ in range(min(_BATCH, BENCH_TRANSACTIONS - offset)):
+                when = now - timedelta(seconds=rng.randrange(365 * 86400))
+                batch.append({
+                    'amount': 500, 'discount': 0,
+                    'payment_method': methods[rng.randrange(3)],
+                    'transaction_type': kinds[rng.randrange(4)],
+                    'branch_id': IDS['main'],
+                    'created_by': staff_ids[rng.randrange(len(staff_ids))],
+                    'transaction_date': when, 'created_at': when,
+                })
+            db.session.execute(Transaction.__table__.insert(), batch)
+        db.session.commit()
+
+
+def test_query_count_is_flat_in_the_number_of_staff(app, owner):
+    few_queries, few_staff = _report_queries(app, owner)
+
+    _load_bench(app)
+    many_queries, many_staff = _report_queries(app, owner)
+
+    # Less the owner, the trainer and the branchless central accountant.
+    assert many_staff == BENCH_STAFF - 3
+    assert many_queries == few_queries, (
+        f'{few_queries} queries for {few_staff} staff, '
+        f'{many_queries} for {many_staff}'
+    )
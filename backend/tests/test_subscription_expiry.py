@@ -0,0 +1,192 @@
+"""Subscription expiry: set-based, chunked, and counted per gym.
+
+``auto_expire_subscriptions`` (app/utils/helpers.py) expires overdue
+subscriptions and deactivates the fingerprints of members left with nothing
+that opens the door. These tests hold it to that:
+
+* only active subscriptions past their end date expire;
+* a member's fingerprints go only when no current active subscription whose
+  service grants entry is left — a PT-only package does not keep them;
+* the counts come back per gym, and are the same whatever the chunk size, and
+  on a database without ``UPDATE ... RETURNING`` (MySQL);
+* the statements issued depend on the number of chunks, not on the number of
+  subscriptions or fingerprints.
+
+Run with:  pytest backend/tests/test_subscription_expiry.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture
+def app():
+    """Function-scoped: every test expires the same fixture from scratch."""
+    os.environ['DATABASE_URL'] = (
+        'sqlite:///' + tempfile.mktemp(suffix='.db').replace(os.sep, '/')
+    )
+    from app import create_app
+    from app.extensions import db
+
+    application = create_app('testing')
+    with application.app_context():
+        db.create_all()
+        _seed()
+    return application
+
+
+def _seed():
+    from app.extensions import db
+    from app.models.branch import Branch
+    from app.models.customer import Customer
+    from app.models.fingerprint import Fingerprint
+    from app.models.gym import Gym
+    from app.models.service import Service, ServiceType
+    from app.models.subscription import Subscription, SubscriptionStatus
+    from app.models.user import User, UserRole
+
+    ids = {}
+    branches = []
+    for n in range(2):
+        owner = User(username=f'ex_owner{n}', email=f'ex_owner{n}@example.com',
+                     full_name='Owner', role=UserRole.OWNER, is_active=True)
+        owner.set_password('secret123')
+        db.session.add(owner)
+        db.session.flush()
+        gym = Gym(name=f'expiry gym {n}', owner_id=owner.id, is_setup_complete=True)
+        db.session.add(gym)
+        db.session.flush()
+        branch = Branch(name=f'expiry branch {n}', code=f'EX{n}', gym_id=gym.id,
+                        is_active=True)
+        db.session.add(branch)
+        db.session.flush()
+        ids[f'gym{n}'] = gym.id
+        branches.append(branch)
+
+    gym_service = Service(name='Gym', service_type=ServiceType.GYM, price=500,
+                          duration_days=30, allowed_days_per_week=7,
+                          grants_gym_entry=True)
+    pt_service = Service(name='PT', service_type=ServiceType.PERSONAL_TRAINING,
+                         price=2000, duration_days=90, allowed_days_per_week=7,
+                         grants_gym_entry=False)
+    db.session.add_all([gym_service, pt_service])
+    db.session.flush()
+
+    def member(tag, branch, *subscriptions):
+        customer = Customer(full_name=tag, phone=f'0166{len(ids):07d}',
+                            branch_id=branch.id, is_active=True)
+        db.session.add(customer)
+        db.session.flush()
+        ids[tag] = customer.id
+        db.session.add(Fingerprint(customer_id=customer.id,
+                                   fingerprint_hash=f'print-{tag}',
+                                   template_hash=f'tmpl-{tag}', is_active=True))
+        for n, (service, end_offset, status) in enumerate(subscriptions):
+            subscription = Subscription(
+                customer_id=customer.id, service_id=service.id, branch_id=branch.id,
+                start_date=TODAY - timedelta(days=60),
+                end_date=TODAY + timedelta(days=end_offset),
+                status=status, subscription_type='time_based')
+            db.session.add(subscription)
+            db.session.flush()
+            ids[f'{tag}.{n}'] = subscription.id
+
+    active, frozen = SubscriptionStatus.ACTIVE, SubscriptionStatus.FROZEN
+    first, second = branches
+    member('lapsed', first, (gym_service, -1, active))
+    member('lapsed_twice', first, (gym_service, -10, active), (gym_service, -2, active))
+    member('renewed', first, (gym_service, -1, active), (gym_service, 20, active))
+    member('pt_only_left', second, (gym_service, -1, active), (pt_service, 40, active))
+    member('current', second, (gym_service, 0, active))
+    member('frozen', second, (gym_service, -1, frozen))
+    db.session.commit()
+    globals()['IDS'] = ids
+
+
+def _state():
+    from app.models.fingerprint import Fingerprint
+    from app.models.subscription import Subscription
+
+    statuses = {s.id: s.status.value for s in Subscription.query}
+    prints = {f.customer_id: f.is_active for f in Fingerprint.query}
+    return statuses, prints
+
+
+def test_overdue_subscriptions_expire_and_members_without_entry_are_locked_out(app):
+    from app.utils.helpers import auto_expire_subscriptions
+
+    with app.app_context():
+        result = auto_expire_subscriptions(today=TODAY)
+        statuses, prints = _state()
+
+    assert result['expired'] == 5
+    assert result['by_gym'] == {IDS['gym0']: 4, IDS['gym1']: 1}
+    assert result['fingerprints_deactivated'] == 3
+
+    for key in ('lapsed.0', 'lapsed_twice.0', 'lapsed_twice.1', 'renewed.0',
+                'pt_only_left.0'):
+        assert statuses[IDS[key]] == 'expired', key
+    for key in ('renewed.1', 'pt_only_left.1', 'current.0'):
+        assert statuses[IDS[key]] == 'active', key
+    assert statuses[IDS['frozen.0']] == 'frozen'
+
+    assert prints[IDS['lapsed']] is False
+    assert prints[IDS['lapsed_twice']] is False
+    assert prints[IDS['pt_only_left']] is False  # PT does not open the door
+    assert prints[IDS['renewed']] is True
+    assert prints[IDS['current']] is True
+    assert prints[IDS['frozen']] is True
+
+
+def test_chunking_and_limits_do_not_change_the_outcome(app):
+    from app.utils.helpers import auto_expire_subscriptions
+
+    with app.app_context():
+        first = auto_expire_subscriptions(limit=3, chunk_size=2, today=TODAY)
+        rest = auto_expire_subscriptions(limit=3, chunk_size=2, today=TODAY)
+        assert auto_expire_subscriptions(today=TODAY)['expired'] == 0
+        statuses, prints = _state()
+
+    assert (first['expired'], rest['expired']) == (3, 2)
+    assert first['fingerprints_deactivated'] + rest['fingerprints_deactivated'] == 3
+    assert list(statuses.values()).count('expired') == 5
+    assert sorted(prints.values()) == [False] * 3 + [True] * 3
+
+
+def test_without_update_returning_the_counts_are_the_same(app, monkeypatch):
+    from app.extensions import db
+    from app.utils.helpers import auto_expire_subscriptions
+
+    with app.app_context():
+        # As on MySQL: the expired ids are read back instead of returned.
+        monkeypatch.setattr(db.engine.dialect, 'update_returning', False)
+        first = auto_expire_subscriptions(limit=3, chunk_size=2, today=TODAY)
+        rest = auto_expire_subscriptions(today=TODAY)
+        statuses, _ = _state()
+
+    assert (first['expired'], rest['expired']) == (3, 2)
+    by_gym = {gym: first['by_gym'].get(gym, 0) + rest['by_gym'].get(gym, 0)
+              for gym in (IDS['gym0'], IDS['gym1'])}
+    assert by_gym == {IDS['gym0']: 4, IDS['gym1']: 1}
+    assert first['fingerprints_deactivated'] + rest['fingerprints_deactivated'] == 3
+    assert list(statuses.values()).count('expired') == 5
+
+
+def test_statements_scale_with_chunks_not_rows(app):
+    from app.services.query_profiler import collect_queries
+    from app.utils.helpers import auto_expire_subscriptions
+
+    with app.app_context():
+        with collect_queries() as log:
+            auto_expire_subscriptions(today=TODAY)
+    # One chunk: page, expire, deactivate. A short page means no next one.
+    writes = [s for s in log.sql if s.startswith('UPDATE')]
+    assert len(writes) == 2
+    assert len([s for s in log.sql if s.startswith('SELECT')]) == 1
@@ -325,19 +325,17 @@ def test_role_notifications_do_not_cross_gyms(app):
         gym_a_id = Gym.query.filter_by(owner_id=owner_a.id).one().id
 
     import app.services.fcm_service as fcm
+    from app.services.push_outbox import FakeTransport, dispatch_pending
 
-    original = fcm.send_push_to_tokens
-
-    def capture(tokens, *args, **kwargs):
-        sent_to.extend(tokens)
-        return len(tokens)
-
-    fcm.send_push_to_tokens = capture
-    try:
-        with app.app_context():
-            fcm.notify_role('owner', 'title', 'body', gym_id=gym_a_id)
-    finally:
-        fcm.send_push_to_tokens = original
+    # Deliver through a recording transport, from this thread.
+    transport = FakeTransport()
+    app.extensions['push_transport'] = transport
+    app.config['PUSH_DISPATCHER'] = 'manual'
+    with app.app_context():
+        fcm.notify_role('owner', 'title', 'body', gym_id=gym_a_id)
+        dispatch_pending()
+    for call in transport.sent:
+        sent_to.extend(call['tokens'])
 
     assert 'token-owner_A' in sent_to, 'gym A owner should have been notified'
     assert 'token-owner_B' not in sent_to, "gym B's owner was notified about gym A"
@@ -0,0 +1,104 @@
+"""The shared upsert (app/utils/upsert.py), on each of its three paths.
+
+The summary tables' listeners all write through ``upsert``. These tests hold
+it to the same outcome whichever statement the dialect gets:
+
+* ``ON CONFLICT DO UPDATE`` (SQLite here, Postgres in production) inserts a
+  new key and folds a repeat into the existing row;
+* the UPDATE-then-INSERT fallback, for a dialect with neither, does the same;
+* MySQL is given ``ON DUPLICATE KEY UPDATE`` with the same assignments, in the
+  order they were written.
+
+Run with:  pytest backend/tests/test_upsert.py
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+metadata = MetaData()
+counters = Table(
+    'counters', metadata,
+    Column('branch_id', Integer, primary_key=True),
+    Column('minute', String(16), primary_key=True),
+    Column('entries', Integer, nullable=False),
+    Column('label', String(20)),
+)
+
+
+def _add(new):
+    return {'entries': counters.c.entries + new.entries, 'label': new['label']}
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        yield connection
+
+
+class _Dialect:
+    """The engine's dialect, under another name."""
+
+    def __init__(self, dialect, name):
+        self._dialect = dialect
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._dialect, attribute)
+
+
+class _Renamed:
+    """A connection whose dialect reports ``name``, executing for real."""
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self.dialect = _Dialect(connection.dialect, name)
+
+    def execute(self, statement, *args):
+        return self._connection.execute(statement, *args)
+
+
+def _rows(connection):
+    return connection.execute(
+        select(counters).order_by(counters.c.branch_id, counters.c.minute)).all()
+
+
+@pytest.mark.parametrize('dialect', [None, 'firebird'])
+def test_a_new_key_is_inserted_and_a_repeat_is_folded_in(connection, dialect):
+    from app.utils.upsert import upsert
+
+    target = connection if dialect is None else _Renamed(connection, dialect)
+    for branch_id, entries, label in ((1, 2, 'first'), (1, 3, 'second'), (2, 5, 'other')):
+        upsert(target, counters,
+               {'branch_id': branch_id, 'minute': '10:00', 'entries': entries, 'label': label},
+               ['branch_id', 'minute'], _add)
+
+    assert _rows(connection) == [(1, '10:00', 5, 'second'), (2, '10:00', 5, 'other')]
+
+
+def test_mysql_gets_on_duplicate_key_update():
+    from sqlalchemy.dialects import mysql
+    from app.utils.upsert import upsert
+
+    executed = []
+
+    class _Recording:
+        dialect = mysql.dialect()
+
+        def execute(self, statement):
+            executed.append(statement)
+
+    upsert(_Recording(), counters,
+           {'branch_id': 1, 'minute': '10:00', 'entries': 2, 'label': 'x'},
+           ['branch_id', 'minute'], _add)
+
+    [statement] = executed
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assert sql.startswith('INSERT INTO counters')
+    assert ('ON DUPLICATE KEY UPDATE entries = (counters.entries + VALUES(entries)), '
+            'label = VALUES(label)') in sql